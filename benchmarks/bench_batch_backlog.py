@@ -0,0 +1,123 @@
+"""Backlog triage: real-time adapter path vs. batch-inference backlog mode.
+
+Both paths use the same stub model (fixed latency, fixed token usage), run
+guardrails, and record the action without side effects. Real-time runs the
+adapter, guardrails and action per message on ``--concurrency`` threads.
+Batch mode runs ``BacklogRun`` with the local job backend. Cost is token cost
+at ``--input-cost-per-1k``/``--output-cost-per-1k``, with batch at half price.
+A real Bedrock batch job also waits in a queue, which is not simulated here.
+
+    python benchmarks/bench_batch_backlog.py --messages 5000 --model-latency-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import batch_inference as bi  # noqa: E402
+import bedrock_adapter as ba  # noqa: E402
+import guardrails_handler  # noqa: E402
+
+OUTPUT = json.dumps(
+    {
+        "category": "SYSTEM_TRANSIENT",
+        "recommended_action": "REDRIVE",
+        "confidence": 0.9,
+        "summary": "Transient timeout.",
+        "reasoning": "Replayable.",
+    }
+)
+
+
+class StubModel:
+    def __init__(self, latency_ms: float) -> None:
+        self.latency_ms = latency_ms
+
+    def invoke_model(self, **_kwargs):
+        time.sleep(self.latency_ms / 1000)
+        body = {"content": [{"text": OUTPUT}], "usage": {"input_tokens": 250, "output_tokens": 60}}
+        return {"body": io.BytesIO(json.dumps(body).encode("utf-8"))}
+
+
+def _bodies(count: int):
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return [
+        json.dumps(
+            {
+                "correlationId": f"bench-{i}",
+                "failureCategory": "DOWNSTREAM_TIMEOUT",
+                "errorMessage": f"Timeout after 3 retries calling inventory-{i % 40}",
+                "timestamp": now,
+                "stateAtFailure": "FAILED",
+                "redriveAttempts": 0,
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def _realtime(messages, model, concurrency: int):
+    ba._bedrock_client = lambda: model
+
+    def one(message):
+        started = time.perf_counter()
+        result = ba.handler({"message": message}, None)
+        guarded = guardrails_handler.handler({**result, **bi.GUARDRAIL_PARAMS}, None)
+        bi.decide(guarded["llm"], guarded["guardrails"], 0.8)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, messages))
+    return time.perf_counter() - started, sum(latencies) / len(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model-latency-ms", type=float, default=20.0)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--input-cost-per-1k", type=float, default=0.003)
+    parser.add_argument("--output-cost-per-1k", type=float, default=0.015)
+    args = parser.parse_args()
+
+    messages = list(bi.messages_from_bodies(_bodies(args.messages)))
+    model = StubModel(args.model_latency_ms)
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull, tempfile.TemporaryDirectory() as run_dir:
+        sys.stdout = devnull  # silence handler logs/metrics
+        try:
+            realtime_seconds, mean_latency_ms = _realtime(messages, model, args.concurrency)
+            backend = bi.LocalBatchBackend(model, os.path.join(run_dir, "jobs"), workers=args.concurrency)
+            run = bi.BacklogRun(
+                run_dir, backend, chunk_size=args.chunk_size, actions=lambda _decision, _event: None, poll_seconds=0.05
+            )
+            run.run(messages)
+        finally:
+            sys.stdout = stdout
+        report = run.report(args.input_cost_per_1k, args.output_cost_per_1k, mean_latency_ms, args.concurrency)
+
+    per_1k = report["per_1k_messages"]
+    print(
+        f"messages={args.messages} concurrency={args.concurrency} model_latency={args.model_latency_ms}ms "
+        f"chunk_size={args.chunk_size}"
+    )
+    print(f"realtime  measured={realtime_seconds / args.messages * 1000:.2f}s/1k mean_latency={mean_latency_ms:.1f}ms")
+    for path in ("realtime", "batch"):
+        print(f"{path:<9} cost=${per_1k[path]['cost_usd']:.3f}/1k time={per_1k[path]['seconds']:.2f}s/1k")
+    print(f"batch stages: {json.dumps(run.progress()['seconds'])}")
+
+
+if __name__ == "__main__":
+    main()
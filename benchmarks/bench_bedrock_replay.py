@@ -0,0 +1,123 @@
+"""Offline load test of the Bedrock adapter against the replay stand-in.
+
+Without a cassette, a synthetic one is generated for the sample messages.
+
+    python benchmarks/bench_bedrock_replay.py --messages 2000 --concurrency 32 \\
+        --latency lognormal:900,0.6 --throttle-rate 0.02 [--cassette recorded.jsonl]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba  # noqa: E402
+import bedrock_standin as bs  # noqa: E402
+
+
+def _messages(count: int):
+    return [
+        {
+            "correlationId": f"bench-{i % 50}",
+            "failureCategory": "DOWNSTREAM_TIMEOUT",
+            "errorMessage": "Timeout after 3 retries",
+            "timestamp": "2025-01-15T10:36:00Z",
+            "stateAtFailure": "FAILED",
+            "redriveAttempts": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def _synthetic_cassette(path: str, messages, model_id: str) -> None:
+    output = {
+        "category": "SYSTEM_TRANSIENT",
+        "recommended_action": "REDRIVE",
+        "confidence": 0.9,
+        "summary": "Transient timeout.",
+        "reasoning": "Replayable.",
+    }
+    seen = set()
+    with open(path, "w", encoding="utf-8") as handle:
+        for message in messages:
+            body = json.dumps({"messages": [{"role": "user", "content": [{"type": "text", "text": ba._build_prompt(message)}]}]})
+            key = bs.fingerprint(model_id, body)
+            if key in seen:
+                continue
+            seen.add(key)
+            entry = {
+                "fingerprint": key,
+                "model_id": model_id,
+                "response": {"content": [{"text": json.dumps(output)}], "usage": {"input_tokens": 250, "output_tokens": 60}},
+                "latency_ms": 800.0,
+            }
+            handle.write(json.dumps(entry) + "\n")
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", default="lognormal:900,0.6")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--cassette")
+    args = parser.parse_args()
+
+    messages = _messages(args.messages)
+    cassette = args.cassette
+    if not cassette:
+        cassette = os.path.join(tempfile.mkdtemp(), "synthetic.jsonl")
+        _synthetic_cassette(cassette, messages, os.getenv("MODEL_ID", "anthropic.claude-3-7-sonnet-20250219-v1:0"))
+
+    os.environ.update(
+        {
+            "BEDROCK_STANDIN_MODE": "replay",
+            "BEDROCK_CASSETTE": cassette,
+            "BEDROCK_STANDIN_LATENCY": args.latency,
+            "BEDROCK_STANDIN_THROTTLE_RATE": str(args.throttle_rate),
+            "BEDROCK_STANDIN_ERROR_RATE": str(args.error_rate),
+            "BEDROCK_STANDIN_SEED": "7",
+        }
+    )
+
+    def run(message):
+        started = time.perf_counter()
+        result = ba.handler({"message": message}, None)
+        return (time.perf_counter() - started) * 1000, result["llm"]["category"] == "UNKNOWN"
+
+    stdout = sys.stdout
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull  # silence adapter logs/metrics
+        try:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                results = list(pool.map(run, messages))
+        finally:
+            sys.stdout = stdout
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    fallbacks = sum(1 for _, fallback in results if fallback)
+    print(f"messages={len(results)} concurrency={args.concurrency} latency={args.latency}")
+    print(f"throughput={len(results) / elapsed:.1f} msg/s fallback_rate={fallbacks / len(results):.3f}")
+    print(
+        f"p50={_percentile(latencies, 0.50):.1f}ms p90={_percentile(latencies, 0.90):.1f}ms "
+        f"p99={_percentile(latencies, 0.99):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Decision log write throughput and query latency on a synthetic corpus.
+
+    python benchmarks/bench_decision_log.py [rows]
+"""
+from __future__ import annotations
+
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import decision_log as dl  # noqa: E402
+
+CATEGORIES = ["SYSTEM_TRANSIENT", "DATA_QUALITY", "UNKNOWN", "DEPENDENCY_OUTAGE"]
+SOURCES = [f"service-{i}" for i in range(40)]
+REASONS = ["stale_message", "max_attempts_exceeded", "already_completed", "duplicate_message", "token_budget_exceeded"]
+
+
+def _rows(count: int, start: int):
+    rng = random.Random(42)
+    for i in range(count):
+        category = rng.choice(CATEGORIES)
+        reasons = [r for r in REASONS if rng.random() < 0.1]
+        action = "REDRIVE" if category == "SYSTEM_TRANSIENT" and not reasons else "TICKET"
+        yield {
+            "ts": start + i // 4,
+            "failure_category": "DOWNSTREAM_TIMEOUT",
+            "category": category,
+            "llm_action": action,
+            "action": action,
+            "state": "FAILED",
+            "source": rng.choice(SOURCES),
+            "attempts": rng.randint(0, 3),
+            "confidence": rng.random(),
+            "reasons": reasons,
+            "correlation_id": f"c-{i}",
+            "error_message": "Timeout after 3 retries",
+            "summary": "Transient timeout.",
+            "timestamp": "",
+        }
+
+
+def _timed(label: str, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = (time.perf_counter() - started) * 1000
+    shown = result if not isinstance(result, dict) else dict(sorted(result.items())[:4])
+    print(f"{label:<58} {elapsed:8.1f} ms  {shown}")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    root = tempfile.mkdtemp(prefix="decision-log-")
+    start = 1_736_900_000
+    try:
+        writer = dl.DecisionLogWriter(root, flush_rows=65536)
+        started = time.perf_counter()
+        writer.extend(_rows(count, start))
+        writer.close()
+        elapsed = time.perf_counter() - started
+        print(f"wrote {count} rows in {elapsed:.1f}s ({count / elapsed:,.0f} rows/s)")
+
+        log = dl.DecisionLog(root)
+        week = (start + count // 8, start + count // 4)
+        _timed("count(category=SYSTEM_TRANSIENT, action=REDRIVE)", lambda: log.count(category="SYSTEM_TRANSIENT", action="REDRIVE"))
+        _timed(
+            "count(SYSTEM_TRANSIENT redrives, source, time range)",
+            lambda: log.count(start=week[0], end=week[1], category="SYSTEM_TRANSIENT", action="REDRIVE", source="service-7"),
+        )
+        _timed("aggregate(group_by=category)", lambda: log.aggregate("category"))
+        _timed("aggregate(group_by=reason, action=TICKET)", lambda: log.aggregate("reason", action="TICKET"))
+        _timed("aggregate(group_by=time, reason=stale_message)", lambda: log.aggregate("time", reason="stale_message"))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
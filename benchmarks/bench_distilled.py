@@ -0,0 +1,98 @@
+"""Distilled classifier: accuracy, Bedrock calls avoided, latency and artifact size.
+
+A synthetic decision history mixes recurring error templates (with varying
+ids, numbers and hosts) and a tail of one-off errors. ``--label-noise`` of
+rows carry a different label, to stand in for model disagreement.
+
+    python benchmarks/bench_distilled.py --rows 50000 --templates 120 --threshold 0.95
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import distilled_classifier as dc  # noqa: E402
+
+WORDS = (
+    "timeout connection refused reset peer upstream inventory payments orders gateway schema field missing "
+    "invalid expected number string null throttled rate exceeded access denied kms decrypt role token expired "
+    "deadlock lock wait database replica lag partition offset commit serialization unknown enum value"
+).split()
+CATEGORIES = ["SYSTEM_TRANSIENT|REDRIVE", "DATA_ERROR|TICKET", "PERMISSION|TICKET", "CAPACITY|REDRIVE", "BUG|TICKET"]
+FAILURES = ["DOWNSTREAM_TIMEOUT", "VALIDATION_ERROR", "AUTH_ERROR", "THROTTLED", "UNHANDLED"]
+
+
+def _history(rows: int, templates: int, noise: float, one_off: float, seed: int):
+    rng = random.Random(seed)
+    shapes = []
+    for _ in range(templates):
+        label = rng.randrange(len(CATEGORIES))
+        words = " ".join(rng.sample(WORDS, rng.randint(4, 9)))
+        shapes.append((FAILURES[label], words + " at {host}:{port} after {n} ms (request {id})", CATEGORIES[label]))
+    weights = [1 / (rank + 1) for rank in range(templates)]  # a few templates dominate
+    out = []
+    for _ in range(rows):
+        if rng.random() < one_off:
+            text = " ".join(rng.choices(WORDS, k=rng.randint(3, 8))) + f" {uuid.uuid4()}"
+            out.append((rng.choice(FAILURES), text, rng.choice(CATEGORIES)))
+            continue
+        failure, template, label = rng.choices(shapes, weights)[0]
+        text = template.format(host=f"10.0.{rng.randint(0, 255)}.{rng.randint(0, 255)}", port=rng.randint(1000, 9999), n=rng.randint(1, 30000), id=uuid.uuid4())
+        if rng.random() < noise:
+            label = rng.choice(CATEGORIES)
+        out.append((failure, text, label))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--templates", type=int, default=120)
+    parser.add_argument("--label-noise", type=float, default=0.02)
+    parser.add_argument("--one-off", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    args = parser.parse_args()
+
+    history = _history(args.rows, args.templates, args.label_noise, args.one_off, seed=7)
+    cut = int(len(history) * 0.8)
+    calibration_cut = int(cut * 0.9)
+    started = time.perf_counter()
+    model = dc.train(history[:calibration_cut], calibration=history[calibration_cut:cut])
+    train_seconds = time.perf_counter() - started
+
+    holdout = history[cut:]
+    report = dc.evaluate(model, holdout, thresholds=(args.threshold,))
+    covered = report["thresholds"][str(args.threshold)]
+    messages = [{"failureCategory": c, "errorMessage": e} for c, e, _ in holdout]
+    speed = dc.latency(model, messages[:5000])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.dlqc")
+        size = dc.save(model, path)
+        started = time.perf_counter()
+        dc.load(path)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    print(f"rows={args.rows} templates={args.templates} noise={args.label_noise} one_off={args.one_off}")
+    print(f"train={train_seconds:.2f}s features={len(model.weights)} temperature={model.temperature:.2f}")
+    print(f"artifact={size / 1024:.1f} KiB load={load_ms:.1f}ms")
+    print(f"holdout accuracy={report['accuracy']:.3f} calibration_error={report['calibration_error']:.3f}")
+    print(
+        f"threshold={args.threshold} answered_locally={covered['coverage']:.1%} "
+        f"local_accuracy={covered['accuracy'] if covered['accuracy'] is not None else 0:.3f}"
+    )
+    print(
+        f"predict p50={speed['predict_us_p50']}us p99={speed['predict_us_p99']}us "
+        f"batch={speed['batch_per_second']} msg/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Decode throughput and SQS request/byte savings for packed and compressed bodies.
+
+    python benchmarks/bench_envelopes.py [events]
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "lambda"))
+
+import envelopes  # noqa: E402
+
+
+def _events(count: int):
+    return [
+        {
+            "correlationId": f"0194e12c-13c4-7358-bf00-{i:012d}",
+            "failureCategory": ("DOWNSTREAM_TIMEOUT", "VALIDATION_ERROR", "THROTTLED")[i % 3],
+            "errorMessage": f"Timeout after 3 retries calling inventory-service (attempt {i % 7})",
+            "timestamp": "2025-01-15T10:36:00Z",
+            "stateAtFailure": "FAILED",
+            "redriveAttempts": i % 3,
+            "source": ("payments", "orders", "billing")[i % 3],
+        }
+        for i in range(count)
+    ]
+
+
+def _sns(body: str) -> str:
+    return json.dumps({"Type": "Notification", "MessageId": "m", "TopicArn": "arn:aws:sns:x", "Message": body})
+
+
+def main(count: int) -> None:
+    events = _events(count)
+    cases = {
+        "plain": [json.dumps(e) for e in events],
+        "sns(plain)": [_sns(json.dumps(e)) for e in events],
+        "packed": envelopes.encode_events(events, max_events=100),
+        "packed+gzip": envelopes.encode_events(events, compression="gzip", max_events=100),
+        "sns(packed+gzip)": [_sns(b) for b in envelopes.encode_events(events, compression="gzip", max_events=100)],
+    }
+    if envelopes.zstandard is not None:
+        cases["packed+zstd"] = envelopes.encode_events(events, compression="zstd", max_events=100)
+
+    print(f"{'case':<18} {'bodies':>7} {'send reqs':>9} {'bytes/event':>11} {'decode ev/s':>12}")
+    for name, bodies in cases.items():
+        started = time.perf_counter()
+        decoded = sum(len(envelopes.decode_body(b)) for b in bodies)
+        elapsed = time.perf_counter() - started
+        assert decoded == count, name
+        total_bytes = sum(len(b.encode("utf-8")) for b in bodies)
+        # SendMessageBatch carries up to 10 bodies per request
+        requests = -(-len(bodies) // 10)
+        print(f"{name:<18} {len(bodies):>7} {requests:>9} {total_bytes / count:>11.1f} {count / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
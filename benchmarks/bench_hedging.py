@@ -0,0 +1,105 @@
+"""Tail latency with and without hedged requests, against a simulated long-tail backend.
+
+Call latency is lognormal (median ``--median-ms``), and ``--slow-rate`` of calls
+stall for ``--slow-ms`` (a cold or overloaded host). Stalls are independent, so a
+hedge usually lands on a healthy host. Times are scaled down so the run is quick.
+
+    python benchmarks/bench_hedging.py --calls 2000 --concurrency 16 --max-rate 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import hedging  # noqa: E402
+
+
+class LongTailBackend:
+    def __init__(self, median_ms: float, sigma: float, slow_rate: float, slow_ms: float, seed: int) -> None:
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self) -> str:
+        with self._lock:
+            self.calls += 1
+            stalled = self._random.random() < self.slow_rate
+            latency_ms = self._random.lognormvariate(0, self.sigma) * self.median_ms
+        time.sleep((latency_ms + (self.slow_ms if stalled else 0)) / 1000)
+        return "ok"
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _run(args, hedger):
+    backend = LongTailBackend(args.median_ms, args.sigma, args.slow_rate, args.slow_ms, seed=7)
+
+    def one(_index):
+        started = time.perf_counter()
+        if hedger is None:
+            backend.call()
+        else:
+            hedger.run(backend.call, backend.call)
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one, range(args.calls)))
+    return latencies, backend.calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--median-ms", type=float, default=20.0)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    parser.add_argument("--max-rate", type=float, default=0.1)
+    parser.add_argument("--percentile", type=float, default=0.9)
+    args = parser.parse_args()
+
+    print(
+        f"calls={args.calls} concurrency={args.concurrency} median={args.median_ms}ms "
+        f"slow_rate={args.slow_rate} slow={args.slow_ms}ms"
+    )
+    for label, hedger in (
+        ("no hedging", None),
+        (
+            f"hedged p{int(args.percentile * 100)} cap={args.max_rate}",
+            hedging.Hedger(
+                percentile=args.percentile,
+                max_rate=args.max_rate,
+                min_delay_ms=1,
+                initial_delay_ms=args.median_ms * 2,
+                max_workers=args.concurrency * 2,
+            ),
+        ),
+    ):
+        latencies, backend_calls = _run(args, hedger)
+        line = (
+            f"{label:<24} p50={_percentile(latencies, 0.50):6.1f}ms p99={_percentile(latencies, 0.99):6.1f}ms "
+            f"p99.9={_percentile(latencies, 0.999):6.1f}ms extra_calls={(backend_calls - args.calls) / args.calls:.1%}"
+        )
+        if hedger is not None:
+            stats = hedger.stats()
+            line += f" hedge_rate={stats['hedge_rate']:.1%} hedge_win_rate={stats['win_rate']:.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Full parse vs. lazy field extraction on large DLQ bodies.
+
+Each case decodes the body, normalizes it and serializes the Step Functions
+input, which is the triage handler's per-record work.
+
+    python benchmarks/bench_lazy_decode.py [iterations]
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "lambda"))
+
+os.environ["LAZY_DECODE_MIN_BYTES"] = "1"
+import lazy_json  # noqa: E402
+import triage_handler  # noqa: E402
+
+
+def _document(rng: random.Random, target_bytes: int):
+    """Nested order document: line items, addresses and free-text notes."""
+    items = []
+    while len(json.dumps(items)) < target_bytes:
+        items.append(
+            {
+                "sku": f"SKU-{rng.randrange(10**6):06d}",
+                "quantity": rng.randint(1, 9),
+                "price": round(rng.uniform(1, 500), 2),
+                "tags": [rng.choice(("fragile", "gift", "bulk", "cold")) for _ in range(3)],
+                "address": {"line1": f"{rng.randint(1, 999)} Main St", "city": "Springfield", "zip": "12345"},
+                "notes": "Customer requested \"leave at door\"; " * rng.randint(1, 4),
+            }
+        )
+    return {"orderId": "o-1", "items": items}
+
+
+def _bodies(target_bytes: int):
+    rng = random.Random(3)
+    head = {
+        "correlationId": "0194e12c-13c4-7358-bf00-000000000001",
+        "failureCategory": "DOWNSTREAM_TIMEOUT",
+        "errorMessage": "Timeout after 3 retries calling inventory-service",
+        "timestamp": "2025-01-15T10:36:00Z",
+        "stateAtFailure": "FAILED",
+        "redriveAttempts": 1,
+        "source": "orders",
+    }
+    nested = json.dumps({**head, "payload": _document(rng, target_bytes)})
+    blob = json.dumps({**head, "attachment": base64.b64encode(rng.randbytes(target_bytes * 3 // 4)).decode()})
+    return {"nested": nested, "blob": blob}
+
+
+def _full(body: str) -> str:
+    normalized = triage_handler._normalize(json.loads(body))
+    return json.dumps({"message": normalized, "trace": {}})
+
+
+def _lazy(body: str) -> str:
+    normalized = triage_handler._normalize(triage_handler._decode(body)[0])
+    return lazy_json.dumps({"message": normalized, "trace": {}})
+
+
+def _measure(func, body: str, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(body)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return iterations / elapsed, peak
+
+
+def main(iterations: int) -> None:
+    print(f"{'case':<14} {'body KiB':>8} {'mode':<5} {'bodies/s':>10} {'peak KiB':>9}")
+    for size in (64 * 1024, 256 * 1024, 1024 * 1024):
+        for name, body in _bodies(size).items():
+            assert json.loads(_full(body))["message"] == json.loads(_lazy(body))["message"]
+            for mode, func in (("full", _full), ("lazy", _lazy)):
+                rate, peak = _measure(func, body, iterations)
+                print(f"{name:<14} {len(body) / 1024:>8.0f} {mode:<5} {rate:>10,.0f} {peak / 1024:>9,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,90 @@
+"""Token reduction of prompt compaction vs. the old 10k-character truncation.
+
+Builds a small synthetic corpus of DLQ event shapes seen in practice and
+reports prompt tokens (chars / 4) for each, plus whether the tail of the
+error (usually the root cause) survives.
+
+    python benchmarks/bench_prompt_compaction.py
+"""
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "lambda"))
+
+import prompt_compaction as pc  # noqa: E402
+
+ROOT_CAUSE = "Caused by: java.net.SocketTimeoutException: connect timed out (inventory:8443)"
+
+
+def _normalized(raw):
+    return {
+        "correlationId": raw.get("correlationId") or raw.get("id") or "unknown",
+        "failureCategory": raw.get("failureCategory") or raw.get("category") or "UNKNOWN",
+        "errorMessage": raw.get("errorMessage") or raw.get("error") or "",
+        "timestamp": raw.get("timestamp") or raw.get("time") or "",
+        "stateAtFailure": raw.get("stateAtFailure") or raw.get("state") or "FAILED",
+        "redriveAttempts": int(raw.get("redriveAttempts", 0)),
+        "source": raw.get("source") or raw.get("service") or "unknown",
+        "raw": raw,
+    }
+
+
+def corpus():
+    base = {"correlationId": "0194e12c-13c4-7358-bf00-d40b0d69497b", "timestamp": "2025-01-15T10:36:00Z", "source": "orders"}
+    recursion = "\n".join(f"\tat com.acme.tree.Node.visit(Node.java:{118 + i % 3})" for i in range(1500))
+    retries = "\n".join(
+        f"\tat com.acme.http.RetryingClient.send(RetryingClient.java:88)\n\tat com.acme.http.Backoff.run(Backoff.java:{30 + i})"
+        for i in range(120)
+    )
+    headers = {f"x-amzn-header-{i}": "v" * 40 for i in range(30)}
+    return {
+        "short timeout": {**base, "failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": "Timeout after 3 retries"},
+        "deep recursion": {**base, "failureCategory": "BUG", "errorMessage": "java.lang.StackOverflowError\n" + recursion + "\n" + ROOT_CAUSE},
+        "retry loop trace": {**base, "failureCategory": "DOWNSTREAM_TIMEOUT", "error": "HttpRetryException\n" + retries + "\n" + ROOT_CAUSE},
+        "sns-wrapped headers": {
+            **base,
+            "category": "VALIDATION_ERROR",
+            "errorMessage": "Schema validation failed: field 'amount' must be positive",
+            "headers": headers,
+            "awsRequestId": "3f1c2a",
+            "receiptHandle": "AQEB" + "z" * 600,
+        },
+        "huge log dump": {
+            **base,
+            "failureCategory": "UNKNOWN",
+            "errorMessage": "Batch failed\n" + "".join(f"row {i}: ok {'.' * 60}\n" for i in range(3000)) + ROOT_CAUSE,
+        },
+    }
+
+
+def _legacy(message):
+    text = json.dumps(message)
+    return text[:10000] + "... [truncated]" if len(text) > 10000 else text
+
+
+def main() -> None:
+    print(f"{'event':<22} {'raw tok':>8} {'legacy tok':>10} {'compact tok':>11} {'saved':>7}  tail kept (legacy/compact)")
+    totals = [0, 0, 0]
+    for name, raw in corpus().items():
+        message = _normalized(raw)
+        original = pc.estimate_tokens(json.dumps(message))
+        legacy = _legacy(message)
+        text, report = pc.compact(message)
+        totals[0] += original
+        totals[1] += pc.estimate_tokens(legacy)
+        totals[2] += report["compacted_tokens"]
+        tail = f"{ROOT_CAUSE in legacy}/{ROOT_CAUSE in text}" if ROOT_CAUSE in json.dumps(raw) else "-"
+        saved = 1 - report["compacted_tokens"] / pc.estimate_tokens(legacy)
+        print(
+            f"{name:<22} {original:>8} {pc.estimate_tokens(legacy):>10} {report['compacted_tokens']:>11} {saved:>6.0%}"
+            f"  {tail}"
+        )
+    print(f"{'total':<22} {totals[0]:>8} {totals[1]:>10} {totals[2]:>11} {1 - totals[2] / totals[1]:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
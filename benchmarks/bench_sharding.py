@@ -0,0 +1,117 @@
+"""Per-worker cache hit rate and throughput: fingerprint-affinity vs random assignment.
+
+Messages follow a Zipf distribution over ``--signatures`` error templates, with
+volatile ids and numbers. Each of ``--workers`` workers has its own bounded
+``SimilarityIndex`` (``--cache`` entries), as the Bedrock adapter does. A hit
+reuses a prior decision; a miss costs a model call of ``--model-ms``. The
+model time is simulated, not slept, and each worker overlaps ``--concurrency``
+calls. Throughput is messages / (slowest worker's index time + model time).
+
+Also reports how many signatures change owner when one worker is added, for
+the hash ring and for ``hash % N``.
+
+    python benchmarks/bench_sharding.py --messages 40000 --workers 8 --signatures 4000 --cache 500
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import sharding  # noqa: E402
+from similarity_index import SimilarityIndex  # noqa: E402
+
+WORDS = (
+    "timeout connection refused reset upstream inventory payments orders gateway schema field missing invalid "
+    "expected number string throttled rate exceeded access denied decrypt token expired deadlock lock replica "
+    "partition offset commit serialization enum value quota disk socket handshake certificate"
+).split()
+CATEGORIES = ["DOWNSTREAM_TIMEOUT", "VALIDATION_ERROR", "AUTH_ERROR", "THROTTLED", "UNHANDLED"]
+
+
+def _messages(count: int, signatures: int, seed: int):
+    rng = random.Random(seed)
+    templates = [
+        (rng.choice(CATEGORIES), " ".join(rng.sample(WORDS, 6)) + " on host-{n} after {ms} ms (request {id})")
+        for _ in range(signatures)
+    ]
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(signatures)]
+    out = []
+    for template_category, template in rng.choices(templates, weights, k=count):
+        text = template.format(n=rng.randint(1, 99), ms=rng.randint(1, 30000), id=rng.getrandbits(48))
+        out.append({"failureCategory": template_category, "errorMessage": text})
+    return out
+
+
+def _simulate(messages, assign, workers: int, cache: int, model_ms: float, concurrency: int):
+    indexes = [SimilarityIndex(max_entries=cache) for _ in range(workers)]
+    cpu = [0.0] * workers
+    misses = [0] * workers
+    for i, message in enumerate(messages):
+        worker = assign(i, message)
+        index = indexes[worker]
+        started = time.perf_counter()
+        if index.query(message["errorMessage"], 0.8, message["failureCategory"]) is None:
+            misses[worker] += 1
+            index.add(str(i), message["errorMessage"], {"recommended_action": "TICKET"}, message["failureCategory"])
+        cpu[worker] += time.perf_counter() - started
+    wall = max(cpu[w] + misses[w] * model_ms / 1000 / concurrency for w in range(workers))
+    return {
+        "hit_rate": 1 - sum(misses) / len(messages),
+        "model_calls": sum(misses),
+        "throughput": len(messages) / wall,
+        "busiest_share": max(index.stats["queries"] for index in indexes) / len(messages),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=40000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--signatures", type=int, default=4000)
+    parser.add_argument("--cache", type=int, default=500)
+    parser.add_argument("--model-ms", type=float, default=800.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--vnodes", type=int, default=128)
+    args = parser.parse_args()
+
+    messages = _messages(args.messages, args.signatures, seed=7)
+    nodes = [f"worker-{i}" for i in range(args.workers)]
+    ring = sharding.HashRing(nodes, vnodes=args.vnodes)
+    slot = {node: i for i, node in enumerate(nodes)}
+    rng = random.Random(11)
+
+    started = time.perf_counter()
+    keys = [sharding.shard_key(message) for message in messages]
+    owners = [slot[ring.node_for(key)] for key in keys]
+    route_us = (time.perf_counter() - started) / len(messages) * 1e6
+
+    results = {
+        "random": _simulate(messages, lambda i, m: rng.randrange(args.workers), args.workers, args.cache, args.model_ms, args.concurrency),
+        "affinity": _simulate(messages, lambda i, m: owners[i], args.workers, args.cache, args.model_ms, args.concurrency),
+    }
+
+    distinct = sorted(set(keys))
+    grown = sharding.HashRing(nodes + [f"worker-{args.workers}"], vnodes=args.vnodes)
+    ring_moved = sharding.moved_fraction(ring, grown, distinct)
+    modulo_moved = sum(int(k, 16) % args.workers != int(k, 16) % (args.workers + 1) for k in distinct) / len(distinct)
+
+    print(
+        f"messages={args.messages} workers={args.workers} signatures={args.signatures} "
+        f"cache={args.cache}/worker model={args.model_ms:.0f}ms x{args.concurrency}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:>8}: hit_rate={result['hit_rate']:.1%} model_calls={result['model_calls']} "
+            f"throughput={result['throughput']:.0f} msg/s busiest_worker={result['busiest_share']:.1%}"
+        )
+    print(f"routing={route_us:.1f}us/message (signature + ring lookup)")
+    print(f"add worker {args.workers + 1}: ring moves {ring_moved:.1%} of signatures, hash % N moves {modulo_moved:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Per-message validation cost: legacy path vs. compiled adapters.
+
+Run with the installed Pydantic (v1 or v2):
+
+    python benchmarks/bench_validation.py [iterations]
+"""
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "lambda"))
+sys.path.append(str(ROOT))
+
+import pydantic  # noqa: E402
+
+import bedrock_adapter as ba  # noqa: E402
+import dlq_triage_sample as sample  # noqa: E402
+
+OUTPUT_TEXT = json.dumps(
+    {
+        "category": "SYSTEM_TRANSIENT",
+        "recommended_action": "REDRIVE",
+        "confidence": 0.91,
+        "summary": "Transient timeout after retries.",
+        "reasoning": "Timeouts after retries are typically replayable once downstream recovers.",
+    }
+)
+OUTPUT_BYTES = OUTPUT_TEXT.encode("utf-8")
+MESSAGE = {
+    "correlationId": "0194e12c-13c4-7358-bf00-d40b0d69497b",
+    "failureCategory": "DOWNSTREAM_TIMEOUT",
+    "errorMessage": "Timeout after 3 retries",
+    "timestamp": "2025-01-15T10:36:00Z",
+    "stateAtFailure": "FAILED",
+    "redriveAttempts": 0,
+}
+BATCH = 100
+OUTPUT_BATCH = ("[" + ",".join([OUTPUT_TEXT] * BATCH) + "]").encode("utf-8")
+
+
+def legacy_output():
+    parsed = json.loads(OUTPUT_TEXT)
+    if hasattr(ba.TriageOutput, "model_validate"):
+        triage = ba.TriageOutput.model_validate(parsed)
+    else:
+        triage = ba.TriageOutput.parse_obj(parsed)
+    return triage.model_dump() if hasattr(triage, "model_dump") else triage.dict()
+
+
+def legacy_message():
+    if hasattr(sample.DLQMessage, "model_validate"):
+        return sample.DLQMessage.model_validate(MESSAGE)
+    return sample.DLQMessage.parse_obj(MESSAGE)
+
+
+CASES = [
+    ("output: json.loads + validate + dump", legacy_output, 1),
+    ("output: compiled validate_json + dump", lambda: ba.TRIAGE_OUTPUT.dump(ba.TRIAGE_OUTPUT.validate_json(OUTPUT_BYTES)), 1),
+    ("output: compiled validate_json_dict", lambda: ba.TRIAGE_OUTPUT.validate_json_dict(OUTPUT_BYTES), 1),
+    (f"output: batch of {BATCH} validate_json_many_dict", lambda: ba.TRIAGE_OUTPUT.validate_json_many_dict(OUTPUT_BATCH), BATCH),
+    ("message: model_validate per call", legacy_message, 1),
+    ("message: compiled validate_python", lambda: sample.DLQ_MESSAGE.validate_python(MESSAGE), 1),
+    (f"message: batch of {BATCH} validate_many", lambda: sample.validate_messages([MESSAGE] * BATCH), BATCH),
+]
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"pydantic {pydantic.VERSION}, {iterations} iterations")
+    for name, func, per_call in CASES:
+        calls = max(1, iterations // per_call)
+        seconds = min(timeit.repeat(func, number=calls, repeat=3))
+        print(f"{name:<48} {seconds / (calls * per_call) * 1e6:8.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
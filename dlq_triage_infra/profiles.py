@@ -0,0 +1,125 @@
+"""Named performance profiles for ``DlqTriageStack``.
+
+Select one with ``-c performance_profile=<name>`` and adjust single values
+with ``-c performance_overrides='{"batch_size": 5}'``. Profiles are plain
+data so they can be inspected and tested without synthesizing the stack.
+
+Keys:
+
+- ``memory_mb``: default Lambda memory; ``memory_overrides`` per function
+  (``triage``, ``bedrock``, ``guardrails``, ``redrive``, ``ticket``, ``producer``, ``quarantine``)
+- ``arm64``: run every function on Graviton
+- ``timeout_seconds``: Lambda timeout
+- ``reserved_concurrency`` / ``provisioned_concurrency``: per function name
+- ``batch_size`` / ``batch_window_seconds`` / ``max_concurrency``: SQS event source
+- ``visibility_timeout_seconds``: DLQ visibility timeout (keep it above six
+  times the function timeout plus the batching window)
+- ``workflow_type``: ``STANDARD`` or ``EXPRESS``. Every profile uses
+  STANDARD: triage names each execution after its SQS message and relies on
+  ``ExecutionAlreadyExists`` to skip events a redelivered batch already
+  started. Express workflows do not reject duplicate names, so with EXPRESS a
+  redelivery can run an event twice. Choose it only if the downstream steps
+  tolerate that.
+"""
+from __future__ import annotations
+
+import copy
+from typing import Any, Dict, Optional
+
+FUNCTIONS = ("triage", "bedrock", "guardrails", "redrive", "ticket", "producer", "quarantine")
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # Matches the original stack: Lambda defaults, one message per invocation
+    "default": {
+        "memory_mb": 128,
+        "memory_overrides": {},
+        "arm64": False,
+        "timeout_seconds": 30,
+        "reserved_concurrency": {},
+        "provisioned_concurrency": {},
+        "batch_size": 1,
+        "batch_window_seconds": 0,
+        "max_concurrency": None,
+        "workflow_type": "STANDARD",
+        "visibility_timeout_seconds": 60,
+    },
+    # Warm, well-resourced functions; every message starts immediately
+    "low-latency": {
+        "memory_mb": 512,
+        "memory_overrides": {"triage": 1024, "bedrock": 1024},
+        "arm64": True,
+        "timeout_seconds": 30,
+        "reserved_concurrency": {},
+        "provisioned_concurrency": {"triage": 2, "bedrock": 4},
+        "batch_size": 1,
+        "batch_window_seconds": 0,
+        "max_concurrency": 50,
+        "workflow_type": "STANDARD",
+        "visibility_timeout_seconds": 180,
+    },
+    # Large batches and a short window to amortize invocations during storms
+    "high-throughput": {
+        "memory_mb": 512,
+        "memory_overrides": {"triage": 1024},
+        "arm64": True,
+        "timeout_seconds": 60,
+        "reserved_concurrency": {"bedrock": 100},
+        "provisioned_concurrency": {},
+        "batch_size": 50,
+        "batch_window_seconds": 2,
+        "max_concurrency": 200,
+        "workflow_type": "STANDARD",
+        "visibility_timeout_seconds": 370,
+    },
+    # Small functions, long batching window and a hard cap on parallelism
+    "cost": {
+        "memory_mb": 256,
+        "memory_overrides": {},
+        "arm64": True,
+        "timeout_seconds": 60,
+        "reserved_concurrency": {"bedrock": 5},
+        "provisioned_concurrency": {},
+        "batch_size": 10,
+        "batch_window_seconds": 30,
+        "max_concurrency": 2,
+        "workflow_type": "STANDARD",
+        "visibility_timeout_seconds": 390,
+    },
+}
+
+
+def resolve(name: Optional[str] = None, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Profile ``name`` (default ``default``) with ``overrides`` applied, validated."""
+    name = name or "default"
+    if name not in PROFILES:
+        raise ValueError(f"Unknown performance profile {name!r}; expected one of {sorted(PROFILES)}")
+    profile = copy.deepcopy(PROFILES[name])
+    for key, value in (overrides or {}).items():
+        if key not in profile:
+            raise ValueError(f"Unknown performance setting {key!r}")
+        if isinstance(profile[key], dict) and isinstance(value, dict):
+            profile[key].update(value)
+        else:
+            profile[key] = value
+    profile["name"] = name
+
+    if profile["workflow_type"] not in ("STANDARD", "EXPRESS"):
+        raise ValueError("workflow_type must be STANDARD or EXPRESS")
+    if not 1 <= profile["batch_size"] <= 10000:
+        raise ValueError("batch_size must be between 1 and 10000")
+    if profile["batch_size"] > 10 and not profile["batch_window_seconds"]:
+        # SQS event sources reject batches above 10 without a batching window
+        raise ValueError("batch_size above 10 requires batch_window_seconds")
+    if profile["max_concurrency"] is not None and profile["max_concurrency"] < 2:
+        raise ValueError("max_concurrency must be at least 2")
+    if profile["visibility_timeout_seconds"] < profile["timeout_seconds"] + profile["batch_window_seconds"]:
+        raise ValueError("visibility_timeout_seconds must cover the function timeout and batching window")
+    for key in ("memory_overrides", "reserved_concurrency", "provisioned_concurrency"):
+        unknown = set(profile[key]) - set(FUNCTIONS)
+        if unknown:
+            raise ValueError(f"Unknown function(s) in {key}: {sorted(unknown)}")
+    return profile
+
+
+def memory_for(profile: Dict[str, Any], function: str) -> int:
+    return int(profile["memory_overrides"].get(function, profile["memory_mb"]))
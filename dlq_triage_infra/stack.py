@@ -1,18 +1,31 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
 
 import aws_cdk as cdk
 from aws_cdk import Duration
+from aws_cdk import aws_dynamodb as dynamodb
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_efs as efs
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as events_targets
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as _lambda
 from aws_cdk import aws_lambda_event_sources as lambda_events
+from aws_cdk import aws_logs as logs
+from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_sqs as sqs
 from aws_cdk import aws_sns as sns
 from aws_cdk import aws_stepfunctions as sfn
 from aws_cdk import aws_stepfunctions_tasks as tasks
 from constructs import Construct
 
+from dlq_triage_infra import profiles
+
+# Where the shared EFS access point is mounted; decision_log_dir and archive_dir must be under it
+EFS_MOUNT_PATH = "/mnt/efs"
+
 
 class DlqTriageStack(cdk.Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -20,37 +33,111 @@ class DlqTriageStack(cdk.Stack):
 
         model_id = self.node.try_get_context("model_id") or "anthropic.claude-3-sonnet-20240229-v1:0"
         bedrock_region = self.node.try_get_context("bedrockRegion") or "us-east-1"
+        # Optional failover regions in preference order, e.g. ["us-east-1", "us-west-2"]
+        bedrock_regions = self._json_context("bedrock_regions") or [bedrock_region]
         confidence_threshold = float(self.node.try_get_context("confidence_threshold") or 0.8)
+        # Optional cascade: list of {"model_id", "input_cost_per_1k", "output_cost_per_1k"}, cheapest first
+        model_tiers = self._json_context("model_tiers") or []
+        # Optional per-category escalation thresholds, e.g. {"SYSTEM_TRANSIENT": 0.85}
+        escalation_thresholds = self._json_context("escalation_thresholds") or {}
+        # Optional priority lanes / tenant quotas, see lambda/scheduling.py
+        priority_lanes = self._json_context("priority_lanes")
+        if priority_lanes:
+            # Caught at synth; at runtime such rules fall back to the default lane
+            lanes = set(priority_lanes.get("lanes", {}))
+            unknown = {rule.get("lane") for rule in priority_lanes.get("rules", [])} - lanes
+            if unknown:
+                raise ValueError(f"priority_lanes rules name unknown lane(s): {sorted(map(str, unknown))}")
+        # Optional decision log directory on the shared EFS mount, e.g. "/mnt/efs/decisions"
+        decision_log_dir = self.node.try_get_context("decision_log_dir") or ""
+        # Optional DLQ body archive for selective replay, also on the EFS mount
+        archive_dir = self.node.try_get_context("archive_dir") or ""
+        # Optional hot-reloadable guardrail policy (local path or s3://bucket/key)
+        guardrail_policy_path = self.node.try_get_context("guardrail_policy_path") or ""
+        # Optional message-only guardrails in the triage lambda, so hopeless messages skip Bedrock
+        guardrails_precheck = str(self.node.try_get_context("guardrails_precheck") or "false").lower() == "true"
+        guardrail_params = {"max_age_days": 2, "max_redrive_attempts": 2, "max_token_estimate": 2000}
+        # Producer body encoding: none | gzip | zstd (zstd needs the zstandard package bundled)
+        producer_encoding = self.node.try_get_context("producer_encoding") or "none"
+        # Optional distilled classifier artifact inside the lambda bundle, e.g. "models/distilled.dlqc"
+        distilled_model = self.node.try_get_context("distilled_model") or ""
+        distilled_threshold = str(self.node.try_get_context("distilled_threshold") or 0.95)
+        # Optional hedged Bedrock calls, e.g. {"max_rate": 0.05, "percentile": 0.95, "model_id": "..."}
+        bedrock_hedging = self._json_context("bedrock_hedging") or {}
+        # Optional Bedrock spend budgets, e.g. {"hourly_usd": 5, "daily_usd": 60, "degraded_model_id": "..."}
+        spend_budgets = self._json_context("spend_budgets") or {}
+        # Poison-message quarantine thresholds, e.g. {"max_failures": 3, "execution_cost_usd": 0.02}
+        quarantine_config = self._json_context("quarantine") or {}
+        # Optional handler profiling, e.g. {"mode": "sample", "rate": 0.05, "tracemalloc": true}
+        handler_profiling = self._json_context("handler_profiling") or {}
+        # Memory, architecture, concurrency, batching and workflow type, see profiles.py
+        self.profile = profiles.resolve(
+            self.node.try_get_context("performance_profile"), self._json_context("performance_overrides")
+        )
 
         dlq_queue = sqs.Queue(
             self,
             "DlqQueue",
-            visibility_timeout=Duration.seconds(60),
+            visibility_timeout=Duration.seconds(self.profile["visibility_timeout_seconds"]),
         )
 
         notify_topic = sns.Topic(self, "DlqTriageNotifications")
 
         lambda_dir = Path(__file__).resolve().parent.parent / "lambda"
 
+        # Each container's /tmp is private, so the logs go to one EFS file system shared by all
+        storage = self._shared_storage(decision_log_dir, archive_dir) if decision_log_dir or archive_dir else {}
+
         triage_lambda = _lambda.Function(
             self,
             "DlqTriageLambda",
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="triage_handler.handler",
             code=_lambda.Code.from_asset(str(lambda_dir)),
-            timeout=Duration.seconds(30),
+            **self._function_options("triage"),
+            **(storage if archive_dir else {}),
             environment={
                 "STATE_MACHINE_ARN": "PLACEHOLDER",
+                "PRIORITY_LANES": json.dumps(priority_lanes) if priority_lanes else "",
+                "DLQ_ARCHIVE_DIR": archive_dir,
+                "GUARDRAILS_PRECHECK": "1" if guardrails_precheck else "0",
+                "GUARDRAIL_POLICY_PATH": guardrail_policy_path,
+                **{f"GUARDRAIL_{name.upper()}": str(value) for name, value in guardrail_params.items()},
             },
         )
 
+        if archive_dir:
+            # Merges the small per-container segments into full indexed ones (DlqArchive.compact).
+            # One at a time: two compactions would merge the same segments twice.
+            compaction_lambda = _lambda.Function(
+                self,
+                "DlqArchiveCompactionLambda",
+                runtime=_lambda.Runtime.PYTHON_3_11,
+                handler="dlq_archive.compact_handler",
+                code=_lambda.Code.from_asset(str(lambda_dir)),
+                memory_size=1024,
+                architecture=_lambda.Architecture.ARM_64 if self.profile["arm64"] else _lambda.Architecture.X86_64,
+                timeout=Duration.minutes(15),
+                reserved_concurrent_executions=1,
+                **storage,
+                environment={"DLQ_ARCHIVE_DIR": archive_dir},
+            )
+            events.Rule(
+                self,
+                "DlqArchiveCompactionSchedule",
+                schedule=events.Schedule.rate(Duration.hours(1)),
+                targets=[events_targets.LambdaFunction(compaction_lambda)],
+            )
+
         redrive_lambda = _lambda.Function(
             self,
             "DlqRedriveLambda",
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="redrive_handler.handler",
             code=_lambda.Code.from_asset(str(lambda_dir)),
-            timeout=Duration.seconds(30),
+            **self._function_options("redrive"),
+            **(storage if decision_log_dir else {}),
+            environment={"DECISION_LOG_DIR": decision_log_dir},
         )
 
         ticket_lambda = _lambda.Function(
@@ -59,7 +146,9 @@ class DlqTriageStack(cdk.Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="ticket_handler.handler",
             code=_lambda.Code.from_asset(str(lambda_dir)),
-            timeout=Duration.seconds(30),
+            **self._function_options("ticket"),
+            **(storage if decision_log_dir else {}),
+            environment={"DECISION_LOG_DIR": decision_log_dir},
         )
 
         bedrock_adapter_lambda = _lambda.Function(
@@ -67,10 +156,16 @@ class DlqTriageStack(cdk.Stack):
             "DlqBedrockAdapterLambda",
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="bedrock_adapter.handler",
-            timeout=Duration.seconds(30),
+            **self._function_options("bedrock"),
             environment={
                 "MODEL_ID": model_id,
                 "BEDROCK_REGION": bedrock_region,
+                "BEDROCK_REGIONS": ",".join(bedrock_regions),
+                "CONFIDENCE_THRESHOLD": str(confidence_threshold),
+                "MODEL_TIERS": json.dumps(model_tiers),
+                "ESCALATION_THRESHOLDS": json.dumps(escalation_thresholds),
+                "DISTILLED_MODEL_PATH": distilled_model,
+                "DISTILLED_THRESHOLD": distilled_threshold,
             },
             code=_lambda.Code.from_asset(str(lambda_dir)),
         )
@@ -81,8 +176,17 @@ class DlqTriageStack(cdk.Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="guardrails_handler.handler",
             code=_lambda.Code.from_asset(str(lambda_dir)),
-            timeout=Duration.seconds(30),
+            **self._function_options("guardrails"),
+            environment={"GUARDRAIL_POLICY_PATH": guardrail_policy_path},
         )
+        if guardrail_policy_path.startswith("s3://"):
+            for function in (guardrails_lambda, triage_lambda):
+                function.add_to_role_policy(
+                    iam.PolicyStatement(
+                        actions=["s3:GetObject"],
+                        resources=[f"arn:aws:s3:::{guardrail_policy_path[5:]}"],
+                    )
+                )
 
         producer_lambda = _lambda.Function(
             self,
@@ -90,18 +194,131 @@ class DlqTriageStack(cdk.Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="producer_handler.handler",
             code=_lambda.Code.from_asset(str(lambda_dir)),
-            timeout=Duration.seconds(30),
+            **self._function_options("producer"),
             environment={
                 "DLQ_QUEUE_URL": dlq_queue.queue_url,
+                "PRODUCER_ENCODING": producer_encoding,
             },
         )
 
+        if bedrock_hedging:
+            hedging_env = {
+                "BEDROCK_HEDGING": "1",
+                "HEDGE_MAX_RATE": str(bedrock_hedging.get("max_rate", 0.1)),
+                "HEDGE_PERCENTILE": str(bedrock_hedging.get("percentile", 0.9)),
+                "HEDGE_MIN_DELAY_MS": str(bedrock_hedging.get("min_delay_ms", 50)),
+                "HEDGE_MODEL_ID": bedrock_hedging.get("model_id", ""),
+                "HEDGE_INPUT_COST_PER_1K": str(bedrock_hedging.get("input_cost_per_1k", 0)),
+                "HEDGE_OUTPUT_COST_PER_1K": str(bedrock_hedging.get("output_cost_per_1k", 0)),
+            }
+            for key, value in hedging_env.items():
+                bedrock_adapter_lambda.add_environment(key, value)
+
+        quarantine_table = dynamodb.Table(
+            self,
+            "QuarantineTable",
+            partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+        )
+        quarantine_env = {
+            "QUARANTINE_TABLE": quarantine_table.table_name,
+            "QUARANTINE_MAX_FAILURES": str(quarantine_config.get("max_failures", 3)),
+            "QUARANTINE_MAX_FINGERPRINT_FAILURES": str(quarantine_config.get("max_fingerprint_failures", 20)),
+            "QUARANTINE_FINGERPRINT_WINDOW_SECONDS": str(quarantine_config.get("fingerprint_window_seconds", 900)),
+            "QUARANTINE_FINGERPRINT_TTL_SECONDS": str(quarantine_config.get("fingerprint_ttl_seconds", 3600)),
+            "QUARANTINE_CACHE_SECONDS": str(quarantine_config.get("cache_seconds", 30)),
+            "QUARANTINE_EXECUTION_COST_USD": str(quarantine_config.get("execution_cost_usd", 0)),
+        }
+        quarantine_lambda = _lambda.Function(
+            self,
+            "DlqQuarantineLambda",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="quarantine_handler.handler",
+            code=_lambda.Code.from_asset(str(lambda_dir)),
+            **self._function_options("quarantine"),
+            environment=quarantine_env,
+        )
+        for key, value in quarantine_env.items():
+            triage_lambda.add_environment(key, value)
+
+        # Bodies too large for the 256 KB execution input travel by reference (lambda/payload_refs.py)
+        payload_bucket = s3.Bucket(
+            self,
+            "PayloadBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            # Matches the longest SQS retention; executions read the body within minutes
+            lifecycle_rules=[s3.LifecycleRule(prefix="payloads/", expiration=Duration.days(14))],
+        )
+        triage_lambda.add_environment("PAYLOAD_BUCKET", payload_bucket.bucket_name)
+        payload_bucket.grant_put(triage_lambda)
+        payload_bucket.grant_read(bedrock_adapter_lambda)
+        payload_bucket.grant_read(quarantine_lambda)
+        quarantine_table.grant_read_write_data(triage_lambda)
+        quarantine_table.grant_read_write_data(quarantine_lambda)
+
+        # Counter table shared by the spend governor and the tenant token quota
+        tenant_quota = (priority_lanes or {}).get("tenant_token_quota")
+        spend_table = None
+        if spend_budgets or tenant_quota:
+            spend_table = dynamodb.Table(
+                self,
+                "BedrockSpendTable",
+                partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+                sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+            )
+        if tenant_quota:
+            triage_lambda.add_environment("QUOTA_TABLE", spend_table.table_name)
+            spend_table.grant_read_write_data(triage_lambda)
+
+        if spend_budgets:
+            spend_env = {
+                "SPEND_TABLE": spend_table.table_name,
+                "SPEND_HARD_FACTOR": str(spend_budgets.get("hard_factor", 1.25)),
+                "SPEND_DEGRADED_MODEL_ID": spend_budgets.get("degraded_model_id", ""),
+            }
+            for name in ("hourly_usd", "daily_usd", "hourly_tokens", "daily_tokens"):
+                spend_env[f"SPEND_{name.upper()}"] = str(spend_budgets.get(name, 0))
+            for key, value in spend_env.items():
+                bedrock_adapter_lambda.add_environment(key, value)
+            spend_table.grant_read_write_data(bedrock_adapter_lambda)
+
+        if handler_profiling:
+            profiling_env = {
+                "PROFILE_MODE": handler_profiling.get("mode", "sample"),
+                "PROFILE_SAMPLE_RATE": str(handler_profiling.get("rate", 0.01)),
+                "PROFILE_TRACEMALLOC": "1" if handler_profiling.get("tracemalloc") else "0",
+            }
+            for function in (
+                triage_lambda,
+                redrive_lambda,
+                ticket_lambda,
+                bedrock_adapter_lambda,
+                guardrails_lambda,
+                producer_lambda,
+                quarantine_lambda,
+            ):
+                for key, value in profiling_env.items():
+                    function.add_environment(key, value)
+
+        # Functions with provisioned concurrency are invoked through their "live" alias
+        triage_target = self._invoke_target(triage_lambda, "triage")
+        bedrock_target = self._invoke_target(bedrock_adapter_lambda, "bedrock")
+        guardrails_target = self._invoke_target(guardrails_lambda, "guardrails")
+        redrive_target = self._invoke_target(redrive_lambda, "redrive")
+        ticket_target = self._invoke_target(ticket_lambda, "ticket")
+        quarantine_target = self._invoke_target(quarantine_lambda, "quarantine")
+
         # Step Functions: Bedrock adapter -> guardrails choice -> action -> SNS notify
         bedrock_task = tasks.LambdaInvoke(
             self,
             "BedrockAdapter",
-            lambda_function=bedrock_adapter_lambda,
-            payload=sfn.TaskInput.from_object({"message.$": "$.message"}),
+            lambda_function=bedrock_target,
+            payload=sfn.TaskInput.from_object({"message.$": "$.message", "trace.$": "$.trace"}),
             result_path="$.bedrock_result",
         )
         bedrock_task.add_retry(
@@ -113,14 +330,13 @@ class DlqTriageStack(cdk.Stack):
         guardrails_task = tasks.LambdaInvoke(
             self,
             "GuardrailsLambda",
-            lambda_function=guardrails_lambda,
+            lambda_function=guardrails_target,
             payload=sfn.TaskInput.from_object(
                 {
                     "message.$": "$.bedrock_result.Payload.message",
                     "llm.$": "$.bedrock_result.Payload.llm",
-                    "max_age_days": 2,
-                    "max_redrive_attempts": 2,
-                    "max_token_estimate": 2000,
+                    "trace.$": "$.bedrock_result.Payload.trace",
+                    **guardrail_params,
                 }
             ),
             result_path="$.guardrails_result",
@@ -129,9 +345,14 @@ class DlqTriageStack(cdk.Stack):
         redrive_task = tasks.LambdaInvoke(
             self,
             "RedriveLambda",
-            lambda_function=redrive_lambda,
+            lambda_function=redrive_target,
             payload=sfn.TaskInput.from_object(
-                {"message.$": "$.guardrails_result.Payload.message", "llm.$": "$.guardrails_result.Payload.llm"}
+                {
+                    "message.$": "$.guardrails_result.Payload.message",
+                    "llm.$": "$.guardrails_result.Payload.llm",
+                    "trace.$": "$.guardrails_result.Payload.trace",
+                    "guardrails.$": "$.guardrails_result.Payload.guardrails",
+                }
             ),
             result_path="$.redrive",
         )
@@ -144,9 +365,14 @@ class DlqTriageStack(cdk.Stack):
         ticket_task = tasks.LambdaInvoke(
             self,
             "TicketLambda",
-            lambda_function=ticket_lambda,
+            lambda_function=ticket_target,
             payload=sfn.TaskInput.from_object(
-                {"message.$": "$.guardrails_result.Payload.message", "llm.$": "$.guardrails_result.Payload.llm"}
+                {
+                    "message.$": "$.guardrails_result.Payload.message",
+                    "llm.$": "$.guardrails_result.Payload.llm",
+                    "trace.$": "$.guardrails_result.Payload.trace",
+                    "guardrails.$": "$.guardrails_result.Payload.guardrails",
+                }
             ),
             result_path="$.ticket",
         )
@@ -168,11 +394,23 @@ class DlqTriageStack(cdk.Stack):
                     "summary.$": "$.guardrails_result.Payload.llm.summary",
                     "allow_redrive.$": "$.guardrails_result.Payload.guardrails.allow_redrive",
                     "guardrail_reasons.$": "$.guardrails_result.Payload.guardrails.reasons",
+                    "trace_id.$": "$.guardrails_result.Payload.trace.trace_id",
                 }
             ),
             subject="DLQ triage outcome",
         )
 
+        # Failures that outlast the task retries are counted; repeat offenders get quarantined
+        record_failure = tasks.LambdaInvoke(
+            self,
+            "RecordFailure",
+            lambda_function=quarantine_target,
+            payload=sfn.TaskInput.from_object({"message.$": "$.message", "trace.$": "$.trace", "error.$": "$.error"}),
+            result_path="$.quarantine",
+        ).next(sfn.Fail(self, "TriageFailed", error="DlqTriageFailed", cause="Failure recorded for quarantine"))
+        for task in (bedrock_task, guardrails_task, redrive_task, ticket_task):
+            task.add_catch(record_failure, result_path="$.error")
+
         decision = sfn.Choice(self, "Decision")
         decision.when(
             sfn.Condition.and_(
@@ -184,11 +422,32 @@ class DlqTriageStack(cdk.Stack):
         )
         decision.otherwise(ticket_task.next(notify_task))
 
+        # Messages the triage lambda already rejected go straight to the ticket path
+        precheck = sfn.Choice(self, "GuardrailsPrecheck")
+        precheck.when(
+            sfn.Condition.is_present("$.precheck"),
+            sfn.Pass(
+                self,
+                "SkipBedrock",
+                parameters={
+                    "Payload": {
+                        "message.$": "$.message",
+                        "llm.$": "$.precheck.llm",
+                        "trace.$": "$.trace",
+                        "guardrails.$": "$.precheck.guardrails",
+                    }
+                },
+                result_path="$.guardrails_result",
+            ).next(ticket_task),
+        )
+        precheck.otherwise(bedrock_task.next(guardrails_task).next(decision))
+
         workflow = sfn.StateMachine(
             self,
             "DlqTriageStateMachine",
-            definition=bedrock_task.next(guardrails_task).next(decision),
+            definition=precheck,
             timeout=Duration.minutes(2),
+            **self._workflow_options(),
         )
 
         # Wire state machine ARN into triage lambda
@@ -198,28 +457,83 @@ class DlqTriageStack(cdk.Stack):
         workflow.grant_start_execution(triage_lambda)
 
         # Allow Step Functions to invoke lambdas and publish SNS
-        redrive_lambda.grant_invoke(workflow.role)
-        ticket_lambda.grant_invoke(workflow.role)
-        guardrails_lambda.grant_invoke(workflow.role)
-        bedrock_adapter_lambda.grant_invoke(workflow.role)
+        redrive_target.grant_invoke(workflow.role)
+        ticket_target.grant_invoke(workflow.role)
+        guardrails_target.grant_invoke(workflow.role)
+        bedrock_target.grant_invoke(workflow.role)
+        quarantine_target.grant_invoke(workflow.role)
         notify_topic.grant_publish(workflow.role)
 
-        # Allow Bedrock adapter to call Bedrock
+        # Allow Bedrock adapter to call Bedrock in every configured region
+        bedrock_adapter_lambda.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["bedrock:InvokeModel"],
+                resources=[
+                    arn
+                    for region in bedrock_regions
+                    for arn in (
+                        f"arn:aws:bedrock:{region}::foundation-model/*",
+                        f"arn:aws:bedrock:{region}:{self.account}:inference-profile/*",
+                    )
+                ],
+            )
+        )
+        # Cross-region inference profiles (us.*, eu.*, ...) route each call to the
+        # foundation model in one of the profile's destination regions, which may
+        # be outside bedrock_regions; allow any region, but only through our profiles
         bedrock_adapter_lambda.add_to_role_policy(
             iam.PolicyStatement(
                 actions=["bedrock:InvokeModel"],
-                resources=["*"],
+                resources=["arn:aws:bedrock:*::foundation-model/*"],
+                conditions={
+                    "StringLike": {
+                        "bedrock:InferenceProfileArn": [
+                            f"arn:aws:bedrock:{region}:{self.account}:inference-profile/*" for region in bedrock_regions
+                        ]
+                    }
+                },
             )
         )
 
         # Event source: SQS DLQ -> triage lambda
-        triage_lambda.add_event_source(
+        batch_window = self.profile["batch_window_seconds"]
+        triage_target.add_event_source(
             lambda_events.SqsEventSource(
                 dlq_queue,
-                batch_size=1,
+                batch_size=self.profile["batch_size"],
+                max_batching_window=Duration.seconds(batch_window) if batch_window else None,
+                max_concurrency=self.profile["max_concurrency"],
+                report_batch_item_failures=True,
             )
         )
 
+        # With several lanes, the DLQ consumer forwards each event to its lane's queue.
+        # Each lane queue has its own event source, with concurrency split by weight.
+        lane_weights = (priority_lanes or {}).get("lanes") or {}
+        if len(lane_weights) > 1:
+            total_concurrency = self.profile["max_concurrency"] or 20
+            total_weight = sum(lane_weights.values())
+            lane_urls = {}
+            for lane, weight in lane_weights.items():
+                lane_queue = sqs.Queue(
+                    self,
+                    f"DlqLaneQueue-{lane}",
+                    visibility_timeout=Duration.seconds(self.profile["visibility_timeout_seconds"]),
+                )
+                lane_queue.grant_send_messages(triage_lambda)
+                lane_urls[lane] = lane_queue.queue_url
+                triage_target.add_event_source(
+                    lambda_events.SqsEventSource(
+                        lane_queue,
+                        batch_size=self.profile["batch_size"],
+                        max_batching_window=Duration.seconds(batch_window) if batch_window else None,
+                        # The event source minimum is 2
+                        max_concurrency=max(2, round(total_concurrency * weight / total_weight)),
+                        report_batch_item_failures=True,
+                    )
+                )
+            triage_lambda.add_environment("LANE_QUEUES", self.to_json_string(lane_urls))
+
         # Allow producer lambda to send test messages into DLQ
         dlq_queue.grant_send_messages(producer_lambda)
 
@@ -228,3 +542,58 @@ class DlqTriageStack(cdk.Stack):
         cdk.CfnOutput(self, "StateMachineArn", value=workflow.state_machine_arn)
         cdk.CfnOutput(self, "SnsTopicArn", value=notify_topic.topic_arn)
         cdk.CfnOutput(self, "ProducerLambdaName", value=producer_lambda.function_name)
+        cdk.CfnOutput(self, "PerformanceProfile", value=self.profile["name"])
+
+    def _function_options(self, function: str) -> dict:
+        options = {
+            "memory_size": profiles.memory_for(self.profile, function),
+            "architecture": _lambda.Architecture.ARM_64 if self.profile["arm64"] else _lambda.Architecture.X86_64,
+            "timeout": Duration.seconds(self.profile["timeout_seconds"]),
+        }
+        reserved = self.profile["reserved_concurrency"].get(function)
+        if reserved:
+            options["reserved_concurrent_executions"] = reserved
+        return options
+
+    def _shared_storage(self, *paths: str) -> dict:
+        """VPC and EFS access point for the functions that write the decision log or archive."""
+        for path in paths:
+            if path and not path.startswith(EFS_MOUNT_PATH + "/"):
+                raise ValueError(f"{path} must be under {EFS_MOUNT_PATH} to be on the shared file system")
+        # The NAT gateway keeps AWS APIs (Step Functions, CloudWatch) reachable from the VPC
+        vpc = ec2.Vpc(self, "SharedStorageVpc", max_azs=2, nat_gateways=1)
+        file_system = efs.FileSystem(
+            self, "SharedStorage", vpc=vpc, encrypted=True, removal_policy=cdk.RemovalPolicy.RETAIN
+        )
+        access_point = file_system.add_access_point(
+            "LambdaAccessPoint",
+            path="/dlq-triage",
+            create_acl=efs.Acl(owner_uid="1001", owner_gid="1001", permissions="750"),
+            posix_user=efs.PosixUser(uid="1001", gid="1001"),
+        )
+        return {"vpc": vpc, "filesystem": _lambda.FileSystem.from_efs_access_point(access_point, EFS_MOUNT_PATH)}
+
+    def _invoke_target(self, fn: _lambda.Function, function: str) -> _lambda.IFunction:
+        provisioned = self.profile["provisioned_concurrency"].get(function)
+        if not provisioned:
+            return fn
+        return fn.add_alias("live", provisioned_concurrent_executions=provisioned)
+
+    def _workflow_options(self) -> dict:
+        if self.profile["workflow_type"] != "EXPRESS":
+            return {"state_machine_type": sfn.StateMachineType.STANDARD}
+        # Express workflows keep no execution history; log failures instead
+        return {
+            "state_machine_type": sfn.StateMachineType.EXPRESS,
+            "logs": sfn.LogOptions(
+                destination=logs.LogGroup(self, "DlqTriageWorkflowLogs", retention=logs.RetentionDays.ONE_WEEK),
+                level=sfn.LogLevel.ERROR,
+            ),
+        }
+
+    def _json_context(self, key: str):
+        """Context values arrive as objects from cdk.json but as strings from `-c`."""
+        value = self.node.try_get_context(key)
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
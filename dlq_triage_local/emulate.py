@@ -0,0 +1,253 @@
+"""End-to-end local run: producer -> SQS -> triage -> state machine -> SNS.
+
+Every piece is in-process: ``InMemorySqs`` and ``InMemorySns`` replace the
+queue and topic, ``WorkflowEmulator`` interprets the synthesized state
+machine, and the real handlers run unchanged. Bedrock is a deterministic stub
+(``StubBedrock``) with optional latency.
+
+    python -m dlq_triage_local.emulate --messages 10000 --workers 16
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from dlq_triage_local.sns import InMemorySns
+from dlq_triage_local.sqs import InMemorySqs
+from dlq_triage_local.workflow import LAMBDA_DIR, WorkflowEmulator, load_definition
+
+if str(LAMBDA_DIR) not in sys.path:
+    sys.path.append(str(LAMBDA_DIR))
+
+import bedrock_adapter  # noqa: E402
+import producer_handler  # noqa: E402
+import region_pool  # noqa: E402
+import triage_handler  # noqa: E402
+
+STATE_MACHINE_ARN = "arn:aws:states:local:000000000000:stateMachine:DlqTriage"
+CATEGORIES = ("DOWNSTREAM_TIMEOUT", "THROTTLED", "VALIDATION_ERROR", "SCHEMA_MISMATCH")
+
+
+class _Body:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class StubBedrock:
+    """Deterministic classifier: transient categories redrive, the rest ticket."""
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+
+    def invoke_model(self, **kwargs: Any) -> Dict[str, Any]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        prompt = json.loads(kwargs["body"])["messages"][0]["content"][0]["text"]
+        transient = "TIMEOUT" in prompt or "THROTTLED" in prompt
+        output = {
+            "category": "SYSTEM_TRANSIENT" if transient else "DATA_ERROR",
+            "recommended_action": "REDRIVE" if transient else "TICKET",
+            "confidence": 0.92 if transient else 0.75,
+            "summary": "Stub classification.",
+            "reasoning": "Deterministic local stub.",
+        }
+        payload = {"content": [{"text": json.dumps(output)}], "usage": {"input_tokens": len(prompt) // 4, "output_tokens": 60}}
+        return {"body": _Body(json.dumps(payload).encode("utf-8"))}
+
+
+class _LocalBoto3:
+    """Stands in for the ``boto3`` module inside the handlers."""
+
+    def __init__(self, clients: Dict[str, Any]) -> None:
+        self.clients = clients
+
+    def client(self, service: str, **_kwargs: Any) -> Any:
+        return self.clients[service]
+
+
+class LocalRuntime:
+    """Installs the in-memory services into the handler modules for the duration of a run."""
+
+    MODULES = (triage_handler, producer_handler, bedrock_adapter)
+
+    def __init__(self, workers: int = 8, bedrock: Optional[Any] = None, time_scale: float = 0.0) -> None:
+        self.sqs = InMemorySqs()
+        self.sns = InMemorySns(self.sqs)
+        self.queue_url = self.sqs.create_queue(QueueName="dlq")["QueueUrl"]
+        self.workflow = WorkflowEmulator(load_definition(), sns=self.sns, max_workers=workers, time_scale=time_scale)
+        self.boto3 = _LocalBoto3(
+            {"sqs": self.sqs, "stepfunctions": self.workflow, "bedrock-runtime": bedrock or StubBedrock()}
+        )
+        self._saved: List[Any] = []
+        self._env: Dict[str, Optional[str]] = {}
+
+    def __enter__(self) -> "LocalRuntime":
+        self._saved = [module.boto3 for module in self.MODULES]
+        for module in self.MODULES:
+            module.boto3 = self.boto3
+        for key, value in (("STATE_MACHINE_ARN", STATE_MACHINE_ARN), ("DLQ_QUEUE_URL", self.queue_url)):
+            self._env[key] = os.environ.get(key)
+            os.environ[key] = value
+        # Pools cache clients created from the real boto3
+        region_pool._POOLS.clear()
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.workflow.shutdown()
+        for module, saved in zip(self.MODULES, self._saved):
+            module.boto3 = saved
+        for key, value in self._env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        region_pool._POOLS.clear()
+
+    def produce(self, messages: List[Dict[str, Any]], pack_size: int = 1, chunk: int = 500) -> None:
+        previous = os.environ.get("PRODUCER_PACK_SIZE")
+        os.environ["PRODUCER_PACK_SIZE"] = str(pack_size)
+        try:
+            for start in range(0, len(messages), chunk):
+                producer_handler.handler({"messages": messages[start:start + chunk]}, None)
+        finally:
+            if previous is None:
+                os.environ.pop("PRODUCER_PACK_SIZE", None)
+            else:
+                os.environ["PRODUCER_PACK_SIZE"] = previous
+
+    def drain(self, batch_size: int = 10) -> int:
+        """Feed the queue to the triage handler until it is empty; returns batches handled."""
+        batches = 0
+        while True:
+            received = self.sqs.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=batch_size)
+            messages = received.get("Messages", [])
+            if not messages:
+                return batches
+            records = [
+                {
+                    "messageId": m["MessageId"],
+                    "receiptHandle": m["ReceiptHandle"],
+                    "body": m["Body"],
+                    "attributes": m["Attributes"],
+                }
+                for m in messages
+            ]
+            result = triage_handler.handler({"Records": records}, None)
+            failed = {f["itemIdentifier"] for f in result.get("batchItemFailures", [])}
+            entries = [
+                {"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]}
+                for i, m in enumerate(messages)
+                if m["MessageId"] not in failed
+            ]
+            if entries:
+                self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            batches += 1
+
+
+def sample_messages(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return [
+        {
+            "correlationId": f"local-{i:07d}",
+            "failureCategory": rng.choice(CATEGORIES),
+            "errorMessage": f"Call to inventory-service failed after {rng.randint(1, 5)} retries",
+            "timestamp": now,
+            "stateAtFailure": "FAILED",
+            "redriveAttempts": rng.choice((0, 0, 0, 1, 3)),
+            "source": rng.choice(("orders", "payments", "billing")),
+        }
+        for i in range(count)
+    ]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def summarize(runtime: LocalRuntime, wall_seconds: float) -> Dict[str, Any]:
+    executions = list(runtime.workflow.executions.values())
+    durations = [e["duration_ms"] for e in executions if "duration_ms" in e]
+    end_to_end = []
+    outcomes: Dict[str, int] = {}
+    for execution in executions:
+        states = execution.get("states", [])
+        outcome = "redrive" if "RedriveLambda" in states else "ticket" if "TicketLambda" in states else "none"
+        key = outcome if execution.get("status") == "SUCCEEDED" else execution.get("status", "UNKNOWN").lower()
+        outcomes[key] = outcomes.get(key, 0) + 1
+        # The trace starts at SQS send time, so this includes queue wait
+        trace = json.loads(execution.get("input") or "{}").get("trace")
+        if trace and "stop_ms" in execution:
+            end_to_end.append(execution["stop_ms"] - trace["start_ms"])
+    return {
+        "executions": len(executions),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_second": round(len(executions) / wall_seconds, 1) if wall_seconds else 0.0,
+        "workflow_ms": {p: round(_percentile(durations, q), 3) for p, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))},
+        "end_to_end_ms": {p: round(_percentile(end_to_end, q), 3) for p, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))},
+        "outcomes": outcomes,
+        "skipped_bedrock": sum("SkipBedrock" in e.get("states", []) for e in executions),
+        "sqs_calls": dict(runtime.sqs.calls),
+        "sns_published": sum(len(v) for v in runtime.sns.published.values()),
+    }
+
+
+def run(
+    messages: int,
+    workers: int = 8,
+    batch_size: int = 10,
+    bedrock_latency_ms: float = 0.0,
+    pack_size: int = 1,
+    quiet: bool = True,
+) -> Dict[str, Any]:
+    events = sample_messages(messages)
+    sink = io.StringIO() if quiet else sys.stdout
+    with redirect_stdout(sink), LocalRuntime(workers=workers, bedrock=StubBedrock(bedrock_latency_ms)) as runtime:
+        started = time.perf_counter()
+        runtime.produce(events, pack_size)
+        runtime.drain(batch_size)
+        runtime.workflow.wait()
+        wall = time.perf_counter() - started
+        if quiet:
+            # Handlers log heavily; keep memory flat on large runs
+            sink.seek(0)
+            sink.truncate()
+    return summarize(runtime, wall)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8, help="concurrent workflow executions")
+    parser.add_argument("--batch-size", type=int, default=10, help="SQS records per triage invocation")
+    parser.add_argument("--bedrock-latency-ms", type=float, default=0.0, help="stub Bedrock latency")
+    parser.add_argument("--pack-size", type=int, default=1, help="events per SQS body (see PRODUCER_PACK_SIZE)")
+    parser.add_argument("--verbose", action="store_true", help="keep handler logs and metrics on stdout")
+    args = parser.parse_args(argv)
+    summary = run(
+        args.messages,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        bedrock_latency_ms=args.bedrock_latency_ms,
+        pack_size=args.pack_size,
+        quiet=not args.verbose,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
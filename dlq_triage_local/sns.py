@@ -0,0 +1,56 @@
+"""In-memory SNS stand-in: topics, publish, and SQS or callback subscribers."""
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+
+class InMemorySns:
+    def __init__(self, sqs: Optional[Any] = None) -> None:
+        self.sqs = sqs
+        self.published: Dict[str, List[Dict[str, Any]]] = {}
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._lock = threading.Lock()
+
+    def create_topic(self, Name: str, **_kwargs) -> Dict[str, str]:
+        arn = f"arn:aws:sns:local:000000000000:{Name}"
+        with self._lock:
+            self.published.setdefault(arn, [])
+        return {"TopicArn": arn}
+
+    def subscribe(self, TopicArn: str, Protocol: str, Endpoint: Any, **_kwargs) -> Dict[str, str]:
+        """``Protocol`` is ``sqs`` (Endpoint is a queue URL) or ``callback`` (a callable)."""
+        if Protocol == "sqs":
+            if self.sqs is None:
+                raise ValueError("sqs subscriptions need an InMemorySqs")
+            queue_url = Endpoint
+
+            def _deliver(notification: Dict[str, Any]) -> None:
+                self.sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(notification))
+
+            callback = _deliver
+        elif Protocol == "callback":
+            callback = Endpoint
+        else:
+            raise ValueError(f"Unsupported protocol {Protocol!r}")
+        with self._lock:
+            self._subscribers.setdefault(TopicArn, []).append(callback)
+        return {"SubscriptionArn": f"{TopicArn}:{uuid.uuid4()}"}
+
+    def publish(self, TopicArn: str, Message: str, Subject: Optional[str] = None, **_kwargs) -> Dict[str, str]:
+        message_id = str(uuid.uuid4())
+        notification = {
+            "Type": "Notification",
+            "MessageId": message_id,
+            "TopicArn": TopicArn,
+            "Subject": Subject,
+            "Message": Message,
+        }
+        with self._lock:
+            self.published.setdefault(TopicArn, []).append(notification)
+            subscribers = list(self._subscribers.get(TopicArn, ()))
+        for callback in subscribers:
+            callback(notification)
+        return {"MessageId": message_id}
@@ -0,0 +1,181 @@
+"""In-memory SQS stand-in for local workers, emulators and tests.
+
+Implements the subset of the boto3 SQS client used in this repo, with
+visibility timeouts, long polling and receive counts. Timeouts are seconds
+and may be fractional to keep tests fast.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _Message:
+    __slots__ = ("message_id", "body", "sent_ms", "visible_at", "receipt_handle", "receive_count", "attributes")
+
+    def __init__(self, body: str, sent_ms: int, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.message_id = str(uuid.uuid4())
+        self.body = body
+        self.sent_ms = sent_ms
+        self.visible_at = 0.0
+        self.receipt_handle: Optional[str] = None
+        self.receive_count = 0
+        self.attributes = attributes or {}
+
+
+class _Queue:
+    def __init__(self, visibility_timeout: float) -> None:
+        self.visibility_timeout = visibility_timeout
+        self.messages: Dict[str, _Message] = {}
+        self.by_receipt: Dict[str, _Message] = {}
+
+
+class InMemorySqs:
+    def __init__(self, clock: Callable[[], float] = time.monotonic, default_visibility_timeout: float = 30.0) -> None:
+        self.clock = clock
+        self.default_visibility_timeout = default_visibility_timeout
+        self._queues: Dict[str, _Queue] = {}
+        self._cond = threading.Condition()
+        self._receipts = itertools.count()
+        self.calls: Dict[str, int] = {}
+
+    def _count(self, op: str) -> None:
+        self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _queue(self, url: str) -> _Queue:
+        if url not in self._queues:
+            self._queues[url] = _Queue(self.default_visibility_timeout)
+        return self._queues[url]
+
+    def create_queue(self, QueueName: str, Attributes: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        url = f"https://sqs.local/000000000000/{QueueName}"
+        with self._cond:
+            queue = self._queue(url)
+            if Attributes and "VisibilityTimeout" in Attributes:
+                queue.visibility_timeout = float(Attributes["VisibilityTimeout"])
+        return {"QueueUrl": url}
+
+    def send_message(self, QueueUrl: str, MessageBody: str, MessageAttributes: Optional[Dict[str, Any]] = None, **_kwargs):
+        self._count("SendMessage")
+        message = _Message(MessageBody, int(time.time() * 1000), MessageAttributes)
+        with self._cond:
+            self._queue(QueueUrl).messages[message.message_id] = message
+            self._cond.notify_all()
+        return {"MessageId": message.message_id}
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]]):
+        self._count("SendMessageBatch")
+        successful = []
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            for entry in Entries:
+                message = _Message(entry["MessageBody"], int(time.time() * 1000), entry.get("MessageAttributes"))
+                queue.messages[message.message_id] = message
+                successful.append({"Id": entry["Id"], "MessageId": message.message_id})
+            self._cond.notify_all()
+        return {"Successful": successful, "Failed": []}
+
+    def _take_visible(self, queue: _Queue, limit: int, visibility_timeout: float) -> List[Dict[str, Any]]:
+        now = self.clock()
+        taken = []
+        for message in queue.messages.values():
+            if len(taken) >= limit:
+                break
+            if message.visible_at > now:
+                continue
+            if message.receipt_handle:
+                queue.by_receipt.pop(message.receipt_handle, None)
+            message.receipt_handle = f"rh-{next(self._receipts)}-{message.message_id}"
+            message.receive_count += 1
+            message.visible_at = now + visibility_timeout
+            queue.by_receipt[message.receipt_handle] = message
+            entry = {
+                "MessageId": message.message_id,
+                "ReceiptHandle": message.receipt_handle,
+                "Body": message.body,
+                "Attributes": {
+                    "SentTimestamp": str(message.sent_ms),
+                    "ApproximateReceiveCount": str(message.receive_count),
+                },
+            }
+            if message.attributes:
+                entry["MessageAttributes"] = message.attributes
+            taken.append(entry)
+        return taken
+
+    def receive_message(
+        self,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        WaitTimeSeconds: float = 0,
+        VisibilityTimeout: Optional[float] = None,
+        **_kwargs,
+    ):
+        self._count("ReceiveMessage")
+        deadline = self.clock() + WaitTimeSeconds
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            timeout = queue.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+            while True:
+                taken = self._take_visible(queue, min(10, MaxNumberOfMessages), timeout)
+                remaining = deadline - self.clock()
+                if taken or remaining <= 0:
+                    return {"Messages": taken} if taken else {}
+                # Wake periodically so messages whose visibility expires are seen
+                self._cond.wait(min(remaining, 0.05))
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str):
+        self._count("DeleteMessage")
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            message = queue.by_receipt.pop(ReceiptHandle, None)
+            if message is not None:
+                queue.messages.pop(message.message_id, None)
+        return {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: List[Dict[str, str]]):
+        self._count("DeleteMessageBatch")
+        successful, failed = [], []
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            for entry in Entries:
+                message = queue.by_receipt.pop(entry["ReceiptHandle"], None)
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                    continue
+                queue.messages.pop(message.message_id, None)
+                successful.append({"Id": entry["Id"]})
+        return {"Successful": successful, "Failed": failed}
+
+    def change_message_visibility_batch(self, QueueUrl: str, Entries: List[Dict[str, Any]]):
+        self._count("ChangeMessageVisibilityBatch")
+        successful, failed = [], []
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            now = self.clock()
+            for entry in Entries:
+                message = queue.by_receipt.get(entry["ReceiptHandle"])
+                if message is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                    continue
+                message.visible_at = now + float(entry["VisibilityTimeout"])
+                successful.append({"Id": entry["Id"]})
+            self._cond.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def get_queue_attributes(self, QueueUrl: str, AttributeNames: Optional[List[str]] = None):
+        self._count("GetQueueAttributes")
+        with self._cond:
+            queue = self._queue(QueueUrl)
+            now = self.clock()
+            visible = sum(1 for m in queue.messages.values() if m.visible_at <= now)
+            in_flight = len(queue.messages) - visible
+        return {
+            "Attributes": {
+                "ApproximateNumberOfMessages": str(visible),
+                "ApproximateNumberOfMessagesNotVisible": str(in_flight),
+            }
+        }
@@ -0,0 +1,425 @@
+"""Local interpreter for the triage state machine (Amazon States Language).
+
+The definition comes from ``DlqTriageStack`` itself: ``synthesize`` builds the
+stack with the CDK, resolves the intrinsic functions in the state machine's
+``DefinitionString`` and rewrites Lambda ARNs to their handler names
+(``lambda:bedrock_adapter.handler``). The result is checked in as
+``state_machine.asl.json`` so the emulator runs without node or the CDK;
+``python -m dlq_triage_local.workflow --synth`` regenerates it.
+
+``WorkflowEmulator`` runs executions in-process: Task states call the
+handlers directly (``lambda:invoke`` results are wrapped in ``Payload`` as
+Step Functions does) or publish to an in-memory SNS, and the interpreter
+honors InputPath/Parameters/ResultSelector/ResultPath/OutputPath, Choice
+rules, Retry (backoff scaled by ``time_scale``) and Catch. It also exposes
+``start_execution`` so it can stand in for the Step Functions client used by
+``triage_handler``.
+"""
+from __future__ import annotations
+
+import copy
+import importlib
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+LAMBDA_DIR = ROOT / "lambda"
+DEFINITION_PATH = Path(__file__).with_name("state_machine.asl.json")
+
+LAMBDA_INVOKE = "arn:aws:states:::lambda:invoke"
+SNS_PUBLISH = "arn:aws:states:::sns:publish"
+
+_PATH_TOKEN = re.compile(r"\.([A-Za-z0-9_\-]+)|\[(\d+)\]|\['([^']+)'\]")
+_MISSING = object()
+
+
+class StatesError(Exception):
+    """A Step Functions error name (e.g. ``States.Runtime``) plus its cause."""
+
+    def __init__(self, error: str, cause: str = "") -> None:
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+        # Shaped like botocore's ClientError.response, for callers that check the code
+        self.response = {"Error": {"Code": error, "Message": cause}}
+
+
+def _tokens(path: str) -> List[Any]:
+    if not path.startswith("$"):
+        raise StatesError("States.Runtime", f"Invalid path {path!r}")
+    rest = path[2:] if path.startswith("$$") else path[1:]
+    tokens: List[Any] = []
+    position = 0
+    while position < len(rest):
+        match = _PATH_TOKEN.match(rest, position)
+        if match is None:
+            raise StatesError("States.Runtime", f"Unsupported path {path!r}")
+        name, index, quoted = match.groups()
+        tokens.append(int(index) if index is not None else (name or quoted))
+        position = match.end()
+    return tokens
+
+
+def get_path(data: Any, path: str, context: Optional[Dict[str, Any]] = None, default: Any = _MISSING) -> Any:
+    value = context if path.startswith("$$") else data
+    for token in _tokens(path):
+        try:
+            value = value[token]
+        except (KeyError, IndexError, TypeError):
+            if default is not _MISSING:
+                return default
+            raise StatesError("States.Runtime", f"Path {path!r} not found in input") from None
+    return value
+
+
+def set_path(data: Any, path: Optional[str], value: Any) -> Any:
+    """ResultPath semantics: ``$`` replaces, ``None`` keeps the input, else merge."""
+    if path is None:
+        return data
+    tokens = _tokens(path)
+    if not tokens:
+        return value
+    root = copy.copy(data) if isinstance(data, dict) else {}
+    node = root
+    for token in tokens[:-1]:
+        child = node.get(token)
+        node[token] = copy.copy(child) if isinstance(child, dict) else {}
+        node = node[token]
+    node[tokens[-1]] = value
+    return root
+
+
+def apply_parameters(template: Any, data: Any, context: Dict[str, Any]) -> Any:
+    if isinstance(template, dict):
+        out = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                out[key[:-2]] = get_path(data, value, context)
+            else:
+                out[key] = apply_parameters(value, data, context)
+        return out
+    if isinstance(template, list):
+        return [apply_parameters(item, data, context) for item in template]
+    return template
+
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "StringEquals": lambda a, b: isinstance(a, str) and a == b,
+    "StringLessThan": lambda a, b: isinstance(a, str) and a < b,
+    "StringGreaterThan": lambda a, b: isinstance(a, str) and a > b,
+    "NumericEquals": lambda a, b: isinstance(a, (int, float)) and not isinstance(a, bool) and a == b,
+    "NumericLessThan": lambda a, b: isinstance(a, (int, float)) and not isinstance(a, bool) and a < b,
+    "NumericLessThanEquals": lambda a, b: isinstance(a, (int, float)) and not isinstance(a, bool) and a <= b,
+    "NumericGreaterThan": lambda a, b: isinstance(a, (int, float)) and not isinstance(a, bool) and a > b,
+    "NumericGreaterThanEquals": lambda a, b: isinstance(a, (int, float)) and not isinstance(a, bool) and a >= b,
+    "BooleanEquals": lambda a, b: isinstance(a, bool) and a == b,
+}
+
+
+def choice_matches(rule: Dict[str, Any], data: Any) -> bool:
+    if "And" in rule:
+        return all(choice_matches(r, data) for r in rule["And"])
+    if "Or" in rule:
+        return any(choice_matches(r, data) for r in rule["Or"])
+    if "Not" in rule:
+        return not choice_matches(rule["Not"], data)
+    variable = rule["Variable"]
+    if "IsPresent" in rule:
+        absent = object()
+        return (get_path(data, variable, default=absent) is not absent) == rule["IsPresent"]
+    value = get_path(data, variable)
+    if "IsNull" in rule:
+        return (value is None) == rule["IsNull"]
+    for name, compare in _COMPARATORS.items():
+        if name in rule:
+            return compare(value, rule[name])
+        if f"{name}Path" in rule:
+            return compare(value, get_path(data, rule[f"{name}Path"]))
+    raise StatesError("States.Runtime", f"Unsupported choice rule {sorted(rule)}")
+
+
+def _error_matches(names: List[str], error: str) -> bool:
+    # States.TaskFailed matches every error except a timeout
+    return "States.ALL" in names or error in names or ("States.TaskFailed" in names and error != "States.Timeout")
+
+
+def _load_handler(spec: str) -> Callable[[Dict[str, Any], Any], Any]:
+    if str(LAMBDA_DIR) not in sys.path:
+        sys.path.append(str(LAMBDA_DIR))
+    module_name, _, func = spec.rpartition(".")
+    return getattr(importlib.import_module(module_name), func)
+
+
+class WorkflowEmulator:
+    def __init__(
+        self,
+        definition: Optional[Dict[str, Any]] = None,
+        sns: Optional[Any] = None,
+        functions: Optional[Dict[str, Callable[[Dict[str, Any], Any], Any]]] = None,
+        time_scale: float = 0.0,
+        max_workers: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.definition = definition if definition is not None else load_definition()
+        self.sns = sns
+        self.functions = dict(functions or {})
+        self.time_scale = time_scale
+        self.sleep = sleep
+        self.executions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers else None
+        self._futures: List[Future] = []
+
+    # -- boto3 "stepfunctions" client subset -------------------------------------------------
+
+    def start_execution(self, stateMachineArn: str, name: Optional[str] = None, input: str = "{}") -> Dict[str, Any]:
+        name = name or str(uuid.uuid4())
+        arn = f"{stateMachineArn}:{name}"
+        with self._lock:
+            if arn in self.executions:
+                raise StatesError("ExecutionAlreadyExists", arn)
+            self.executions[arn] = {"executionArn": arn, "name": name, "status": "RUNNING", "input": input}
+        payload = json.loads(input)
+        if self._executor is not None:
+            self._futures.append(self._executor.submit(self._record, arn, name, payload))
+        else:
+            self._record(arn, name, payload)
+        return {"executionArn": arn, "startDate": time.time()}
+
+    def describe_execution(self, executionArn: str) -> Dict[str, Any]:
+        return self.executions[executionArn]
+
+    def wait(self) -> None:
+        """Block until every execution started so far has finished."""
+        while self._futures:
+            self._futures.pop().result()
+
+    def shutdown(self) -> None:
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _record(self, arn: str, name: str, payload: Any) -> None:
+        result = self.run(payload, name=name)
+        with self._lock:
+            self.executions[arn].update(result)
+
+    # -- interpreter -------------------------------------------------------------------------
+
+    def run(self, payload: Any, name: str = "local") -> Dict[str, Any]:
+        started = time.perf_counter()
+        context = {
+            "Execution": {"Id": name, "Name": name, "Input": payload, "StartTime": time.time()},
+            "StateMachine": {"Id": "local"},
+        }
+        timeout = self.definition.get("TimeoutSeconds")
+        history: List[str] = []
+        state_name = self.definition["StartAt"]
+        data = payload
+        try:
+            while True:
+                if timeout is not None and time.perf_counter() - started > timeout:
+                    raise StatesError("States.Timeout", "Execution timed out")
+                state = self.definition["States"][state_name]
+                history.append(state_name)
+                context["State"] = {"Name": state_name, "EnteredTime": time.time(), "RetryCount": 0}
+                data, next_state = self._step(state, data, context)
+                if next_state is None:
+                    status = "SUCCEEDED"
+                    break
+                state_name = next_state
+            return self._result(status, data, history, started)
+        except StatesError as exc:
+            status = "TIMED_OUT" if exc.error == "States.Timeout" else "FAILED"
+            return self._result(status, None, history, started, exc.error, exc.cause)
+
+    @staticmethod
+    def _result(status, output, history, started, error=None, cause=None) -> Dict[str, Any]:
+        result = {
+            "status": status,
+            "output": output,
+            "states": history,
+            "duration_ms": (time.perf_counter() - started) * 1000,
+            "stop_ms": time.time() * 1000,
+        }
+        if error:
+            result.update(error=error, cause=cause)
+        return result
+
+    def _step(self, state: Dict[str, Any], data: Any, context: Dict[str, Any]):
+        kind = state["Type"]
+        if kind == "Choice":
+            effective = get_path(data, state.get("InputPath", "$"))
+            for rule in state.get("Choices", []):
+                if choice_matches(rule, effective):
+                    return data, rule["Next"]
+            if "Default" not in state:
+                raise StatesError("States.NoChoiceMatched", "No Choice rule matched and there is no Default")
+            return data, state["Default"]
+        if kind == "Succeed":
+            return self._output(state, get_path(data, state.get("InputPath", "$"))), None
+        if kind == "Fail":
+            raise StatesError(state.get("Error", "States.Fail"), state.get("Cause", ""))
+        if kind == "Wait":
+            self.sleep(float(state.get("Seconds", 0)) * self.time_scale)
+            return self._output(state, data), self._next(state)
+        if kind == "Pass":
+            effective = self._effective_input(state, data, context)
+            result = state["Result"] if "Result" in state else effective
+            return self._output(state, set_path(data, state.get("ResultPath", "$"), result)), self._next(state)
+        if kind == "Task":
+            return self._task(state, data, context)
+        raise StatesError("States.Runtime", f"State type {kind} is not supported by the emulator")
+
+    @staticmethod
+    def _next(state: Dict[str, Any]) -> Optional[str]:
+        return None if state.get("End") else state["Next"]
+
+    @staticmethod
+    def _effective_input(state: Dict[str, Any], data: Any, context: Dict[str, Any]) -> Any:
+        path = state.get("InputPath", "$")
+        effective = get_path(data, path, context) if path else {}
+        if "Parameters" in state:
+            effective = apply_parameters(state["Parameters"], effective, context)
+        return effective
+
+    @staticmethod
+    def _output(state: Dict[str, Any], data: Any) -> Any:
+        path = state.get("OutputPath", "$")
+        return get_path(data, path) if path else {}
+
+    def _task(self, state: Dict[str, Any], data: Any, context: Dict[str, Any]):
+        attempts: Dict[int, int] = {}
+        while True:
+            try:
+                effective = self._effective_input(state, data, context)
+                result = self._invoke(state["Resource"], effective)
+                if "ResultSelector" in state:
+                    result = apply_parameters(state["ResultSelector"], result, context)
+                merged = set_path(data, state["ResultPath"] if "ResultPath" in state else "$", result)
+                return self._output(state, merged), self._next(state)
+            except StatesError as exc:
+                retrier = self._retrier(state, exc.error)
+                if retrier is not None:
+                    index, rule = retrier
+                    attempt = attempts.get(index, 0)
+                    if attempt < rule.get("MaxAttempts", 3):
+                        attempts[index] = attempt + 1
+                        context["State"]["RetryCount"] = sum(attempts.values())
+                        interval = rule.get("IntervalSeconds", 1) * rule.get("BackoffRate", 2.0) ** attempt
+                        self.sleep(min(interval, rule.get("MaxDelaySeconds", interval)) * self.time_scale)
+                        continue
+                for catcher in state.get("Catch", []):
+                    if _error_matches(catcher["ErrorEquals"], exc.error):
+                        failure = {"Error": exc.error, "Cause": exc.cause}
+                        return set_path(data, catcher.get("ResultPath", "$"), failure), catcher["Next"]
+                raise
+
+    @staticmethod
+    def _retrier(state: Dict[str, Any], error: str):
+        for index, rule in enumerate(state.get("Retry", [])):
+            if _error_matches(rule["ErrorEquals"], error):
+                return index, rule
+        return None
+
+    def _invoke(self, resource: str, params: Dict[str, Any]) -> Any:
+        if resource == LAMBDA_INVOKE:
+            return self._invoke_lambda(params)
+        if resource == SNS_PUBLISH:
+            if self.sns is None:
+                raise StatesError("States.Runtime", "No SNS stand-in configured")
+            message = params["Message"]
+            response = self.sns.publish(
+                TopicArn=params["TopicArn"],
+                Message=message if isinstance(message, str) else json.dumps(message),
+                Subject=params.get("Subject"),
+            )
+            return {"MessageId": response["MessageId"]}
+        raise StatesError("States.Runtime", f"Resource {resource} is not supported by the emulator")
+
+    def _invoke_lambda(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        spec = str(params["FunctionName"])
+        if not spec.startswith("lambda:"):
+            raise StatesError("States.Runtime", f"Unresolved function {spec}")
+        handler_name = spec[len("lambda:"):]
+        if handler_name not in self.functions:
+            self.functions[handler_name] = _load_handler(handler_name)
+        # Round-trip through JSON like the real invoke API
+        event = json.loads(json.dumps(params.get("Payload", {})))
+        try:
+            response = self.functions[handler_name](event, None)
+        except Exception as exc:
+            cause = json.dumps({"errorMessage": str(exc), "errorType": type(exc).__name__})
+            raise StatesError(type(exc).__name__, cause) from exc
+        return {"ExecutedVersion": "$LATEST", "Payload": json.loads(json.dumps(response)), "StatusCode": 200}
+
+
+def load_definition(path: Path = DEFINITION_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _resolve_intrinsics(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "Fn::Join" in value:
+            separator, parts = value["Fn::Join"]
+            return separator.join(str(_resolve_intrinsics(part)) for part in parts)
+        if "Ref" in value:
+            pseudo = {"AWS::Partition": "aws", "AWS::Region": "local", "AWS::AccountId": "000000000000"}
+            return pseudo.get(value["Ref"], f"local:{value['Ref']}")
+        if "Fn::GetAtt" in value:
+            return f"local:{value['Fn::GetAtt'][0]}"
+        return {k: _resolve_intrinsics(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_intrinsics(item) for item in value]
+    return value
+
+
+def _rewrite_resources(node: Any, resources: Dict[str, Any]) -> Any:
+    """Replace ``local:<logicalId>`` references with handler names and SNS topic ARNs."""
+    if isinstance(node, dict):
+        return {k: _rewrite_resources(v, resources) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_rewrite_resources(item, resources) for item in node]
+    if isinstance(node, str) and node.startswith("local:"):
+        logical_id = node[len("local:"):]
+        resource = resources.get(logical_id, {})
+        if resource.get("Type") == "AWS::Lambda::Alias":
+            logical_id = resource["Properties"]["FunctionName"]["Ref"]
+            resource = resources[logical_id]
+        if resource.get("Type") == "AWS::Lambda::Function":
+            return f"lambda:{resource['Properties']['Handler']}"
+        if resource.get("Type") == "AWS::SNS::Topic":
+            return f"arn:aws:sns:local:000000000000:{logical_id}"
+    return node
+
+
+def synthesize(context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """ASL of the state machine in ``DlqTriageStack`` (needs aws-cdk-lib and node)."""
+    import aws_cdk
+    from aws_cdk import assertions
+
+    if str(ROOT) not in sys.path:
+        sys.path.append(str(ROOT))
+    from dlq_triage_infra.stack import DlqTriageStack
+
+    app = aws_cdk.App(context=context or {})
+    template = assertions.Template.from_stack(DlqTriageStack(app, "DlqTriageStack")).to_json()
+    resources = template["Resources"]
+    machine = next(r for r in resources.values() if r["Type"] == "AWS::StepFunctions::StateMachine")
+    definition = json.loads(_resolve_intrinsics(machine["Properties"]["DefinitionString"]))
+    return _rewrite_resources(definition, resources)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--synth"]:
+        print(json.dumps(synthesize(), indent=2))
+    else:
+        print("usage: python -m dlq_triage_local.workflow --synth > dlq_triage_local/state_machine.asl.json")
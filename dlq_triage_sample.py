@@ -6,11 +6,22 @@ from __future__ import annotations
 
 import json
 import os
+import signal
+import sys
+import threading
 import time
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 
 from pydantic import BaseModel, Field, ValidationError
 
+sys.path.append(str(Path(__file__).resolve().parent / "lambda"))
+
+import guardrail_policy  # noqa: E402
+import profiling  # noqa: E402
+import sharding  # noqa: E402
+from validation import CompiledModel  # noqa: E402
+
 try:  # Pydantic v2
     from pydantic import field_validator
     _USE_V2_VALIDATOR = True
@@ -57,6 +68,8 @@ class DLQMessage(BaseModel):
             return value
 
 
+DLQ_MESSAGE = CompiledModel(DLQMessage)
+
 ALLOWLIST = {"SYSTEM_TRANSIENT"}
 CONFIDENCE_THRESHOLD = 0.8
 MAX_REDRIVE_AGE_DAYS = 2
@@ -95,44 +108,34 @@ def classify(message: DLQMessage) -> Decision:
     )
 
 
-def guardrails(message: DLQMessage, decision: Decision) -> str:
-    """Apply safety checks to decide final action."""
-    # Confidence gate
-    if decision.confidence < CONFIDENCE_THRESHOLD:
-        return "TICKET"
-
-    # Category allowlist gate
-    if decision.category not in ALLOWLIST:
-        return "TICKET"
+GUARDRAIL_POLICY = guardrail_policy.store_for(
+    os.getenv("GUARDRAIL_POLICY_PATH") or guardrail_policy.bundled("sample")
+)
 
-    # Age gate
-    ts = message.timestamp
-    if ts and is_older_than_days(ts, MAX_REDRIVE_AGE_DAYS):
-        return "TICKET"
 
-    # Redrive attempts gate
-    attempts = message.redriveAttempts
-    if attempts >= MAX_REDRIVE_ATTEMPTS:
-        return "TICKET"
+def _dump(model: BaseModel) -> Dict[str, Any]:
+    return model.model_dump() if hasattr(model, "model_dump") else model.dict()
 
-    # Terminal state gate
-    if (message.stateAtFailure or "").upper() == "COMPLETED":
-        return "SUPPRESS"
 
+def guardrails(message: DLQMessage, decision: Decision) -> str:
+    """Apply safety checks to decide final action (see lambda/policies/sample.json)."""
+    verdict = GUARDRAIL_POLICY.get().evaluate(
+        {
+            "message": _dump(message),
+            "llm": _dump(decision),
+            "params": {
+                "confidence_threshold": CONFIDENCE_THRESHOLD,
+                "allowlist": sorted(ALLOWLIST),
+                "max_age_days": MAX_REDRIVE_AGE_DAYS,
+                "max_redrive_attempts": MAX_REDRIVE_ATTEMPTS,
+            },
+        }
+    )
+    if not verdict.allowed:
+        return verdict.outcome
     return decision.recommended_action
 
 
-def is_older_than_days(timestamp: str, max_days: int) -> bool:
-    try:
-        # Minimal parsing: YYYY-MM-DDTHH:MM:SSZ
-        date_part = timestamp.split("T", 1)[0]
-        year, month, day = map(int, date_part.split("-"))
-        days = (time.time() - time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))) / 86400
-        return days > max_days
-    except Exception:
-        return True
-
-
 def action_redrive(message: DLQMessage) -> None:
     print(f"[REDRIVE] Replaying message {message.correlationId}")
 
@@ -149,11 +152,15 @@ def action_ticket(message: DLQMessage, decision: Decision) -> None:
 
 
 def _validate_message(message: Dict[str, Any]) -> DLQMessage:
-    if hasattr(DLQMessage, "model_validate"):
-        return DLQMessage.model_validate(message)
-    return DLQMessage.parse_obj(message)
+    return DLQ_MESSAGE.validate_python(message)
+
 
+def validate_messages(messages: List[Dict[str, Any]]) -> List[DLQMessage]:
+    """Validate a batch of messages in one pass; raises on the first invalid entry."""
+    return DLQ_MESSAGE.validate_many(messages)
 
+
+@profiling.profiled("process_message")
 def process_message(message: Dict[str, Any]) -> None:
     try:
         parsed = _validate_message(message)
@@ -219,10 +226,255 @@ def sqs_sample(queue_url: str) -> None:
     sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=msg["ReceiptHandle"])
 
 
+class AdaptiveController:
+    """Tunes receive batch size and active poller count.
+
+    Batch size shrinks when a full batch would not finish within half the
+    visibility timeout at the observed per-message latency. Pollers scale up
+    while the queue backlog exceeds what the active pollers take per round, and
+    back down when polls come back empty.
+    """
+
+    def __init__(
+        self,
+        visibility_timeout: float,
+        min_pollers: int = 1,
+        max_pollers: int = 8,
+        max_batch: int = 10,
+    ) -> None:
+        self.visibility_timeout = visibility_timeout
+        self.min_pollers = min_pollers
+        self.max_pollers = max_pollers
+        self.max_batch = max_batch
+        self.batch_size = max_batch
+        self.pollers = min_pollers
+        self.latency: Optional[float] = None  # EWMA seconds per message
+        self._lock = threading.Lock()
+
+    def observe_batch(self, processed: int, elapsed: float) -> None:
+        with self._lock:
+            if processed:
+                per_message = elapsed / processed
+                self.latency = per_message if self.latency is None else 0.8 * self.latency + 0.2 * per_message
+                fit = int(self.visibility_timeout * 0.5 / max(self.latency, 1e-6))
+                self.batch_size = max(1, min(self.max_batch, fit))
+            elif self.pollers > self.min_pollers:
+                self.pollers -= 1
+
+    def observe_depth(self, queue_depth: int) -> None:
+        with self._lock:
+            if queue_depth > self.pollers * self.batch_size * 2 and self.pollers < self.max_pollers:
+                self.pollers += 1
+
+
+class SqsWorker:
+    """Long-running consumer: concurrent long-poll receivers with batch acks.
+
+    Messages that take longer than half the visibility timeout get their
+    visibility extended by a heartbeat thread. ``stop()`` (wired to SIGTERM by
+    ``run``) stops new receives and lets in-flight messages finish and ack.
+    """
+
+    def __init__(
+        self,
+        sqs: Any,
+        queue_url: str,
+        process: Callable[[Dict[str, Any]], None] = process_message,
+        visibility_timeout: float = 60,
+        wait_time_seconds: float = 20,
+        heartbeat_interval: Optional[float] = None,
+        controller: Optional[AdaptiveController] = None,
+        max_backoff: float = 30.0,
+    ) -> None:
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.process = process
+        self.visibility_timeout = visibility_timeout
+        self.wait_time_seconds = wait_time_seconds
+        self.heartbeat_interval = heartbeat_interval or visibility_timeout / 4
+        self.controller = controller or AdaptiveController(visibility_timeout)
+        # Receive/heartbeat errors back off from 0.1 s, doubling up to this
+        self.max_backoff = max_backoff
+        self.stats = {"received": 0, "processed": 0, "failed": 0, "deleted": 0, "heartbeats": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, float] = {}  # receipt handle -> visibility deadline
+
+    def _bump(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def stop(self, *_args: Any) -> None:
+        self._stop.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def _poll_once(self) -> int:
+        resp = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=self.controller.batch_size,
+            WaitTimeSeconds=self.wait_time_seconds,
+            VisibilityTimeout=self.visibility_timeout,
+        )
+        messages = resp.get("Messages", [])
+        if not messages:
+            self.controller.observe_batch(0, 0.0)
+            return 0
+        self._bump("received", len(messages))
+        deadline = time.monotonic() + self.visibility_timeout
+        with self._lock:
+            for msg in messages:
+                self._in_flight[msg["ReceiptHandle"]] = deadline
+
+        started = time.perf_counter()
+        acks = []
+        for msg in messages:
+            try:
+                self.process(json.loads(msg["Body"]))
+                acks.append(msg)
+                self._bump("processed")
+            except Exception as exc:
+                # Not acked: SQS redelivers it after the visibility timeout
+                print(f"[WORKER] Failed to process {msg['MessageId']}: {exc}")
+                self._bump("failed")
+                with self._lock:
+                    self._in_flight.pop(msg["ReceiptHandle"], None)
+        self.controller.observe_batch(len(messages), time.perf_counter() - started)
+        self._ack(acks)
+        return len(messages)
+
+    def _ack(self, messages: List[Dict[str, Any]]) -> None:
+        try:
+            for i in range(0, len(messages), 10):
+                chunk = messages[i:i + 10]
+                resp = self.sqs.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{"Id": str(n), "ReceiptHandle": m["ReceiptHandle"]} for n, m in enumerate(chunk)],
+                )
+                self._bump("deleted", len(resp.get("Successful", [])))
+                for failure in resp.get("Failed", []):
+                    print(f"[WORKER] Delete failed: {failure}")
+        finally:
+            # Undeleted messages are redelivered; stop extending their visibility either way
+            with self._lock:
+                for m in messages:
+                    self._in_flight.pop(m["ReceiptHandle"], None)
+
+    def _heartbeat_once(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [rh for rh, deadline in self._in_flight.items() if deadline - now < self.visibility_timeout / 2]
+            for rh in due:
+                self._in_flight[rh] = now + self.visibility_timeout
+        for i in range(0, len(due), 10):
+            chunk = due[i:i + 10]
+            self.sqs.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(n), "ReceiptHandle": rh, "VisibilityTimeout": self.visibility_timeout}
+                    for n, rh in enumerate(chunk)
+                ],
+            )
+            self._bump("heartbeats", len(chunk))
+
+    def _backoff(self, errors: int) -> float:
+        return min(self.max_backoff, 0.1 * 2 ** (errors - 1))
+
+    def _safely(self, what: str, func: Callable[[], Any]) -> bool:
+        """Run one step of a loop; log and count an error instead of ending the thread."""
+        try:
+            func()
+            return True
+        except Exception as exc:
+            print(f"[WORKER] {what} failed: {exc}")
+            self._bump("errors")
+            return False
+
+    def _observe_depth(self) -> None:
+        attrs = self.sqs.get_queue_attributes(
+            QueueUrl=self.queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+        ).get("Attributes", {})
+        self.controller.observe_depth(int(attrs.get("ApproximateNumberOfMessages", 0)))
+
+    def _supervise(self) -> None:
+        errors = 0
+        delay = self.heartbeat_interval
+        while not self._stop.wait(delay):
+            ok = self._safely("Heartbeat", self._heartbeat_once)
+            ok = self._safely("Queue depth", self._observe_depth) and ok
+            errors = 0 if ok else errors + 1
+            delay = self.heartbeat_interval if ok else max(self.heartbeat_interval, self._backoff(errors))
+        # Keep in-flight messages alive while pollers drain
+        while self._in_flight:
+            self._safely("Heartbeat", self._heartbeat_once)
+            time.sleep(min(self.heartbeat_interval, 0.1))
+
+    def _poller(self, index: int) -> None:
+        errors = 0
+        while not self._stop.is_set():
+            if index >= self.controller.pollers:
+                self._stop.wait(0.1)
+                continue
+            if self._safely(f"Poller {index}", self._poll_once):
+                errors = 0
+            else:
+                errors += 1
+                self._stop.wait(self._backoff(errors))
+
+    def start(self) -> List[threading.Thread]:
+        threads = [threading.Thread(target=self._supervise, name="dlq-heartbeat", daemon=True)]
+        threads += [
+            threading.Thread(target=self._poller, args=(i,), name=f"dlq-poller-{i}", daemon=True)
+            for i in range(self.controller.max_pollers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def run(self) -> Dict[str, int]:
+        """Block until SIGTERM/SIGINT, then drain in-flight work and return stats."""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        threads = self.start()
+        while not self._stop.wait(0.5):
+            pass
+        for thread in threads:
+            thread.join()
+        print(f"[WORKER] Drained: {json.dumps(self.stats)}")
+        return self.stats
+
+
+def worker_sample(queue_url: str) -> None:
+    if boto3 is None:
+        raise RuntimeError("boto3 not available; install boto3 or run in-memory sample.")
+    visibility_timeout = int(os.getenv("DLQ_WORKER_VISIBILITY_TIMEOUT", "60"))
+    controller = AdaptiveController(
+        visibility_timeout,
+        min_pollers=int(os.getenv("DLQ_WORKER_MIN_POLLERS", "1")),
+        max_pollers=int(os.getenv("DLQ_WORKER_MAX_POLLERS", "8")),
+    )
+    sqs = boto3.client("sqs")
+    process = process_message
+    if os.getenv("DLQ_SHARD_ROUTER"):
+        # Forward to per-shard queues instead of triaging; workers consume those queues
+        router = sharding.router_from_env(sqs)
+        if router is None:
+            raise RuntimeError("DLQ_SHARD_ROUTER needs SHARD_QUEUES")
+        process = router.process
+    SqsWorker(sqs, queue_url, process=process, visibility_timeout=visibility_timeout, controller=controller).run()
+
+
 def main() -> None:
     queue_url = os.getenv("DLQ_QUEUE_URL")
     if queue_url:
         try:
+            if os.getenv("DLQ_WORKER"):
+                print("[SAMPLE] Running SQS worker (SIGTERM to drain)")
+                worker_sample(queue_url)
+                return
             print("[SAMPLE] Using AWS SQS")
             sqs_sample(queue_url)
             return
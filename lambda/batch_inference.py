@@ -0,0 +1,524 @@
+"""Backlog mode: triage large DLQ backlogs with Bedrock batch inference.
+
+Real-time triage makes one ``invoke_model`` call per message. For backlogs
+of hundreds of thousands of messages, ``BacklogRun`` works in stages instead:
+
+1. ``prepare``: normalize the messages, build the same prompts as
+   ``bedrock_adapter``, and write batch-inference input files (JSONL
+   ``{"recordId", "modelInput"}``, ``chunk_size`` records per file)
+2. ``submit``: hand each file to a job backend
+3. ``collect``: wait for the jobs and download their output files
+4. ``apply``: stream the results through ``TriageOutput`` validation, the
+   guardrails handler and the workflow's Decision rule into the redrive or
+   ticket handler
+
+Progress lives in ``manifest.json`` in the run directory. The manifest is
+rewritten atomically after every stage and every ``checkpoint_every``
+applied records, so rerunning the same command resumes where the last one
+stopped. Actions are at-least-once: records applied after the last
+checkpoint are applied again.
+
+Backends: ``BedrockBatchBackend`` (S3 plus ``CreateModelInvocationJob``) and
+``LocalBatchBackend``, which processes a file in-process with any
+``invoke_model`` client (the replay stand-in, a region pool, a stub).
+
+    python lambda/batch_inference.py run-dir --messages backlog.jsonl --backend local
+    python lambda/batch_inference.py run-dir --archive /mnt/archive --category DOWNSTREAM_TIMEOUT \\
+        --backend bedrock --s3-uri s3://bucket/dlq-batch --role-arn arn:aws:iam::...:role/batch
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+import bedrock_adapter
+import envelopes
+import guardrails_handler
+import redrive_handler
+import ticket_handler
+import triage_handler
+
+MANIFEST = "manifest.json"
+DONE_STATUSES = ("Completed", "PartiallyCompleted")
+FAILED_STATUSES = ("Failed", "Stopped", "Expired")
+# Guardrail parameters the workflow passes to the guardrails handler
+GUARDRAIL_PARAMS = {"max_age_days": 2, "max_redrive_attempts": 2, "max_token_estimate": 2000}
+# Bedrock batch inference is billed at half the on-demand token price
+BATCH_PRICE_FACTOR = 0.5
+
+Action = Callable[[str, Dict[str, Any]], Any]
+
+
+def messages_from_bodies(bodies: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Normalized events from raw SQS bodies, unpacking envelopes like the triage handler.
+
+    Bodies are always parsed in full (never lazily): prompts and sidecars
+    serialize ``raw`` with ``json.dumps``.
+    """
+    for body in bodies:
+        for payload in envelopes.decode_body(body):
+            yield triage_handler._normalize(payload)
+
+
+def decide(llm: Dict[str, Any], guardrails: Dict[str, Any], threshold: float) -> str:
+    """The workflow's Decision state."""
+    if (
+        llm.get("recommended_action") == "REDRIVE"
+        and float(llm.get("confidence", 0.0)) >= threshold
+        and guardrails.get("allow_redrive") is True
+    ):
+        return "REDRIVE"
+    return "TICKET"
+
+
+def handler_actions(decision: str, event: Dict[str, Any]) -> Any:
+    """Default action: the redrive or ticket handler, as the workflow would call it."""
+    if decision == "REDRIVE":
+        return redrive_handler.handler(event, None)
+    return ticket_handler.handler(event, None)
+
+
+def _parse_output(record: Dict[str, Any]) -> tuple:
+    """(validated llm or None, usage, failure reason) for one output record."""
+    if record.get("error"):
+        return None, {}, "Bedrock batch record failed"
+    body = record.get("modelOutput") or {}
+    usage = body.get("usage") or {}
+    text = (body.get("content") or [{}])[0].get("text", "")
+    try:
+        return bedrock_adapter.TRIAGE_OUTPUT.validate_json_dict(text), usage, ""
+    except (json.JSONDecodeError, ValidationError):
+        return None, usage, "Failed to parse/validate model output"
+
+
+class LocalBatchBackend:
+    """Processes input files in-process with an ``invoke_model`` client; for tests and offline runs."""
+
+    def __init__(self, client: Any, jobs_dir: str, workers: int = 8) -> None:
+        self.client = client
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._jobs: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-job")
+
+    def _output_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.jsonl.out")
+
+    def _invoke(self, model_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            resp = self.client.invoke_model(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(record["modelInput"]),
+            )
+            return {"recordId": record["recordId"], "modelOutput": json.loads(resp["body"].read().decode("utf-8"))}
+        except Exception as exc:
+            return {"recordId": record["recordId"], "error": {"errorMessage": str(exc)}}
+
+    def _process(self, input_path: str, model_id: str, job_id: str) -> None:
+        with open(input_path, encoding="utf-8") as handle:
+            records = [json.loads(line) for line in handle]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda record: self._invoke(model_id, record), records))
+        tmp = self._output_path(job_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            for result in results:
+                handle.write(json.dumps(result) + "\n")
+        os.replace(tmp, self._output_path(job_id))
+
+    def submit(self, input_path: str, model_id: str, job_name: str) -> str:
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        job_id = f"local-{job_name}"
+        if not os.path.exists(self._output_path(job_id)):
+            self._jobs[job_id] = self._executor.submit(self._process, input_path, model_id, job_id)
+        return job_id
+
+    def status(self, job_id: str) -> str:
+        if os.path.exists(self._output_path(job_id)):
+            return "Completed"
+        future = self._jobs.get(job_id)
+        if future is None:
+            # Submitted by an earlier process that stopped before finishing
+            return "Stopped"
+        if future.done() and future.exception() is not None:
+            return "Failed"
+        return "InProgress"
+
+    def fetch(self, job_id: str, dest_path: str) -> None:
+        os.replace(self._output_path(job_id), dest_path)
+
+
+class BedrockBatchBackend:
+    """Uploads input files under ``s3_uri`` and runs them as Bedrock model invocation jobs."""
+
+    def __init__(self, s3_uri: str, role_arn: str, bedrock: Any = None, s3: Any = None) -> None:
+        import boto3
+
+        if not s3_uri.startswith("s3://"):
+            raise ValueError("s3_uri must start with s3://")
+        self.bucket, _, prefix = s3_uri[5:].partition("/")
+        self.prefix = prefix.strip("/")
+        self.role_arn = role_arn
+        self.bedrock = bedrock or boto3.client("bedrock")
+        self.s3 = s3 or boto3.client("s3")
+
+    def _key(self, *parts: str) -> str:
+        return "/".join(part for part in (self.prefix, *parts) if part)
+
+    def submit(self, input_path: str, model_id: str, job_name: str) -> str:
+        input_key = self._key("input", f"{job_name}.jsonl")
+        self.s3.upload_file(input_path, self.bucket, input_key)
+        resp = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{self.bucket}/{input_key}", "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{self.bucket}/{self._key('output')}/"}},
+        )
+        return resp["jobArn"]
+
+    def status(self, job_id: str) -> str:
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job_id)["status"]
+
+    def fetch(self, job_id: str, dest_path: str) -> None:
+        job = self.bedrock.get_model_invocation_job(jobIdentifier=job_id)
+        input_name = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"].rsplit("/", 1)[-1]
+        # Bedrock writes <output prefix>/<job id>/<input file>.out
+        key = self._key("output", job_id.rsplit("/", 1)[-1], f"{input_name}.out")
+        tmp = dest_path + ".tmp"
+        self.s3.download_file(self.bucket, key, tmp)
+        os.replace(tmp, dest_path)
+
+
+class BacklogRun:
+    """One restartable backlog run rooted at ``run_dir``."""
+
+    def __init__(
+        self,
+        run_dir: str,
+        backend: Any,
+        model_id: Optional[str] = None,
+        chunk_size: int = 10000,
+        checkpoint_every: int = 100,
+        confidence_threshold: Optional[float] = None,
+        actions: Action = handler_actions,
+        poll_seconds: float = 30.0,
+    ) -> None:
+        self.run_dir = run_dir
+        self.backend = backend
+        self.model_id = model_id or os.getenv("MODEL_ID", "anthropic.claude-3-7-sonnet-20250219-v1:0")
+        self.chunk_size = chunk_size
+        self.checkpoint_every = checkpoint_every
+        self.confidence_threshold = (
+            confidence_threshold
+            if confidence_threshold is not None
+            else float(os.getenv("CONFIDENCE_THRESHOLD", "0.8"))
+        )
+        self.actions = actions
+        self.poll_seconds = poll_seconds
+        os.makedirs(run_dir, exist_ok=True)
+        self.manifest = self._load()
+
+    # -- manifest -------------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.run_dir, name)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self._path(MANIFEST), encoding="utf-8") as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {
+                "run_id": uuid.uuid4().hex[:12],
+                "model_id": self.model_id,
+                "prepared": False,
+                "chunks": [],
+                "seconds": {},
+            }
+
+    def save(self) -> None:
+        tmp = self._path(MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump(self.manifest, handle)
+        os.replace(tmp, self._path(MANIFEST))
+
+    def _timed(self, stage: str, started: float) -> None:
+        seconds = self.manifest["seconds"]
+        seconds[stage] = round(seconds.get(stage, 0.0) + time.perf_counter() - started, 3)
+
+    # -- stages ---------------------------------------------------------------
+
+    def prepare(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """Write input files and message sidecars; a no-op once the run is prepared."""
+        if self.manifest["prepared"]:
+            return sum(chunk["records"] for chunk in self.manifest["chunks"])
+        started = time.perf_counter()
+        chunks: List[Dict[str, Any]] = []
+        inputs = sidecar = None
+        try:
+            for message in messages:
+                if not chunks or chunks[-1]["records"] == self.chunk_size:
+                    for handle in (inputs, sidecar):
+                        if handle is not None:
+                            handle.close()
+                    index = len(chunks)
+                    chunk = {
+                        "index": index,
+                        "input": f"chunk-{index:05d}.jsonl",
+                        "messages": f"chunk-{index:05d}.messages.jsonl",
+                        "output": f"chunk-{index:05d}.jsonl.out",
+                        "records": 0,
+                        "status": "prepared",
+                        "job_id": None,
+                        "attempts": 0,
+                        "applied": 0,
+                        "usage": {"input_tokens": 0, "output_tokens": 0},
+                        "decisions": {"REDRIVE": 0, "TICKET": 0, "invalid": 0},
+                    }
+                    chunks.append(chunk)
+                    inputs = open(self._path(chunk["input"]), "w", encoding="utf-8")
+                    sidecar = open(self._path(chunk["messages"]), "w", encoding="utf-8")
+                chunk = chunks[-1]
+                # 11 characters, as Bedrock expects; doubles as the sidecar line number
+                record_id = f"{chunk['index']:04d}{chunk['records']:07d}"
+                prompt = bedrock_adapter._build_prompt(message)
+                inputs.write(json.dumps({"recordId": record_id, "modelInput": bedrock_adapter._model_input(prompt)}) + "\n")
+                sidecar.write(json.dumps(message) + "\n")
+                chunk["records"] += 1
+        finally:
+            for handle in (inputs, sidecar):
+                if handle is not None:
+                    handle.close()
+        self.manifest["chunks"] = chunks
+        self.manifest["prepared"] = True
+        self._timed("prepare", started)
+        self.save()
+        return sum(chunk["records"] for chunk in chunks)
+
+    def submit(self) -> int:
+        """Submit every prepared chunk; returns the number submitted now."""
+        started = time.perf_counter()
+        submitted = 0
+        for chunk in self.manifest["chunks"]:
+            if chunk["status"] != "prepared":
+                continue
+            # Bedrock rejects a reused job name, so every resubmission gets its own
+            chunk["attempts"] = chunk.get("attempts", 0) + 1
+            job_name = f"dlq-backlog-{self.manifest['run_id']}-{chunk['index']:05d}-{chunk['attempts']}"
+            chunk["job_id"] = self.backend.submit(self._path(chunk["input"]), self.model_id, job_name)
+            chunk["status"] = "submitted"
+            submitted += 1
+            self.save()
+        self._timed("submit", started)
+        self.save()
+        return submitted
+
+    def collect(self, timeout: Optional[float] = None) -> bool:
+        """Wait for submitted jobs and download their outputs; True when all are collected."""
+        started = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                waiting = False
+                for chunk in self.manifest["chunks"]:
+                    if chunk["status"] != "submitted":
+                        continue
+                    status = self.backend.status(chunk["job_id"])
+                    if status in DONE_STATUSES:
+                        self.backend.fetch(chunk["job_id"], self._path(chunk["output"]))
+                        chunk["status"] = "collected"
+                        self.save()
+                    elif status in FAILED_STATUSES:
+                        # Resubmitted on the next submit()
+                        chunk["status"] = "prepared"
+                        chunk["job_id"] = None
+                        self.save()
+                        print(json.dumps({"level": "WARN", "message": "Batch job ended", "chunk": chunk["index"], "status": status}))
+                    else:
+                        waiting = True
+                if not waiting or (deadline is not None and time.monotonic() >= deadline):
+                    break
+                time.sleep(self.poll_seconds)
+        finally:
+            self._timed("collect", started)
+            self.save()
+        return all(chunk["status"] in ("collected", "applied") for chunk in self.manifest["chunks"])
+
+    def _apply_record(self, chunk: Dict[str, Any], record: Dict[str, Any], messages: List[Dict[str, Any]]) -> None:
+        message = messages[int(record["recordId"][4:])]
+        llm, usage, reason = _parse_output(record)
+        chunk["usage"]["input_tokens"] += int(usage.get("input_tokens", 0))
+        chunk["usage"]["output_tokens"] += int(usage.get("output_tokens", 0))
+        if llm is None:
+            chunk["decisions"]["invalid"] += 1
+            llm = bedrock_adapter._fallback_llm(reason)
+        guarded = guardrails_handler.handler({"message": message, "llm": llm, **GUARDRAIL_PARAMS}, None)
+        decision = decide(llm, guarded["guardrails"], self.confidence_threshold)
+        chunk["decisions"][decision] += 1
+        self.actions(decision, guarded)
+
+    def apply(self) -> int:
+        """Apply every collected chunk's results; returns the number of records applied now."""
+        started = time.perf_counter()
+        applied = 0
+        try:
+            for chunk in self.manifest["chunks"]:
+                if chunk["status"] != "collected":
+                    continue
+                with open(self._path(chunk["messages"]), encoding="utf-8") as handle:
+                    messages = [json.loads(line) for line in handle]
+                with open(self._path(chunk["output"]), encoding="utf-8") as handle:
+                    for line_number, line in enumerate(handle):
+                        if line_number < chunk["applied"]:
+                            continue
+                        self._apply_record(chunk, json.loads(line), messages)
+                        chunk["applied"] += 1
+                        applied += 1
+                        if chunk["applied"] % self.checkpoint_every == 0:
+                            self.save()
+                chunk["status"] = "applied"
+                self.save()
+        finally:
+            self._timed("apply", started)
+            self.save()
+        return applied
+
+    def run(self, messages: Iterable[Dict[str, Any]], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Every stage in order, each resuming from the manifest."""
+        self.prepare(messages)
+        self.submit()
+        while not self.collect(timeout):
+            if timeout is not None:
+                break
+            self.submit()
+        self.apply()
+        return self.progress()
+
+    # -- reporting ------------------------------------------------------------
+
+    def progress(self) -> Dict[str, Any]:
+        chunks = self.manifest["chunks"]
+        statuses: Dict[str, int] = {}
+        for chunk in chunks:
+            statuses[chunk["status"]] = statuses.get(chunk["status"], 0) + 1
+        decisions = {"REDRIVE": 0, "TICKET": 0, "invalid": 0}
+        for chunk in chunks:
+            for key, value in chunk["decisions"].items():
+                decisions[key] += value
+        return {
+            "run_id": self.manifest["run_id"],
+            "records": sum(chunk["records"] for chunk in chunks),
+            "applied": sum(chunk["applied"] for chunk in chunks),
+            "chunks": statuses,
+            "decisions": decisions,
+            "seconds": dict(self.manifest["seconds"]),
+        }
+
+    def report(
+        self,
+        input_cost_per_1k: float,
+        output_cost_per_1k: float,
+        realtime_latency_ms: float,
+        realtime_concurrency: int,
+    ) -> Dict[str, Any]:
+        """Model cost and wall time per 1,000 messages: this run vs. the real-time path.
+
+        Real-time cost uses the same token counts at on-demand prices. Real-time
+        time assumes ``realtime_concurrency`` executions of ``realtime_latency_ms``
+        each (end-to-end workflow latency) running back to back.
+        """
+        chunks = self.manifest["chunks"]
+        records = sum(chunk["applied"] for chunk in chunks)
+        if not records:
+            return {"records": 0}
+        tokens_in = sum(chunk["usage"]["input_tokens"] for chunk in chunks)
+        tokens_out = sum(chunk["usage"]["output_tokens"] for chunk in chunks)
+        on_demand = tokens_in / 1000 * input_cost_per_1k + tokens_out / 1000 * output_cost_per_1k
+        per_1k = 1000 / records
+        return {
+            "records": records,
+            "input_tokens": tokens_in,
+            "output_tokens": tokens_out,
+            "per_1k_messages": {
+                "batch": {
+                    "cost_usd": round(on_demand * BATCH_PRICE_FACTOR * per_1k, 4),
+                    "seconds": round(sum(self.manifest["seconds"].values()) * per_1k, 3),
+                },
+                "realtime": {
+                    "cost_usd": round(on_demand * per_1k, 4),
+                    "seconds": round(1000 * (realtime_latency_ms / 1000) / max(1, realtime_concurrency), 3),
+                },
+            },
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Triage a DLQ backlog with batch inference")
+    parser.add_argument("run_dir")
+    parser.add_argument("--messages", help="JSONL file with one SQS body per line")
+    parser.add_argument("--archive", help="DLQ archive root to read the backlog from")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--category")
+    parser.add_argument("--source")
+    parser.add_argument("--backend", choices=("local", "bedrock"), default="local")
+    parser.add_argument("--s3-uri")
+    parser.add_argument("--role-arn")
+    parser.add_argument("--model-id")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--poll-seconds", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, help="stop waiting for jobs after N seconds; rerun to resume")
+    parser.add_argument("--input-cost-per-1k", type=float, default=0.003)
+    parser.add_argument("--output-cost-per-1k", type=float, default=0.015)
+    parser.add_argument("--realtime-latency-ms", type=float, default=3000.0)
+    parser.add_argument("--realtime-concurrency", type=int, default=10)
+    parser.add_argument("--status", action="store_true", help="print progress and exit")
+    args = parser.parse_args(argv)
+
+    if args.backend == "bedrock":
+        if not (args.s3_uri and args.role_arn):
+            parser.error("--backend bedrock needs --s3-uri and --role-arn")
+        backend: Any = BedrockBatchBackend(args.s3_uri, args.role_arn)
+    else:
+        backend = LocalBatchBackend(bedrock_adapter._bedrock_client(), os.path.join(args.run_dir, "jobs"))
+    run = BacklogRun(args.run_dir, backend, model_id=args.model_id, chunk_size=args.chunk_size, poll_seconds=args.poll_seconds)
+    if args.status:
+        print(json.dumps(run.progress()))
+        return
+
+    def bodies() -> Iterator[str]:
+        if args.archive:
+            import dlq_archive
+
+            filters = {key: getattr(args, key) for key in ("category", "source") if getattr(args, key)}
+            for record in dlq_archive.DlqArchive(args.archive).query(args.start, args.end, **filters):
+                yield record["body"]
+        elif args.messages:
+            with open(args.messages, encoding="utf-8") as handle:
+                for line in handle:
+                    if line.strip():
+                        yield line.strip()
+
+    if not run.manifest["prepared"] and not (args.archive or args.messages):
+        parser.error("a new run needs --messages or --archive")
+    print(json.dumps(run.run(messages_from_bodies(bodies()), timeout=args.timeout)))
+    print(
+        json.dumps(
+            run.report(
+                args.input_cost_per_1k, args.output_cost_per_1k, args.realtime_latency_ms, args.realtime_concurrency
+            )
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
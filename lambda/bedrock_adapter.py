@@ -1,9 +1,25 @@
 import json
 import os
-from typing import Any, Dict, Literal
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 
 import boto3
 from pydantic import BaseModel, ValidationError, confloat
+from typing_extensions import TypedDict
+
+import distilled_classifier
+import hedging
+import payload_refs
+import prompt_compaction
+import profiling
+import region_pool
+import spend_governor
+import tracing
+from similarity_index import SimilarityIndex
+from validation import CompiledModel
+
+METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
 
 
 class TriageOutput(BaseModel):
@@ -14,6 +30,35 @@ class TriageOutput(BaseModel):
     reasoning: str
 
 
+class TriageOutputDict(TypedDict):
+    category: str
+    recommended_action: Literal["REDRIVE", "TICKET"]
+    confidence: confloat(ge=0.0, le=1.0)
+    summary: str
+    reasoning: str
+
+
+TRIAGE_OUTPUT = CompiledModel(TriageOutput, TriageOutputDict)
+
+
+def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> None:
+    emf = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [list(dims.keys())] if dims else [[]],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dims,
+    }
+    print(json.dumps(emf))
+
+
 def _fallback_llm(reason: str) -> Dict[str, Any]:
     return {
         "category": "UNKNOWN",
@@ -24,22 +69,184 @@ def _fallback_llm(reason: str) -> Dict[str, Any]:
     }
 
 
-def handler(event, _context):
-    message: Dict[str, Any] = event.get("message", {})
-    model_id = os.getenv("MODEL_ID", "anthropic.claude-3-7-sonnet-20250219-v1:0")
-
-    bedrock_region = os.getenv("BEDROCK_REGION") or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+def _real_client(region: Optional[str] = None):
+    bedrock_region = region or os.getenv("BEDROCK_REGION") or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+    # Optional per-region endpoint overrides, e.g. local stub servers
+    endpoint_url = json.loads(os.getenv("BEDROCK_ENDPOINTS") or "{}").get(bedrock_region)
     try:
-        client = boto3.client("bedrock-runtime", region_name=bedrock_region)
+        return boto3.client("bedrock-runtime", region_name=bedrock_region, endpoint_url=endpoint_url)
     except TypeError:
         # Tests monkeypatch boto3.client with a lambda that only takes the service name
-        client = boto3.client("bedrock-runtime")
+        return boto3.client("bedrock-runtime")
+
+
+def _bedrock_client():
+    """Regional client pool, or the record/replay stand-in when BEDROCK_STANDIN_MODE is set."""
+    if os.getenv("BEDROCK_STANDIN_MODE"):
+        import bedrock_standin
+
+        return bedrock_standin.client_from_env(_real_client)
+    return region_pool.pool_from_env(_real_client)
+
+
+_SIMILARITY_INDEX: Optional[SimilarityIndex] = None
+
+
+def _similarity_index() -> Optional[SimilarityIndex]:
+    """Process-wide index of prior decisions; enabled by SIMILARITY_THRESHOLD."""
+    global _SIMILARITY_INDEX
+    if not os.getenv("SIMILARITY_THRESHOLD"):
+        return None
+    if _SIMILARITY_INDEX is None:
+        _SIMILARITY_INDEX = SimilarityIndex(max_entries=int(os.getenv("SIMILARITY_MAX_ENTRIES", "5000")))
+    return _SIMILARITY_INDEX
+
+
+def _reuse_prior_decision(message: Dict[str, Any], trace: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    index = _similarity_index()
+    error = str(message.get("errorMessage") or "")
+    if index is None or not error:
+        return None
+    started = time.perf_counter()
+    with tracing.span(trace, "similarity_lookup", "bedrock_adapter"):
+        neighbor = index.query(error, float(os.environ["SIMILARITY_THRESHOLD"]), group=str(message.get("failureCategory") or ""))
+    _emit_metric("SimilarityQueryLatency", (time.perf_counter() - started) * 1000, unit="Milliseconds")
+    _emit_metric("SimilarityHit", 1 if neighbor else 0, action="similarity")
+    if neighbor is None:
+        return None
+    key, similarity, decision = neighbor
+    print(
+        json.dumps(
+            {
+                "level": "INFO",
+                "message": "Reused prior decision",
+                "correlationId": message.get("correlationId"),
+                "neighbor": key,
+                "similarity": similarity,
+            }
+        )
+    )
+    return {
+        "message": message,
+        # Scale confidence by similarity so weak matches fall below the Decision threshold
+        "llm": {**decision, "confidence": round(decision["confidence"] * similarity, 4)},
+        "trace": trace,
+        "reuse": {"correlationId": key, "similarity": similarity},
+    }
+
+
+def _remember_decision(message: Dict[str, Any], llm: Dict[str, Any]) -> None:
+    index = _similarity_index()
+    error = str(message.get("errorMessage") or "")
+    if index is None or not error:
+        return
+    key = str(message.get("correlationId") or "unknown")
+    if key == "unknown":
+        key = uuid.uuid4().hex
+    index.add(key, error, llm, group=str(message.get("failureCategory") or ""))
+
+
+def _distilled_decision(message: Dict[str, Any], trace: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Answer locally when the distilled classifier (DISTILLED_MODEL_PATH) is confident enough."""
+    model = distilled_classifier.model_from_env()
+    if model is None:
+        return None
+    started = time.perf_counter()
+    with tracing.span(trace, "distilled_classify", "bedrock_adapter"):
+        label, probability = model.predict(message)
+    _emit_metric("DistilledLatency", (time.perf_counter() - started) * 1e6, unit="Microseconds")
+    hit = label != distilled_classifier.OTHER and probability >= float(os.getenv("DISTILLED_THRESHOLD", "0.95"))
+    _emit_metric("DistilledHit", 1 if hit else 0, action="distilled")
+    if not hit:
+        return None
+    return {
+        "message": message,
+        "llm": TRIAGE_OUTPUT.validate_python_dict(model.triage_output(label, probability)),
+        "trace": trace,
+        "distilled": {"label": label, "probability": round(probability, 4)},
+    }
+
+
+def _model_tiers() -> List[Dict[str, Any]]:
+    """Cascade tiers, cheapest first. Without MODEL_TIERS, MODEL_ID is the only tier."""
+    raw = os.getenv("MODEL_TIERS")
+    if raw:
+        tiers = json.loads(raw)
+        if tiers:
+            return tiers
+    return [
+        {
+            "model_id": os.getenv("MODEL_ID", "anthropic.claude-3-7-sonnet-20250219-v1:0"),
+            # Optional prices, so spend budgets in USD also work without a cascade
+            "input_cost_per_1k": float(os.getenv("MODEL_INPUT_COST_PER_1K", "0")),
+            "output_cost_per_1k": float(os.getenv("MODEL_OUTPUT_COST_PER_1K", "0")),
+        }
+    ]
+
 
-    message_str = json.dumps(message)
-    if len(message_str) > 10000:
-        message_str = message_str[:10000] + "... [truncated]"
+def _escalation_thresholds() -> Dict[str, float]:
+    thresholds = {"default": float(os.getenv("CONFIDENCE_THRESHOLD", "0.8"))}
+    raw = os.getenv("ESCALATION_THRESHOLDS")
+    if raw:
+        thresholds.update({key: float(value) for key, value in json.loads(raw).items()})
+    return thresholds
 
-    prompt = (
+
+def _should_escalate(llm: Optional[Dict[str, Any]], thresholds: Dict[str, float]) -> bool:
+    if llm is None:
+        return True
+    threshold = thresholds.get(llm["category"], thresholds["default"])
+    return llm["confidence"] < threshold
+
+
+def _tier_cost(tier: Dict[str, Any], usage: Dict[str, Any]) -> float:
+    return (
+        int(usage.get("input_tokens", 0)) / 1000 * float(tier.get("input_cost_per_1k", 0.0))
+        + int(usage.get("output_tokens", 0)) / 1000 * float(tier.get("output_cost_per_1k", 0.0))
+    )
+
+
+def _record_usage(
+    governor: Optional[spend_governor.SpendGovernor], tier: Dict[str, Any], message: Dict[str, Any], usage: Dict[str, Any]
+) -> None:
+    if not usage:
+        return
+    _emit_metric("BedrockInputTokens", int(usage.get("input_tokens", 0)), model=tier["model_id"])
+    _emit_metric("BedrockOutputTokens", int(usage.get("output_tokens", 0)), model=tier["model_id"])
+    if governor is not None:
+        try:
+            governor.record(tier["model_id"], message, usage, _tier_cost(tier, usage))
+        except Exception as exc:
+            # Accounting must never fail a triage
+            print(json.dumps({"level": "ERROR", "message": "Usage accounting failed", "error": str(exc)}))
+
+
+def _degraded_tier(tiers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """SPEND_DEGRADED_MODEL_ID (with its tier prices, if listed), else the cheapest tier."""
+    model_id = os.getenv("SPEND_DEGRADED_MODEL_ID")
+    if not model_id:
+        return tiers[0]
+    return next((tier for tier in tiers if tier["model_id"] == model_id), {"model_id": model_id})
+
+
+def _budget_exhausted(message: Dict[str, Any], trace: Dict[str, Any]) -> Dict[str, Any]:
+    """No Bedrock: the distilled classifier's best guess at any confidence, else a ticket."""
+    llm = _fallback_llm("Bedrock spend budget exhausted")
+    model = distilled_classifier.model_from_env()
+    if model is not None:
+        label, probability = model.predict(message)
+        if label != distilled_classifier.OTHER:
+            llm = TRIAGE_OUTPUT.validate_python_dict(model.triage_output(label, probability))
+    return {"message": message, "llm": llm, "trace": trace, "governor": {"mode": "exhausted"}}
+
+
+def _build_prompt(message: Dict[str, Any]) -> str:
+    # A large body arrives as an S3 reference; only the prompt needs its content
+    message_str, report = prompt_compaction.compact(payload_refs.resolve(message))
+    _emit_metric("PromptTokens", report["compacted_tokens"], action="prompt")
+    _emit_metric("PromptTokensSaved", report["original_tokens"] - report["compacted_tokens"], action="prompt")
+
+    return (
         "Return ONLY JSON with keys: category, recommended_action, confidence, summary, reasoning.\n"
         "- recommended_action must be REDRIVE or TICKET\n"
         "- confidence must be a number between 0 and 1\n"
@@ -50,35 +257,174 @@ def handler(event, _context):
         f"{message_str}"
     )
 
-    payload = {
+
+def _model_input(prompt: str) -> Dict[str, Any]:
+    """InvokeModel request body; also the ``modelInput`` of batch-inference records."""
+    return {
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": 512,
         "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
     }
 
+
+def _invoke(
+    client, model_id: str, prompt: str, trace: Optional[Dict[str, Any]] = None
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], str]:
+    """Call one model; returns (validated llm or None, usage, failure reason)."""
+    trace = trace if trace is not None else tracing.new_trace()
+    payload = _model_input(prompt)
+
     try:
-        resp = client.invoke_model(
-            ModelId=model_id,
-            ContentType="application/json",
-            Accept="application/json",
-            Body=json.dumps(payload),
-        )
-        body = json.loads(resp["Body"].read().decode("utf-8"))
+        with tracing.span(trace, "invoke_model", "bedrock_adapter"):
+            resp = client.invoke_model(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(payload),
+            )
+            body = json.loads(resp["body"].read().decode("utf-8"))
         text = body.get("content", [{}])[0].get("text", "")
     except Exception:
-        print(json.dumps({"level": "ERROR", "message": "Bedrock invoke failed"}))
-        llm = _fallback_llm("Bedrock invoke failed")
-        return {"message": message, "llm": llm}
+        print(json.dumps({"level": "ERROR", "message": "Bedrock invoke failed", "model_id": model_id}))
+        return None, {}, "Bedrock invoke failed"
 
+    usage = body.get("usage") or {}
     try:
-        parsed = json.loads(text)
-        if hasattr(TriageOutput, "model_validate"):
-            triage = TriageOutput.model_validate(parsed)
-        else:  # Pydantic v1 fallback
-            triage = TriageOutput.parse_obj(parsed)
-        llm = triage.model_dump() if hasattr(triage, "model_dump") else triage.dict()
+        with tracing.span(trace, "parse", "bedrock_adapter"):
+            llm = TRIAGE_OUTPUT.validate_json_dict(text)
+        return llm, usage, ""
     except (json.JSONDecodeError, ValidationError):
-        print(json.dumps({"level": "WARN", "message": "Bedrock output invalid"}))
-        llm = _fallback_llm("Failed to parse/validate model output")
+        print(json.dumps({"level": "WARN", "message": "Bedrock output invalid", "model_id": model_id}))
+        return None, usage, "Failed to parse/validate model output"
+
+
+def _hedge_tier(tier: Dict[str, Any], tiers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tier that prices hedge calls: ``tier`` itself unless HEDGE_MODEL_ID names another model."""
+    model_id = os.getenv("HEDGE_MODEL_ID")
+    if not model_id or model_id == tier["model_id"]:
+        return tier
+    return next(
+        (other for other in tiers if other["model_id"] == model_id),
+        {
+            "model_id": model_id,
+            "input_cost_per_1k": float(os.getenv("HEDGE_INPUT_COST_PER_1K", "0")),
+            "output_cost_per_1k": float(os.getenv("HEDGE_OUTPUT_COST_PER_1K", "0")),
+        },
+    )
+
+
+def _invoke_hedged(
+    hedger: hedging.Hedger,
+    client,
+    tier: Dict[str, Any],
+    hedge_tier: Dict[str, Any],
+    prompt: str,
+    trace: Dict[str, Any],
+    record: Callable[[Dict[str, Any], Dict[str, Any]], None],
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], str]:
+    """``_invoke`` with a backup request to the next region and/or HEDGE_MODEL_ID when slow.
+
+    ``record(tier, usage)`` is called for both calls: the winner now, the
+    loser when it finishes (a loser still running is billed all the same).
+    """
+    hedge_client = client.hedge_view() if isinstance(client, region_pool.RegionPool) else client
+    # Each call records spans on its own copy; only the winner's are kept
+    traces = {"primary": {**trace, "spans": []}, "hedge": {**trace, "spans": []}}
+    result, info = hedger.run(
+        lambda: _invoke(client, tier["model_id"], prompt, traces["primary"]),
+        lambda: _invoke(hedge_client, hedge_tier["model_id"], prompt, traces["hedge"]),
+        valid=lambda outcome: outcome[0] is not None,
+    )
+    trace["spans"].extend(traces[info["winner"]]["spans"])
+    tiers = {"primary": tier, "hedge": hedge_tier}
+    record(tiers[info["winner"]], result[1])
+    loser = info["loser"]
+    if loser is not None:
+        loser_tier = tiers["hedge" if info["winner"] == "primary" else "primary"]
+        # Runs at once if the loser is done; a cancelled call never reached Bedrock
+        loser.add_done_callback(
+            lambda future: None
+            if future.cancelled() or future.exception() is not None
+            else record(loser_tier, future.result()[1])
+        )
+    _emit_metric("BedrockHedged", 1 if info["hedged"] else 0, action="hedge")
+    if info["hedged"]:
+        _emit_metric("BedrockHedgeWon", 1 if info["winner"] == "hedge" else 0, action="hedge")
+    _emit_metric("BedrockCallLatency", info["latency_ms"], unit="Milliseconds", action="hedge")
+    return result
+
+
+@profiling.profiled()
+def handler(event, _context):
+    message: Dict[str, Any] = event.get("message", {})
+    tiers = _model_tiers()
+    thresholds = _escalation_thresholds()
+
+    trace = tracing.from_event(event)
+
+    distilled = _distilled_decision(message, trace)
+    if distilled is not None:
+        return distilled
+
+    reused = _reuse_prior_decision(message, trace)
+    if reused is not None:
+        return reused
+
+    governor = spend_governor.governor_from_env()
+    mode = "normal"
+    if governor is not None:
+        try:
+            mode = governor.mode()
+        except Exception as exc:
+            # An unreachable counter store must not stop triage
+            print(json.dumps({"level": "ERROR", "message": "Spend governor unavailable", "error": str(exc)}))
+        _emit_metric("SpendMode", spend_governor.MODES.index(mode), unit="None", action="governor")
+    if mode == "exhausted":
+        return _budget_exhausted(message, trace)
+
+    client = _bedrock_client()
+    hedger = hedging.hedger_from_env()
+    if mode == "degraded":
+        # Cheapest path only: one tier, no escalation, no hedges
+        tiers = [_degraded_tier(tiers)]
+        hedger = None
+    with tracing.span(trace, "prompt_build", "bedrock_adapter"):
+        prompt = _build_prompt(message)
+
+    llm: Optional[Dict[str, Any]] = None
+    reason = ""
+    tier_index = 0
+    for tier_index, tier in enumerate(tiers):
+        started = time.perf_counter()
+        if hedger is None:
+            llm, usage, reason = _invoke(client, tier["model_id"], prompt, trace)
+            _record_usage(governor, tier, message, usage)
+        else:
+            llm, usage, reason = _invoke_hedged(
+                hedger,
+                client,
+                tier,
+                _hedge_tier(tier, tiers),
+                prompt,
+                trace,
+                lambda used_tier, used: _record_usage(governor, used_tier, message, used),
+            )
+        if len(tiers) > 1:
+            tier_name = str(tier_index)
+            _emit_metric("TierLatency", (time.perf_counter() - started) * 1000, unit="Milliseconds", tier=tier_name)
+            _emit_metric("TierCost", _tier_cost(tier, usage), unit="None", tier=tier_name)
+        if tier_index == len(tiers) - 1 or not _should_escalate(llm, thresholds):
+            break
+
+    if len(tiers) > 1:
+        _emit_metric("CascadeEscalated", 1 if tier_index > 0 else 0, action="cascade")
+
+    if llm is not None:
+        _remember_decision(message, llm)
 
-    return {"message": message, "llm": llm}
+    result = {"message": message, "llm": llm if llm is not None else _fallback_llm(reason), "trace": trace}
+    if len(tiers) > 1:
+        result["cascade"] = {"tier": tier_index, "model_id": tiers[tier_index]["model_id"]}
+    if mode != "normal":
+        result["governor"] = {"mode": mode, "model_id": tiers[0]["model_id"]}
+    return result
@@ -0,0 +1,216 @@
+"""Local Bedrock runtime stand-in for offline load tests and benchmarks.
+
+Two modes, selected by ``BEDROCK_STANDIN_MODE``:
+
+- ``record``: wrap the real ``bedrock-runtime`` client and append every
+  request/response pair to the cassette at ``BEDROCK_CASSETTE`` (JSONL).
+- ``replay``: serve responses from the cassette keyed by prompt fingerprint,
+  with a configurable latency distribution, throttling rate and error
+  injection. No network access is needed.
+
+Replay knobs (all optional):
+
+- ``BEDROCK_STANDIN_LATENCY``: ``recorded`` (default), ``fixed:<ms>``,
+  ``uniform:<lo_ms>,<hi_ms>`` or ``lognormal:<median_ms>,<sigma>``
+- ``BEDROCK_STANDIN_THROTTLE_RATE`` / ``BEDROCK_STANDIN_ERROR_RATE``: 0..1
+- ``BEDROCK_STANDIN_SEED``: seed for reproducible runs
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+
+class _Body:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+def fingerprint(model_id: str, body: Any) -> str:
+    """Stable key for a request: model id plus the prompt text."""
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8")
+    try:
+        payload = json.loads(body)
+        parts = [
+            block.get("text", "")
+            for msg in payload.get("messages", [])
+            for block in msg.get("content", [])
+            if isinstance(block, dict)
+        ]
+        key = "\n".join(parts)
+    except (TypeError, ValueError, AttributeError):
+        key = str(body)
+    return hashlib.sha256(f"{model_id}\n{key}".encode("utf-8")).hexdigest()[:32]
+
+
+def _client_error(code: str, message: str, status: int) -> ClientError:
+    return ClientError(
+        {"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "InvokeModel",
+    )
+
+
+class LatencyModel:
+    """Samples a response latency in milliseconds from a spec string."""
+
+    def __init__(self, spec: str = "recorded", rng: Optional[random.Random] = None) -> None:
+        self.rng = rng or random.Random()
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency spec: {spec}")
+
+    def sample(self, recorded_ms: float = 0.0) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(self.args[0], self.args[1])
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return self.rng.lognormvariate(math.log(median), sigma)
+        return recorded_ms
+
+
+def load_cassette(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    entries: Dict[str, List[Dict[str, Any]]] = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                entry = json.loads(line)
+                entries.setdefault(entry["fingerprint"], []).append(entry)
+    return entries
+
+
+class RecordingClient:
+    """Delegates to a real client and appends each exchange to a cassette."""
+
+    def __init__(self, inner, path: str) -> None:
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def invoke_model(self, **kwargs):
+        started = time.perf_counter()
+        resp = self.inner.invoke_model(**kwargs)
+        data = resp["body"].read()
+        latency_ms = (time.perf_counter() - started) * 1000
+        entry = {
+            "fingerprint": fingerprint(kwargs.get("modelId", ""), kwargs.get("body", "")),
+            "model_id": kwargs.get("modelId", ""),
+            "request": json.loads(kwargs.get("body", "{}")),
+            "response": json.loads(data),
+            "latency_ms": round(latency_ms, 3),
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry) + "\n")
+        return {**resp, "body": _Body(data)}
+
+
+class ReplayClient:
+    """Serves cassette responses with injected latency, throttles and errors."""
+
+    def __init__(
+        self,
+        entries: Dict[str, List[Dict[str, Any]]],
+        latency: Optional[LatencyModel] = None,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        default_response: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.entries = entries
+        self.rng = random.Random(seed)
+        self.latency = latency or LatencyModel("recorded", self.rng)
+        self.latency.rng = self.rng
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.default_response = default_response
+        self.sleep = sleep
+        self.stats = {"calls": 0, "hits": 0, "misses": 0, "throttled": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReplayClient":
+        return cls(load_cassette(path), **kwargs)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def invoke_model(self, **kwargs):
+        self._count("calls")
+        roll = self.rng.random()
+        key = fingerprint(kwargs.get("modelId", ""), kwargs.get("body", ""))
+        candidates = self.entries.get(key)
+        entry = self.rng.choice(candidates) if candidates else None
+
+        self.sleep(self.latency.sample(entry["latency_ms"] if entry else 0.0) / 1000)
+
+        if roll < self.throttle_rate:
+            self._count("throttled")
+            raise _client_error("ThrottlingException", "Rate exceeded (stand-in)", 429)
+        if roll < self.throttle_rate + self.error_rate:
+            self._count("errors")
+            raise _client_error("ServiceUnavailableException", "Injected error (stand-in)", 503)
+
+        if entry is not None:
+            self._count("hits")
+            response = entry["response"]
+        elif self.default_response is not None:
+            self._count("misses")
+            response = self.default_response
+        else:
+            self._count("misses")
+            raise _client_error("ValidationException", f"No cassette entry for fingerprint {key}", 400)
+        return {"body": _Body(json.dumps(response).encode("utf-8")), "contentType": "application/json"}
+
+
+_REPLAY_CLIENTS: Dict[tuple, ReplayClient] = {}
+
+
+def client_from_env(real_client_factory: Callable[[], Any]):
+    """Return a stand-in client when BEDROCK_STANDIN_MODE is set, else None.
+
+    Replay clients are cached per configuration so the cassette is loaded once
+    per process rather than on every invocation.
+    """
+    mode = os.getenv("BEDROCK_STANDIN_MODE")
+    if not mode:
+        return None
+    path = os.environ["BEDROCK_CASSETTE"]
+    if mode == "record":
+        return RecordingClient(real_client_factory(), path)
+    if mode == "replay":
+        config = (
+            path,
+            os.getenv("BEDROCK_STANDIN_LATENCY", "recorded"),
+            float(os.getenv("BEDROCK_STANDIN_THROTTLE_RATE", "0")),
+            float(os.getenv("BEDROCK_STANDIN_ERROR_RATE", "0")),
+            os.getenv("BEDROCK_STANDIN_SEED"),
+        )
+        if config not in _REPLAY_CLIENTS:
+            _REPLAY_CLIENTS[config] = ReplayClient.from_file(
+                path,
+                latency=LatencyModel(config[1]),
+                throttle_rate=config[2],
+                error_rate=config[3],
+                seed=int(config[4]) if config[4] else None,
+            )
+        return _REPLAY_CLIENTS[config]
+    raise ValueError(f"Unknown BEDROCK_STANDIN_MODE: {mode}")
@@ -0,0 +1,493 @@
+"""Append-only columnar decision log with fast analytical queries.
+
+Every triage outcome (normalized message fields, LLM output, guardrail reasons
+and final action) is appended as one row. Rows live in segment directories,
+one open segment per writer, sealed after ``segment_rows`` rows::
+
+    <root>/seg-<writer>-<seq>/
+        meta.json        rows, ts range, sortedness, per-column dictionaries
+        ts.q             int64 epoch seconds (decision time)
+        <column>.u16     dictionary codes for categorical columns
+        attempts.u8      redrive attempts (capped at 255)
+        confidence.u8    LLM confidence in percent
+        reasons.u32      bitmask over the segment's reason dictionary
+        strings.jsonl    correlationId, errorMessage, summary, timestamp
+        strings.idx      uint64 line offsets into strings.jsonl
+
+Column files are fixed-width arrays that are memory-mapped for reading.
+Queries prune segments by time range and dictionary, then evaluate filters as
+byte masks (``bytes.translate``) folded into Python ints, so AND/OR and
+counting (``int.bit_count``) run at C speed without per-row Python work.
+
+Writers never touch each other's segments, so concurrent Lambdas can share a
+directory (e.g. on EFS). ``meta.json`` is replaced atomically on every flush;
+readers only see rows it covers. A failed flush cuts the column files back to
+the lengths meta.json records and keeps the rows buffered, so a retry appends
+them in line.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import calendar
+import json
+import mmap
+import os
+import sys
+import time
+import uuid
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+CATEGORICAL = ("failure_category", "category", "llm_action", "action", "state", "source")
+STRINGS = ("correlation_id", "error_message", "summary", "timestamp")
+MAX_REASONS = 32
+
+# _EQ[b] maps byte b to 1 and everything else to 0; _BIT[k] maps bytes with bit k set to 1.
+_EQ = [bytes(1 if i == b else 0 for i in range(256)) for b in range(256)]
+_BIT = [bytes(1 if i & (1 << k) else 0 for i in range(256)) for k in range(8)]
+
+Filter = Union[None, str, Iterable[str]]
+
+
+def _to_epoch(value: Any) -> int:
+    if value is None or value == "":
+        return int(time.time())
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).replace("Z", "")
+    return calendar.timegm(time.strptime(text[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+def decision_row(
+    message: Dict[str, Any],
+    llm: Dict[str, Any],
+    guardrails: Optional[Dict[str, Any]],
+    action: str,
+    decided_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Flatten one triage outcome into a log row."""
+    return {
+        "ts": int(decided_at if decided_at is not None else time.time()),
+        "failure_category": str(message.get("failureCategory") or "UNKNOWN"),
+        "category": str(llm.get("category") or "UNKNOWN"),
+        "llm_action": str(llm.get("recommended_action") or "TICKET"),
+        "action": action,
+        "state": str(message.get("stateAtFailure") or ""),
+        "source": str(message.get("source") or "unknown"),
+        "attempts": int(message.get("redriveAttempts") or 0),
+        "confidence": float(llm.get("confidence") or 0.0),
+        "reasons": list((guardrails or {}).get("reasons") or []),
+        "correlation_id": str(message.get("correlationId") or ""),
+        "error_message": str(message.get("errorMessage") or ""),
+        "summary": str(llm.get("summary") or ""),
+        "timestamp": str(message.get("timestamp") or ""),
+    }
+
+
+class DecisionLogWriter:
+    """Appends rows to this writer's open segment, sealing it when full."""
+
+    def __init__(self, root: str, segment_rows: int = 262144, flush_rows: int = 1, writer_id: Optional[str] = None):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.flush_rows = flush_rows
+        self.writer_id = writer_id or uuid.uuid4().hex[:12]
+        self._seq = 0
+        os.makedirs(root, exist_ok=True)
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self.segment_dir = os.path.join(self.root, f"seg-{self.writer_id}-{self._seq:06d}")
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._seq += 1
+        self.rows = 0
+        self._committed_rows = 0
+        self._committed_strings = 0
+        self.ts_min: Optional[int] = None
+        self.ts_max: Optional[int] = None
+        self.sorted = True
+        self.dicts: Dict[str, Dict[str, int]] = {col: {} for col in CATEGORICAL + ("reasons",)}
+        self.strings_offset = 0
+        self._reset_buffers()
+
+    def _reset_buffers(self) -> None:
+        self._pending = 0
+        self._ts = array("q")
+        self._cat = {col: array("H") for col in CATEGORICAL}
+        self._attempts = bytearray()
+        self._confidence = bytearray()
+        self._reasons = array("I")
+        self._strings: List[bytes] = []
+        self._string_offsets = array("Q")
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self.dicts[column]
+        if value not in codes:
+            limit = MAX_REASONS if column == "reasons" else 65536
+            if len(codes) >= limit:
+                raise ValueError(f"Too many distinct values for {column} in one segment")
+            codes[value] = len(codes)
+        return codes[value]
+
+    def append(self, row: Dict[str, Any]) -> None:
+        ts = int(row["ts"])
+        if self.ts_max is not None and ts < self.ts_max:
+            self.sorted = False
+        self.ts_min = ts if self.ts_min is None else min(self.ts_min, ts)
+        self.ts_max = ts if self.ts_max is None else max(self.ts_max, ts)
+        self._ts.append(ts)
+        for col in CATEGORICAL:
+            self._cat[col].append(self._code(col, row[col]))
+        self._attempts.append(min(255, max(0, int(row["attempts"]))))
+        self._confidence.append(min(100, max(0, int(round(float(row["confidence"]) * 100)))))
+        mask = 0
+        for reason in row["reasons"]:
+            mask |= 1 << self._code("reasons", reason)
+        self._reasons.append(mask)
+        line = (json.dumps([row[name] for name in STRINGS]) + "\n").encode("utf-8")
+        self._string_offsets.append(self.strings_offset)
+        self.strings_offset += len(line)
+        self._strings.append(line)
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.flush_rows or self.rows >= self.segment_rows:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def _write(self, name: str, data: bytes) -> None:
+        with open(os.path.join(self.segment_dir, name), "ab") as handle:
+            handle.write(data)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        try:
+            self._write("ts.q", _little_endian(self._ts))
+            for col in CATEGORICAL:
+                self._write(f"{col}.u16", _little_endian(self._cat[col]))
+            self._write("attempts.u8", bytes(self._attempts))
+            self._write("confidence.u8", bytes(self._confidence))
+            self._write("reasons.u32", _little_endian(self._reasons))
+            self._write("strings.jsonl", b"".join(self._strings))
+            self._write("strings.idx", _little_endian(self._string_offsets))
+            meta = {
+                "rows": self.rows,
+                "ts_min": self.ts_min,
+                "ts_max": self.ts_max,
+                "sorted": self.sorted,
+                "sealed": self.rows >= self.segment_rows,
+                "dicts": {col: list(codes) for col, codes in self.dicts.items()},
+            }
+            tmp = os.path.join(self.segment_dir, "meta.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump(meta, handle)
+            os.replace(tmp, os.path.join(self.segment_dir, "meta.json"))
+        except BaseException:
+            self._rollback()
+            raise
+        self._committed_rows = self.rows
+        self._committed_strings = self.strings_offset
+        self._reset_buffers()
+        if self.rows >= self.segment_rows:
+            self._open_segment()
+
+    def _rollback(self) -> None:
+        """Cut the files back to what meta.json describes; the rows stay buffered for the next flush.
+
+        If that fails too, the segment is left as meta.json describes it (readers
+        ignore bytes past ``rows``) and this writer moves on to a new one.
+        """
+        rows = self._committed_rows
+        committed = {f"{col}.u16": rows * 2 for col in CATEGORICAL}
+        committed.update(
+            {
+                "ts.q": rows * 8,
+                "attempts.u8": rows,
+                "confidence.u8": rows,
+                "reasons.u32": rows * 4,
+                "strings.jsonl": self._committed_strings,
+                "strings.idx": rows * 8,
+            }
+        )
+        try:
+            for name, length in committed.items():
+                path = os.path.join(self.segment_dir, name)
+                if os.path.exists(path):
+                    os.truncate(path, length)
+        except OSError:
+            self._open_segment()
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover - files are little-endian
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _Segment:
+    _WIDTHS = {"ts.q": 8, "attempts.u8": 1, "confidence.u8": 1, "reasons.u32": 4, "strings.idx": 8}
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        self.rows: int = meta["rows"]
+        self.ts_min: int = meta["ts_min"]
+        self.ts_max: int = meta["ts_max"]
+        self.sorted: bool = meta["sorted"]
+        self.dicts: Dict[str, List[str]] = meta["dicts"]
+        self._codes = {col: {v: i for i, v in enumerate(values)} for col, values in self.dicts.items()}
+        self._cache: Dict[str, bytes] = {}
+
+    def _column(self, name: str) -> bytes:
+        if name not in self._cache:
+            width = self._WIDTHS.get(name, 2)
+            with open(os.path.join(self.path, name), "rb") as handle:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    self._cache[name] = mapped[: self.rows * width]
+        return self._cache[name]
+
+    def ones(self) -> int:
+        return int.from_bytes(b"\x01" * self.rows, "little")
+
+    def codes_for(self, column: str, values: Sequence[str]) -> List[int]:
+        codes = self._codes.get(column, {})
+        return [codes[v] for v in values if v in codes]
+
+    def eq_mask(self, column: str, codes: Sequence[int]) -> int:
+        data = self._column(f"{column}.u16")
+        low = data[0::2]
+        high = data[1::2] if len(self.dicts[column]) > 256 else None
+        mask = 0
+        for code in codes:
+            match = int.from_bytes(low.translate(_EQ[code & 0xFF]), "little")
+            if high is not None:
+                match &= int.from_bytes(high.translate(_EQ[code >> 8]), "little")
+            mask |= match
+        return mask
+
+    def reason_mask(self, codes: Sequence[int]) -> int:
+        data = self._column("reasons.u32")
+        mask = 0
+        for code in codes:
+            mask |= int.from_bytes(data[code // 8::4].translate(_BIT[code % 8]), "little")
+        return mask
+
+    def ts_bounds(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """Row range [lo, hi) with start <= ts < end; only valid for sorted segments."""
+        view = memoryview(self._column("ts.q")).cast("q")
+        lo = 0 if start is None else bisect.bisect_left(view, start)
+        hi = self.rows if end is None else bisect.bisect_left(view, end)
+        return lo, max(lo, hi)
+
+    def ts_mask(self, start: Optional[int], end: Optional[int]) -> int:
+        if self.sorted:
+            lo, hi = self.ts_bounds(start, end)
+            return int.from_bytes(b"\x00" * lo + b"\x01" * (hi - lo), "little")
+        view = memoryview(self._column("ts.q")).cast("q")
+        start = start if start is not None else -(1 << 62)
+        end = end if end is not None else 1 << 62
+        return int.from_bytes(bytes(1 if start <= t < end else 0 for t in view), "little")
+
+    def row(self, index: int) -> Dict[str, Any]:
+        offsets = memoryview(self._column("strings.idx")).cast("Q")
+        with open(os.path.join(self.path, "strings.jsonl"), "rb") as handle:
+            handle.seek(offsets[index])
+            strings = json.loads(handle.readline())
+        row: Dict[str, Any] = {"ts": memoryview(self._column("ts.q")).cast("q")[index]}
+        for col in CATEGORICAL:
+            code = memoryview(self._column(f"{col}.u16")).cast("H")[index]
+            row[col] = self.dicts[col][code]
+        row["attempts"] = self._column("attempts.u8")[index]
+        row["confidence"] = self._column("confidence.u8")[index] / 100
+        bits = memoryview(self._column("reasons.u32")).cast("I")[index]
+        row["reasons"] = [r for i, r in enumerate(self.dicts["reasons"]) if bits & (1 << i)]
+        row.update(zip(STRINGS, strings))
+        return row
+
+
+def _as_list(value: Filter) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class DecisionLog:
+    """Read/query side. Filters take a value or a collection of values (IN)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def segments(self) -> Iterator[_Segment]:
+        if not os.path.isdir(self.root):
+            return
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.startswith("seg-") and os.path.exists(os.path.join(path, "meta.json")):
+                segment = _Segment(path)
+                if segment.rows:
+                    yield segment
+
+    def _select(
+        self,
+        segment: _Segment,
+        start: Optional[int],
+        end: Optional[int],
+        reason: Filter,
+        filters: Dict[str, Filter],
+    ) -> Optional[int]:
+        """Selection mask for one segment, or None when it is pruned."""
+        if start is not None and segment.ts_max < start:
+            return None
+        if end is not None and segment.ts_min >= end:
+            return None
+        masks = []
+        for column, value in filters.items():
+            values = _as_list(value)
+            if values is None:
+                continue
+            codes = segment.codes_for(column, values)
+            if not codes:
+                return None
+            if len(codes) < len(segment.dicts[column]):
+                masks.append(segment.eq_mask(column, codes))
+        reasons = _as_list(reason)
+        if reasons is not None:
+            codes = segment.codes_for("reasons", reasons)
+            if not codes:
+                return None
+            masks.append(segment.reason_mask(codes))
+        if (start is not None and start > segment.ts_min) or (end is not None and end <= segment.ts_max):
+            masks.append(segment.ts_mask(start, end))
+        mask = masks[0] if masks else segment.ones()
+        for other in masks[1:]:
+            mask &= other
+        return mask
+
+    def _filters(self, kwargs: Dict[str, Filter]) -> Dict[str, Filter]:
+        unknown = set(kwargs) - set(CATEGORICAL)
+        if unknown:
+            raise TypeError(f"Unknown filter(s): {sorted(unknown)}")
+        return kwargs
+
+    def count(self, start: Any = None, end: Any = None, reason: Filter = None, **filters: Filter) -> int:
+        start_ts = None if start is None else _to_epoch(start)
+        end_ts = None if end is None else _to_epoch(end)
+        total = 0
+        for segment in self.segments():
+            mask = self._select(segment, start_ts, end_ts, reason, self._filters(filters))
+            if mask:
+                total += mask.bit_count()
+        return total
+
+    def aggregate(
+        self,
+        group_by: str,
+        start: Any = None,
+        end: Any = None,
+        reason: Filter = None,
+        bucket_seconds: int = 3600,
+        **filters: Filter,
+    ) -> Dict[Any, int]:
+        """Row counts grouped by a categorical column, ``reason`` or ``time``."""
+        start_ts = None if start is None else _to_epoch(start)
+        end_ts = None if end is None else _to_epoch(end)
+        result: Dict[Any, int] = {}
+        for segment in self.segments():
+            mask = self._select(segment, start_ts, end_ts, reason, self._filters(filters))
+            if not mask:
+                continue
+            if group_by == "time":
+                groups = self._time_groups(segment, mask, bucket_seconds)
+            elif group_by == "reason":
+                groups = (
+                    (value, (mask & segment.reason_mask([code])).bit_count())
+                    for code, value in enumerate(segment.dicts["reasons"])
+                )
+            elif group_by in CATEGORICAL:
+                groups = (
+                    (value, (mask & segment.eq_mask(group_by, [code])).bit_count())
+                    for code, value in enumerate(segment.dicts[group_by])
+                )
+            else:
+                raise ValueError(f"Cannot group by {group_by}")
+            for key, count in groups:
+                if count:
+                    result[key] = result.get(key, 0) + count
+        return result
+
+    def _time_groups(self, segment: _Segment, mask: int, bucket_seconds: int) -> Iterator[Tuple[int, int]]:
+        first = segment.ts_min - segment.ts_min % bucket_seconds
+        for bucket in range(first, segment.ts_max + 1, bucket_seconds):
+            yield bucket, (mask & segment.ts_mask(bucket, bucket + bucket_seconds)).bit_count()
+
+    def rows(self, limit: int = 100, start: Any = None, end: Any = None, reason: Filter = None, **filters: Filter):
+        start_ts = None if start is None else _to_epoch(start)
+        end_ts = None if end is None else _to_epoch(end)
+        out: List[Dict[str, Any]] = []
+        for segment in self.segments():
+            mask = self._select(segment, start_ts, end_ts, reason, self._filters(filters))
+            if not mask:
+                continue
+            selected = mask.to_bytes(segment.rows, "little")
+            index = selected.find(1)
+            while index != -1 and len(out) < limit:
+                out.append(segment.row(index))
+                index = selected.find(1, index + 1)
+            if len(out) >= limit:
+                break
+        return out
+
+
+_WRITER: Optional[DecisionLogWriter] = None
+
+
+def record_decision(
+    message: Dict[str, Any], llm: Dict[str, Any], guardrails: Optional[Dict[str, Any]], action: str
+) -> None:
+    """Append to the log under DECISION_LOG_DIR; a no-op when it is unset."""
+    global _WRITER
+    root = os.getenv("DECISION_LOG_DIR")
+    if not root:
+        return
+    if _WRITER is None or _WRITER.root != root:
+        _WRITER = DecisionLogWriter(root, flush_rows=int(os.getenv("DECISION_LOG_FLUSH_ROWS", "1")))
+    _WRITER.append(decision_row(message, llm, guardrails, action))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the DLQ triage decision log")
+    parser.add_argument("root")
+    parser.add_argument("--group-by")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--reason")
+    parser.add_argument("--rows", type=int, default=0, help="print up to N matching rows")
+    for col in CATEGORICAL:
+        parser.add_argument(f"--{col.replace('_', '-')}")
+    args = parser.parse_args(argv)
+
+    log = DecisionLog(args.root)
+    filters = {col: getattr(args, col) for col in CATEGORICAL if getattr(args, col)}
+    common = {"start": args.start, "end": args.end, "reason": args.reason, **filters}
+    if args.rows:
+        for row in log.rows(limit=args.rows, **common):
+            print(json.dumps(row))
+    elif args.group_by:
+        print(json.dumps(log.aggregate(args.group_by, **common), indent=2))
+    else:
+        print(log.count(**common))
+
+
+if __name__ == "__main__":
+    main()
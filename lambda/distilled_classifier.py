@@ -0,0 +1,435 @@
+"""Local classifier distilled from past Bedrock decisions.
+
+Most DLQ errors repeat, and so do the model's answers. This module trains a
+multinomial naive Bayes model offline from the decision log. Each label is
+one ``(category, recommended_action)`` pair. Features are hashed tokens of
+the normalized ``errorMessage`` (words and word pairs) plus
+``failureCategory``. Labels with fewer than ``min_class_count`` examples are
+merged into ``__other__``, which never answers on its own. Neither does a
+message whose features are mostly unknown to the model (below
+``min_coverage``): naive Bayes is confidently wrong on text it has not seen.
+
+Naive Bayes is overconfident, so probabilities are calibrated with a single
+temperature fitted on a held-out split. The adapter answers locally when the
+calibrated probability clears ``DISTILLED_THRESHOLD``; everything else goes
+to Bedrock.
+
+The artifact is zlib-compressed: a JSON header (labels, priors, temperature,
+summaries) plus float32 per-label weights for every hashed feature seen at
+least ``min_feature_count`` times. It has no dependencies beyond the standard
+library, so it loads in the Lambda runtime as is.
+
+    python lambda/distilled_classifier.py train /mnt/decisions --out model.dlqc
+    python lambda/distilled_classifier.py evaluate model.dlqc /mnt/decisions --start 2025-02-01
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import re
+import struct
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from similarity_index import normalize
+
+MAGIC = b"DLQDC1\n"
+OTHER = "__other__"
+# Errors are classified on their first MAX_CHARS characters
+MAX_CHARS = 1000
+_WORD = re.compile(r"[a-z_]+|<[a-z]+>")
+
+Example = Tuple[str, str, str]  # (failureCategory, errorMessage, label)
+
+
+def label_for(category: str, action: str) -> str:
+    return f"{category}|{action}"
+
+
+def features(failure_category: str, error_message: str, n_buckets: int) -> List[int]:
+    """Hashed feature ids; repeated tokens repeat (multinomial counts)."""
+    words = _WORD.findall(normalize(error_message[:MAX_CHARS]))
+    tokens = [f"c:{failure_category}"] + words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    mask = n_buckets - 1
+    return [zlib.crc32(token.encode("utf-8")) & mask for token in tokens]
+
+
+def _softmax(scores: Sequence[float], temperature: float) -> List[float]:
+    top = max(scores)
+    exps = [math.exp((score - top) / temperature) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+
+class DistilledModel:
+    def __init__(
+        self,
+        labels: List[str],
+        bias: List[float],
+        unseen: List[float],
+        weights: Dict[int, Tuple[float, ...]],
+        n_buckets: int,
+        temperature: float = 1.0,
+        summaries: Optional[Dict[str, str]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        min_coverage: float = 0.5,
+    ) -> None:
+        self.labels = labels
+        self.bias = bias
+        # log P(feature | label) for features without a stored weight
+        self.unseen = unseen
+        # Stored as the difference from ``unseen``, so absent features cost nothing
+        self.weights = weights
+        self.n_buckets = n_buckets
+        self.temperature = temperature
+        self.summaries = summaries or {}
+        self.meta = meta or {}
+        # Fraction of a message's features the model must know to answer
+        self.min_coverage = min_coverage
+
+    def scores(self, feature_ids: Sequence[int]) -> List[float]:
+        return self._scores(feature_ids)[0]
+
+    def _scores(self, feature_ids: Sequence[int]) -> Tuple[List[float], int]:
+        count = len(feature_ids)
+        scores = [bias + count * unseen for bias, unseen in zip(self.bias, self.unseen)]
+        rows = [row for row in map(self.weights.get, feature_ids) if row is not None]
+        if rows:
+            # Column sums over the known features' weight rows
+            scores = [score + sum(column) for score, column in zip(scores, zip(*rows))]
+        return scores, len(rows)
+
+    def _classify(self, failure_category: str, error_message: str) -> Tuple[str, float]:
+        feature_ids = features(failure_category, error_message, self.n_buckets)
+        scores, known = self._scores(feature_ids)
+        probabilities = _softmax(scores, self.temperature)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        if known < self.min_coverage * len(feature_ids):
+            return OTHER, probabilities[best]
+        return self.labels[best], probabilities[best]
+
+    def predict(self, message: Dict[str, Any]) -> Tuple[str, float]:
+        """(label, calibrated probability) for one normalized message."""
+        return self._classify(str(message.get("failureCategory") or "UNKNOWN"), str(message.get("errorMessage") or ""))
+
+    def predict_batch(self, messages: Iterable[Dict[str, Any]]) -> List[Tuple[str, float]]:
+        """``predict`` for many messages; identical (category, error) pairs are scored once."""
+        cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        out = []
+        for message in messages:
+            key = (str(message.get("failureCategory") or "UNKNOWN"), str(message.get("errorMessage") or "")[:MAX_CHARS])
+            result = cache.get(key)
+            if result is None:
+                result = cache[key] = self._classify(*key)
+            out.append(result)
+        return out
+
+    def triage_output(self, label: str, probability: float) -> Dict[str, Any]:
+        """A ``TriageOutput``-shaped answer for a predicted label."""
+        category, _, action = label.partition("|")
+        return {
+            "category": category,
+            "recommended_action": action,
+            "confidence": round(probability, 4),
+            "summary": self.summaries.get(label) or f"Classified as {category}.",
+            "reasoning": (
+                f"Local classifier distilled from {self.meta.get('trained_rows', 0)} prior decisions "
+                f"(p={probability:.3f})."
+            ),
+        }
+
+
+def _fit(examples: Sequence[Example], n_buckets: int, alpha: float, min_class_count: int, min_feature_count: int):
+    label_counts = Counter(label for _, _, label in examples)
+    labels = sorted(label for label, count in label_counts.items() if count >= min_class_count)
+    if len(labels) < len(label_counts):
+        labels.append(OTHER)
+    index = {label: i for i, label in enumerate(labels)}
+    k = len(labels)
+
+    feature_counts: Dict[int, List[int]] = defaultdict(lambda: [0] * k)
+    totals = [0] * k
+    docs = [0] * k
+    for category, error, label in examples:
+        c = index.get(label, index.get(OTHER))
+        docs[c] += 1
+        for feature in features(category, error, n_buckets):
+            feature_counts[feature][c] += 1
+            totals[c] += 1
+
+    vocabulary = len(feature_counts) or 1
+    denominators = [math.log(total + alpha * vocabulary) for total in totals]
+    unseen = [math.log(alpha) - denominator for denominator in denominators]
+    bias = [math.log(count / len(examples)) for count in docs]
+    weights = {
+        feature: tuple(math.log(count + alpha) - math.log(alpha) for count in counts)
+        for feature, counts in feature_counts.items()
+        if sum(counts) >= min_feature_count
+    }
+    return labels, bias, unseen, weights
+
+
+def _calibrate(model: DistilledModel, examples: Sequence[Example]) -> float:
+    """Temperature with the lowest negative log-likelihood on ``examples``."""
+    index = {label: i for i, label in enumerate(model.labels)}
+    scored = [
+        (model.scores(features(category, error, model.n_buckets)), index.get(label, index.get(OTHER)))
+        for category, error, label in examples
+    ]
+    # Labels the model cannot produce say nothing about its confidence
+    scored = [(scores, truth) for scores, truth in scored if truth is not None]
+    best_temperature, best_loss = 1.0, float("inf")
+    for step in range(-4, 49):
+        temperature = 2 ** (step / 4)
+        loss = 0.0
+        for scores, truth in scored:
+            loss -= math.log(max(_softmax(scores, temperature)[truth], 1e-12))
+        if loss < best_loss:
+            best_temperature, best_loss = temperature, loss
+    return best_temperature
+
+
+def _summaries(examples: Iterable[Tuple[str, str]]) -> Dict[str, str]:
+    per_label: Dict[str, Counter] = defaultdict(Counter)
+    for label, summary in examples:
+        if summary:
+            per_label[label][summary] += 1
+    return {label: counts.most_common(1)[0][0] for label, counts in per_label.items()}
+
+
+def train(
+    examples: Sequence[Example],
+    summaries: Optional[Dict[str, str]] = None,
+    n_buckets: int = 1 << 18,
+    alpha: float = 0.5,
+    min_class_count: int = 20,
+    min_feature_count: int = 2,
+    min_coverage: float = 0.5,
+    calibration: Sequence[Example] = (),
+) -> DistilledModel:
+    """Fit on ``examples``; the temperature is fitted on ``calibration`` (if given)."""
+    if n_buckets & (n_buckets - 1):
+        raise ValueError("n_buckets must be a power of two")
+    if not examples:
+        raise ValueError("No training examples")
+    labels, bias, unseen, weights = _fit(examples, n_buckets, alpha, min_class_count, min_feature_count)
+    model = DistilledModel(
+        labels,
+        bias,
+        unseen,
+        weights,
+        n_buckets,
+        summaries=summaries,
+        meta={"trained_rows": len(examples), "trained_at": int(time.time()), "alpha": alpha},
+        min_coverage=min_coverage,
+    )
+    if calibration:
+        model.temperature = _calibrate(model, calibration)
+    return model
+
+
+def save(model: DistilledModel, path: str) -> int:
+    """Write the artifact atomically; returns its size in bytes."""
+    features_sorted = sorted(model.weights)
+    header = json.dumps(
+        {
+            "labels": model.labels,
+            "bias": model.bias,
+            "unseen": model.unseen,
+            "n_buckets": model.n_buckets,
+            "temperature": model.temperature,
+            "summaries": model.summaries,
+            "meta": model.meta,
+            "min_coverage": model.min_coverage,
+            "features": len(features_sorted),
+        }
+    ).encode("utf-8")
+    flat = array("f", (weight for feature in features_sorted for weight in model.weights[feature]))
+    blob = struct.pack("<I", len(header)) + header + array("I", features_sorted).tobytes() + flat.tobytes()
+    data = MAGIC + zlib.compress(blob, 9)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def load(path: str) -> DistilledModel:
+    with open(path, "rb") as handle:
+        data = handle.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a distilled classifier artifact")
+    blob = zlib.decompress(data[len(MAGIC):])
+    (header_len,) = struct.unpack_from("<I", blob)
+    header = json.loads(blob[4:4 + header_len])
+    k, n = len(header["labels"]), header["features"]
+    offset = 4 + header_len
+    feature_ids = array("I")
+    feature_ids.frombytes(blob[offset:offset + 4 * n])
+    flat = array("f")
+    flat.frombytes(blob[offset + 4 * n:offset + 4 * n + 4 * n * k])
+    weights = {feature: tuple(flat[i * k:(i + 1) * k]) for i, feature in enumerate(feature_ids)}
+    return DistilledModel(
+        header["labels"],
+        header["bias"],
+        header["unseen"],
+        weights,
+        header["n_buckets"],
+        temperature=header["temperature"],
+        summaries=header["summaries"],
+        meta=header["meta"],
+        min_coverage=header["min_coverage"],
+    )
+
+
+_MODELS: Dict[str, DistilledModel] = {}
+
+
+def model_from_env() -> Optional[DistilledModel]:
+    """Process-wide model from DISTILLED_MODEL_PATH, loaded once per container."""
+    path = os.getenv("DISTILLED_MODEL_PATH")
+    if not path:
+        return None
+    if path not in _MODELS:
+        _MODELS[path] = load(path)
+    return _MODELS[path]
+
+
+# -- reports ------------------------------------------------------------------
+
+
+def evaluate(
+    model: DistilledModel, examples: Sequence[Example], thresholds: Sequence[float] = (0.8, 0.9, 0.95, 0.99)
+) -> Dict[str, Any]:
+    """Accuracy, coverage and accuracy above each threshold, and calibration error."""
+    if not examples:
+        return {"rows": 0}
+    known = set(model.labels)
+    predictions = model.predict_batch({"failureCategory": c, "errorMessage": e} for c, e, _ in examples)
+    truths = [label if label in known else OTHER for _, _, label in examples]
+    correct = [predicted == truth for (predicted, _), truth in zip(predictions, truths)]
+    report: Dict[str, Any] = {
+        "rows": len(examples),
+        "accuracy": round(sum(correct) / len(examples), 4),
+        "thresholds": {},
+    }
+    for threshold in thresholds:
+        covered = [
+            ok for (label, probability), ok in zip(predictions, correct) if label != OTHER and probability >= threshold
+        ]
+        report["thresholds"][str(threshold)] = {
+            "coverage": round(len(covered) / len(examples), 4),
+            "accuracy": round(sum(covered) / len(covered), 4) if covered else None,
+        }
+    # Expected calibration error over 10 equal-width probability bins
+    bins: Dict[int, List[Tuple[float, bool]]] = defaultdict(list)
+    for (_, probability), ok in zip(predictions, correct):
+        bins[min(9, int(probability * 10))].append((probability, ok))
+    report["calibration_error"] = round(
+        sum(
+            len(items) / len(examples) * abs(sum(p for p, _ in items) / len(items) - sum(ok for _, ok in items) / len(items))
+            for items in bins.values()
+        ),
+        4,
+    )
+    return report
+
+
+def latency(model: DistilledModel, messages: Sequence[Dict[str, Any]], repeat: int = 3) -> Dict[str, Any]:
+    """Per-message ``predict`` latency and ``predict_batch`` throughput."""
+    samples = []
+    for _ in range(repeat):
+        for message in messages:
+            started = time.perf_counter()
+            model.predict(message)
+            samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    started = time.perf_counter()
+    model.predict_batch(messages)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "predict_us_p50": round(samples[len(samples) // 2], 1),
+        "predict_us_p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 1),
+        "batch_per_second": round(len(messages) / batch_seconds) if batch_seconds else None,
+    }
+
+
+# -- decision log ---------------------------------------------------------------
+
+
+def examples_from_log(root: str, start: Any = None, end: Any = None) -> Tuple[List[Example], List[str], List[str]]:
+    """(examples, correlation ids, summaries) for Bedrock decisions in the log; fallbacks are skipped."""
+    import decision_log
+
+    examples, ids, summaries = [], [], []
+    for row in decision_log.DecisionLog(root).rows(limit=1 << 62, start=start, end=end):
+        if row["category"] == "UNKNOWN" or row["llm_action"] not in ("REDRIVE", "TICKET"):
+            continue
+        examples.append((row["failure_category"], row["error_message"], label_for(row["category"], row["llm_action"])))
+        ids.append(row["correlation_id"])
+        summaries.append(row["summary"])
+    return examples, ids, summaries
+
+
+def split(examples: Sequence[Example], ids: Sequence[str], holdout: float) -> Tuple[List[Example], List[Example]]:
+    """Deterministic train/holdout split by correlationId hash."""
+    cut = int(holdout * 1000)
+    train_rows, holdout_rows = [], []
+    for example, correlation_id in zip(examples, ids):
+        (holdout_rows if zlib.crc32(correlation_id.encode("utf-8")) % 1000 < cut else train_rows).append(example)
+    return train_rows, holdout_rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the distilled triage classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_cmd = commands.add_parser("train", help="train from a decision log")
+    train_cmd.add_argument("log_root")
+    train_cmd.add_argument("--out", required=True)
+    train_cmd.add_argument("--start")
+    train_cmd.add_argument("--end")
+    train_cmd.add_argument("--holdout", type=float, default=0.2)
+    train_cmd.add_argument("--buckets", type=int, default=1 << 18)
+    train_cmd.add_argument("--min-class-count", type=int, default=20)
+    train_cmd.add_argument("--min-feature-count", type=int, default=2)
+    train_cmd.add_argument("--min-coverage", type=float, default=0.5)
+    eval_cmd = commands.add_parser("evaluate", help="report accuracy and latency on a decision log")
+    eval_cmd.add_argument("model")
+    eval_cmd.add_argument("log_root")
+    eval_cmd.add_argument("--start")
+    eval_cmd.add_argument("--end")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        examples, ids, summaries = examples_from_log(args.log_root, args.start, args.end)
+        train_rows, holdout_rows = split(examples, ids, args.holdout)
+        options = {
+            "n_buckets": args.buckets,
+            "min_class_count": args.min_class_count,
+            "min_feature_count": args.min_feature_count,
+            "min_coverage": args.min_coverage,
+        }
+        # Report on a model that has not seen the holdout, then refit on everything
+        candidate = train(train_rows, calibration=holdout_rows, **options)
+        report = {"holdout": evaluate(candidate, holdout_rows)}
+        model = train(examples, summaries=_summaries(zip((e[2] for e in examples), summaries)), **options)
+        model.temperature = candidate.temperature
+        report["artifact_bytes"] = save(model, args.out)
+        report["labels"] = model.labels
+        report["features"] = len(model.weights)
+        report["temperature"] = model.temperature
+    else:
+        model = load(args.model)
+        examples, _, _ = examples_from_log(args.log_root, args.start, args.end)
+        report = {"evaluation": evaluate(model, examples)}
+    report["latency"] = latency(model, [{"failureCategory": c, "errorMessage": e} for c, e, _ in examples[:5000]])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
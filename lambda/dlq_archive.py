@@ -0,0 +1,686 @@
+"""Indexed archive of triaged DLQ bodies for selective bulk replay.
+
+The triage handler appends every decoded event before its SQS message is
+deleted. Rows live in segment directories, one open segment per writer,
+sealed after ``segment_rows`` rows or ``segment_seconds`` seconds, whichever
+comes first (same layout rules as ``decision_log``)::
+
+    <root>/seg-<writer>-<seq>/
+        meta.json        rows, ts range, sortedness, category/source dictionaries,
+                         open time, segments this one replaces (compaction)
+        ts.q             int64 failure time (epoch seconds; archive time if missing)
+        category.u16     failure category code
+        source.u16       source code
+        fp.Q             error fingerprint (``error_analytics.signature``)
+        cid.Q            64-bit hash of correlationId
+        bodies.bin       original bodies, concatenated
+        bodies.idx       uint64 start offset of each body
+        <col>.sidx       sealed segments only: sorted ts/fp/cid values ...
+        <col>.srow       ... and the uint32 row each one came from
+
+Category and source filters are byte masks over the dictionary codes.
+Time, fingerprint and correlationId filters use the sorted secondary indexes
+(binary search), so a point lookup touches a few pages per segment however
+large the archive grows. Open segments fall back to scanning their columns.
+
+Each Lambda container writes its own segments, so most seal on age with a few
+hundred rows. ``DlqArchive.compact`` merges small sealed segments, and open
+ones whose writer has gone, into full indexed segments. Each merged segment
+lists the segments it replaces. Readers skip those once the merged segment is
+sealed, and skip the merged segment until then, so a compaction that stops
+part way never shows a row twice.
+
+A failed flush cuts the segment's files back to the lengths recorded in
+meta.json and keeps the rows buffered, so the next flush appends them in
+line with the other columns.
+
+``DlqArchive.replay`` streams matching bodies to a sender in batches;
+``sqs_sender`` sends them to a queue (for example the source queue of a fixed
+consumer) with ``SendMessageBatch``.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+import uuid
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import envelopes
+from error_analytics import signature
+
+CATEGORICAL = ("category", "source")
+INDEXED = {"ts": "q", "fp": "Q", "cid": "Q"}
+
+_EQ = [bytes(1 if i == b else 0 for i in range(256)) for b in range(256)]
+
+Filter = Union[None, str, Iterable[str]]
+
+
+def _to_epoch(value: Any) -> int:
+    """Epoch seconds from a number or an ISO-8601 string (naive times are UTC)."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def correlation_hash(correlation_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(correlation_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def fingerprint_value(fingerprint: str) -> int:
+    return int(fingerprint, 16)
+
+
+def archive_row(message: Dict[str, Any], body: str, archived_at: Optional[float] = None) -> Dict[str, Any]:
+    """Index fields for one normalized event and its original body."""
+    timestamp = message.get("timestamp")
+    try:
+        ts = _to_epoch(timestamp) if timestamp else int(archived_at if archived_at is not None else time.time())
+    except ValueError:
+        ts = int(archived_at if archived_at is not None else time.time())
+    return {
+        "ts": ts,
+        "category": str(message.get("failureCategory") or "UNKNOWN"),
+        "source": str(message.get("source") or "unknown"),
+        "fp": fingerprint_value(signature(message)[0]),
+        "cid": correlation_hash(str(message.get("correlationId") or "")),
+        "body": body,
+    }
+
+
+class ArchiveWriter:
+    """Appends rows to this writer's open segment, sealing and indexing it when full or old."""
+
+    def __init__(
+        self,
+        root: str,
+        segment_rows: int = 262144,
+        flush_rows: int = 1,
+        writer_id: Optional[str] = None,
+        segment_seconds: float = 900.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.flush_rows = flush_rows
+        self.segment_seconds = segment_seconds
+        self.clock = clock
+        self.writer_id = writer_id or uuid.uuid4().hex[:12]
+        self._seq = 0
+        os.makedirs(root, exist_ok=True)
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self.segment_dir = os.path.join(self.root, f"seg-{self.writer_id}-{self._seq:06d}")
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._seq += 1
+        self.opened_at = self.clock()
+        self.replaces: List[str] = []
+        self.rows = 0
+        self._committed_rows = 0
+        self._committed_bytes = 0
+        self.ts_min: Optional[int] = None
+        self.ts_max: Optional[int] = None
+        self.sorted = True
+        self.dicts: Dict[str, Dict[str, int]] = {col: {} for col in CATEGORICAL}
+        self.body_offset = 0
+        self._reset_buffers()
+
+    def _reset_buffers(self) -> None:
+        self._pending = 0
+        self._columns = {col: array(code) for col, code in INDEXED.items()}
+        self._cat = {col: array("H") for col in CATEGORICAL}
+        self._bodies: List[bytes] = []
+        self._offsets = array("Q")
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self.dicts[column]
+        if value not in codes:
+            if len(codes) >= 65536:
+                raise ValueError(f"Too many distinct values for {column} in one segment")
+            codes[value] = len(codes)
+        return codes[value]
+
+    def append(self, row: Dict[str, Any]) -> None:
+        ts = int(row["ts"])
+        if self.ts_max is not None and ts < self.ts_max:
+            self.sorted = False
+        self.ts_min = ts if self.ts_min is None else min(self.ts_min, ts)
+        self.ts_max = ts if self.ts_max is None else max(self.ts_max, ts)
+        for col in INDEXED:
+            self._columns[col].append(int(row[col]))
+        for col in CATEGORICAL:
+            self._cat[col].append(self._code(col, row[col]))
+        body = row["body"].encode("utf-8")
+        self._offsets.append(self.body_offset)
+        self.body_offset += len(body)
+        self._bodies.append(body)
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.flush_rows or self.rows >= self.segment_rows:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def _write(self, name: str, data: bytes, mode: str = "ab") -> None:
+        with open(os.path.join(self.segment_dir, name), mode) as handle:
+            handle.write(data)
+
+    def flush(self, seal: bool = False) -> None:
+        """Write buffered rows; ``seal`` closes the segment even if it is not full."""
+        if not self._pending and not (seal and self.rows):
+            return
+        sealed = (
+            seal
+            or self.rows >= self.segment_rows
+            or self.clock() - self.opened_at >= self.segment_seconds
+        )
+        try:
+            for col, code in INDEXED.items():
+                self._write(f"{col}.{code}", _little_endian(self._columns[col]))
+            for col in CATEGORICAL:
+                self._write(f"{col}.u16", _little_endian(self._cat[col]))
+            self._write("bodies.bin", b"".join(self._bodies))
+            self._write("bodies.idx", _little_endian(self._offsets))
+            if sealed:
+                self._build_indexes()
+            meta = {
+                "rows": self.rows,
+                "bytes": self.body_offset,
+                "ts_min": self.ts_min,
+                "ts_max": self.ts_max,
+                "sorted": self.sorted,
+                "sealed": sealed,
+                "opened_at": self.opened_at,
+                "replaces": self.replaces,
+                "dicts": {col: list(codes) for col, codes in self.dicts.items()},
+            }
+            tmp = os.path.join(self.segment_dir, "meta.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump(meta, handle)
+            os.replace(tmp, os.path.join(self.segment_dir, "meta.json"))
+        except BaseException:
+            self._rollback()
+            raise
+        self._committed_rows = self.rows
+        self._committed_bytes = self.body_offset
+        self._reset_buffers()
+        if sealed:
+            self._open_segment()
+
+    def seal(self) -> None:
+        self.flush(seal=True)
+
+    def _rollback(self) -> None:
+        """Cut the files back to what meta.json describes; the rows stay buffered for the next flush.
+
+        If that fails too, the segment is left as meta.json describes it (readers
+        ignore bytes past ``rows``) and this writer moves on to a new one.
+        """
+        committed = {f"{col}.{code}": self._committed_rows * 8 for col, code in INDEXED.items()}
+        committed.update({f"{col}.u16": self._committed_rows * 2 for col in CATEGORICAL})
+        committed.update({"bodies.bin": self._committed_bytes, "bodies.idx": self._committed_rows * 8})
+        try:
+            for name, length in committed.items():
+                path = os.path.join(self.segment_dir, name)
+                if os.path.exists(path):
+                    os.truncate(path, length)
+        except OSError:
+            self._open_segment()
+
+    def _build_indexes(self) -> None:
+        for col, code in INDEXED.items():
+            values = array(code)
+            with open(os.path.join(self.segment_dir, f"{col}.{code}"), "rb") as handle:
+                values.frombytes(handle.read())
+            if sys.byteorder != "little":  # pragma: no cover
+                values.byteswap()
+            order = array("I", sorted(range(len(values)), key=values.__getitem__))
+            ordered = array(code, (values[i] for i in order))
+            if sys.byteorder != "little":  # pragma: no cover
+                ordered.byteswap()
+                order.byteswap()
+            self._write(f"{col}.sidx", ordered.tobytes(), "wb")
+            self._write(f"{col}.srow", order.tobytes(), "wb")
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover - files are little-endian
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _Segment:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        self.rows: int = meta["rows"]
+        self.bytes: int = meta["bytes"]
+        self.ts_min: int = meta["ts_min"]
+        self.ts_max: int = meta["ts_max"]
+        self.sorted: bool = meta["sorted"]
+        self.sealed: bool = meta["sealed"]
+        self.dicts: Dict[str, List[str]] = meta["dicts"]
+        # Older segments have no open time; their directory's is close enough
+        self.opened_at: float = meta.get("opened_at") or os.path.getmtime(path)
+        self.replaces: List[str] = meta.get("replaces", [])
+        self._codes = {col: {v: i for i, v in enumerate(values)} for col, values in self.dicts.items()}
+        self._cache: Dict[str, Any] = {}
+
+    def _mapped(self, name: str) -> memoryview:
+        """Read-only view of a segment file, mapped once per query."""
+        if name not in self._cache:
+            with open(os.path.join(self.path, name), "rb") as handle:
+                self._cache[name] = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._cache[name])
+
+    def close(self) -> None:
+        for mapped in self._cache.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a view; the map closes when it is collected
+                pass
+        self._cache.clear()
+
+    def column(self, col: str) -> memoryview:
+        code = INDEXED[col]
+        return self._mapped(f"{col}.{code}")[: self.rows * 8].cast(code)
+
+    def ones(self) -> int:
+        return int.from_bytes(b"\x01" * self.rows, "little")
+
+    def codes_for(self, column: str, values: Sequence[str]) -> List[int]:
+        codes = self._codes.get(column, {})
+        return [codes[v] for v in values if v in codes]
+
+    def eq_mask(self, column: str, codes: Sequence[int]) -> int:
+        data = bytes(self._mapped(f"{column}.u16")[: self.rows * 2])
+        low = data[0::2]
+        high = data[1::2] if len(self.dicts[column]) > 256 else None
+        mask = 0
+        for code in codes:
+            match = int.from_bytes(low.translate(_EQ[code & 0xFF]), "little")
+            if high is not None:
+                match &= int.from_bytes(high.translate(_EQ[code >> 8]), "little")
+            mask |= match
+        return mask
+
+    def _rows_mask(self, rows: Iterable[int]) -> int:
+        selected = bytearray(self.rows)
+        for row in rows:
+            selected[row] = 1
+        return int.from_bytes(selected, "little")
+
+    def range_mask(self, col: str, low: int, high: int) -> int:
+        """Rows with low <= value < high."""
+        if col == "ts" and self.sorted:
+            view = self.column("ts")
+            lo, hi = bisect.bisect_left(view, low), bisect.bisect_left(view, high)
+            return int.from_bytes(b"\x00" * lo + b"\x01" * max(0, hi - lo), "little")
+        if self.sealed:
+            ordered = self._mapped(f"{col}.sidx")[: self.rows * 8].cast(INDEXED[col])
+            lo, hi = bisect.bisect_left(ordered, low), bisect.bisect_left(ordered, high)
+            return self._rows_mask(self._mapped(f"{col}.srow")[: self.rows * 4].cast("I")[lo:hi])
+        return self._rows_mask(i for i, value in enumerate(self.column(col)) if low <= value < high)
+
+    def eq_values_mask(self, col: str, values: Sequence[int]) -> int:
+        if self.sealed:
+            mask = 0
+            for value in values:
+                mask |= self.range_mask(col, value, value + 1)
+            return mask
+        # Open segments: find each 8-byte pattern in the column at C speed
+        data = bytes(self._mapped(f"{col}.{INDEXED[col]}")[: self.rows * 8])
+        rows = []
+        for value in values:
+            pattern = value.to_bytes(8, "little", signed=INDEXED[col] == "q")
+            index = data.find(pattern)
+            while index != -1:
+                if index % 8 == 0:
+                    rows.append(index // 8)
+                index = data.find(pattern, index + 1)
+        return self._rows_mask(rows)
+
+    def body(self, index: int) -> str:
+        offsets = self._mapped("bodies.idx")[: self.rows * 8].cast("Q")
+        end = offsets[index + 1] if index + 1 < self.rows else self.bytes
+        return bytes(self._mapped("bodies.bin")[offsets[index]:end]).decode("utf-8")
+
+    def record(self, index: int) -> Dict[str, Any]:
+        return {
+            "ts": self.column("ts")[index],
+            "category": self.dicts["category"][self._mapped("category.u16")[: self.rows * 2].cast("H")[index]],
+            "source": self.dicts["source"][self._mapped("source.u16")[: self.rows * 2].cast("H")[index]],
+            "fingerprint": f"{self.column('fp')[index]:012x}",
+            "body": self.body(index),
+        }
+
+    def rows_for_writer(self) -> Iterator[Dict[str, Any]]:
+        """Every row in the shape ``ArchiveWriter.append`` takes."""
+        columns = {col: self.column(col) for col in INDEXED}
+        codes = {col: self._mapped(f"{col}.u16")[: self.rows * 2].cast("H") for col in CATEGORICAL}
+        for index in range(self.rows):
+            row: Dict[str, Any] = {col: columns[col][index] for col in INDEXED}
+            for col in CATEGORICAL:
+                row[col] = self.dicts[col][codes[col][index]]
+            row["body"] = self.body(index)
+            yield row
+
+
+def _as_list(value: Filter) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class DlqArchive:
+    """Read/query side. Filters take a value or a collection of values (IN)."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def _all_segments(self) -> List[_Segment]:
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.startswith("seg-") and os.path.exists(os.path.join(path, "meta.json")):
+                found.append(_Segment(path))
+        return found
+
+    def segments(self) -> Iterator[_Segment]:
+        """Live segments: not empty, not replaced by a compacted one, not a compaction in progress."""
+        found = self._all_segments()
+        replaced = {name for segment in found if segment.sealed for name in segment.replaces}
+        for segment in found:
+            in_progress = segment.replaces and not segment.sealed
+            if segment.rows and not in_progress and os.path.basename(segment.path) not in replaced:
+                yield segment
+
+    def compact(
+        self,
+        target_rows: int = 262144,
+        idle_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ) -> Dict[str, int]:
+        """Merge small finished segments into sealed, indexed ones of up to ``target_rows`` rows.
+
+        A segment is finished once sealed, or once it has been open for
+        ``idle_seconds`` (longer than a writer keeps one open, so its writer is
+        gone). Each merged segment is written and sealed before the segments it
+        replaces are removed.
+        """
+        found = self._all_segments()
+        replaced = {name for segment in found if segment.sealed for name in segment.replaces}
+        now = clock()
+        groups: List[List[_Segment]] = []
+        group_rows = 0
+        removed = 0
+        for segment in found:
+            name = os.path.basename(segment.path)
+            if name in replaced:
+                # Left over from a compaction that stopped before cleaning up
+                shutil.rmtree(segment.path, ignore_errors=True)
+                removed += 1
+                continue
+            if segment.replaces and not segment.sealed:
+                # Output of a compaction that stopped part way; its sources are still live
+                if now - segment.opened_at >= idle_seconds:
+                    shutil.rmtree(segment.path, ignore_errors=True)
+                    removed += 1
+                continue
+            finished = segment.sealed or now - segment.opened_at >= idle_seconds
+            if not finished or segment.rows * 2 > target_rows:
+                continue
+            if not groups or group_rows + segment.rows > target_rows:
+                groups.append([])
+                group_rows = 0
+            groups[-1].append(segment)
+            group_rows += segment.rows
+        # A lone sealed segment is already indexed; merging it gains nothing
+        groups = [g for g in groups if len(g) > 1 or (g and not g[0].sealed)]
+        written = merged = 0
+        if groups:
+            writer = ArchiveWriter(
+                self.root,
+                segment_rows=target_rows,
+                flush_rows=65536,
+                writer_id=f"compact-{uuid.uuid4().hex[:12]}",
+                segment_seconds=float("inf"),
+            )
+            for group in groups:
+                writer.replaces = [os.path.basename(segment.path) for segment in group]
+                for segment in group:
+                    try:
+                        writer.extend(segment.rows_for_writer())
+                    finally:
+                        segment.close()
+                writer.seal()
+                written += 1
+                for segment in group:
+                    shutil.rmtree(segment.path, ignore_errors=True)
+                    merged += 1
+        return {"segments_written": written, "segments_merged": merged, "leftovers_removed": removed}
+
+    def _select(
+        self,
+        segment: _Segment,
+        start: Optional[int],
+        end: Optional[int],
+        category: Filter,
+        source: Filter,
+        fingerprint: Filter,
+        correlation_id: Filter,
+    ) -> Optional[int]:
+        """Selection mask for one segment, or None when it is pruned."""
+        if start is not None and segment.ts_max < start:
+            return None
+        if end is not None and segment.ts_min >= end:
+            return None
+        masks = []
+        # Point lookups first: they are the most selective
+        lookups = []
+        if correlation_id is not None:
+            lookups.append(("cid", [correlation_hash(v) for v in _as_list(correlation_id)]))
+        if fingerprint is not None:
+            lookups.append(("fp", [fingerprint_value(v) for v in _as_list(fingerprint)]))
+        for col, values in lookups:
+            mask = segment.eq_values_mask(col, values)
+            if not mask:
+                return None
+            masks.append(mask)
+        for column, value in (("category", category), ("source", source)):
+            values = _as_list(value)
+            if values is None:
+                continue
+            codes = segment.codes_for(column, values)
+            if not codes:
+                return None
+            if len(codes) < len(segment.dicts[column]):
+                masks.append(segment.eq_mask(column, codes))
+        if (start is not None and start > segment.ts_min) or (end is not None and end <= segment.ts_max):
+            low = start if start is not None else segment.ts_min
+            high = end if end is not None else segment.ts_max + 1
+            masks.append(segment.range_mask("ts", low, high))
+        mask = masks[0] if masks else segment.ones()
+        for other in masks[1:]:
+            mask &= other
+        return mask
+
+    def _matches(self, start: Any, end: Any, filters: Dict[str, Filter]) -> Iterator[tuple]:
+        unknown = set(filters) - {"category", "source", "fingerprint", "correlation_id"}
+        if unknown:
+            raise TypeError(f"Unknown filter(s): {sorted(unknown)}")
+        start_ts = None if start is None else _to_epoch(start)
+        end_ts = None if end is None else _to_epoch(end)
+        for segment in self.segments():
+            try:
+                mask = self._select(
+                    segment,
+                    start_ts,
+                    end_ts,
+                    filters.get("category"),
+                    filters.get("source"),
+                    filters.get("fingerprint"),
+                    filters.get("correlation_id"),
+                )
+                if mask:
+                    yield segment, mask
+            finally:
+                segment.close()
+
+    def count(self, start: Any = None, end: Any = None, **filters: Filter) -> int:
+        return sum(mask.bit_count() for _segment, mask in self._matches(start, end, filters))
+
+    def query(self, start: Any = None, end: Any = None, limit: Optional[int] = None, **filters: Filter):
+        """Yield matching records (``ts``, ``category``, ``source``, ``fingerprint``, ``body``)."""
+        emitted = 0
+        for segment, mask in self._matches(start, end, filters):
+            selected = mask.to_bytes(segment.rows, "little")
+            index = selected.find(1)
+            while index != -1:
+                if limit is not None and emitted >= limit:
+                    return
+                yield segment.record(index)
+                emitted += 1
+                index = selected.find(1, index + 1)
+
+    def replay(
+        self,
+        send: Callable[[List[str]], Any],
+        start: Any = None,
+        end: Any = None,
+        batch_size: int = 100,
+        limit: Optional[int] = None,
+        **filters: Filter,
+    ) -> Dict[str, Any]:
+        """Stream matching bodies to ``send`` in lists of up to ``batch_size``."""
+        started = time.perf_counter()
+        batch: List[str] = []
+        replayed = batches = 0
+        for segment, mask in self._matches(start, end, filters):
+            selected = mask.to_bytes(segment.rows, "little")
+            index = selected.find(1)
+            while index != -1 and (limit is None or replayed < limit):
+                batch.append(segment.body(index))
+                replayed += 1
+                if len(batch) >= batch_size:
+                    send(batch)
+                    batches += 1
+                    batch = []
+                index = selected.find(1, index + 1)
+        if batch:
+            send(batch)
+            batches += 1
+        elapsed = time.perf_counter() - started
+        return {
+            "replayed": replayed,
+            "batches": batches,
+            "seconds": round(elapsed, 3),
+            "per_second": round(replayed / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def sqs_sender(sqs: Any, queue_url: str) -> Callable[[List[str]], int]:
+    """Replay sender that writes bodies to ``queue_url`` with SendMessageBatch."""
+    return lambda bodies: envelopes.send_batches(sqs, queue_url, bodies)
+
+
+_WRITER: Optional[ArchiveWriter] = None
+
+
+def writer_from_env() -> Optional[ArchiveWriter]:
+    """Process-wide writer under DLQ_ARCHIVE_DIR; None when archiving is off.
+
+    Rows are buffered until the caller flushes (the triage handler flushes
+    once per invocation, before SQS deletes the batch).
+    """
+    global _WRITER
+    root = os.getenv("DLQ_ARCHIVE_DIR")
+    if not root:
+        return None
+    if _WRITER is None or _WRITER.root != root:
+        _WRITER = ArchiveWriter(
+            root,
+            flush_rows=1 << 30,
+            segment_seconds=float(os.getenv("DLQ_ARCHIVE_SEGMENT_SECONDS", "900")),
+        )
+    return _WRITER
+
+
+def compact_handler(event: Dict[str, Any], _context: Any) -> Dict[str, int]:
+    """Scheduled Lambda entry point: compact the archive under DLQ_ARCHIVE_DIR."""
+    stats = DlqArchive(os.environ["DLQ_ARCHIVE_DIR"]).compact(
+        idle_seconds=float(os.getenv("DLQ_ARCHIVE_IDLE_SECONDS", "3600")),
+    )
+    print(json.dumps({"message": "Compacted DLQ archive", **stats}))
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query and replay the DLQ archive")
+    parser.add_argument("root")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--category")
+    parser.add_argument("--source")
+    parser.add_argument("--fingerprint")
+    parser.add_argument("--correlation-id")
+    parser.add_argument("--rows", type=int, default=0, help="print up to N matching records")
+    parser.add_argument("--replay-to", help="queue URL to send matching bodies to")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--compact", action="store_true", help="merge small segments into indexed ones")
+    args = parser.parse_args(argv)
+
+    archive = DlqArchive(args.root)
+    if args.compact:
+        print(json.dumps(archive.compact()))
+        return
+    filters = {
+        key: getattr(args, key)
+        for key in ("category", "source", "fingerprint", "correlation_id")
+        if getattr(args, key)
+    }
+    if args.replay_to:
+        import boto3
+
+        stats = archive.replay(
+            sqs_sender(boto3.client("sqs"), args.replay_to),
+            start=args.start,
+            end=args.end,
+            batch_size=args.batch_size,
+            **filters,
+        )
+        print(json.dumps(stats))
+    elif args.rows:
+        for record in archive.query(args.start, args.end, limit=args.rows, **filters):
+            print(json.dumps(record))
+    else:
+        print(archive.count(args.start, args.end, **filters))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Decoder registry for SQS message bodies.
+
+A body may arrive as a plain DLQ event or wrapped in one or more envelopes:
+
+- SNS-to-SQS notifications (``{"Type": "Notification", "Message": "..."}``)
+- EventBridge events (``{"detail-type": ..., "detail": {...}}``)
+- CloudEvents (``{"specversion": "1.0", "data": ...}`` or ``data_base64``)
+- base64-encoded gzip or zstd payloads (detected by their magic bytes)
+- packed bodies carrying many events (``{"dlqEvents": [...]}`` or a JSON list)
+
+``decode_body`` unwraps envelopes recursively and returns the list of DLQ
+events found. ``encode_events`` is the matching producer side: it packs
+events into as few bodies as fit under the SQS size limit, optionally
+compressed, and ``send_batches`` sends bodies with ``SendMessageBatch``. zstd needs the optional ``zstandard`` package.
+Entries a batch response lists as ``Failed`` are resent; any still failing
+raise ``SendError``.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import gzip
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:  # optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+PACKED_KEY = "dlqEvents"
+# Top-level keys that mark a body as an envelope rather than a plain event
+ENVELOPE_KEYS = ("Type", "detail-type", "specversion", PACKED_KEY)
+MAX_BODY_BYTES = 256 * 1024
+MAX_DEPTH = 5
+# Cap on one decompressed payload: a 256 KB body must not expand into gigabytes
+MAX_DECOMPRESSED_BYTES = 16 * 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class DecodeError(ValueError):
+    """The body is not valid JSON or not a recognised envelope."""
+
+
+class SendError(RuntimeError):
+    """SendMessageBatch still rejected some bodies after the retries."""
+
+    def __init__(self, failed: List[Tuple[int, str]], requests: int) -> None:
+        super().__init__(f"{len(failed)} message(s) not sent: {failed[0][1]}")
+        # (index into the bodies passed to send_batches, error)
+        self.failed = failed
+        self.requests = requests
+
+
+# Each decoder returns the unwrapped payload(s), or None when it does not apply
+Decoder = Callable[[Any], Optional[List[Any]]]
+DECODERS: List[Tuple[str, Decoder]] = []
+
+
+def register(name: str) -> Callable[[Decoder], Decoder]:
+    """Add a decoder; decoders are tried in registration order."""
+
+    def _wrap(func: Decoder) -> Decoder:
+        DECODERS.append((name, func))
+        return func
+
+    return _wrap
+
+
+def _gunzip(raw: bytes, limit: int) -> bytes:
+    out = bytearray()
+    data = raw
+    while data:
+        member = zlib.decompressobj(wbits=31)
+        out += member.decompress(data, limit + 1 - len(out))
+        if len(out) > limit:
+            raise DecodeError(f"Compressed body expands beyond {limit} bytes")
+        if not member.eof:
+            raise DecodeError("Truncated gzip body")
+        # Concatenated members, as gzip.decompress accepts; zero padding is ignored
+        data = member.unused_data.lstrip(b"\x00")
+    return bytes(out)
+
+
+def _decompress(raw: bytes, limit: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+    """``raw`` decompressed when it is gzip or zstd; DecodeError if corrupt or over ``limit`` bytes."""
+    if raw.startswith(_GZIP_MAGIC):
+        try:
+            return _gunzip(raw, limit)
+        except zlib.error as exc:
+            raise DecodeError(f"Corrupt gzip body: {exc}") from exc
+    if raw.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise DecodeError("zstd body received but the zstandard package is not installed")
+        try:
+            if zstandard.frame_content_size(raw) > limit:
+                raise DecodeError(f"Compressed body expands beyond {limit} bytes")
+            # Bounds frames that do not record their size (-1 above)
+            return zstandard.ZstdDecompressor().decompress(raw, max_output_size=limit)
+        except zstandard.ZstdError as exc:
+            raise DecodeError(f"Corrupt zstd body: {exc}") from exc
+    return raw
+
+
+def _parse_text(text: str) -> Any:
+    stripped = text.lstrip()
+    if stripped[:1] in ("{", "["):
+        try:
+            return json.loads(stripped)
+        except json.JSONDecodeError as exc:
+            raise DecodeError(f"Invalid JSON: {exc}") from exc
+    try:
+        raw = base64.b64decode(stripped, validate=True)
+    except (binascii.Error, ValueError) as exc:
+        raise DecodeError("Body is neither JSON nor base64") from exc
+    try:
+        return json.loads(_decompress(raw))
+    except (OSError, EOFError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise DecodeError(f"Undecodable compressed body: {exc}") from exc
+
+
+def _inherit(event: Any, **defaults: Any) -> Any:
+    """Fill envelope metadata (source, time) into events that lack it."""
+    if isinstance(event, dict):
+        for key, value in defaults.items():
+            if value and not event.get(key):
+                event[key] = value
+    return event
+
+
+@register("sns")
+def _sns(payload: Any) -> Optional[List[Any]]:
+    if isinstance(payload, dict) and payload.get("Type") == "Notification" and "Message" in payload:
+        message = payload["Message"]
+        return [_parse_text(message) if isinstance(message, str) else message]
+    return None
+
+
+@register("eventbridge")
+def _eventbridge(payload: Any) -> Optional[List[Any]]:
+    if isinstance(payload, dict) and "detail-type" in payload and "detail" in payload:
+        detail = payload["detail"]
+        if isinstance(detail, str):
+            detail = _parse_text(detail)
+        return [_inherit(detail, source=payload.get("source"), time=payload.get("time"))]
+    return None
+
+
+@register("cloudevents")
+def _cloudevents(payload: Any) -> Optional[List[Any]]:
+    if not (isinstance(payload, dict) and "specversion" in payload):
+        return None
+    if "data_base64" in payload:
+        try:
+            data = json.loads(_decompress(base64.b64decode(payload["data_base64"])))
+        except (binascii.Error, ValueError, OSError, EOFError) as exc:
+            raise DecodeError(f"Undecodable CloudEvents data_base64: {exc}") from exc
+    else:
+        data = payload.get("data")
+        if isinstance(data, str):
+            data = _parse_text(data)
+    return [_inherit(data, source=payload.get("source"), time=payload.get("time"))]
+
+
+@register("packed")
+def _packed(payload: Any) -> Optional[List[Any]]:
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and isinstance(payload.get(PACKED_KEY), list):
+        return payload[PACKED_KEY]
+    return None
+
+
+@register("encoded")
+def _encoded(payload: Any) -> Optional[List[Any]]:
+    # A JSON string holding a base64/compressed or JSON-encoded body
+    if isinstance(payload, str):
+        return [_parse_text(payload)]
+    return None
+
+
+def _unwrap(payload: Any, depth: int, out: List[Dict[str, Any]]) -> None:
+    if depth > MAX_DEPTH:
+        raise DecodeError("Envelope nesting too deep")
+    for _name, decoder in DECODERS:
+        inner = decoder(payload)
+        if inner is not None:
+            for item in inner:
+                _unwrap(item, depth + 1, out)
+            return
+    if not isinstance(payload, dict):
+        raise DecodeError(f"Unsupported event payload of type {type(payload).__name__}")
+    out.append(payload)
+
+
+def decode_body(body: str) -> List[Dict[str, Any]]:
+    """All DLQ events carried by one SQS body, in order."""
+    events: List[Dict[str, Any]] = []
+    _unwrap(_parse_text(body or "{}"), 0, events)
+    return events
+
+
+def _compress(raw: bytes, compression: str) -> str:
+    if compression == "gzip":
+        return base64.b64encode(gzip.compress(raw, compresslevel=6, mtime=0)).decode("ascii")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        return base64.b64encode(zstandard.ZstdCompressor(level=3).compress(raw)).decode("ascii")
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def encode_events(
+    events: List[Dict[str, Any]],
+    compression: str = "none",
+    max_events: int = 100,
+    max_bytes: int = MAX_BODY_BYTES,
+) -> List[str]:
+    """Pack events into SQS bodies of at most ``max_events`` events / ``max_bytes`` bytes.
+
+    A single event with no compression is sent as a plain body so existing
+    consumers keep working.
+    """
+    if compression == "none" and len(events) == 1:
+        return [json.dumps(events[0])]
+
+    def _render(chunk: List[Dict[str, Any]]) -> str:
+        raw = json.dumps({PACKED_KEY: chunk}, separators=(",", ":"))
+        return raw if compression == "none" else _compress(raw.encode("utf-8"), compression)
+
+    bodies: List[str] = []
+    pending = list(events)
+    while pending:
+        size = min(max_events, len(pending))
+        body = _render(pending[:size])
+        while len(body.encode("utf-8")) > max_bytes and size > 1:
+            # Shrink proportionally to the overshoot, then retry
+            size = max(1, min(size - 1, int(size * max_bytes / len(body.encode("utf-8")))))
+            body = _render(pending[:size])
+        if len(body.encode("utf-8")) > max_bytes:
+            raise ValueError("A single event exceeds the maximum SQS body size")
+        bodies.append(body)
+        pending = pending[size:]
+    return bodies
+
+
+def _batches(bodies: List[str], indexes: List[int]) -> List[List[int]]:
+    """Groups of at most 10 entries and 256 KiB per request."""
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_bytes = 0
+    for index in indexes:
+        size = len(bodies[index].encode("utf-8"))
+        if batch and (len(batch) == 10 or batch_bytes + size > MAX_BODY_BYTES):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(index)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def send_batches(
+    sqs,
+    queue_url: str,
+    bodies: List[str],
+    attributes: Optional[List[Dict[str, Any]]] = None,
+    retries: int = 3,
+    backoff_seconds: float = 0.1,
+) -> int:
+    """SendMessageBatch in groups of 10 entries and at most 256 KiB per request.
+
+    ``attributes`` optionally gives each body its ``MessageAttributes``.
+    Entries listed as ``Failed`` are resent up to ``retries`` times, except
+    sender faults (e.g. an oversized body), which would fail again. Returns
+    the number of requests; raises ``SendError`` if any body was not sent.
+    """
+    requests = 0
+    pending = list(range(len(bodies)))
+    permanent: Dict[int, str] = {}
+    failed: Dict[int, str] = {}
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_seconds * 2 ** (attempt - 1))
+        failed = {}
+        for batch in _batches(bodies, pending):
+            entries = []
+            for index in batch:
+                entry: Dict[str, Any] = {"Id": str(index), "MessageBody": bodies[index]}
+                if attributes and attributes[index]:
+                    entry["MessageAttributes"] = attributes[index]
+                entries.append(entry)
+            resp = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+            requests += 1
+            for failure in resp.get("Failed", []):
+                error = failure.get("Message") or failure.get("Code", "")
+                target = permanent if failure.get("SenderFault") else failed
+                target[int(failure["Id"])] = error
+        pending = sorted(failed)
+        if not pending:
+            break
+    unsent = sorted({**permanent, **failed}.items())
+    if unsent:
+        raise SendError(unsent, requests)
+    return requests
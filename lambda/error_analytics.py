@@ -0,0 +1,329 @@
+"""Streaming error-signature analytics in constant memory.
+
+Every DLQ event is reduced to a signature (failure category plus the
+normalized first line of the error). Per time window the module keeps:
+
+- a Count-Min sketch of signature frequencies,
+- a bounded top-K candidate set ranked by the sketch's estimates,
+- HyperLogLog counters for distinct correlationIds and distinct signatures.
+
+All structures have a fixed size. The window lives at module level, so warm
+invocations of the same container accumulate into it. Sketches merge
+losslessly (Count-Min by adding cells, HyperLogLog by taking register
+maxima). The closing snapshot of each window carries the serialized
+sketches, so a consumer can combine the snapshots from concurrent
+containers with ``merge_snapshots``.
+
+Metrics stay additive and low-cardinality: ``DlqEvents`` and
+``ErrorCategoryEvents`` (by ``category``) carry the events seen since the
+previous emit, so CloudWatch sums are exact across emits and containers. The
+distinct counts are per container and window and are emitted once, when the
+window closes. The per-signature breakdown only goes to the snapshot log
+line, never to metric dimensions.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import math
+import os
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from similarity_index import normalize
+
+METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
+# Categories beyond this many per emit are reported as OTHER
+MAX_CATEGORIES = 20
+
+
+def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> None:
+    emf = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [list(dims.keys())] if dims else [[]],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dims,
+    }
+    print(json.dumps(emf))
+
+
+def _hash64(key: str, salt: bytes = b"") -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+
+
+def signature(message: Dict[str, Any]) -> Tuple[str, str]:
+    """(signature id, human readable signature) for a normalized DLQ event."""
+    first_line = str(message.get("errorMessage") or "").strip().split("\n", 1)[0][:200]
+    text = f"{message.get('failureCategory') or 'UNKNOWN'}: {normalize(first_line)}"
+    return f"{_hash64(text):016x}"[:12], text
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = array("I", [0]) * (width * depth)
+
+    def _cells(self, key: str) -> List[int]:
+        # Two independent halves of one 128-bit digest (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Add ``count`` and return the new estimate."""
+        cells = self._cells(key)
+        for cell in cells:
+            self.table[cell] += count
+        return min(self.table[cell] for cell in cells)
+
+    def estimate(self, key: str) -> int:
+        return min(self.table[cell] for cell in self._cells(key))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Count-Min sketches must have the same shape to merge")
+        for i, value in enumerate(other.table):
+            if value:
+                self.table[i] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"width": self.width, "depth": self.depth, "table": base64.b64encode(self.table.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(data["width"], data["depth"])
+        table = array("I")
+        table.frombytes(base64.b64decode(data["table"]))
+        sketch.table = table
+        return sketch
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12) -> None:
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, key: str) -> None:
+        value = _hash64(key, salt=b"hll")
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("HyperLogLog precision must match to merge")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": base64.b64encode(bytes(self.registers)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        hll = cls(data["precision"])
+        hll.registers = bytearray(base64.b64decode(data["registers"]))
+        return hll
+
+
+class HeavyHitters:
+    """Top-K candidates ranked by Count-Min estimates; holds at most ``capacity`` entries."""
+
+    def __init__(self, sketch: CountMinSketch, capacity: int = 50) -> None:
+        self.sketch = sketch
+        self.capacity = capacity
+        self.candidates: Dict[str, Tuple[int, str]] = {}
+
+    def offer(self, key: str, estimate: int, label: str) -> None:
+        if key in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[key] = (estimate, label)
+            return
+        smallest = min(self.candidates, key=lambda k: self.candidates[k][0])
+        if estimate > self.candidates[smallest][0]:
+            del self.candidates[smallest]
+            self.candidates[key] = (estimate, label)
+
+    def top(self, k: int) -> List[Tuple[str, int, str]]:
+        ranked = sorted(((key, self.sketch.estimate(key), label) for key, (_, label) in self.candidates.items()),
+                        key=lambda item: -item[1])
+        return ranked[:k]
+
+    def merge(self, other: "HeavyHitters") -> None:
+        """Call after merging the underlying sketches so estimates are combined."""
+        for key in list(self.candidates):
+            self.candidates[key] = (self.sketch.estimate(key), self.candidates[key][1])
+        for key, (_, label) in other.candidates.items():
+            self.offer(key, self.sketch.estimate(key), label)
+
+
+class WindowStats:
+    """Sketches for one time window."""
+
+    def __init__(self, window_start: int, width: int = 2048, depth: int = 4, capacity: int = 50, precision: int = 12):
+        self.window_start = window_start
+        self.events = 0
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy = HeavyHitters(self.sketch, capacity)
+        self.correlation_ids = HyperLogLog(precision)
+        self.signatures = HyperLogLog(precision)
+
+    def observe(self, message: Dict[str, Any]) -> None:
+        key, label = signature(message)
+        self.events += 1
+        self.heavy.offer(key, self.sketch.add(key), label)
+        self.signatures.add(key)
+        self.correlation_ids.add(str(message.get("correlationId") or ""))
+
+    def merge(self, other: "WindowStats") -> None:
+        self.events += other.events
+        self.sketch.merge(other.sketch)
+        self.heavy.merge(other.heavy)
+        self.correlation_ids.merge(other.correlation_ids)
+        self.signatures.merge(other.signatures)
+
+    def snapshot(self, k: int = 10, include_sketches: bool = True) -> Dict[str, Any]:
+        snapshot: Dict[str, Any] = {
+            "window_start": self.window_start,
+            "events": self.events,
+            "distinct_correlation_ids": self.correlation_ids.count(),
+            "distinct_signatures": self.signatures.count(),
+            "top": [{"signature": key, "count": count, "label": label} for key, count, label in self.heavy.top(k)],
+        }
+        if include_sketches:
+            snapshot["sketches"] = {
+                "count_min": self.sketch.to_dict(),
+                "heavy": {key: label for key, (_, label) in self.heavy.candidates.items()},
+                "correlation_ids": self.correlation_ids.to_dict(),
+                "signatures": self.signatures.to_dict(),
+            }
+        return snapshot
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "WindowStats":
+        sketches = snapshot["sketches"]
+        stats = cls(snapshot["window_start"])
+        stats.events = snapshot["events"]
+        stats.sketch = CountMinSketch.from_dict(sketches["count_min"])
+        stats.heavy = HeavyHitters(stats.sketch)
+        for key, label in sketches["heavy"].items():
+            stats.heavy.offer(key, stats.sketch.estimate(key), label)
+        stats.correlation_ids = HyperLogLog.from_dict(sketches["correlation_ids"])
+        stats.signatures = HyperLogLog.from_dict(sketches["signatures"])
+        return stats
+
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Any]], k: int = 10) -> Dict[str, Any]:
+    """Combine snapshots of the same window (e.g. from concurrent containers)."""
+    merged: Optional[WindowStats] = None
+    for snapshot in snapshots:
+        stats = WindowStats.from_snapshot(snapshot)
+        if merged is None:
+            merged = stats
+        else:
+            merged.merge(stats)
+    if merged is None:
+        raise ValueError("no snapshots to merge")
+    return merged.snapshot(k)
+
+
+class ErrorAnalytics:
+    """Process-wide tumbling-window analytics, emitted every ``emit_seconds``."""
+
+    def __init__(
+        self,
+        window_seconds: int = 60,
+        emit_seconds: float = 10.0,
+        top_k: int = 10,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.emit_seconds = emit_seconds
+        self.top_k = top_k
+        self.clock = clock
+        self.current = WindowStats(self._window(clock()))
+        self._last_emit = float("-inf")
+        # Events per failure category since the previous emit
+        self._pending: Dict[str, int] = {}
+
+    def _window(self, now: float) -> int:
+        return int(now // self.window_seconds) * self.window_seconds
+
+    def _roll(self, now: float) -> None:
+        window = self._window(now)
+        if window != self.current.window_start:
+            # Publish the closing window before starting a new one
+            self.emit(final=True)
+            self.current = WindowStats(window)
+
+    def observe_batch(self, messages: List[Dict[str, Any]]) -> None:
+        """Fold one invocation's events into the window shared by warm invocations."""
+        self._roll(self.clock())
+        for message in messages:
+            self.current.observe(message)
+            category = str(message.get("failureCategory") or "UNKNOWN")
+            if category not in self._pending and len(self._pending) >= MAX_CATEGORIES:
+                category = "OTHER"
+            self._pending[category] = self._pending.get(category, 0) + 1
+
+    def maybe_emit(self) -> bool:
+        now = self.clock()
+        self._roll(now)
+        if now - self._last_emit < self.emit_seconds:
+            return False
+        self.emit()
+        return True
+
+    def emit(self, final: bool = False) -> Dict[str, Any]:
+        self._last_emit = self.clock()
+        # Mergeable sketches only travel with the closing snapshot of a window
+        snapshot = self.current.snapshot(self.top_k, include_sketches=final)
+        window = str(snapshot["window_start"])
+        pending, self._pending = self._pending, {}
+        _emit_metric("DlqEvents", sum(pending.values()))
+        for category, count in sorted(pending.items()):
+            _emit_metric("ErrorCategoryEvents", count, category=category)
+        if final:
+            _emit_metric("DistinctCorrelationIds", snapshot["distinct_correlation_ids"])
+            _emit_metric("DistinctErrorSignatures", snapshot["distinct_signatures"])
+        print(json.dumps({"level": "INFO", "message": "Error signature snapshot", "window": window,
+                          "final": final, "snapshot": snapshot}))
+        return snapshot
+
+
+_ANALYTICS: Optional[ErrorAnalytics] = None
+
+
+def analytics_from_env() -> Optional[ErrorAnalytics]:
+    """Process-wide analytics; disabled with ERROR_ANALYTICS=0."""
+    global _ANALYTICS
+    if os.getenv("ERROR_ANALYTICS", "1") == "0":
+        return None
+    if _ANALYTICS is None:
+        _ANALYTICS = ErrorAnalytics(
+            window_seconds=int(os.getenv("ERROR_ANALYTICS_WINDOW_SECONDS", "60")),
+            emit_seconds=float(os.getenv("ERROR_ANALYTICS_EMIT_SECONDS", "10")),
+            top_k=int(os.getenv("ERROR_ANALYTICS_TOP_K", "10")),
+        )
+    return _ANALYTICS
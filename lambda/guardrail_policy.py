@@ -0,0 +1,285 @@
+"""Declarative guardrail policies compiled into a short-circuiting evaluator.
+
+A policy is a JSON document with an ordered list of rules::
+
+    {
+      "name": "workflow",
+      "rules": [
+        {"id": "max_attempts_exceeded", "check": "less_than",
+         "field": "message.redriveAttempts", "value": {"param": "max_redrive_attempts", "default": 2}},
+        {"id": "stale_message", "check": "not_older_than_days",
+         "field": "message.timestamp", "value": {"param": "max_age_days", "default": 2}}
+      ]
+    }
+
+Each rule passes or fails; a failing rule contributes its ``id`` as a reason
+and its ``outcome`` (default ``TICKET``). Evaluation stops at the first
+failure. Rules may be reordered, but only within consecutive runs that share
+an outcome, so the precedence between outcomes written in the file is kept.
+Within a run the evaluator periodically sorts rules by measured cost divided
+by measured failure rate, so cheap, selective checks run first. Rules that
+read only ``message.*`` can be evaluated on their own, before the model has
+answered (``root="message"``).
+
+``PolicyStore`` reloads the policy from a local path or ``s3://`` URI when it
+changes, without a redeploy.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+POLICY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies")
+
+
+def _older_than_days(timestamp: str, max_days: float) -> bool:
+    try:
+        date_part = timestamp.split("T", 1)[0]
+        year, month, day = map(int, date_part.split("-"))
+        days = (time.time() - time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))) / 86400
+        return days > max_days
+    except Exception:
+        return True
+
+
+def token_estimate(value: Any) -> int:
+    size = len(json.dumps(value))
+    raw = value.get("raw") if isinstance(value, dict) else None
+    if isinstance(raw, dict) and "$ref" in raw:
+        # A body stored by reference (payload_refs) counts at its stored size
+        size += int(raw.get("bytes", 0))
+    return max(1, size // 4)
+
+
+def _check_not_older_than_days(value: Any, limit: Any, rule: Dict[str, Any]) -> bool:
+    if not value:
+        return bool(rule.get("allow_missing", False))
+    return not _older_than_days(str(value), float(limit))
+
+
+def _check_less_than(value: Any, limit: Any, _rule: Dict[str, Any]) -> bool:
+    return float(value or 0) < float(limit)
+
+
+def _check_at_least(value: Any, limit: Any, _rule: Dict[str, Any]) -> bool:
+    return float(value or 0) >= float(limit)
+
+
+def _check_not_equals(value: Any, other: Any, rule: Dict[str, Any]) -> bool:
+    if rule.get("ignore_case", True):
+        return str(value or "").upper() != str(other).upper()
+    return value != other
+
+
+def _check_in(value: Any, allowed: Any, _rule: Dict[str, Any]) -> bool:
+    return value in set(allowed)
+
+
+def _check_token_budget(value: Any, limit: Any, _rule: Dict[str, Any]) -> bool:
+    return token_estimate(value) <= int(limit)
+
+
+def _check_not_duplicate(value: Any, _limit: Any, _rule: Dict[str, Any]) -> bool:
+    return not is_duplicate(value or {})
+
+
+def is_duplicate(_message: Dict[str, Any]) -> bool:
+    """Placeholder idempotency check (replace with real service)."""
+    return False
+
+
+# check name -> (predicate, rough cost in ns used until a rule has been measured)
+CHECKS: Dict[str, Tuple[Callable[[Any, Any, Dict[str, Any]], bool], float]] = {
+    "less_than": (_check_less_than, 300.0),
+    "at_least": (_check_at_least, 300.0),
+    "not_equals": (_check_not_equals, 400.0),
+    "in": (_check_in, 400.0),
+    "not_older_than_days": (_check_not_older_than_days, 3000.0),
+    "token_budget": (_check_token_budget, 10000.0),
+    "not_duplicate": (_check_not_duplicate, 50000.0),
+}
+
+
+class Verdict:
+    __slots__ = ("allowed", "outcome", "reasons")
+
+    def __init__(self, allowed: bool, outcome: Optional[str], reasons: List[str]) -> None:
+        self.allowed = allowed
+        self.outcome = outcome
+        self.reasons = reasons
+
+
+class _Rule:
+    __slots__ = ("id", "field", "outcome", "spec", "predicate", "static_cost", "evaluated", "failed", "total_ns")
+
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        if spec.get("check") not in CHECKS:
+            raise ValueError(f"Unknown check {spec.get('check')!r} in rule {spec.get('id')!r}")
+        self.id: str = spec["id"]
+        self.field: List[str] = spec.get("field", "message").split(".")
+        self.outcome: str = spec.get("outcome", "TICKET")
+        self.spec = spec
+        self.predicate, self.static_cost = CHECKS[spec["check"]]
+        self.evaluated = 0
+        self.failed = 0
+        self.total_ns = 0
+
+    def rank(self) -> float:
+        """Expected cost per early exit; lower runs first."""
+        if self.evaluated < 20:
+            # Assume every rule is equally selective until measured
+            return self.static_cost / 0.5
+        cost = self.total_ns / self.evaluated
+        fail_rate = max(self.failed / self.evaluated, 1e-3)
+        return cost / fail_rate
+
+    def value(self, params: Dict[str, Any]) -> Any:
+        raw = self.spec.get("value")
+        if isinstance(raw, dict) and "param" in raw:
+            return params.get(raw["param"], raw.get("default"))
+        return raw
+
+
+def _resolve(context: Dict[str, Any], path: List[str]) -> Any:
+    value: Any = context
+    for part in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+class PolicyEvaluator:
+    def __init__(self, policy: Dict[str, Any], reorder_every: int = 64) -> None:
+        self.name = policy.get("name", "policy")
+        self.rules = [_Rule(spec) for spec in policy.get("rules", [])]
+        self.reorder_every = reorder_every
+        self.evaluations = 0
+        self._blocks = self._split_blocks(self.rules)
+
+    @staticmethod
+    def _split_blocks(rules: List[_Rule]) -> Tuple[Tuple[_Rule, ...], ...]:
+        blocks: List[List[_Rule]] = []
+        for rule in rules:
+            if blocks and blocks[-1][0].outcome == rule.outcome:
+                blocks[-1].append(rule)
+            else:
+                blocks.append([rule])
+        return tuple(tuple(block) for block in blocks)
+
+    def order(self) -> List[str]:
+        return [rule.id for block in self._blocks for rule in block]
+
+    def _reorder(self) -> None:
+        # Sorting in place would empty the lists other threads are iterating;
+        # build new blocks and swap them in with one assignment instead
+        self._blocks = tuple(tuple(sorted(block, key=_Rule.rank)) for block in self._blocks)
+
+    def evaluate(self, context: Dict[str, Any], short_circuit: bool = True, root: Optional[str] = None) -> Verdict:
+        """``root`` restricts evaluation to rules reading that part of the context, e.g. ``"message"``."""
+        self.evaluations += 1
+        if self.evaluations == 1 or self.evaluations % self.reorder_every == 0:
+            self._reorder()
+        params = context.get("params", {})
+        reasons: List[str] = []
+        outcome: Optional[str] = None
+        for block in self._blocks:  # read once; a concurrent reorder swaps in new blocks
+            for rule in block:
+                if root is not None and rule.field[0] != root:
+                    continue
+                started = time.perf_counter_ns()
+                passed = rule.predicate(_resolve(context, rule.field), rule.value(params), rule.spec)
+                rule.total_ns += time.perf_counter_ns() - started
+                rule.evaluated += 1
+                if passed:
+                    continue
+                rule.failed += 1
+                reasons.append(rule.id)
+                if outcome is None:
+                    outcome = rule.outcome
+                if short_circuit:
+                    return Verdict(False, outcome, reasons)
+        return Verdict(not reasons, outcome, reasons)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            rule.id: {
+                "evaluated": rule.evaluated,
+                "failed": rule.failed,
+                "mean_us": round(rule.total_ns / rule.evaluated / 1000, 3) if rule.evaluated else 0.0,
+            }
+            for rule in self.rules
+        }
+
+    def adopt_stats(self, previous: "PolicyEvaluator") -> None:
+        """Carry measurements over a reload for rules whose spec did not change."""
+        old = {rule.id: rule for rule in previous.rules}
+        for rule in self.rules:
+            prior = old.get(rule.id)
+            if prior is not None and prior.spec == rule.spec:
+                rule.evaluated, rule.failed, rule.total_ns = prior.evaluated, prior.failed, prior.total_ns
+        self.evaluations = previous.evaluations
+
+
+def _read_source(source: str, known_version: Optional[str]) -> Tuple[str, Optional[str]]:
+    """(version, text) for a local path or s3:// URI; text is None when unchanged."""
+    if source.startswith("s3://"):
+        import boto3
+
+        bucket, _, key = source[5:].partition("/")
+        s3 = boto3.client("s3")
+        version = s3.head_object(Bucket=bucket, Key=key)["ETag"]
+        if version == known_version:
+            return version, None
+        return version, s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    version = str(os.stat(source).st_mtime_ns)
+    if version == known_version:
+        return version, None
+    with open(source, "r", encoding="utf-8") as handle:
+        return version, handle.read()
+
+
+class PolicyStore:
+    """Holds the compiled policy and reloads it at most every ``check_interval`` seconds."""
+
+    def __init__(self, source: str, check_interval: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.source = source
+        self.check_interval = check_interval
+        self.clock = clock
+        self.version: Optional[str] = None
+        self.evaluator: Optional[PolicyEvaluator] = None
+        self._checked_at = float("-inf")
+
+    def get(self) -> PolicyEvaluator:
+        now = self.clock()
+        if self.evaluator is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                version, text = _read_source(self.source, self.version)
+                if text is not None:
+                    evaluator = PolicyEvaluator(json.loads(text))
+                    if self.evaluator is not None:
+                        evaluator.adopt_stats(self.evaluator)
+                        print(json.dumps({"level": "INFO", "message": "Guardrail policy reloaded", "source": self.source}))
+                    self.evaluator, self.version = evaluator, version
+            except Exception as exc:
+                if self.evaluator is None:
+                    raise
+                # Keep serving the last good policy
+                print(json.dumps({"level": "WARN", "message": "Guardrail policy reload failed", "error": str(exc)}))
+        return self.evaluator
+
+
+_STORES: Dict[str, PolicyStore] = {}
+
+
+def store_for(source: str) -> PolicyStore:
+    if source not in _STORES:
+        _STORES[source] = PolicyStore(source, check_interval=float(os.getenv("GUARDRAIL_POLICY_CHECK_SECONDS", "30")))
+    return _STORES[source]
+
+
+def bundled(name: str) -> str:
+    return os.path.join(POLICY_DIR, f"{name}.json")
@@ -1,66 +1,139 @@
 import json
 import os
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-# Placeholder idempotency check (replace with real service)
+import guardrail_policy
+import profiling
+import tracing
 
-def _is_duplicate(_message: Dict[str, Any]) -> bool:
-    return False
+POLICY_SOURCE = os.getenv("GUARDRAIL_POLICY_PATH") or guardrail_policy.bundled("workflow")
+# Ticket summaries for messages rejected before the model is called
+PRECHECK_SUMMARIES = {
+    "stale_message": "Message is older than the redrive window.",
+    "max_attempts_exceeded": "Redrive attempts are exhausted.",
+    "already_completed": "The work already completed; there is nothing to redrive.",
+    "duplicate_message": "Duplicate of a message that was already handled.",
+    "token_budget_exceeded": "Message is too large for automated triage.",
+}
 
 
-def _is_older_than_days(timestamp: str, max_days: int) -> bool:
-    try:
-        date_part = timestamp.split("T", 1)[0]
-        year, month, day = map(int, date_part.split("-"))
-        days = (time.time() - time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))) / 86400
-        return days > max_days
-    except Exception as exc:
-        print(json.dumps({"level": "WARN", "message": "Invalid timestamp", "timestamp": timestamp, "error": str(exc)}))
-        return True
+def _emit_rule_stats(evaluator: guardrail_policy.PolicyEvaluator, metric_namespace: str) -> None:
+    for rule_id, stats in evaluator.stats().items():
+        emf = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": metric_namespace,
+                        "Dimensions": [["rule"]],
+                        "Metrics": [
+                            {"Name": "GuardrailRuleEvaluations", "Unit": "Count"},
+                            {"Name": "GuardrailRuleFailures", "Unit": "Count"},
+                            {"Name": "GuardrailRuleMeanLatency", "Unit": "Microseconds"},
+                        ],
+                    }
+                ],
+            },
+            "rule": rule_id,
+            "GuardrailRuleEvaluations": stats["evaluated"],
+            "GuardrailRuleFailures": stats["failed"],
+            "GuardrailRuleMeanLatency": stats["mean_us"],
+        }
+        print(json.dumps(emf))
+    print(json.dumps({"level": "INFO", "message": "Guardrail rule order", "order": evaluator.order()}))
 
 
+def short_circuit() -> bool:
+    """Stop at the first failing rule; ``reasons`` then holds that rule only."""
+    return os.getenv("GUARDRAILS_SHORT_CIRCUIT", "").lower() in ("1", "true", "yes")
+
+
+def precheck_params() -> Dict[str, int]:
+    """Limits for the pre-model check; keep them in line with the workflow's guardrails payload."""
+    return {
+        "max_age_days": int(os.getenv("GUARDRAIL_MAX_AGE_DAYS", "2")),
+        "max_redrive_attempts": int(os.getenv("GUARDRAIL_MAX_REDRIVE_ATTEMPTS", "2")),
+        "max_token_estimate": int(os.getenv("GUARDRAIL_MAX_TOKEN_ESTIMATE", "2000")),
+    }
+
+
+def precheck(message: Dict[str, Any], trace: Dict[str, Any], params: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """Evaluate the message-only rules before the model is called.
+
+    Returns None when the message may still be redriven. Otherwise returns a
+    result shaped like ``handler``'s, with a deterministic TICKET decision,
+    so the workflow can go straight to the ticket path.
+    """
+    evaluator = guardrail_policy.store_for(POLICY_SOURCE).get()
+    stop_early = short_circuit()
+    verdict = evaluator.evaluate({"message": message, "params": params}, short_circuit=stop_early, root="message")
+    if verdict.allowed:
+        return None
+    summary = " ".join(PRECHECK_SUMMARIES.get(reason, f"Guardrail {reason} failed.") for reason in verdict.reasons)
+    return {
+        "message": message,
+        "llm": {
+            "category": str(message.get("failureCategory") or "UNKNOWN"),
+            "recommended_action": "TICKET",
+            "confidence": 1.0,
+            "summary": summary,
+            "reasoning": "Guardrails precheck: " + ", ".join(verdict.reasons),
+        },
+        "trace": trace,
+        "guardrails": {
+            "allow_redrive": False,
+            "reasons": verdict.reasons,
+            "reasons_complete": not stop_early,
+            "token_estimate": guardrail_policy.token_estimate(message),
+            "precheck": True,
+            **params,
+        },
+    }
+
+
+@profiling.profiled()
 def handler(event, _context):
     message: Dict[str, Any] = event.get("message", {})
     llm: Dict[str, Any] = event.get("llm", {})
 
+    trace = tracing.from_event(event)
+    span_start_ms = time.time() * 1000
+    span_started = time.perf_counter()
+
     metric_namespace = os.getenv("METRIC_NAMESPACE", "DlqTriage")
     max_age_days = int(event.get("max_age_days", 2))
     max_redrive_attempts = int(event.get("max_redrive_attempts", 2))
     max_token_estimate = int(event.get("max_token_estimate", 2000))
 
-    ts = message.get("timestamp") or ""
-    attempts = int(message.get("redriveAttempts", 0))
-    already_completed = (message.get("stateAtFailure") or "").upper() == "COMPLETED"
-    stale = _is_older_than_days(ts, max_age_days)
-    duplicate = _is_duplicate(message)
-    token_estimate = max(1, len(json.dumps(message)) // 4)
-
-    allow_redrive = True
-    reasons = []
-
-    if stale:
-        allow_redrive = False
-        reasons.append("stale_message")
-    if attempts >= max_redrive_attempts:
-        allow_redrive = False
-        reasons.append("max_attempts_exceeded")
-    if already_completed:
-        allow_redrive = False
-        reasons.append("already_completed")
-    if duplicate:
-        allow_redrive = False
-        reasons.append("duplicate_message")
-    if token_estimate > max_token_estimate:
-        allow_redrive = False
-        reasons.append("token_budget_exceeded")
+    evaluator = guardrail_policy.store_for(POLICY_SOURCE).get()
+    stop_early = short_circuit()
+    verdict = evaluator.evaluate(
+        {
+            "message": message,
+            "llm": llm,
+            "params": {
+                "max_age_days": max_age_days,
+                "max_redrive_attempts": max_redrive_attempts,
+                "max_token_estimate": max_token_estimate,
+            },
+        },
+        short_circuit=stop_early,
+    )
+    allow_redrive = verdict.allowed
+    reasons = verdict.reasons
+    token_estimate = guardrail_policy.token_estimate(message)
+
+    tracing.add_span(trace, "guardrails", "guardrails_handler", span_start_ms, (time.perf_counter() - span_started) * 1000)
 
     result = {
         "message": message,
         "llm": llm,
+        "trace": trace,
         "guardrails": {
             "allow_redrive": allow_redrive,
             "reasons": reasons,
+            "reasons_complete": not stop_early,
             "max_age_days": max_age_days,
             "max_redrive_attempts": max_redrive_attempts,
             "token_estimate": token_estimate,
@@ -101,5 +174,7 @@ def handler(event, _context):
         "allow_redrive": allow_redrive,
     }
     print(json.dumps(emf))
+    if evaluator.evaluations % int(os.getenv("GUARDRAIL_STATS_EVERY", "100")) == 0:
+        _emit_rule_stats(evaluator, metric_namespace)
     print(json.dumps(result))
     return result
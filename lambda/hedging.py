@@ -0,0 +1,148 @@
+"""Hedged requests: fire a backup call when the first one is slow.
+
+``Hedger.run`` starts the primary call and waits up to an adaptive delay:
+the rolling ``percentile`` (default p90) of recent primary latencies, never
+below ``min_delay_ms``, and ``initial_delay_ms`` until ``min_samples``
+latencies have been seen. If the primary has not finished by then, the
+hedge call is started, unless hedges already make up ``max_rate`` of
+recent requests. The first valid result wins. The loser cannot be
+interrupted mid-request: a not-yet-started call is cancelled, and a
+running one finishes in the background. Its future is returned as
+``info["loser"]`` because a finished call is billed either way.
+
+Enable in the Bedrock adapter with ``BEDROCK_HEDGING=1``; tune with
+``HEDGE_MAX_RATE``, ``HEDGE_PERCENTILE``, ``HEDGE_MIN_DELAY_MS`` and
+``HEDGE_INITIAL_DELAY_MS``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Hedger:
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        max_rate: float = 0.1,
+        min_delay_ms: float = 50.0,
+        initial_delay_ms: float = 1000.0,
+        min_samples: int = 20,
+        window: int = 200,
+        max_workers: int = 8,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be between 0 and 1")
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_delay_ms = min_delay_ms
+        self.initial_delay_ms = initial_delay_ms
+        self.min_samples = min_samples
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.hedged: Deque[bool] = deque(maxlen=window)
+        self.counts = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def delay_ms(self) -> float:
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay_ms
+            ordered = sorted(self.latencies)
+        return max(self.min_delay_ms, ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))])
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            window = len(self.hedged) + 1
+            return sum(self.hedged) + 1 <= self.max_rate * window
+
+    def _record_primary(self, started: float) -> Callable[[Future], None]:
+        def _done(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                with self._lock:
+                    self.latencies.append((time.perf_counter() - started) * 1000)
+
+        return _done
+
+    def run(
+        self,
+        primary: Callable[[], T],
+        hedge: Callable[[], T],
+        valid: Callable[[T], bool] = lambda _result: True,
+    ) -> Tuple[T, Dict[str, Any]]:
+        """Result of the first valid call, plus ``hedged``, ``winner``, ``loser``, ``delay_ms`` and ``latency_ms``.
+
+        ``loser`` is the other call's future when a hedge was sent (it may still
+        be running, or be cancelled), else None.
+        """
+        started = time.perf_counter()
+        delay = self.delay_ms()
+        first = self._executor.submit(primary)
+        first.add_done_callback(self._record_primary(started))
+        labels = {first: "primary"}
+        done, _ = wait([first], timeout=delay / 1000)
+        hedged = not done and self._may_hedge()
+        if hedged:
+            labels[self._executor.submit(hedge)] = "hedge"
+
+        winner: Optional[Future] = None
+        pending = set(labels)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Prefer the primary when both finish in the same wakeup
+            for future in sorted(done, key=lambda f: labels[f] != "primary"):
+                if future.exception() is None and valid(future.result()):
+                    winner = future
+                    break
+        for future in pending:
+            future.cancel()
+        if winner is None:
+            # Nothing valid: surface the primary's outcome (result or exception)
+            winner = first
+
+        with self._lock:
+            self.hedged.append(hedged)
+            self.counts["requests"] += 1
+            self.counts["hedged"] += int(hedged)
+            self.counts["hedge_wins"] += int(labels[winner] == "hedge")
+        info = {
+            "hedged": hedged,
+            "winner": labels[winner],
+            "loser": next((future for future in labels if future is not winner), None),
+            "delay_ms": round(delay, 3),
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+        return winner.result(), info
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.counts["requests"]
+            return {
+                **self.counts,
+                "hedge_rate": round(self.counts["hedged"] / requests, 4) if requests else 0.0,
+                "win_rate": round(self.counts["hedge_wins"] / self.counts["hedged"], 4) if self.counts["hedged"] else 0.0,
+            }
+
+
+_HEDGER: Optional[Hedger] = None
+
+
+def hedger_from_env() -> Optional[Hedger]:
+    """Process-wide hedger (latency history survives warm invocations); None unless BEDROCK_HEDGING=1."""
+    global _HEDGER
+    if os.getenv("BEDROCK_HEDGING") != "1":
+        return None
+    if _HEDGER is None:
+        _HEDGER = Hedger(
+            percentile=float(os.getenv("HEDGE_PERCENTILE", "0.9")),
+            max_rate=float(os.getenv("HEDGE_MAX_RATE", "0.1")),
+            min_delay_ms=float(os.getenv("HEDGE_MIN_DELAY_MS", "50")),
+            initial_delay_ms=float(os.getenv("HEDGE_INITIAL_DELAY_MS", "1000")),
+        )
+    return _HEDGER
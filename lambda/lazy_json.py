@@ -0,0 +1,123 @@
+"""Pull a few top-level fields out of a large JSON object without parsing the rest.
+
+``scan`` walks the top-level object and decodes only the requested keys.
+Every other value is run through the C decoder with an object hook that
+discards each object as soon as it is parsed, so embedded documents are
+validated but never kept as Python objects. ``LazyEvent`` pairs the
+extracted fields with a ``RawJson`` reference to the untouched body, and
+``dumps`` splices that body back verbatim when the event is serialized.
+"""
+from __future__ import annotations
+
+import json
+import re
+import uuid
+from json.decoder import scanstring
+from typing import Any, Dict, Iterable, Optional
+
+_WS = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+# Builds nothing for objects, so skipping a nested document allocates almost nothing
+_SKIPPER = json.JSONDecoder(object_pairs_hook=lambda _pairs: None)
+
+
+class LazyDecodeError(ValueError):
+    """The body is not a well-formed JSON object."""
+
+
+class RawJson:
+    """A JSON document kept as the original text."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def load(self) -> Any:
+        return json.loads(self.text)
+
+
+class LazyEvent:
+    """Extracted fields plus a reference to the full body; read like a dict."""
+
+    __slots__ = ("fields", "raw")
+
+    def __init__(self, fields: Dict[str, Any], raw: RawJson) -> None:
+        self.fields = fields
+        self.raw = raw
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.fields.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.fields
+
+
+def _skip_ws(text: str, idx: int) -> int:
+    return _WS.match(text, idx).end()
+
+
+def scan(text: str, keys: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Decode ``keys`` from the top-level object in ``text``.
+
+    Returns None when the document is not an object. As with ``json.loads``,
+    the last occurrence of a duplicated key wins.
+    """
+    wanted = set(keys)
+    idx = _skip_ws(text, 0)
+    if text[idx:idx + 1] != "{":
+        return None
+    found: Dict[str, Any] = {}
+    try:
+        idx = _skip_ws(text, idx + 1)
+        if text[idx:idx + 1] == "}":
+            idx += 1
+        else:
+            while True:
+                if text[idx:idx + 1] != '"':
+                    raise LazyDecodeError(f"Expected a key at {idx}")
+                key, idx = scanstring(text, idx + 1)
+                idx = _skip_ws(text, idx)
+                if text[idx:idx + 1] != ":":
+                    raise LazyDecodeError(f"Expected ':' at {idx}")
+                idx = _skip_ws(text, idx + 1)
+                if key in wanted:
+                    found[key], idx = _DECODER.raw_decode(text, idx)
+                else:
+                    idx = _SKIPPER.raw_decode(text, idx)[1]
+                idx = _skip_ws(text, idx)
+                separator = text[idx:idx + 1]
+                if separator == "}":
+                    idx += 1
+                    break
+                if separator != ",":
+                    raise LazyDecodeError(f"Expected ',' or '}}' at {idx}")
+                idx = _skip_ws(text, idx + 1)
+    except json.JSONDecodeError as exc:
+        raise LazyDecodeError(str(exc)) from exc
+    if _skip_ws(text, idx) != len(text):
+        raise LazyDecodeError(f"Extra data at {idx}")
+    return found
+
+
+def extract(text: str, keys: Iterable[str]) -> Optional[LazyEvent]:
+    fields = scan(text, keys)
+    return None if fields is None else LazyEvent(fields, RawJson(text))
+
+
+def dumps(obj: Any) -> str:
+    """``json.dumps`` that writes each ``RawJson`` as its original text."""
+    raws = []
+    # A per-call nonce keeps ordinary strings from colliding with the placeholders
+    nonce = uuid.uuid4().hex
+
+    def _default(value: Any) -> Any:
+        if isinstance(value, RawJson):
+            raws.append(value.text)
+            return f"{nonce}:{len(raws) - 1}"
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    out = json.dumps(obj, default=_default)
+    if not raws:
+        return out
+    return re.sub(f'"{nonce}:(\\d+)"', lambda match: raws[int(match.group(1))], out)
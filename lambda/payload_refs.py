@@ -0,0 +1,60 @@
+"""Large event bodies passed to the workflow by reference.
+
+Step Functions caps execution input at 256 KB. When an event's input would
+exceed ``PAYLOAD_OFFLOAD_BYTES`` and ``PAYLOAD_BUCKET`` is set, the triage
+Lambda stores the event's raw body in S3 and sends a reference in its place::
+
+    "raw": {"$ref": "s3://bucket/payloads/<sha256>.json", "bytes": 481234}
+
+Keys are content hashes, so redeliveries of the same body share one object.
+Only the code that needs the body loads it back (``resolve`` / ``load_text``):
+the prompt builder in the Bedrock adapter and the quarantine, which keeps the
+body for replay. Everything else works on the normalized fields.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+REF_KEY = "$ref"
+# Leaves room for the message fields, trace and precheck under the 256 KB limit
+OFFLOAD_BYTES = int(os.getenv("PAYLOAD_OFFLOAD_BYTES", "200000"))
+KEY_PREFIX = "payloads/"
+
+_S3: Optional[Any] = None
+
+
+def _s3() -> Any:
+    global _S3
+    if _S3 is None:
+        import boto3
+
+        _S3 = boto3.client("s3")
+    return _S3
+
+
+def is_ref(raw: Any) -> bool:
+    return isinstance(raw, dict) and REF_KEY in raw
+
+
+def offload(s3: Any, bucket: str, text: str) -> Dict[str, Any]:
+    """Store ``text`` (the event's raw JSON) and return the reference that replaces it."""
+    data = text.encode("utf-8")
+    key = f"{KEY_PREFIX}{hashlib.sha256(data).hexdigest()}.json"
+    s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType="application/json")
+    return {REF_KEY: f"s3://{bucket}/{key}", "bytes": len(data)}
+
+
+def load_text(raw: Dict[str, Any], s3: Optional[Any] = None) -> str:
+    bucket, _, key = raw[REF_KEY][len("s3://"):].partition("/")
+    return (s3 or _s3()).get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+
+
+def resolve(message: Dict[str, Any], s3: Optional[Any] = None) -> Dict[str, Any]:
+    """The message with a referenced ``raw`` body loaded back; unchanged otherwise."""
+    raw = message.get("raw")
+    if not is_ref(raw):
+        return message
+    return {**message, "raw": json.loads(load_text(raw, s3))}
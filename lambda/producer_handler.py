@@ -1,9 +1,13 @@
 import json
 import os
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import boto3
+
+import envelopes
+import profiling
+
 METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
 
 
@@ -25,26 +29,41 @@ def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> N
     print(json.dumps(emf))
 
 
+@profiling.profiled()
 def handler(event, _context):
     queue_url = os.environ["DLQ_QUEUE_URL"]
     sqs = boto3.client("sqs")
 
-    # Accept a provided message or use a default example
+    # Accept provided message(s) or use a default example
+    messages: List[Dict[str, Any]] = (event.get("messages") or []) if isinstance(event, dict) else []
     message: Dict[str, Any] = event.get("message") if isinstance(event, dict) else None
-    if not message:
-        message = {
-            "correlationId": "sample-123",
-            "failureCategory": "DOWNSTREAM_TIMEOUT",
-            "errorMessage": "Timeout after 3 retries",
-            "timestamp": "2025-01-15T10:36:00Z",
-            "stateAtFailure": "FAILED",
-            "redriveAttempts": 0,
-        }
-
-    sqs.send_message(
-        QueueUrl=queue_url,
-        MessageBody=json.dumps(message),
+    if message:
+        messages = [message] + list(messages)
+    if not messages:
+        messages = [
+            {
+                "correlationId": "sample-123",
+                "failureCategory": "DOWNSTREAM_TIMEOUT",
+                "errorMessage": "Timeout after 3 retries",
+                "timestamp": "2025-01-15T10:36:00Z",
+                "stateAtFailure": "FAILED",
+                "redriveAttempts": 0,
+            }
+        ]
+
+    # PRODUCER_ENCODING: none | gzip | zstd; PRODUCER_PACK_SIZE: events per SQS body
+    bodies = envelopes.encode_events(
+        messages,
+        compression=os.getenv("PRODUCER_ENCODING", "none"),
+        max_events=int(os.getenv("PRODUCER_PACK_SIZE", "100")),
     )
+    if len(bodies) == 1:
+        sqs.send_message(QueueUrl=queue_url, MessageBody=bodies[0])
+        requests = 1
+    else:
+        requests = envelopes.send_batches(sqs, queue_url, bodies)
 
-    _emit_metric("ProducerSent", 1, action="producer")
-    return {"status": "sent", "queue_url": queue_url}
+    _emit_metric("ProducerSent", len(messages), action="producer")
+    _emit_metric("ProducerRequests", requests, action="producer")
+    _emit_metric("ProducerBytes", sum(len(b.encode("utf-8")) for b in bodies), unit="Bytes", action="producer")
+    return {"status": "sent", "queue_url": queue_url, "events": len(messages), "requests": requests}
@@ -0,0 +1,228 @@
+"""Opt-in CPU and allocation profiling for handlers.
+
+Wrap a handler with ``@profiling.profiled()``. Nothing happens unless
+``PROFILE_MODE`` is set:
+
+- ``cprofile``: deterministic profile; logs the top functions by cumulative time
+- ``sample``: a background thread samples the handler's stack every
+  ``PROFILE_SAMPLE_INTERVAL_MS`` (default 5) and logs collapsed stacks
+
+Only a ``PROFILE_SAMPLE_RATE`` fraction of invocations (default 0.01) is
+profiled. ``PROFILE_TRACEMALLOC=1`` adds the top allocation sites and peak
+traced memory. With ``PROFILE_OUTPUT_DIR`` set (``/tmp`` on Lambda) each
+profile is also written to a file: ``.folded`` collapsed stacks for
+flamegraph.pl or speedscope, or ``.pstats`` for ``python -m pstats``.
+
+When profiling is off the wrapper adds well under a microsecond per call.
+"""
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+MODES = ("off", "cprofile", "sample")
+
+_CONFIG: Optional[Dict[str, Any]] = None
+_ACTIVE = threading.local()
+
+
+def load_config() -> Dict[str, Any]:
+    mode = os.getenv("PROFILE_MODE", "off").lower() or "off"
+    if mode not in MODES:
+        raise ValueError(f"PROFILE_MODE must be one of {MODES}")
+    return {
+        "mode": mode,
+        "enabled": mode != "off",
+        "rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0.01")),
+        "interval": float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000,
+        "tracemalloc": os.getenv("PROFILE_TRACEMALLOC", "0") == "1",
+        "output_dir": os.getenv("PROFILE_OUTPUT_DIR") or None,
+        "top": int(os.getenv("PROFILE_TOP", "15")),
+    }
+
+
+def config() -> Dict[str, Any]:
+    global _CONFIG
+    if _CONFIG is None:
+        _CONFIG = load_config()
+    return _CONFIG
+
+
+def reset() -> None:
+    """Re-read the environment on the next call (configuration is cached per process)."""
+    global _CONFIG
+    _CONFIG = None
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's stack on a timer and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                if frame.f_code.co_filename != __file__:
+                    labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _top_functions(profile: cProfile.Profile, limit: int) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for (filename, line, name), (_prim, calls, tottime, cumtime, _callers) in rows
+    ]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "where": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_kib": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+def _write_text(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+
+
+def _write(cfg: Dict[str, Any], name: str, suffix: str, write: Callable[[str], None]) -> str:
+    os.makedirs(cfg["output_dir"], exist_ok=True)
+    path = os.path.join(cfg["output_dir"], f"{name}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}{suffix}")
+    write(path)
+    return path
+
+
+def _run_profiled(cfg: Dict[str, Any], name: str, func: Callable[..., Any], args, kwargs) -> Any:
+    profile = sampler = None
+    tracing_memory = cfg["tracemalloc"] and not tracemalloc.is_tracing()
+    if tracing_memory:
+        tracemalloc.start()
+    if cfg["mode"] == "cprofile":
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler owns the interpreter (e.g. a concurrent worker thread)
+            if tracing_memory:
+                tracemalloc.stop()
+            return func(*args, **kwargs)
+    else:
+        sampler = StackSampler(threading.get_ident(), cfg["interval"])
+        sampler.start()
+    _ACTIVE.on = True
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        _ACTIVE.on = False
+        try:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            print(json.dumps(_report(cfg, name, duration_ms, profile, sampler, tracing_memory)))
+        except Exception as exc:
+            # A failed report must not replace the handler's result or exception
+            print(json.dumps({"level": "ERROR", "message": "Handler profile failed", "handler": name, "error": str(exc)}))
+        finally:
+            if tracing_memory:
+                tracemalloc.stop()
+
+
+def _report(
+    cfg: Dict[str, Any],
+    name: str,
+    duration_ms: float,
+    profile: Optional[cProfile.Profile],
+    sampler: Optional[StackSampler],
+    tracing_memory: bool,
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        "level": "INFO",
+        "message": "Handler profile",
+        "handler": name,
+        "mode": cfg["mode"],
+        "duration_ms": round(duration_ms, 3),
+    }
+    if profile is not None:
+        record["top"] = _top_functions(profile, cfg["top"])
+        if cfg["output_dir"]:
+            record["file"] = _write(cfg, name, ".pstats", profile.dump_stats)
+    if sampler is not None:
+        record["samples"] = sum(sampler.stacks.values())
+        record["stacks"] = [
+            {"stack": stack, "count": count} for stack, count in sampler.stacks.most_common(cfg["top"])
+        ]
+        if cfg["output_dir"]:
+            collapsed = sampler.collapsed()
+            record["file"] = _write(cfg, name, ".folded", lambda path: _write_text(path, collapsed))
+    if tracing_memory:
+        record["allocations"] = _top_allocations(tracemalloc.take_snapshot(), cfg["top"])
+        record["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    return record
+
+
+def profiled(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator; profiles a sampled fraction of calls when ``PROFILE_MODE`` is set."""
+
+    def _wrap(func: Callable[..., Any]) -> Callable[..., Any]:
+        label = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def _wrapper(*args: Any, **kwargs: Any) -> Any:
+            cfg = _CONFIG or config()
+            if not cfg["enabled"] or getattr(_ACTIVE, "on", False) or random.random() >= cfg["rate"]:
+                return func(*args, **kwargs)
+            return _run_profiled(cfg, label, func, args, kwargs)
+
+        return _wrapper
+
+    return _wrap
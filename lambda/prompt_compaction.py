@@ -0,0 +1,226 @@
+"""Structure-aware compaction of the DLQ event sent to the model.
+
+Replaces blind character truncation with four passes:
+
+1. ``raw`` is deduplicated against the normalized fields (values already
+   present at the top level are dropped, and ``raw`` goes if nothing is left).
+2. Low-signal keys are dropped by glob rules (request ids, headers, receipt
+   handles, ...).
+3. Consecutive repeated stack-trace frames (deep recursion, retry loops) are
+   collapsed into a single marker line.
+4. If the result is still over the token budget, the longest strings are cut
+   to their head and tail, ``errorMessage`` last, so the exception type and
+   the innermost frame both survive.
+
+Rules come from the ``PROMPT_COMPACTION`` environment variable (JSON)::
+
+    {"max_tokens": 1500, "drop_keys": ["headers", "x-amzn-*"], "keep_keys": ["traceId"]}
+"""
+from __future__ import annotations
+
+import fnmatch
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_RULES: Dict[str, Any] = {
+    "max_tokens": 1500,
+    "drop_keys": [
+        "headers",
+        "receipthandle",
+        "md5ofbody",
+        "md5ofmessageattributes",
+        "awsrequestid",
+        "requestid",
+        "x-amz*",
+        "x-amzn-*",
+        "traceparent",
+        "tracestate",
+        "useragent",
+        "user-agent",
+        "signature*",
+        "signingcert*",
+        "unsubscribeurl",
+        "eventsourcearn",
+    ],
+    "keep_keys": [],
+    "min_frame_repeats": 3,
+}
+
+# Normalized fields that are not compared against ``raw``
+_SKIP_NORMALIZED = {"raw"}
+_LINE_NUMBER = re.compile(r"\d+")
+_MAX_FRAME_BLOCK = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def load_rules() -> Dict[str, Any]:
+    raw = os.getenv("PROMPT_COMPACTION")
+    if not raw:
+        return dict(DEFAULT_RULES)
+    return {**DEFAULT_RULES, **json.loads(raw)}
+
+
+class _Report:
+    def __init__(self) -> None:
+        self.dropped_keys: List[str] = []
+        self.collapsed_frames = 0
+        self.trimmed_chars = 0
+        self.raw_fields_deduped = 0
+
+
+def _is_dropped(key: str, rules: Dict[str, Any]) -> bool:
+    lowered = key.lower()
+    if any(fnmatch.fnmatchcase(lowered, pattern.lower()) for pattern in rules.get("keep_keys", ())):
+        return False
+    return any(fnmatch.fnmatchcase(lowered, pattern.lower()) for pattern in rules.get("drop_keys", ()))
+
+
+def collapse_frames(text: str, min_repeats: int = 3) -> Tuple[str, int]:
+    """Collapse blocks of 1-4 lines repeated ``min_repeats``+ times in a row.
+
+    Line numbers are ignored when comparing, so ``at f(App.java:10)`` and
+    ``at f(App.java:12)`` count as the same frame.
+    """
+    lines = text.split("\n")
+    if len(lines) < min_repeats:
+        return text, 0
+    keys = [_LINE_NUMBER.sub("#", line.strip()) for line in lines]
+    out: List[str] = []
+    collapsed = 0
+    i = 0
+    while i < len(lines):
+        best_width, best_count = 0, 1
+        for width in range(1, _MAX_FRAME_BLOCK + 1):
+            block = keys[i:i + width]
+            if len(block) < width or not any(block):
+                break
+            count = 1
+            while keys[i + count * width:i + (count + 1) * width] == block:
+                count += 1
+            if count >= min_repeats and count * width > best_count * best_width:
+                best_width, best_count = width, count
+        if best_width:
+            out.extend(lines[i:i + best_width])
+            indent = lines[i][: len(lines[i]) - len(lines[i].lstrip())]
+            out.append(f"{indent}... [{best_count - 1} repeated frames omitted]")
+            collapsed += (best_count - 1) * best_width
+            i += best_count * best_width
+        else:
+            out.append(lines[i])
+            i += 1
+    return "\n".join(out), collapsed
+
+
+def head_tail(text: str, max_chars: int) -> str:
+    """Keep the start and end of ``text``; the tail usually holds the root cause."""
+    if len(text) <= max_chars:
+        return text
+    marker = f" ...[{len(text) - max_chars} chars omitted]... "
+    keep = max(0, max_chars - len(marker))
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+def _scrub(value: Any, rules: Dict[str, Any], report: _Report, path: str) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if _is_dropped(str(key), rules):
+                report.dropped_keys.append(f"{path}{key}")
+                continue
+            out[key] = _scrub(item, rules, report, f"{path}{key}.")
+        return out
+    if isinstance(value, list):
+        return [_scrub(item, rules, report, path) for item in value]
+    if isinstance(value, str) and "\n" in value:
+        collapsed, frames = collapse_frames(value, int(rules.get("min_frame_repeats", 3)))
+        report.collapsed_frames += frames
+        return collapsed
+    return value
+
+
+def _dedupe_raw(message: Dict[str, Any], report: _Report) -> Dict[str, Any]:
+    raw = message.get("raw")
+    if not isinstance(raw, dict):
+        return message
+    # Same key with the same value, or a long string repeated under an alias key
+    known_strings = {v for k, v in message.items() if k not in _SKIP_NORMALIZED and isinstance(v, str) and len(v) >= 8}
+    remaining = {}
+    for key, value in raw.items():
+        if (key in message and message[key] == value) or (isinstance(value, str) and value in known_strings):
+            report.raw_fields_deduped += 1
+        else:
+            remaining[key] = value
+    compacted = {k: v for k, v in message.items() if k != "raw"}
+    if remaining:
+        compacted["raw"] = remaining
+    return compacted
+
+
+def _string_slots(value: Any, path: Tuple[Any, ...] = ()) -> List[Tuple[Tuple[Any, ...], str]]:
+    if isinstance(value, dict):
+        return [slot for k, v in value.items() for slot in _string_slots(v, path + (k,))]
+    if isinstance(value, list):
+        return [slot for i, v in enumerate(value) for slot in _string_slots(v, path + (i,))]
+    if isinstance(value, str):
+        return [(path, value)]
+    return []
+
+
+def _assign(root: Any, path: Tuple[Any, ...], value: str) -> None:
+    for part in path[:-1]:
+        root = root[part]
+    root[path[-1]] = value
+
+
+def _render(message: Any) -> str:
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def _fit_budget(message: Dict[str, Any], max_chars: int, report: _Report) -> str:
+    text = _render(message)
+    # Longest strings first, errorMessage only after everything else
+    slots = sorted(_string_slots(message), key=lambda s: (s[0] == ("errorMessage",), -len(s[1])))
+    for path, value in slots:
+        over = len(text) - max_chars
+        if over <= 0:
+            break
+        target = max(200, len(value) - over)
+        if target >= len(value):
+            continue
+        trimmed = head_tail(value, target)
+        report.trimmed_chars += len(value) - len(trimmed)
+        _assign(message, path, trimmed)
+        text = _render(message)
+    if len(text) > max_chars:
+        # Still over (many small fields): fall back to a hard cut
+        report.trimmed_chars += len(text) - max_chars
+        text = text[:max_chars] + "... [truncated]"
+    return text
+
+
+def compact(message: Dict[str, Any], rules: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+    """Compacted JSON text for ``message`` and a report of what was removed."""
+    rules = rules if rules is not None else load_rules()
+    report = _Report()
+    original_tokens = estimate_tokens(json.dumps(message))
+
+    compacted = _dedupe_raw(message, report)
+    compacted = _scrub(compacted, rules, report, "")
+    text = _fit_budget(compacted, int(rules["max_tokens"]) * 4, report)
+
+    compacted_tokens = estimate_tokens(text)
+    return text, {
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "reduction": round(1 - compacted_tokens / original_tokens, 4),
+        "raw_fields_deduped": report.raw_fields_deduped,
+        "dropped_keys": report.dropped_keys,
+        "collapsed_frames": report.collapsed_frames,
+        "trimmed_chars": report.trimmed_chars,
+    }
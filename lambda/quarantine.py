@@ -0,0 +1,475 @@
+"""Poison-message quarantine.
+
+A message that fails the workflow again and again should not keep paying
+for Bedrock calls and retries. The workflow's catch-all state calls
+``Quarantine.record_failure``, which counts failed executions per message
+and per error fingerprint (``error_analytics.signature``) in a shared store:
+
+    pk="msg#<correlationId>"     one message; "msg#body:<hash>" without an id
+    pk="fp#<signature id>"       every message with that error signature
+    pk="fpw#<signature id>#<n>"  messages that failed with it in window n
+
+Only failures the message can have caused are counted: workflow timeouts,
+Lambda service errors, throttling and outages of Bedrock, SNS and the other
+services the workflow calls are not (``is_infrastructure_error``).
+
+A message is quarantined after ``QUARANTINE_MAX_FAILURES`` failed executions
+(default 3) within ``FAILURE_TTL_SECONDS`` of its first failure; the window
+is fixed, later failures do not extend it. A fingerprint is quarantined once
+``QUARANTINE_MAX_FINGERPRINT_FAILURES`` distinct correlationIds (default 20)
+failed with it within one ``QUARANTINE_FINGERPRINT_WINDOW_SECONDS`` window
+(default 900), and only for ``QUARANTINE_FINGERPRINT_TTL_SECONDS`` (default
+3600). Errors without a message have no fingerprint. ``triage_handler``
+checks each batch against the store (one batch read, cached for
+``QUARANTINE_CACHE_SECONDS``). A quarantined message is held with its
+original body instead of starting an execution.
+
+Items keep their body (up to ``MAX_BODY_BYTES``) so they can be released
+and replayed:
+
+    python lambda/quarantine.py <table> list
+    python lambda/quarantine.py <table> release msg#c-123 fp#0a1b2c3d4e5f --replay-to "$DLQ_QUEUE_URL"
+
+Releasing a fingerprint also releases every message held under it. Stores:
+``DynamoQuarantineStore`` (``QUARANTINE_TABLE``; string key ``pk``, TTL on
+``expires_at``) and ``LocalQuarantineStore`` (``QUARANTINE_STORE=local``).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import payload_refs
+import region_pool
+from error_analytics import signature
+
+FAILURE_TTL_SECONDS = 7 * 86400
+QUARANTINE_TTL_SECONDS = 30 * 86400
+FINGERPRINT_WINDOW_SECONDS = 900
+FINGERPRINT_TTL_SECONDS = 3600
+# Failures that say nothing about the message itself
+INFRASTRUCTURE_ERRORS = {"States.Timeout", "States.HeartbeatTimeout"}
+INFRASTRUCTURE_PREFIXES = ("Lambda.", "SNS.")
+INFRASTRUCTURE_CODES = region_pool.THROTTLE_CODES | {
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "InternalFailure",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ProvisionedThroughputExceededException",
+    "EndpointConnectionError",
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+}
+# Leaves room for the other attributes under DynamoDB's 400 KB item limit
+MAX_BODY_BYTES = 350_000
+
+Item = Dict[str, Any]
+
+
+def message_key(message: Dict[str, Any]) -> str:
+    correlation_id = message.get("correlationId")
+    if correlation_id and correlation_id != "unknown":
+        return f"msg#{correlation_id}"
+    raw = message.get("raw", message)
+    if hasattr(raw, "text"):  # lazy_json.RawJson, only for large bodies without an id
+        raw = json.loads(raw.text)
+    text = json.dumps(raw, sort_keys=True, default=str)
+    return "msg#body:" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint_key(message: Dict[str, Any]) -> Optional[str]:
+    """None for an empty error: "UNKNOWN: " would lump unrelated messages together."""
+    if not str(message.get("errorMessage") or "").strip():
+        return None
+    return "fp#" + signature(message)[0]
+
+
+def is_infrastructure_error(error: str, cause: str = "") -> bool:
+    """True for a failure of the platform or a called service rather than of the message.
+
+    ``error``/``cause`` are the Step Functions error name and cause; exceptions
+    raised by a Lambda carry the service error code in the cause.
+    """
+    if error in INFRASTRUCTURE_ERRORS or error.startswith(INFRASTRUCTURE_PREFIXES):
+        return True
+    return any(code in error or code in cause for code in INFRASTRUCTURE_CODES)
+
+
+class LocalQuarantineStore:
+    """In-process store with the DynamoDB store's interface."""
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.items: Dict[str, Item] = {}
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[Item]:
+        item = self.items.get(key)
+        if item is None or item.get("expires_at", float("inf")) < self.clock():
+            return None
+        return item
+
+    def increment(self, key: str, counters: Dict[str, Any], attributes: Item, expires_at: Optional[int] = None) -> Item:
+        with self._lock:
+            item = self._live(key) or {"pk": key}
+            for name, value in counters.items():
+                if isinstance(value, (set, frozenset)):
+                    item[name] = set(item.get(name, ())) | value
+                else:
+                    item[name] = item.get(name, 0) + value
+            item.update(attributes)
+            if expires_at is not None:
+                item.setdefault("expires_at", expires_at)
+            self.items[key] = item
+            return {name: set(value) if isinstance(value, set) else value for name, value in item.items()}
+
+    def update(self, key: str, attributes: Item) -> None:
+        with self._lock:
+            item = self._live(key) or {"pk": key}
+            item.update(attributes)
+            self.items[key] = item
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Item]:
+        with self._lock:
+            return {key: dict(item) for key in set(keys) for item in [self._live(key)] if item is not None}
+
+    def delete(self, key: str) -> Optional[Item]:
+        with self._lock:
+            item = self._live(key)
+            self.items.pop(key, None)
+            return item
+
+    def scan(self, **equals: Any) -> List[Item]:
+        with self._lock:
+            return [
+                dict(item)
+                for key in list(self.items)
+                for item in [self._live(key)]
+                if item is not None and all(item.get(name) == value for name, value in equals.items())
+            ]
+
+
+def _encode(value: Any) -> Dict[str, Any]:
+    if isinstance(value, (set, frozenset)):
+        return {"SS": sorted(str(member) for member in value)}
+    if isinstance(value, bool):
+        return {"N": str(int(value))}
+    if isinstance(value, (int, float)):
+        return {"N": str(value)}
+    return {"S": str(value)}
+
+
+def _decode(item: Dict[str, Dict[str, Any]]) -> Item:
+    out: Item = {}
+    for name, value in item.items():
+        if "SS" in value:
+            out[name] = set(value["SS"])
+        elif "N" in value:
+            number = float(value["N"])
+            out[name] = int(number) if number.is_integer() else number
+        else:
+            out[name] = value.get("S")
+    return out
+
+
+class DynamoQuarantineStore:
+    """Items in a DynamoDB table (string key ``pk``, TTL attribute ``expires_at``)."""
+
+    def __init__(self, table: str, client: Any = None) -> None:
+        import boto3
+
+        self.table = table
+        self.client = client or boto3.client("dynamodb")
+
+    def _update(
+        self, key: str, counters: Dict[str, Any], attributes: Item, returns: str, expires_at: Optional[int] = None
+    ) -> Dict[str, Any]:
+        names: Dict[str, str] = {}
+        values: Dict[str, Dict[str, Any]] = {}
+        adds, sets = [], []
+        for i, (name, value) in enumerate(counters.items()):
+            names[f"#c{i}"], values[f":c{i}"] = name, _encode(value)
+            adds.append(f"#c{i} :c{i}")
+        for i, (name, value) in enumerate(attributes.items()):
+            names[f"#a{i}"], values[f":a{i}"] = name, _encode(value)
+            sets.append(f"#a{i} = :a{i}")
+        extra: Dict[str, Any] = {}
+        if expires_at is not None:
+            # Set once per window; an expired item TTL has not deleted yet fails the condition
+            names["#x"], values[":x"], values[":now"] = "expires_at", _encode(expires_at), _encode(int(time.time()))
+            sets.append("#x = if_not_exists(#x, :x)")
+            extra["ConditionExpression"] = "attribute_not_exists(#x) OR #x >= :now"
+        clauses = []
+        if adds:
+            clauses.append("ADD " + ", ".join(adds))
+        if sets:
+            clauses.append("SET " + ", ".join(sets))
+        return self.client.update_item(
+            TableName=self.table,
+            Key={"pk": {"S": key}},
+            UpdateExpression=" ".join(clauses),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues=returns,
+            **extra,
+        )
+
+    def increment(self, key: str, counters: Dict[str, Any], attributes: Item, expires_at: Optional[int] = None) -> Item:
+        """Add ``counters``; with ``expires_at`` they count within a fixed window set by the first increment."""
+        try:
+            resp = self._update(key, counters, attributes, "ALL_NEW", expires_at)
+        except self.client.exceptions.ConditionalCheckFailedException:
+            # The window is over: start a new one with just this increment
+            resp = self._update(key, {}, {**attributes, **counters, "expires_at": expires_at}, "ALL_NEW")
+        return _decode(resp.get("Attributes", {}))
+
+    def update(self, key: str, attributes: Item) -> None:
+        self._update(key, {}, attributes, "NONE")
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Item]:
+        found: Dict[str, Item] = {}
+        unique = sorted(set(keys))
+        now = time.time()
+        for start in range(0, len(unique), 100):
+            request = {
+                self.table: {
+                    "Keys": [{"pk": {"S": key}} for key in unique[start:start + 100]],
+                    "ProjectionExpression": "#k, #q, #r, #e",
+                    "ExpressionAttributeNames": {"#k": "pk", "#q": "quarantined", "#r": "reason", "#e": "expires_at"},
+                }
+            }
+            while request:
+                resp = self.client.batch_get_item(RequestItems=request)
+                for raw in resp.get("Responses", {}).get(self.table, []):
+                    item = _decode(raw)
+                    # TTL deletion lags, so expired items can still be returned
+                    if item.get("expires_at", float("inf")) >= now:
+                        found[item["pk"]] = item
+                request = resp.get("UnprocessedKeys") or {}
+        return found
+
+    def delete(self, key: str) -> Optional[Item]:
+        resp = self.client.delete_item(TableName=self.table, Key={"pk": {"S": key}}, ReturnValues="ALL_OLD")
+        return _decode(resp["Attributes"]) if resp.get("Attributes") else None
+
+    def scan(self, **equals: Any) -> List[Item]:
+        kwargs: Dict[str, Any] = {"TableName": self.table}
+        if equals:
+            kwargs["FilterExpression"] = " AND ".join(f"#f{i} = :f{i}" for i in range(len(equals)))
+            kwargs["ExpressionAttributeNames"] = {f"#f{i}": name for i, name in enumerate(equals)}
+            kwargs["ExpressionAttributeValues"] = {f":f{i}": _encode(value) for i, value in enumerate(equals.values())}
+        out: List[Item] = []
+        while True:
+            resp = self.client.scan(**kwargs)
+            out.extend(_decode(item) for item in resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp:
+                return out
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _body_attributes(body: Optional[str]) -> Item:
+    if body is None:
+        return {}
+    if len(body.encode("utf-8")) > MAX_BODY_BYTES:
+        # Too large to keep here; replay it from the DLQ archive by correlationId
+        return {"body_omitted": 1}
+    return {"body": body}
+
+
+class Quarantine:
+    def __init__(
+        self,
+        store: Any,
+        max_failures: int = 3,
+        max_fingerprint_failures: int = 20,
+        cache_seconds: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        fingerprint_window_seconds: int = FINGERPRINT_WINDOW_SECONDS,
+        fingerprint_ttl_seconds: int = FINGERPRINT_TTL_SECONDS,
+    ) -> None:
+        self.store = store
+        self.max_failures = max_failures
+        self.max_fingerprint_failures = max_fingerprint_failures
+        self.fingerprint_window_seconds = fingerprint_window_seconds
+        self.fingerprint_ttl_seconds = fingerprint_ttl_seconds
+        self.cache_seconds = cache_seconds
+        self.clock = clock
+        self._cache: Dict[str, Tuple[float, Optional[str]]] = {}  # key -> (checked_at, reason or None)
+        self._lock = threading.Lock()
+
+    def _quarantine(self, key: str, reason: str, now: float, ttl_seconds: int = QUARANTINE_TTL_SECONDS) -> None:
+        self.store.update(key, {"quarantined": 1, "reason": reason, "quarantined_at": int(now), "expires_at": int(now) + ttl_seconds})
+        with self._lock:
+            self._cache[key] = (now, reason)
+
+    def record_failure(self, message: Dict[str, Any], error: str, body: Optional[str] = None) -> Optional[str]:
+        """Count one failed execution; returns the key that got quarantined, if any."""
+        now = self.clock()
+        raw = message.get("raw")
+        if body is None and payload_refs.is_ref(raw):
+            body = payload_refs.load_text(raw)
+        elif body is None and raw is not None:
+            body = json.dumps(raw)
+        msg_key, fp_key = message_key(message), fingerprint_key(message)
+        common = {"last_error": error[:1000], "last_failed_at": int(now)}
+        message_item = self.store.increment(
+            msg_key,
+            {"failures": 1},
+            {
+                **common,
+                "correlationId": message.get("correlationId") or "",
+                "fingerprint": fp_key[3:] if fp_key else "",
+                **_body_attributes(body),
+            },
+            expires_at=int(now) + FAILURE_TTL_SECONDS,
+        )
+        if message_item.get("failures", 0) >= self.max_failures:
+            self._quarantine(msg_key, f"{message_item['failures']} failed executions", now)
+            return msg_key
+        if fp_key is None:
+            return None
+        # One key per window, so the distinct set starts empty in every window
+        window = int(now // self.fingerprint_window_seconds)
+        window_item = self.store.increment(
+            f"fpw#{fp_key[3:]}#{window}",
+            {"correlation_ids": {msg_key}},
+            common,
+            expires_at=(window + 2) * self.fingerprint_window_seconds,
+        )
+        distinct = len(window_item.get("correlation_ids", ()))
+        if distinct >= self.max_fingerprint_failures:
+            reason = f"{distinct} messages failed with this error within {self.fingerprint_window_seconds}s"
+            self._quarantine(fp_key, reason, now, self.fingerprint_ttl_seconds)
+            return fp_key
+        return None
+
+    def check(self, messages: Sequence[Dict[str, Any]]) -> List[Optional[str]]:
+        """Per message, the quarantined key that holds it back (message first), else None."""
+        now = self.clock()
+        pairs = [(message_key(message), fingerprint_key(message)) for message in messages]
+        with self._lock:
+            if len(self._cache) > 50_000:
+                self._cache = {key: entry for key, entry in self._cache.items() if now - entry[0] < self.cache_seconds}
+            cached = {key: entry[1] for key, entry in self._cache.items() if now - entry[0] < self.cache_seconds}
+        missing = {key for pair in pairs for key in pair if key is not None and key not in cached}
+        if missing:
+            found = self.store.get_many(sorted(missing))
+            fresh = {key: (found[key].get("reason") or "quarantined") if found.get(key, {}).get("quarantined") else None for key in missing}
+            with self._lock:
+                for key, reason in fresh.items():
+                    self._cache[key] = (now, reason)
+            cached.update(fresh)
+        return [msg_key if cached.get(msg_key) else fp_key if fp_key and cached.get(fp_key) else None for msg_key, fp_key in pairs]
+
+    def hold(self, message: Dict[str, Any], body: str, held_by: str) -> None:
+        """Keep a skipped delivery (and its body) for release and replay."""
+        now = self.clock()
+        msg_key, fp_key = message_key(message), fingerprint_key(message)
+        attributes: Item = {
+            "correlationId": message.get("correlationId") or "",
+            "fingerprint": fp_key[3:] if fp_key else "",
+            "expires_at": int(now) + QUARANTINE_TTL_SECONDS,
+            **_body_attributes(body),
+        }
+        if held_by != msg_key:
+            attributes.update(quarantined=1, reason=f"held by {held_by}", held_by=held_by, quarantined_at=int(now))
+        self.store.increment(msg_key, {"skipped": 1}, attributes)
+
+    def release(self, key: str) -> List[Item]:
+        """Delete ``key`` (and, for a fingerprint, the messages held under it); returns the released items."""
+        released = []
+        if key.startswith("fp#"):
+            for item in self.store.scan(held_by=key):
+                released.append(self.store.delete(item["pk"]) or item)
+        item = self.store.delete(key)
+        if item is not None:
+            released.insert(0, item)
+        with self._lock:
+            for entry in released:
+                self._cache.pop(entry["pk"], None)
+            self._cache.pop(key, None)
+        return released
+
+    def quarantined(self) -> List[Item]:
+        return sorted(self.store.scan(quarantined=1), key=lambda item: item.get("quarantined_at", 0))
+
+
+_LOCAL_STORE: Optional[LocalQuarantineStore] = None
+_QUARANTINE: Optional[Quarantine] = None
+
+
+def quarantine_from_env() -> Optional[Quarantine]:
+    """Process-wide quarantine; None unless QUARANTINE_TABLE or QUARANTINE_STORE=local is set."""
+    global _QUARANTINE, _LOCAL_STORE
+    table = os.getenv("QUARANTINE_TABLE")
+    if not table and os.getenv("QUARANTINE_STORE") != "local":
+        return None
+    if _QUARANTINE is None:
+        if table:
+            store: Any = DynamoQuarantineStore(table)
+        else:
+            if _LOCAL_STORE is None:
+                _LOCAL_STORE = LocalQuarantineStore()
+            store = _LOCAL_STORE
+        _QUARANTINE = Quarantine(
+            store,
+            max_failures=int(os.getenv("QUARANTINE_MAX_FAILURES", "3")),
+            max_fingerprint_failures=int(os.getenv("QUARANTINE_MAX_FINGERPRINT_FAILURES", "20")),
+            cache_seconds=float(os.getenv("QUARANTINE_CACHE_SECONDS", "30")),
+            fingerprint_window_seconds=int(os.getenv("QUARANTINE_FINGERPRINT_WINDOW_SECONDS", str(FINGERPRINT_WINDOW_SECONDS))),
+            fingerprint_ttl_seconds=int(os.getenv("QUARANTINE_FINGERPRINT_TTL_SECONDS", str(FINGERPRINT_TTL_SECONDS))),
+        )
+    return _QUARANTINE
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="List, release and replay quarantined DLQ messages")
+    parser.add_argument("table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    release = sub.add_parser("release")
+    release.add_argument("keys", nargs="+", help="msg#<correlationId> or fp#<fingerprint>")
+    release.add_argument("--replay-to", help="queue URL to send the released bodies to")
+    args = parser.parse_args(argv)
+
+    quarantine = Quarantine(DynamoQuarantineStore(args.table))
+    if args.command == "list":
+        for item in quarantine.quarantined():
+            item.pop("body", None)
+            print(json.dumps(item, sort_keys=True))
+        return
+    released = [item for key in args.keys for item in quarantine.release(key)]
+    replayable = [item for item in released if item.get("body")]
+    bodies = [item["body"] for item in replayable]
+    report: Dict[str, Any] = {"released": len(released), "with_body": len(bodies)}
+    if args.replay_to and bodies:
+        import boto3
+
+        import envelopes
+
+        try:
+            report["replay_requests"] = envelopes.send_batches(boto3.client("sqs"), args.replay_to, bodies)
+        except envelopes.SendError as exc:
+            # Put the unsent items back so their bodies are not lost
+            for index, _error in exc.failed:
+                item = replayable[index]
+                quarantine.store.update(item["pk"], {k: v for k, v in item.items() if k != "pk"})
+            report["replay_requests"] = exc.requests
+            report["replay_failed"] = [replayable[index]["pk"] for index, _error in exc.failed]
+            print(json.dumps(report))
+            raise SystemExit(1)
+    omitted = [item.get("correlationId") for item in released if item.get("body_omitted")]
+    if omitted:
+        # Replay these with dlq_archive.py --correlation-id
+        report["body_omitted"] = omitted
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
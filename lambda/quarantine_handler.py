@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from typing import Any, Dict
+
+import profiling
+import quarantine
+import tracing
+
+METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
+
+
+def _log(level: str, message: str, **fields: Any) -> None:
+    entry = {"level": level, "message": message, **fields}
+    print(json.dumps(entry))
+
+
+def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> None:
+    emf = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [list(dims.keys())] if dims else [[]],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dims,
+    }
+    print(json.dumps(emf))
+
+
+@profiling.profiled()
+def handler(event, _context):
+    """Catch-all workflow state: count the failed execution and quarantine repeat offenders."""
+    message: Dict[str, Any] = event.get("message", {})
+    error: Dict[str, Any] = event.get("error") or {}
+    trace = tracing.from_event(event)
+    error_name, cause = str(error.get("Error", "Unknown")), str(error.get("Cause", ""))
+    reason = f"{error_name}: {cause[:500]}"
+
+    _log("ERROR", "Triage execution failed", correlationId=message.get("correlationId"), error=reason)
+    _emit_metric("TriageExecutionFailed", 1, action="quarantine")
+
+    quarantined = None
+    store = quarantine.quarantine_from_env()
+    if store is not None and quarantine.is_infrastructure_error(error_name, cause):
+        # Throttling, timeouts and outages would quarantine healthy messages
+        _log("INFO", "Failure not counted against the message", correlationId=message.get("correlationId"), error=error_name)
+        _emit_metric("QuarantineNotCounted", 1, action="quarantine")
+    elif store is not None:
+        with tracing.span(trace, "quarantine", "quarantine_handler"):
+            try:
+                quarantined = store.record_failure(message, reason)
+            except Exception as exc:
+                _log("ERROR", "Quarantine store unavailable", error=str(exc))
+        if quarantined is not None:
+            _log("WARN", "Message quarantined", correlationId=message.get("correlationId"), key=quarantined)
+            _emit_metric("Quarantined", 1, scope=quarantined.split("#", 1)[0])
+
+    return {"quarantined": quarantined, "trace": trace}
@@ -0,0 +1,264 @@
+"""Pooled multi-region Bedrock clients with health-based routing.
+
+One client per region is created lazily and reused for the life of the
+process. Each region keeps a rolling window of recent calls (latency,
+errors, throttles) that yields a score; requests go to the healthiest
+eligible region and fail over to the next one on error.
+
+A region with too many recent failures is ejected for a cooldown that
+doubles on every consecutive ejection (capped). When the cooldown expires
+the region is half-open: it receives a single probe request, and is
+restored on success or ejected again on failure.
+
+``RegionPool`` exposes ``invoke_model`` so it can stand in for a plain
+``bedrock-runtime`` client; ``hedge_view`` gives hedged requests a client
+that starts from the second-best region.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
+
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+# Rejections of the request itself; another region would reject it too
+CALLER_ERROR_CODES = {"ValidationException", "AccessDeniedException", "ResourceNotFoundException"}
+# 4xx statuses that are about the region, not the request: timeouts and throttles
+_RETRYABLE_4XX = {408, 429}
+
+
+def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> None:
+    emf = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [list(dims.keys())] if dims else [[]],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dims,
+    }
+    print(json.dumps(emf))
+
+
+def _is_throttle(exc: Exception) -> bool:
+    code = getattr(exc, "response", {}).get("Error", {}).get("Code", "")
+    return code in THROTTLE_CODES
+
+
+def _is_caller_error(exc: Exception) -> bool:
+    response = getattr(exc, "response", {})
+    code = response.get("Error", {}).get("Code", "")
+    if code in THROTTLE_CODES:
+        return False
+    status = int(response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0)
+    return code in CALLER_ERROR_CODES or (400 <= status < 500 and status not in _RETRYABLE_4XX)
+
+
+class RegionHealth:
+    """Rolling window of outcomes for one region."""
+
+    def __init__(
+        self,
+        window: int = 50,
+        eject_failure_rate: float = 0.5,
+        min_samples: int = 5,
+        consecutive_failures: int = 3,
+        base_cooldown: float = 15.0,
+        max_cooldown: float = 300.0,
+    ) -> None:
+        self.samples: Deque[Tuple[float, str]] = deque(maxlen=window)
+        self.eject_failure_rate = eject_failure_rate
+        self.min_samples = min_samples
+        self.consecutive_failures = consecutive_failures
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.failure_streak = 0
+        self.ejections = 0
+        self.ejected_until: Optional[float] = None
+        self.probing = False
+
+    def _rate(self, outcome: str) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, o in self.samples if o == outcome) / len(self.samples)
+
+    @property
+    def error_rate(self) -> float:
+        return self._rate("error")
+
+    @property
+    def throttle_rate(self) -> float:
+        return self._rate("throttle")
+
+    def latency_ms(self) -> float:
+        """Median latency of successful calls (0 until one succeeds)."""
+        ok = sorted(latency for latency, outcome in self.samples if outcome == "ok")
+        return ok[len(ok) // 2] if ok else 0.0
+
+    def score(self) -> float:
+        """Lower is healthier: median latency inflated by recent failures."""
+        penalty = 1 + 4 * self.error_rate + 8 * self.throttle_rate
+        return (self.latency_ms() or 1.0) * penalty
+
+    def state(self, now: float) -> str:
+        if self.ejected_until is None:
+            return "healthy"
+        return "half_open" if now >= self.ejected_until else "ejected"
+
+    def record(self, latency_ms: float, outcome: str, now: float) -> bool:
+        """Record one call; returns True when this call ejected the region."""
+        self.samples.append((latency_ms, outcome))
+        self.probing = False
+        if outcome == "ok":
+            self.failure_streak = 0
+            if self.ejected_until is not None:
+                # Successful probe: restore and forget the bad window
+                self.ejected_until = None
+                self.ejections = 0
+                self.samples.clear()
+                self.samples.append((latency_ms, outcome))
+            return False
+        self.failure_streak += 1
+        failure_rate = self.error_rate + self.throttle_rate
+        should_eject = (
+            self.ejected_until is not None
+            or self.failure_streak >= self.consecutive_failures
+            or (len(self.samples) >= self.min_samples and failure_rate >= self.eject_failure_rate)
+        )
+        if should_eject:
+            cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self.ejections))
+            self.ejections += 1
+            self.ejected_until = now + cooldown
+        return should_eject
+
+
+class RegionPool:
+    def __init__(
+        self,
+        regions: List[str],
+        client_factory: Callable[[str], Any],
+        clock: Callable[[], float] = time.monotonic,
+        max_attempts: Optional[int] = None,
+        **health_options: Any,
+    ) -> None:
+        if not regions:
+            raise ValueError("at least one region is required")
+        self.regions = list(regions)
+        self.client_factory = client_factory
+        self.clock = clock
+        self.max_attempts = max_attempts or len(self.regions)
+        self.health = {region: RegionHealth(**health_options) for region in self.regions}
+        self._clients: Dict[str, Any] = {}
+
+    def client(self, region: str) -> Any:
+        if region not in self._clients:
+            self._clients[region] = self.client_factory(region)
+        return self._clients[region]
+
+    def route(self) -> List[str]:
+        """Regions to try, in order: one due probe, then healthy by score, then ejected as a last resort."""
+        now = self.clock()
+        probes, healthy, ejected = [], [], []
+        for region in self.regions:
+            health = self.health[region]
+            state = health.state(now)
+            if state == "healthy":
+                healthy.append(region)
+            elif state == "half_open" and not health.probing:
+                probes.append(region)
+            else:
+                ejected.append(region)
+        healthy.sort(key=lambda region: self.health[region].score())
+        ejected.sort(key=lambda region: self.health[region].ejected_until or 0.0)
+        return probes[:1] + healthy + probes[1:] + ejected
+
+    def invoke_model(self, **kwargs: Any) -> Dict[str, Any]:
+        return self._invoke(self.route(), kwargs)
+
+    def hedge_view(self) -> "_HedgeView":
+        """Client-like view whose calls start at the second-best region (for hedged requests)."""
+        return _HedgeView(self)
+
+    def _invoke(self, order: List[str], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        last_exc: Optional[Exception] = None
+        for attempt, region in enumerate(order[: self.max_attempts]):
+            health = self.health[region]
+            if health.state(self.clock()) == "half_open":
+                health.probing = True
+            started = time.perf_counter()
+            try:
+                response = self.client(region).invoke_model(**kwargs)
+            except Exception as exc:
+                if _is_caller_error(exc):
+                    # The request is at fault, not the region: do not count it or fail over
+                    health.probing = False
+                    raise
+                latency_ms = (time.perf_counter() - started) * 1000
+                outcome = "throttle" if _is_throttle(exc) else "error"
+                if health.record(latency_ms, outcome, self.clock()):
+                    _emit_metric("BedrockRegionEjected", 1, region=region)
+                print(json.dumps({"level": "WARN", "message": "Bedrock region failed", "region": region, "outcome": outcome}))
+                last_exc = exc
+                continue
+            health.record((time.perf_counter() - started) * 1000, "ok", self.clock())
+            if attempt:
+                _emit_metric("BedrockRegionFailover", attempt, region=region)
+            return response
+        assert last_exc is not None
+        raise last_exc
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = self.clock()
+        return {
+            region: {
+                "state": health.state(now),
+                "score": round(health.score(), 3),
+                "latency_ms": round(health.latency_ms(), 3),
+                "error_rate": round(health.error_rate, 3),
+                "throttle_rate": round(health.throttle_rate, 3),
+            }
+            for region, health in self.health.items()
+        }
+
+
+class _HedgeView:
+    def __init__(self, pool: RegionPool) -> None:
+        self.pool = pool
+
+    def invoke_model(self, **kwargs: Any) -> Dict[str, Any]:
+        order = self.pool.route()
+        return self.pool._invoke(order[1:] + order[:1], kwargs)
+
+
+_POOLS: Dict[Tuple[str, ...], RegionPool] = {}
+
+
+def regions_from_env() -> List[str]:
+    """BEDROCK_REGIONS (comma separated) in preference order, else the single BEDROCK_REGION."""
+    raw = os.getenv("BEDROCK_REGIONS", "")
+    regions = [region.strip() for region in raw.split(",") if region.strip()]
+    if regions:
+        return regions
+    single = os.getenv("BEDROCK_REGION") or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+    return [single or "us-east-1"]
+
+
+def pool_from_env(client_factory: Callable[[str], Any]) -> RegionPool:
+    """Process-wide pool, so regional clients survive across warm invocations."""
+    regions = tuple(regions_from_env())
+    if regions not in _POOLS:
+        _POOLS[regions] = RegionPool(
+            list(regions),
+            client_factory,
+            base_cooldown=float(os.getenv("BEDROCK_REGION_COOLDOWN_SECONDS", "15")),
+        )
+    return _POOLS[regions]
@@ -0,0 +1,213 @@
+"""Priority lanes, weighted fair scheduling and per-tenant token quotas.
+
+Messages are assigned to a lane from their ``failureCategory`` and ``source``.
+``TenantQuota`` caps the token estimate any single source may consume per
+window.
+
+Lanes only get a guaranteed share of throughput when each has its own
+queue. With ``LANE_QUEUES`` (``{"critical": "<queue url>", ...}``) the
+triage Lambda forwards each event from the shared DLQ to its lane's queue,
+and every lane queue has its own event source whose maximum concurrency
+follows the lane's weight, so a backlog in one lane cannot take the
+concurrency of another. Within one batch, ``WeightedFairScheduler`` still
+orders starts by deficit round robin; on its own it only reorders the
+records of that batch.
+
+Quota counters live in the shared counter table (``QUOTA_TABLE``, the
+``spend_governor`` table) so every container draws on the same budget.
+Without it the quota is per process, which only suits local runs.
+
+Configuration comes from the ``PRIORITY_LANES`` environment variable (JSON)::
+
+    {
+      "lanes": {"critical": 6, "standard": 3, "bulk": 1},
+      "rules": [
+        {"lane": "critical", "sources": ["payments"]},
+        {"lane": "bulk", "categories": ["VALIDATION_ERROR"]}
+      ],
+      "default_lane": "standard",
+      "tenant_token_quota": 200000,
+      "quota_window_seconds": 3600
+    }
+
+Without it there is a single lane and no quota, i.e. plain FIFO.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Union
+
+import spend_governor
+
+DEFAULT_CONFIG: Dict[str, Any] = {"lanes": {"default": 1}, "rules": [], "default_lane": "default"}
+
+
+def load_config() -> Dict[str, Any]:
+    raw = os.getenv("PRIORITY_LANES")
+    if not raw:
+        return dict(DEFAULT_CONFIG)
+    config = {**DEFAULT_CONFIG, **json.loads(raw)}
+    if config["default_lane"] not in config["lanes"]:
+        config["default_lane"] = next(iter(config["lanes"]))
+    return config
+
+
+def lane_for(message: Dict[str, Any], config: Dict[str, Any]) -> str:
+    """First matching rule wins; a rule matches on any listed source or category.
+
+    A rule naming a lane that is not configured sends its messages to the
+    default lane rather than failing every batch.
+    """
+    category = str(message.get("failureCategory") or "").upper()
+    source = str(message.get("source") or "")
+    for rule in config.get("rules", []):
+        if source in rule.get("sources", ()) or category in {c.upper() for c in rule.get("categories", ())}:
+            lane = rule.get("lane")
+            return lane if lane in config["lanes"] else config["default_lane"]
+    return config["default_lane"]
+
+
+class WeightedFairScheduler:
+    """Deficit round robin over lanes; each pop costs one unit of the lane's deficit."""
+
+    def __init__(self, weights: Dict[str, float], clock: Callable[[], float] = time.time) -> None:
+        if not weights or any(w <= 0 for w in weights.values()):
+            raise ValueError("lane weights must be positive")
+        self.weights = dict(weights)
+        self.clock = clock
+        self._order = list(weights)
+        self._queues: Dict[str, Deque[Tuple[Any, float]]] = {lane: deque() for lane in weights}
+        self._deficit = {lane: 0.0 for lane in weights}
+        self._deficit[self._order[0]] = self.weights[self._order[0]]
+        self._cursor = 0
+
+    def push(self, lane: str, item: Any, enqueued_ms: Optional[float] = None) -> None:
+        self._queues[lane].append((item, enqueued_ms if enqueued_ms is not None else self.clock() * 1000))
+
+    def depths(self) -> Dict[str, int]:
+        return {lane: len(queue) for lane, queue in self._queues.items()}
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def pop(self) -> Optional[Tuple[str, Any, float]]:
+        """Next (lane, item, enqueued_ms), or None when every lane is empty."""
+        if not len(self):
+            return None
+        while True:
+            lane = self._order[self._cursor]
+            queue = self._queues[lane]
+            if queue and self._deficit[lane] >= 1:
+                self._deficit[lane] -= 1
+                item, enqueued_ms = queue.popleft()
+                return lane, item, enqueued_ms
+            if not queue:
+                # Idle lanes do not bank credit
+                self._deficit[lane] = 0.0
+            self._cursor = (self._cursor + 1) % len(self._order)
+            next_lane = self._order[self._cursor]
+            if self._queues[next_lane]:
+                self._deficit[next_lane] += self.weights[next_lane]
+
+
+class TenantQuota:
+    """Fixed-window token budget per tenant (source)."""
+
+    def __init__(self, tokens_per_window: int, window_seconds: int = 3600, clock: Callable[[], float] = time.time):
+        self.tokens_per_window = tokens_per_window
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._usage: Dict[str, Tuple[int, int]] = {}
+
+    def try_consume(self, tenant: str, tokens: int) -> bool:
+        window = int(self.clock() // self.window_seconds)
+        used_window, used = self._usage.get(tenant, (window, 0))
+        if used_window != window:
+            used = 0
+        if used + tokens > self.tokens_per_window:
+            return False
+        self._usage[tenant] = (window, used + tokens)
+        return True
+
+    def refund(self, tenant: str, tokens: int) -> None:
+        window = int(self.clock() // self.window_seconds)
+        used_window, used = self._usage.get(tenant, (window, 0))
+        if used_window == window:
+            self._usage[tenant] = (window, max(0, used - tokens))
+
+    def remaining(self, tenant: str) -> int:
+        window = int(self.clock() // self.window_seconds)
+        used_window, used = self._usage.get(tenant, (window, 0))
+        return self.tokens_per_window - (used if used_window == window else 0)
+
+
+class SharedTenantQuota:
+    """``TenantQuota`` kept in a ``spend_governor`` counter store, shared by every container.
+
+    Items: pk="q#<window seconds>#<window index>", sk="source#<tenant>", counter ``tokens``.
+    """
+
+    def __init__(self, store: Any, tokens_per_window: int, window_seconds: int = 3600, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.tokens_per_window = tokens_per_window
+        self.window_seconds = window_seconds
+        self.clock = clock
+
+    def _key(self, tenant: str, now: float) -> Tuple[str, str]:
+        return f"q#{self.window_seconds}#{int(now // self.window_seconds)}", f"source#{tenant}"
+
+    def try_consume(self, tenant: str, tokens: int) -> bool:
+        now = self.clock()
+        pk, sk = self._key(tenant, now)
+        return self.store.add_within(pk, sk, "tokens", tokens, self.tokens_per_window, int(now) + 2 * self.window_seconds)
+
+    def refund(self, tenant: str, tokens: int) -> None:
+        now = self.clock()
+        pk, sk = self._key(tenant, now)
+        self.store.add([(pk, sk, {"tokens": -tokens}, int(now) + 2 * self.window_seconds)])
+
+    def remaining(self, tenant: str) -> int:
+        (counters,) = self.store.get_many([self._key(tenant, self.clock())])
+        return self.tokens_per_window - counters.get("tokens", 0)
+
+
+Quota = Union[TenantQuota, SharedTenantQuota]
+_QUOTAS: Dict[str, Optional[Quota]] = {}
+
+
+def quota_from_config(config: Dict[str, Any]) -> Optional[Quota]:
+    """Shared quota when QUOTA_TABLE (or QUOTA_STORE=local) is set, else one per process."""
+    table = os.getenv("QUOTA_TABLE") or ""
+    local = os.getenv("QUOTA_STORE") == "local"
+    window = int(config.get("quota_window_seconds", 3600))
+    key = json.dumps([config.get("tenant_token_quota"), window, table, local])
+    if key not in _QUOTAS:
+        quota = config.get("tenant_token_quota")
+        if not quota:
+            _QUOTAS[key] = None
+        elif table or local:
+            store = spend_governor.DynamoCounterStore(table) if table else spend_governor.LocalCounterStore()
+            _QUOTAS[key] = SharedTenantQuota(store, int(quota), window)
+        else:
+            _QUOTAS[key] = TenantQuota(int(quota), window)
+    return _QUOTAS[key]
+
+
+def lane_queues_from_env() -> Dict[str, str]:
+    """``LANE_QUEUES``: lane name -> queue URL; empty when lanes share the DLQ."""
+    return json.loads(os.getenv("LANE_QUEUES") or "{}")
+
+
+def lane_of_record(record: Dict[str, Any], lane_queues: Dict[str, str]) -> Optional[str]:
+    """The lane whose queue delivered an SQS event record, or None for the shared DLQ."""
+    # Queue ARNs and URLs both end with the queue name
+    queue_name = str(record.get("eventSourceARN") or "").rsplit(":", 1)[-1]
+    if not queue_name:
+        return None
+    for lane, url in lane_queues.items():
+        if url.rstrip("/").rsplit("/", 1)[-1] == queue_name:
+            return lane
+    return None
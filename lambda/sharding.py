@@ -0,0 +1,141 @@
+"""Fingerprint-affinity routing of DLQ messages to worker shards.
+
+A router consumes the shared DLQ and forwards each message to the queue of
+the shard that owns its error signature (``error_analytics.signature``).
+Each worker then consumes one shard queue, so messages with the same error
+keep landing on the same process and its caches (similarity index, dedupe
+filters) actually get hits.
+
+Ownership uses consistent hashing: every shard is placed on a 64-bit ring at
+``vnodes`` pseudo-random points, and a signature belongs to the first point
+clockwise from its hash. Adding or removing one of N shards moves about 1/N
+of the signatures, instead of nearly all of them as ``hash % N`` would.
+Messages already queued on a shard stay there after a rebalance; they just
+miss that worker's cache once.
+
+``SHARD_QUEUES`` maps shard names to queue URLs, e.g.
+``{"worker-a": "https://sqs.../dlq-a", "worker-b": "https://sqs.../dlq-b"}``.
+If several shards share one FIFO queue, the shard name is the message group.
+That keeps each shard's messages in order, but SQS does not pin a group to
+one consumer, so only separate queues give stable cache affinity.
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from error_analytics import signature
+
+
+def _point(label: str) -> int:
+    return int.from_bytes(hashlib.blake2b(label.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shard_key(message: Dict[str, Any]) -> str:
+    """Routing key: the error signature, so one signature maps to one shard."""
+    return signature(message)[0]
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 128) -> None:
+        self.vnodes = vnodes
+        self._nodes: List[str] = []
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def _rebuild(self) -> None:
+        ring = sorted((_point(f"{node}#{i}"), node) for node in self._nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def add(self, node: str) -> None:
+        if node not in self._nodes:
+            self._nodes.append(node)
+            self._rebuild()
+
+    def remove(self, node: str) -> None:
+        if node in self._nodes:
+            self._nodes.remove(node)
+            self._rebuild()
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _point(key))
+        return self._owners[index % len(self._owners)]
+
+    def load(self) -> Dict[str, float]:
+        """Fraction of the key space each node owns."""
+        share = {node: 0 for node in self._nodes}
+        previous = self._points[-1] - (1 << 64) if self._points else 0
+        for point, owner in zip(self._points, self._owners):
+            share[owner] += point - previous
+            previous = point
+        return {node: round(span / (1 << 64), 4) for node, span in share.items()}
+
+
+def moved_fraction(before: HashRing, after: HashRing, keys: Sequence[str]) -> float:
+    """Share of ``keys`` whose owner differs between two rings."""
+    if not keys:
+        return 0.0
+    return sum(before.node_for(key) != after.node_for(key) for key in keys) / len(keys)
+
+
+class ShardRouter:
+    """Forwards DLQ messages to the queue of the shard that owns their signature."""
+
+    def __init__(self, sqs: Any, queues: Dict[str, str], vnodes: int = 128) -> None:
+        self.sqs = sqs
+        self.queues = dict(queues)
+        self.ring = HashRing(sorted(self.queues), vnodes=vnodes)
+        self.stats: Dict[str, int] = {node: 0 for node in self.queues}
+
+    def route(self, message: Dict[str, Any]) -> str:
+        return self.ring.node_for(shard_key(message))
+
+    def _entry(self, shard: str, message: Dict[str, Any], index: int) -> Dict[str, Any]:
+        body = json.dumps(message)
+        entry = {"Id": str(index), "MessageBody": body}
+        if self.queues[shard].endswith(".fifo"):
+            entry["MessageGroupId"] = shard
+            entry["MessageDeduplicationId"] = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        return entry
+
+    def forward(self, messages: Sequence[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+        """Send each message to its shard queue, 10 per batch; returns (message, error) for failures."""
+        by_shard: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages:
+            by_shard.setdefault(self.route(message), []).append(message)
+        failed: List[Tuple[Dict[str, Any], str]] = []
+        for shard, batch in by_shard.items():
+            for start in range(0, len(batch), 10):
+                chunk = batch[start:start + 10]
+                resp = self.sqs.send_message_batch(
+                    QueueUrl=self.queues[shard], Entries=[self._entry(shard, m, i) for i, m in enumerate(chunk)]
+                )
+                for failure in resp.get("Failed", []):
+                    failed.append((chunk[int(failure["Id"])], failure.get("Message") or failure.get("Code", "")))
+                self.stats[shard] += len(chunk) - len(resp.get("Failed", []))
+        return failed
+
+    def process(self, message: Dict[str, Any]) -> None:
+        """``SqsWorker`` process callback; raising leaves the message on the source queue."""
+        failed = self.forward([message])
+        if failed:
+            raise RuntimeError(f"Forward to shard {self.route(message)} failed: {failed[0][1]}")
+
+
+def router_from_env(sqs: Any) -> Optional[ShardRouter]:
+    queues = json.loads(os.getenv("SHARD_QUEUES") or "{}")
+    if not queues:
+        return None
+    return ShardRouter(sqs, queues, vnodes=int(os.getenv("SHARD_VNODES", "128")))
@@ -0,0 +1,124 @@
+"""Near-duplicate error index (MinHash + LSH) for reusing prior decisions.
+
+Error messages are normalized (numbers, hex ids and UUIDs collapsed), split
+into word shingles and summarized by a MinHash signature. Signatures are
+banded into LSH buckets so a query only compares against entries that share
+at least one band. The index holds at most ``max_entries`` decisions and
+evicts the least recently used ones.
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_UUID = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b")
+_HEX = re.compile(r"\b0x[0-9a-f]+\b|\b[0-9a-f]{12,}\b")
+_NUM = re.compile(r"\d+")
+_TOKEN = re.compile(r"[a-z_]+|<[a-z]+>|[^\sa-z]")
+
+
+def normalize(text: str) -> str:
+    text = text.lower()
+    text = _UUID.sub("<uuid>", text)
+    text = _HEX.sub("<hex>", text)
+    return _NUM.sub("<n>", text)
+
+
+def shingles(text: str, k: int = 3) -> Set[str]:
+    tokens = _TOKEN.findall(normalize(text))
+    if len(tokens) < k:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1) -> None:
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    def signature(self, items: Set[str]) -> Tuple[int, ...]:
+        if not items:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items]
+        return tuple(min(((a * h + b) % _MERSENNE) & _MAX_HASH for h in hashes) for a, b in self._perms)
+
+
+def estimate_similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+class SimilarityIndex:
+    """Bounded MinHash/LSH index from error text to a prior decision."""
+
+    def __init__(self, max_entries: int = 5000, num_perm: int = 64, bands: int = 16, seed: int = 1) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, ...], str, Dict[str, Any]]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+        self.stats = {"queries": 0, "hits": 0, "evictions": 0, "query_ms_total": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, key: str, text: str, decision: Dict[str, Any], group: str = "") -> None:
+        """Index ``decision`` under ``key``; ``group`` restricts matches (e.g. failureCategory)."""
+        if key in self._entries:
+            self._remove(key)
+        signature = self.hasher.signature(shingles(text))
+        self._entries[key] = (signature, group, dict(decision))
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        signature, _group, _decision = self._entries.pop(key)
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, text: str, threshold: float, group: str = "") -> Optional[Tuple[str, float, Dict[str, Any]]]:
+        """Best (key, similarity, decision) at or above ``threshold``, else None."""
+        started = time.perf_counter()
+        self.stats["queries"] += 1
+        signature = self.hasher.signature(shingles(text))
+        candidates: Set[str] = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best: Optional[Tuple[str, float, Dict[str, Any]]] = None
+        for key in candidates:
+            other, other_group, decision = self._entries[key]
+            if other_group != group:
+                continue
+            similarity = estimate_similarity(signature, other)
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (key, similarity, decision)
+        if best is not None:
+            self.stats["hits"] += 1
+            self._entries.move_to_end(best[0])
+        self.stats["query_ms_total"] += (time.perf_counter() - started) * 1000
+        return best
+
+    @property
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["queries"] if self.stats["queries"] else 0.0
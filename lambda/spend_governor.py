@@ -0,0 +1,330 @@
+"""Bedrock usage accounting and a shared hourly/daily spend governor.
+
+Every Bedrock response's ``usage`` block is recorded in a counter store
+shared by all containers. Items are keyed by window and dimension:
+
+    pk="h#2025011510"  sk="total"                      hourly totals
+    pk="d#20250115"    sk="total"                      daily totals
+    pk="d#20250115"    sk="category#DOWNSTREAM_TIMEOUT" per failureCategory
+    pk="d#20250115"    sk="source#orders"              per source
+    pk="d#20250115"    sk="model#<model id>"           per model
+
+Each item counts ``calls``, ``input_tokens``, ``output_tokens`` and
+``cost_micro_usd``. One call updates all five in a single round trip.
+
+Budgets (``SPEND_HOURLY_USD``, ``SPEND_DAILY_USD``, ``SPEND_HOURLY_TOKENS``,
+``SPEND_DAILY_TOKENS``; unset means unlimited) set the adapter's mode:
+
+- ``normal``: below every budget
+- ``degraded``: a budget is used up; only the cheapest model is called, with
+  no cascade escalation and no hedging
+- ``exhausted``: a budget is exceeded by ``SPEND_HARD_FACTOR`` (default
+  1.25); Bedrock is not called, and messages get local answers (the
+  distilled classifier, or a ticket)
+
+Totals are re-read at most every ``SPEND_REFRESH_SECONDS`` (default 5), and
+a container's own spend counts immediately. Concurrent containers can
+therefore overshoot a budget by a few seconds of traffic.
+
+Stores: ``DynamoCounterStore`` (``SPEND_TABLE``; string ``pk``/``sk`` keys,
+TTL on ``expires_at``) and ``LocalCounterStore`` (``SPEND_STORE=local``),
+an in-process stand-in for tests and the local emulator. Both also offer
+``add_within``, a conditional increment that ``scheduling`` uses for
+tenant token quotas kept in the same table.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+FIELDS = ("calls", "input_tokens", "output_tokens", "cost_micro_usd")
+MODES = ("normal", "degraded", "exhausted")
+HOUR_TTL_SECONDS = 2 * 86400
+DAY_TTL_SECONDS = 90 * 86400
+
+Update = Tuple[str, str, Dict[str, int], int]  # (pk, sk, increments, expires_at)
+
+
+def hour_key(now: float) -> str:
+    return "h#" + datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%d%H")
+
+
+def day_key(now: float) -> str:
+    return "d#" + datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%d")
+
+
+class LocalCounterStore:
+    """In-process counter store with the DynamoDB store's interface."""
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.items: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def add(self, updates: Sequence[Update]) -> None:
+        with self._lock:
+            for pk, sk, increments, expires_at in updates:
+                item = self.items.setdefault((pk, sk), {})
+                for name, value in increments.items():
+                    item[name] = item.get(name, 0) + value
+                item["expires_at"] = expires_at
+
+    def add_within(self, pk: str, sk: str, field: str, value: int, limit: int, expires_at: int) -> bool:
+        with self._lock:
+            item = self.items.get((pk, sk))
+            if item is not None and item.get("expires_at", float("inf")) < self.clock():
+                item = None
+            if value > limit or (item or {}).get(field, 0) + value > limit:
+                return False
+            if item is None:
+                item = self.items[(pk, sk)] = {}
+            item[field] = item.get(field, 0) + value
+            item["expires_at"] = expires_at
+            return True
+
+    def _live(self, item: Optional[Dict[str, int]]) -> Dict[str, int]:
+        if not item or item.get("expires_at", float("inf")) < self.clock():
+            return {}
+        return {name: value for name, value in item.items() if name != "expires_at"}
+
+    def get_many(self, keys: Sequence[Tuple[str, str]]) -> List[Dict[str, int]]:
+        with self._lock:
+            return [self._live(self.items.get(key)) for key in keys]
+
+    def query(self, pk: str) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {sk: self._live(item) for (item_pk, sk), item in self.items.items() if item_pk == pk and self._live(item)}
+
+
+class DynamoCounterStore:
+    """Counters in a DynamoDB table (``pk``/``sk`` string keys, TTL attribute ``expires_at``)."""
+
+    def __init__(self, table: str, client: Any = None) -> None:
+        import boto3
+
+        self.table = table
+        self.client = client or boto3.client("dynamodb")
+
+    def add(self, updates: Sequence[Update]) -> None:
+        items = []
+        for pk, sk, increments, expires_at in updates:
+            names = {f"#f{i}": name for i, name in enumerate(increments)}
+            values = {f":v{i}": {"N": str(int(value))} for i, value in enumerate(increments.values())}
+            values[":ttl"] = {"N": str(expires_at)}
+            items.append(
+                {
+                    "Update": {
+                        "TableName": self.table,
+                        "Key": {"pk": {"S": pk}, "sk": {"S": sk}},
+                        "UpdateExpression": "ADD " + ", ".join(f"#f{i} :v{i}" for i in range(len(increments)))
+                        + " SET expires_at = :ttl",
+                        "ExpressionAttributeNames": names,
+                        "ExpressionAttributeValues": values,
+                    }
+                }
+            )
+        self.client.transact_write_items(TransactItems=items)
+
+    def add_within(self, pk: str, sk: str, field: str, value: int, limit: int, expires_at: int) -> bool:
+        """Atomically add ``value`` to ``field`` unless the total would exceed ``limit``."""
+        if value > limit:
+            return False
+        try:
+            self.client.update_item(
+                TableName=self.table,
+                Key={"pk": {"S": pk}, "sk": {"S": sk}},
+                UpdateExpression="ADD #f :v SET expires_at = :ttl",
+                ConditionExpression="attribute_not_exists(#f) OR #f <= :room",
+                ExpressionAttributeNames={"#f": field},
+                ExpressionAttributeValues={
+                    ":v": {"N": str(int(value))},
+                    ":room": {"N": str(int(limit - value))},
+                    ":ttl": {"N": str(expires_at)},
+                },
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    @staticmethod
+    def _decode(item: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        return {
+            name: int(value["N"])
+            for name, value in (item or {}).items()
+            if "N" in value and name != "expires_at"
+        }
+
+    def get_many(self, keys: Sequence[Tuple[str, str]]) -> List[Dict[str, int]]:
+        resp = self.client.batch_get_item(
+            RequestItems={self.table: {"Keys": [{"pk": {"S": pk}, "sk": {"S": sk}} for pk, sk in keys]}}
+        )
+        found = {
+            (item["pk"]["S"], item["sk"]["S"]): self._decode(item) for item in resp["Responses"].get(self.table, [])
+        }
+        return [found.get(key, {}) for key in keys]
+
+    def query(self, pk: str) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        kwargs: Dict[str, Any] = {
+            "TableName": self.table,
+            "KeyConditionExpression": "pk = :pk",
+            "ExpressionAttributeValues": {":pk": {"S": pk}},
+        }
+        while True:
+            resp = self.client.query(**kwargs)
+            for item in resp.get("Items", []):
+                out[item["sk"]["S"]] = self._decode(item)
+            if "LastEvaluatedKey" not in resp:
+                return out
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+class SpendGovernor:
+    def __init__(
+        self,
+        store: Any,
+        budgets: Optional[Dict[str, float]] = None,
+        hard_factor: float = 1.25,
+        refresh_seconds: float = 5.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        # hourly_usd / daily_usd / hourly_tokens / daily_tokens; missing or 0 means unlimited
+        self.budgets = {name: float(limit) for name, limit in (budgets or {}).items() if limit}
+        self.hard_factor = hard_factor
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._read_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _windows(self, now: float) -> Dict[str, str]:
+        return {"hourly": hour_key(now), "daily": day_key(now)}
+
+    def _refresh(self, now: float) -> Dict[str, Dict[str, int]]:
+        windows = self._windows(now)
+        with self._lock:
+            stale = now - self._read_at >= self.refresh_seconds or any(pk not in self._totals for pk in windows.values())
+        if stale:
+            pks = list(windows.values())
+            totals = dict(zip(pks, self.store.get_many([(pk, "total") for pk in pks])))
+            with self._lock:
+                self._totals = totals
+                self._read_at = now
+        with self._lock:
+            return {window: dict(self._totals.get(pk, {})) for window, pk in windows.items()}
+
+    def utilization(self) -> Dict[str, float]:
+        """Fraction of each configured budget used in the current window."""
+        if not self.budgets:
+            return {}
+        totals = self._refresh(self.clock())
+        used = {}
+        for name, limit in self.budgets.items():
+            window, _, unit = name.partition("_")
+            counters = totals.get(window, {})
+            if unit == "usd":
+                value = counters.get("cost_micro_usd", 0) / 1e6
+            else:
+                value = counters.get("input_tokens", 0) + counters.get("output_tokens", 0)
+            used[name] = round(value / limit, 4)
+        return used
+
+    def mode(self) -> str:
+        peak = max(self.utilization().values(), default=0.0)
+        if peak >= self.hard_factor:
+            return "exhausted"
+        if peak >= 1.0:
+            return "degraded"
+        return "normal"
+
+    def record(self, model_id: str, message: Dict[str, Any], usage: Dict[str, Any], cost_usd: float) -> None:
+        """Add one Bedrock call's usage to the shared counters."""
+        now = self.clock()
+        increments = {
+            "calls": 1,
+            "input_tokens": int(usage.get("input_tokens", 0)),
+            "output_tokens": int(usage.get("output_tokens", 0)),
+            "cost_micro_usd": int(round(cost_usd * 1e6)),
+        }
+        hour, day = hour_key(now), day_key(now)
+        hour_expiry, day_expiry = int(now) + HOUR_TTL_SECONDS, int(now) + DAY_TTL_SECONDS
+        self.store.add(
+            [
+                (hour, "total", increments, hour_expiry),
+                (day, "total", increments, day_expiry),
+                (day, f"category#{message.get('failureCategory') or 'UNKNOWN'}", increments, day_expiry),
+                (day, f"source#{message.get('source') or 'unknown'}", increments, day_expiry),
+                (day, f"model#{model_id}", increments, day_expiry),
+            ]
+        )
+        # Count our own spend right away instead of waiting for the next refresh
+        with self._lock:
+            for pk in (hour, day):
+                if pk in self._totals:
+                    totals = self._totals[pk]
+                    for name, value in increments.items():
+                        totals[name] = totals.get(name, 0) + value
+
+
+def usage_report(store: Any, day: str) -> Dict[str, Any]:
+    """Daily usage grouped by dimension, for ``day`` as YYYYMMDD."""
+    report: Dict[str, Any] = {"day": day, "total": {}, "category": {}, "source": {}, "model": {}}
+    for sk, counters in store.query(f"d#{day}").items():
+        if sk == "total":
+            report["total"] = counters
+        else:
+            dimension, _, value = sk.partition("#")
+            report.setdefault(dimension, {})[value] = counters
+    return report
+
+
+_LOCAL_STORE: Optional[LocalCounterStore] = None
+_GOVERNOR: Optional[SpendGovernor] = None
+
+
+def budgets_from_env() -> Dict[str, float]:
+    return {
+        name: float(os.getenv(f"SPEND_{name.upper()}") or 0)
+        for name in ("hourly_usd", "daily_usd", "hourly_tokens", "daily_tokens")
+    }
+
+
+def governor_from_env() -> Optional[SpendGovernor]:
+    """Process-wide governor; None unless SPEND_TABLE or SPEND_STORE=local is set."""
+    global _GOVERNOR, _LOCAL_STORE
+    table = os.getenv("SPEND_TABLE")
+    if not table and os.getenv("SPEND_STORE") != "local":
+        return None
+    if _GOVERNOR is None:
+        if table:
+            store: Any = DynamoCounterStore(table)
+        else:
+            if _LOCAL_STORE is None:
+                _LOCAL_STORE = LocalCounterStore()
+            store = _LOCAL_STORE
+        _GOVERNOR = SpendGovernor(
+            store,
+            budgets_from_env(),
+            hard_factor=float(os.getenv("SPEND_HARD_FACTOR", "1.25")),
+            refresh_seconds=float(os.getenv("SPEND_REFRESH_SECONDS", "5")),
+        )
+    return _GOVERNOR
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bedrock usage per category, source and model")
+    parser.add_argument("table")
+    parser.add_argument("--day", help="YYYYMMDD (default: today, UTC)")
+    args = parser.parse_args(argv)
+    day = args.day or datetime.now(timezone.utc).strftime("%Y%m%d")
+    print(json.dumps(usage_report(DynamoCounterStore(args.table), day), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
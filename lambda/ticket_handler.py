@@ -3,6 +3,10 @@ import os
 import time
 from typing import Any, Dict
 
+import decision_log
+import profiling
+import tracing
+
 
 METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
 
@@ -30,18 +34,29 @@ def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> N
     print(json.dumps(emf))
 
 
+@profiling.profiled()
 def handler(event, _context):
     message: Dict[str, Any] = event.get("message", {})
     llm: Dict[str, Any] = event.get("llm", {})
-
-    # Placeholder for ticket creation (Jira/ServiceNow/etc.)
-    _log(
-        "INFO",
-        "Ticket requested",
-        correlationId=message.get("correlationId"),
-        category=llm.get("category"),
-        recommended_action=llm.get("recommended_action"),
-    )
+    trace = tracing.from_event(event)
+
+    with tracing.span(trace, "action", "ticket_handler"):
+        # Placeholder for ticket creation (Jira/ServiceNow/etc.)
+        _log(
+            "INFO",
+            "Ticket requested",
+            correlationId=message.get("correlationId"),
+            category=llm.get("category"),
+            recommended_action=llm.get("recommended_action"),
+        )
     _emit_metric("Ticket", 1, action="ticket")
 
-    return {"status": "ticket_created"}
+    try:
+        decision_log.record_decision(message, llm, event.get("guardrails"), "TICKET")
+    except Exception as exc:
+        # The action already happened; a log write must not fail (and retry) it
+        _log("ERROR", "Decision log append failed", correlationId=message.get("correlationId"), error=str(exc))
+        _emit_metric("TriageError", 1, action="decision_log_error")
+    tracing.emit_latency_metrics(trace)
+
+    return {"status": "ticket_created", "trace": trace}
@@ -0,0 +1,128 @@
+"""Lightweight per-stage latency spans carried in the workflow input.
+
+Each handler appends spans to ``event["trace"]`` and returns the trace next to
+``message`` so the next Step Functions state receives it. Durations come from
+``time.perf_counter`` (monotonic); start times are wall-clock epoch millis so
+spans recorded in different Lambdas line up on one timeline.
+
+The action lambdas (redrive/ticket) are the final compute step and call
+``emit_latency_metrics`` to publish end-to-end and per-stage latencies.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
+
+
+def _emit_metric(name: str, value: float, unit: str = "Count", **dims: str) -> None:
+    emf = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [list(dims.keys())] if dims else [[]],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dims,
+    }
+    print(json.dumps(emf))
+
+
+def new_trace(start_ms: Optional[float] = None) -> Dict[str, Any]:
+    return {
+        "trace_id": uuid.uuid4().hex,
+        "start_ms": start_ms if start_ms is not None else time.time() * 1000,
+        "spans": [],
+    }
+
+
+def from_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Trace from the workflow input, or a fresh one for direct invocations."""
+    trace = event.get("trace")
+    if isinstance(trace, dict) and "spans" in trace:
+        return trace
+    return new_trace()
+
+
+def add_span(trace: Dict[str, Any], name: str, service: str, start_ms: float, duration_ms: float) -> None:
+    trace["spans"].append(
+        {
+            "name": name,
+            "service": service,
+            "span_id": uuid.uuid4().hex[:16],
+            "start_ms": round(start_ms, 3),
+            "duration_ms": round(duration_ms, 3),
+        }
+    )
+
+
+@contextmanager
+def span(trace: Dict[str, Any], name: str, service: str) -> Iterator[None]:
+    start_ms = time.time() * 1000
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(trace, name, service, start_ms, (time.perf_counter() - started) * 1000)
+
+
+def emit_latency_metrics(trace: Dict[str, Any]) -> None:
+    """Publish per-stage and end-to-end latency; CloudWatch aggregates them into percentiles."""
+    for recorded in trace.get("spans", []):
+        _emit_metric("StageLatency", recorded["duration_ms"], unit="Milliseconds", stage=recorded["name"])
+    _emit_metric("EndToEndLatency", time.time() * 1000 - trace["start_ms"], unit="Milliseconds")
+    if os.getenv("TRACE_EXPORT") == "otlp":
+        print(json.dumps({"level": "INFO", "message": "Trace", "otlp": to_otlp(trace)}))
+
+
+def to_otlp(trace: Dict[str, Any], service_name: str = "dlq-triage") -> Dict[str, Any]:
+    """Render the trace as an OTLP/JSON ``ExportTraceServiceRequest``."""
+    root_id = trace["trace_id"][:16]
+    end_ms = max(
+        [s["start_ms"] + s["duration_ms"] for s in trace.get("spans", [])] or [trace["start_ms"]]
+    )
+
+    def _nanos(ms: float) -> str:
+        return str(int(ms * 1_000_000))
+
+    spans = [
+        {
+            "traceId": trace["trace_id"],
+            "spanId": root_id,
+            "name": "dlq_triage",
+            "kind": 1,
+            "startTimeUnixNano": _nanos(trace["start_ms"]),
+            "endTimeUnixNano": _nanos(end_ms),
+        }
+    ]
+    for recorded in trace.get("spans", []):
+        spans.append(
+            {
+                "traceId": trace["trace_id"],
+                "spanId": recorded["span_id"],
+                "parentSpanId": root_id,
+                "name": recorded["name"],
+                "kind": 1,
+                "startTimeUnixNano": _nanos(recorded["start_ms"]),
+                "endTimeUnixNano": _nanos(recorded["start_ms"] + recorded["duration_ms"]),
+                "attributes": [{"key": "faas.name", "value": {"stringValue": recorded["service"]}}],
+            }
+        )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [{"scope": {"name": "dlq_triage.tracing"}, "spans": spans}],
+            }
+        ]
+    }
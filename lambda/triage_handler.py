@@ -1,10 +1,30 @@
 import json
 import os
+import re
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
+
+import dlq_archive
+import envelopes
+import error_analytics
+import guardrails_handler
+import lazy_json
+import payload_refs
+import profiling
+import quarantine
+import scheduling
+import tracing
+
 METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "DlqTriage")
+# Plain bodies at least this large skip full parsing; 0 always parses fully
+LAZY_DECODE_MIN_BYTES = int(os.getenv("LAZY_DECODE_MIN_BYTES", "65536"))
+# Every key _normalize reads, aliases included
+NORMALIZED_KEYS = (
+    "correlationId", "id", "failureCategory", "category", "errorMessage", "error", "timestamp", "time",
+    "stateAtFailure", "state", "redriveAttempts", "source", "service",
+)
 
 
 def _log(level: str, message: str, **fields: Any) -> None:
@@ -38,10 +58,252 @@ def _normalize(message: Dict[str, Any]) -> Dict[str, Any]:
         "timestamp": message.get("timestamp") or message.get("time") or "",
         "stateAtFailure": message.get("stateAtFailure") or message.get("state") or "FAILED",
         "redriveAttempts": int(message.get("redriveAttempts", 0)),
-        "raw": message,
+        "source": message.get("source") or message.get("service") or "unknown",
+        "raw": message.raw if isinstance(message, lazy_json.LazyEvent) else message,
     }
 
 
+def _decode(body: str) -> List[Any]:
+    """Large plain bodies come back as ``LazyEvent``s; everything else via ``envelopes``."""
+    if LAZY_DECODE_MIN_BYTES and len(body) >= LAZY_DECODE_MIN_BYTES:
+        try:
+            lazy = lazy_json.extract(body, NORMALIZED_KEYS + envelopes.ENVELOPE_KEYS)
+        except lazy_json.LazyDecodeError as exc:
+            raise envelopes.DecodeError(f"Invalid JSON: {exc}") from exc
+        if lazy is not None and not any(key in lazy for key in envelopes.ENVELOPE_KEYS):
+            return [lazy]
+    return envelopes.decode_body(body)
+
+
+def _estimate_tokens(payload: Any) -> int:
+    size = len(payload.raw.text) if isinstance(payload, lazy_json.LazyEvent) else len(json.dumps(payload))
+    return max(1, size // 4)
+
+
+def _raw_text(payload: Any) -> str:
+    """This event's own JSON."""
+    if isinstance(payload, lazy_json.LazyEvent):
+        return payload.raw.text
+    return json.dumps(payload)
+
+
+def _archive_body(record: Dict[str, Any], payload: Any, packed: bool) -> str:
+    """The original SQS body, or this event's own JSON when the body was packed."""
+    if not packed:
+        return record.get("body", "{}")
+    return _raw_text(payload)
+
+
+def _execution_input(
+    normalized: Dict[str, Any],
+    trace: Dict[str, Any],
+    precheck: Optional[Dict[str, Any]],
+    payload: Any,
+    s3: Any,
+    bucket: str,
+) -> str:
+    """StartExecution input; a body that would not fit goes to S3 and travels as a reference."""
+    document: Dict[str, Any] = {"message": normalized, "trace": trace}
+    if precheck is not None:
+        # The workflow sees "precheck" and goes straight to the ticket path; message and trace are not repeated
+        document["precheck"] = {"llm": precheck["llm"], "guardrails": precheck["guardrails"]}
+    text = lazy_json.dumps(document)
+    if bucket and len(text.encode("utf-8")) > payload_refs.OFFLOAD_BYTES:
+        document["message"] = {**normalized, "raw": payload_refs.offload(s3, bucket, _raw_text(payload))}
+        text = lazy_json.dumps(document)
+        _emit_metric("PayloadOffloaded", 1, action="start")
+    return text
+
+
+def _precheck_view(normalized: Dict[str, Any]) -> Dict[str, Any]:
+    """The message as the guardrail rules see it; a lazy body counts by its text length."""
+    if isinstance(normalized["raw"], lazy_json.RawJson):
+        return {**normalized, "raw": normalized["raw"].text}
+    return normalized
+
+
+def _sent_ms(record: Dict[str, Any]) -> Optional[float]:
+    sent = (record.get("attributes") or {}).get("SentTimestamp")
+    return float(sent) if sent else None
+
+
+def _message_attribute(record: Dict[str, Any], name: str) -> Optional[str]:
+    return ((record.get("messageAttributes") or {}).get(name) or {}).get("stringValue")
+
+
+def _dlq_sent_ms(record: Dict[str, Any]) -> Optional[float]:
+    """Send time on the shared DLQ, carried as an attribute by forwarded events."""
+    value = _message_attribute(record, "DlqSentTimestamp")
+    return float(value) if value else None
+
+
+def _execution_name(record: Dict[str, Any], normalized: Dict[str, Any], index: int) -> str:
+    """Stable for one event of one DLQ message, so a redelivery cannot start it twice.
+
+    Forwarded events keep the DLQ message id and event index they were sent with.
+    """
+    origin = _message_attribute(record, "DlqMessageId") or record.get("messageId") or str(int(time.time()))
+    event_index = _message_attribute(record, "DlqEventIndex") or str(index)
+    correlation = re.sub(r"[^A-Za-z0-9_-]", "-", str(normalized["correlationId"]))[:30]
+    return f"dlq-{correlation}-{origin}-{event_index}"[:80]
+
+
+def _error_code(exc: Exception) -> str:
+    return getattr(exc, "response", {}).get("Error", {}).get("Code", "")
+
+
+def _add_failure(failures: List[Dict[str, str]], record: Dict[str, Any]) -> None:
+    """Report the SQS record as failed, once, so it is redelivered."""
+    failure = {"itemIdentifier": record.get("messageId")}
+    if failure["itemIdentifier"] and failure not in failures:
+        failures.append(failure)
+
+
+def _trace_for_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Start the trace at SQS send time when available, recording the queue wait.
+
+    A forwarded event starts at its DLQ send time, with the DLQ wait and the
+    lane queue wait as separate spans.
+    """
+    sent_ms = _sent_ms(record)
+    if sent_ms is None:
+        return tracing.new_trace()
+    now_ms = time.time() * 1000
+    dlq_sent_ms = _dlq_sent_ms(record)
+    if dlq_sent_ms is None:
+        trace = tracing.new_trace(start_ms=sent_ms)
+        tracing.add_span(trace, "sqs_wait", "sqs", sent_ms, max(0.0, now_ms - sent_ms))
+        return trace
+    trace = tracing.new_trace(start_ms=dlq_sent_ms)
+    tracing.add_span(trace, "sqs_wait", "sqs", dlq_sent_ms, max(0.0, sent_ms - dlq_sent_ms))
+    tracing.add_span(trace, "lane_wait", "sqs", sent_ms, max(0.0, now_ms - sent_ms))
+    return trace
+
+
+def _forward_to_lanes(
+    forwarded: Dict[str, List[Tuple[Dict[str, Any], str, int]]], lane_queues: Dict[str, str]
+) -> List[Dict[str, str]]:
+    """Send shared-DLQ events to their lane queues; returns batchItemFailures for unsent ones.
+
+    Each event carries its DLQ message id and index, so re-forwarding a
+    redelivered record yields the same execution names.
+    """
+    failures: List[Dict[str, str]] = []
+    if not forwarded:
+        return failures
+    sqs = boto3.client("sqs")
+    for lane, items in forwarded.items():
+        attributes = []
+        for record, _body, index in items:
+            sent_ms = _dlq_sent_ms(record) or _sent_ms(record) or time.time() * 1000
+            attributes.append(
+                {
+                    "DlqSentTimestamp": {"DataType": "Number", "StringValue": str(int(sent_ms))},
+                    "DlqMessageId": {"DataType": "String", "StringValue": str(record.get("messageId") or "")},
+                    "DlqEventIndex": {"DataType": "Number", "StringValue": str(index)},
+                }
+            )
+        try:
+            envelopes.send_batches(sqs, lane_queues[lane], [body for _record, body, _index in items], attributes)
+            sent = len(items)
+        except envelopes.SendError as exc:
+            _log("ERROR", "Failed to forward to lane queue", lane=lane, failed=len(exc.failed), error=str(exc))
+            _emit_metric("TriageError", 1, action="lane_forward_error")
+            sent = len(items) - len(exc.failed)
+            for index, _error in exc.failed:
+                _add_failure(failures, items[index][0])
+        except Exception as exc:
+            # Throttling, a missing queue, a network error: retry the whole lane, keep the others
+            _log("ERROR", "Failed to forward to lane queue", lane=lane, failed=len(items), error=str(exc))
+            _emit_metric("TriageError", 1, action="lane_forward_error")
+            sent = 0
+            for record, _body, _index in items:
+                _add_failure(failures, record)
+        _emit_metric("LaneForwarded", sent, lane=lane)
+    return failures
+
+
+def _hold_quarantined(store: Any, decoded: List[Any], archive: Any) -> List[Any]:
+    """Per decoded event, the quarantine key holding it back; held events start no execution."""
+    if store is None or not decoded:
+        return [None] * len(decoded)
+    try:
+        held = store.check([item[2] for item in decoded])
+    except Exception as exc:
+        # Fail open: a message is only held once its body is safely stored
+        _log("ERROR", "Quarantine check failed", error=str(exc))
+        _emit_metric("TriageError", 1, action="quarantine_error")
+        return [None] * len(decoded)
+    skipped = 0
+    for index, ((record, payload, normalized, _trace, _tokens, packed, _event), key) in enumerate(zip(decoded, held)):
+        if key is None:
+            continue
+        body = _archive_body(record, payload, packed)
+        try:
+            store.hold(normalized, body, key)
+        except Exception as exc:
+            _log("ERROR", "Quarantine hold failed", correlationId=normalized["correlationId"], error=str(exc))
+            held[index] = None
+            continue
+        skipped += 1
+        _log("WARN", "Skipped quarantined message", correlationId=normalized["correlationId"], key=key)
+        if archive is not None:
+            archive.append(dlq_archive.archive_row(normalized, body))
+    if skipped:
+        _emit_metric("QuarantineSkipped", skipped)
+        # Every skipped execution would have called Bedrock at least once
+        _emit_metric("BedrockCallsAvoided", skipped, stage="quarantine")
+        cost = float(os.getenv("QUARANTINE_EXECUTION_COST_USD") or 0)
+        if cost:
+            _emit_metric("QuarantineCostAvoided", round(skipped * cost, 6), unit="None")
+    return held
+
+
+def _defer_over_quota(quota: Any, pending: List[Any], prechecks: List[Any]) -> List[Dict[str, Any]]:
+    """Records whose events do not all fit the tenant quota; none of their events start.
+
+    Tokens are taken per record and source, and given back when another
+    source of the same record is over quota, so a packed record is admitted
+    or deferred as a whole.
+    """
+    if quota is None:
+        return []
+    needed: Dict[int, Dict[str, int]] = {}
+    records: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+    for (lane, item), precheck in zip(pending, prechecks):
+        # Rejected messages will not call Bedrock, so they do not use the tenant's token quota
+        if precheck is not None:
+            continue
+        record, _payload, normalized, _trace, tokens = item[:5]
+        sources = needed.setdefault(id(record), {})
+        sources[normalized["source"]] = sources.get(normalized["source"], 0) + tokens
+        records.setdefault(id(record), (lane, record))
+    deferred = []
+    for key, sources in needed.items():
+        lane, record = records[key]
+        taken: List[Tuple[str, int]] = []
+        try:
+            for source, tokens in sources.items():
+                if not quota.try_consume(source, tokens):
+                    break
+                taken.append((source, tokens))
+            else:
+                continue
+            for taken_source, tokens in taken:
+                quota.refund(taken_source, tokens)
+        except Exception as exc:
+            # Fail open: an unreachable quota table must not stop triage
+            _log("ERROR", "Tenant quota unavailable", error=str(exc))
+            _emit_metric("TriageError", 1, action="quota_error")
+            continue
+        # Leave it on the queue; it is redelivered after the visibility timeout
+        _log("WARN", "Tenant token quota exhausted", source=source, lane=lane)
+        _emit_metric("TenantThrottled", 1, lane=lane)
+        deferred.append(record)
+    return deferred
+
+
+@profiling.profiled()
 def handler(event, _context):
     if not isinstance(event, dict):
         _log("ERROR", "Invalid event type", event_type=str(type(event)))
@@ -50,32 +312,153 @@ def handler(event, _context):
 
     state_machine_arn = os.environ["STATE_MACHINE_ARN"]
     sfn = boto3.client("stepfunctions")
+    payload_bucket = os.getenv("PAYLOAD_BUCKET") or ""
+    s3 = boto3.client("s3") if payload_bucket else None
+
+    config = scheduling.load_config()
+    scheduler = scheduling.WeightedFairScheduler(config["lanes"])
+    quota = scheduling.quota_from_config(config)
+    failures = []
+    decoded_events = 0
+    analytics = error_analytics.analytics_from_env()
+    archive = dlq_archive.writer_from_env()
+    # Message-only guardrails before the workflow, so hopeless messages skip Bedrock
+    precheck_params = guardrails_handler.precheck_params() if os.getenv("GUARDRAILS_PRECHECK") == "1" else None
+    bedrock_calls_avoided = 0
+    quarantine_store = quarantine.quarantine_from_env()
+    lane_queues = scheduling.lane_queues_from_env()
+    forwarded: Dict[str, List[Tuple[Dict[str, Any], str, int]]] = {}
+    decoded = []
 
     for record in event.get("Records", []):
         try:
-            body = record.get("body", "{}")
-            payload = json.loads(body)
-            normalized = _normalize(payload)
-            execution_name = f"dlq-{normalized['correlationId']}-{int(time.time())}"
+            trace = _trace_for_record(record)
+            with tracing.span(trace, "normalize", "triage_handler"):
+                payloads = _decode(record.get("body", "{}"))
+                normalized_events = [_normalize(payload) for payload in payloads]
+            record_lane = scheduling.lane_of_record(record, lane_queues)
+            if lane_queues and record_lane is None:
+                # Shared DLQ: each event goes to its lane's queue, whose consumer starts the execution
+                for index, (payload, normalized) in enumerate(zip(payloads, normalized_events)):
+                    body = _archive_body(record, payload, len(payloads) > 1)
+                    forwarded.setdefault(scheduling.lane_for(normalized, config), []).append((record, body, index))
+                continue
+            decoded_events += len(payloads)
+            if analytics is not None:
+                analytics.observe_batch(normalized_events)
+            for index, (payload, normalized) in enumerate(zip(payloads, normalized_events)):
+                # Packed bodies share one SQS trace; each event gets its own copy
+                event_trace = trace if len(payloads) == 1 else {
+                    **tracing.new_trace(start_ms=trace["start_ms"]),
+                    "spans": list(trace["spans"]),
+                }
+                decoded.append(
+                    (
+                        record_lane or scheduling.lane_for(normalized, config),
+                        (record, payload, normalized, event_trace, _estimate_tokens(payload), len(payloads) > 1, index),
+                    )
+                )
+        except envelopes.DecodeError as exc:
+            _log("ERROR", "Invalid JSON in SQS message", error=str(exc))
+            _emit_metric("TriageError", 1, action="invalid_json")
+            continue
+        except Exception as exc:
+            _log("ERROR", "Failed to process message", error=str(exc))
+            _emit_metric("TriageError", 1, action="process_error")
+            continue
+
+    failures.extend(_forward_to_lanes(forwarded, lane_queues))
+
+    # Quarantined messages are held back before scheduling, so they start no execution
+    held = _hold_quarantined(quarantine_store, [item for _lane, item in decoded], archive)
+    pending = [(lane, item) for (lane, item), key in zip(decoded, held) if key is None]
+    prechecks = []
+    for _lane, (_record, _payload, normalized, trace, *_rest) in pending:
+        precheck = None
+        if precheck_params is not None:
+            with tracing.span(trace, "guardrails_precheck", "triage_handler"):
+                precheck = guardrails_handler.precheck(_precheck_view(normalized), trace, precheck_params)
+        prechecks.append(precheck)
+    # The quota admits or defers each SQS record as a whole, before any of its events start
+    deferred = _defer_over_quota(quota, pending, prechecks)
+    for record in deferred:
+        _add_failure(failures, record)
+    deferred_ids = {id(record) for record in deferred}
+    for (lane, item), precheck in zip(pending, prechecks):
+        record = item[0]
+        if id(record) in deferred_ids:
+            continue
+        # Lane wait: time on the lane queue, or only this batch's scheduling without lane queues
+        enqueued_ms = _sent_ms(record) if scheduling.lane_of_record(record, lane_queues) else None
+        scheduler.push(lane, (item, precheck), enqueued_ms=enqueued_ms)
+
+    _emit_metric("DecodedEvents", decoded_events)
+    if analytics is not None:
+        analytics.maybe_emit()
+    for lane, depth in scheduler.depths().items():
+        _emit_metric("LaneDepth", depth, lane=lane)
+
+    while True:
+        scheduled = scheduler.pop()
+        if scheduled is None:
+            break
+        lane, ((record, payload, normalized, trace, tokens, packed, index), precheck), enqueued_ms = scheduled
+        _emit_metric("LaneWaitTime", max(0.0, time.time() * 1000 - enqueued_ms), unit="Milliseconds", lane=lane)
+        execution_name = _execution_name(record, normalized, index)
+        started = time.perf_counter()
+        try:
             sfn.start_execution(
                 stateMachineArn=state_machine_arn,
                 name=execution_name,
-                input=json.dumps({"message": normalized}),
+                input=_execution_input(normalized, trace, precheck, payload, s3, payload_bucket),
             )
+        except Exception as exc:
+            if _error_code(exc) == "ExecutionAlreadyExists":
+                # An earlier delivery of this record already started this event
+                _log("INFO", "Triage execution already started", correlationId=normalized["correlationId"], executionName=execution_name)
+                # Its tokens were paid by that delivery
+                if precheck is None and quota is not None:
+                    quota.refund(normalized["source"], tokens)
+                continue
+            _log("ERROR", "Failed to start triage execution", correlationId=normalized["correlationId"], error=str(exc))
+            _emit_metric("TriageError", 1, action="start_error")
+            if precheck is None and quota is not None:
+                quota.refund(normalized["source"], tokens)
+            # Redelivery retries it; events of the record that did start are skipped by name
+            _add_failure(failures, record)
+            continue
+        # Recorded after the call, so it cannot travel in the input it sent
+        start_execution_ms = (time.perf_counter() - started) * 1000
+        _emit_metric("StageLatency", start_execution_ms, unit="Milliseconds", stage="start_execution")
+        _log(
+            "INFO",
+            "Started triage execution",
+            correlationId=normalized["correlationId"],
+            executionName=execution_name,
+            traceId=trace["trace_id"],
+            lane=lane,
+        )
+        _emit_metric("TriageStarted", 1, action="start")
+        if precheck is not None:
+            bedrock_calls_avoided += 1
             _log(
                 "INFO",
-                "Started triage execution",
+                "Guardrails precheck routed to ticket",
                 correlationId=normalized["correlationId"],
-                executionName=execution_name,
+                reasons=precheck["guardrails"]["reasons"],
             )
-            _emit_metric("TriageStarted", 1, action="start")
-        except json.JSONDecodeError as exc:
-            _log("ERROR", "Invalid JSON in SQS message", error=str(exc))
-            _emit_metric("TriageError", 1, action="invalid_json")
-            continue
-        except Exception as exc:
-            _log("ERROR", "Failed to process message", error=str(exc))
-            _emit_metric("TriageError", 1, action="process_error")
-            continue
+        if archive is not None:
+            archive.append(dlq_archive.archive_row(normalized, _archive_body(record, payload, packed)))
+
+    if precheck_params is not None:
+        _emit_metric("BedrockCallsAvoided", bedrock_calls_avoided, stage="guardrails_precheck")
+
+    if archive is not None:
+        # One write per invocation, before SQS deletes the batch
+        try:
+            archive.flush()
+        except OSError as exc:
+            _log("ERROR", "Failed to write DLQ archive", error=str(exc))
+            _emit_metric("TriageError", 1, action="archive_error")
 
-    return {"status": "ok"}
+    return {"status": "ok", "batchItemFailures": failures}
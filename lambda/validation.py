@@ -0,0 +1,85 @@
+"""Compiled pydantic validators shared by the lambdas and the local sample.
+
+Adapters are built once at import time so per-message validation skips the
+pydantic version checks and schema lookups that ``model_validate`` /
+``parse_obj`` pay on every call, and JSON is validated straight from bytes
+without an intermediate ``json.loads``.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Generic, Iterable, List, Optional, Type, TypeVar, Union
+
+from pydantic import BaseModel
+
+try:  # Pydantic v2
+    from pydantic import TypeAdapter
+    PYDANTIC_V2 = True
+except ImportError:  # pragma: no cover - Pydantic v1 fallback
+    from pydantic import parse_obj_as, parse_raw_as
+    TypeAdapter = None
+    PYDANTIC_V2 = False
+
+JsonInput = Union[str, bytes, bytearray]
+M = TypeVar("M", bound=BaseModel)
+
+
+class CompiledModel(Generic[M]):
+    """Pre-built validators for one pydantic model.
+
+    ``dict_type`` is an optional ``TypedDict`` mirroring the model. On
+    Pydantic v2 it enables the ``*_dict`` methods to validate without
+    constructing model instances; without it (or on v1) they validate the
+    model and dump it.
+    """
+
+    def __init__(self, model: Type[M], dict_type: Optional[type] = None) -> None:
+        self.model = model
+        self._has_dict_type = PYDANTIC_V2 and dict_type is not None
+        if PYDANTIC_V2:
+            self._one = TypeAdapter(model)
+            self._many = TypeAdapter(List[model])
+            if dict_type is not None:
+                self._dict_one = TypeAdapter(dict_type)
+                self._dict_many = TypeAdapter(List[dict_type])
+
+    def validate_python(self, obj: Any) -> M:
+        if PYDANTIC_V2:
+            return self._one.validate_python(obj)
+        return self.model.parse_obj(obj)
+
+    def validate_json(self, data: JsonInput) -> M:
+        if PYDANTIC_V2:
+            return self._one.validate_json(data)
+        return self.model.parse_raw(data)
+
+    def validate_many(self, objs: Iterable[Any]) -> List[M]:
+        if PYDANTIC_V2:
+            return self._many.validate_python(list(objs))
+        return parse_obj_as(List[self.model], list(objs))
+
+    def validate_json_many(self, data: JsonInput) -> List[M]:
+        """Validate a JSON array of objects in a single pass."""
+        if PYDANTIC_V2:
+            return self._many.validate_json(data)
+        return parse_raw_as(List[self.model], data)
+
+    def dump(self, instance: M) -> Dict[str, Any]:
+        if PYDANTIC_V2:
+            return instance.model_dump()
+        return instance.dict()
+
+    def validate_python_dict(self, obj: Any) -> Dict[str, Any]:
+        if self._has_dict_type:
+            return self._dict_one.validate_python(obj)
+        return self.dump(self.validate_python(obj))
+
+    def validate_json_dict(self, data: JsonInput) -> Dict[str, Any]:
+        """Lightweight path: validated plain dict, no model instance when possible."""
+        if self._has_dict_type:
+            return self._dict_one.validate_json(data)
+        return self.dump(self.validate_json(data))
+
+    def validate_json_many_dict(self, data: JsonInput) -> List[Dict[str, Any]]:
+        if self._has_dict_type:
+            return self._dict_many.validate_json(data)
+        return [self.dump(item) for item in self.validate_json_many(data)]
@@ -0,0 +1,55 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import hedging
+import quarantine
+import region_pool
+import scheduling
+import spend_governor
+
+
+@pytest.fixture(autouse=True)
+def _fresh_region_pools():
+    # Pools cache clients per process; tests swap boto3.client per test
+    region_pool._POOLS.clear()
+    yield
+    region_pool._POOLS.clear()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_hedger():
+    # The hedger keeps latency history per process
+    hedging._HEDGER = None
+    yield
+    hedging._HEDGER = None
+
+
+@pytest.fixture(autouse=True)
+def _fresh_spend_governor():
+    # The governor and the local counter store are process-wide
+    spend_governor._GOVERNOR = None
+    spend_governor._LOCAL_STORE = None
+    yield
+    spend_governor._GOVERNOR = None
+    spend_governor._LOCAL_STORE = None
+
+
+@pytest.fixture(autouse=True)
+def _fresh_quarantine():
+    quarantine._QUARANTINE = None
+    quarantine._LOCAL_STORE = None
+    yield
+    quarantine._QUARANTINE = None
+    quarantine._LOCAL_STORE = None
+
+
+@pytest.fixture(autouse=True)
+def _fresh_quotas():
+    # Quotas, and their local counter stores, are cached per process
+    scheduling._QUOTAS.clear()
+    yield
+    scheduling._QUOTAS.clear()
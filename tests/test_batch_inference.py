@@ -0,0 +1,197 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import io
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import batch_inference as bi
+
+
+def _body(i, error="Timeout calling inventory", attempts=0):
+    return json.dumps(
+        {
+            "correlationId": f"c-{i}",
+            "failureCategory": "DOWNSTREAM_TIMEOUT",
+            "errorMessage": error,
+            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "redriveAttempts": attempts,
+        }
+    )
+
+
+class StubModel:
+    """Answers REDRIVE for timeouts, garbage for 'garbled' errors and raises for 'boom'."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **kwargs):
+        self.calls += 1
+        prompt = json.loads(kwargs["body"])["messages"][0]["content"][0]["text"]
+        if "boom" in prompt:
+            raise RuntimeError("service unavailable")
+        text = "not json" if "garbled" in prompt else json.dumps(
+            {
+                "category": "SYSTEM_TRANSIENT",
+                "recommended_action": "REDRIVE",
+                "confidence": 0.95,
+                "summary": "Transient timeout.",
+                "reasoning": "Retry.",
+            }
+        )
+        body = {"content": [{"text": text}], "usage": {"input_tokens": 200, "output_tokens": 50}}
+        return {"body": io.BytesIO(json.dumps(body).encode())}
+
+
+class Recorder:
+    def __init__(self, fail_after=None):
+        self.calls = []
+        self.fail_after = fail_after
+
+    def __call__(self, decision, event):
+        if self.fail_after is not None and len(self.calls) == self.fail_after:
+            raise RuntimeError("crash")
+        self.calls.append((decision, event["message"]["correlationId"], event["guardrails"]["allow_redrive"]))
+
+
+def _run(tmp_path, actions, model=None, **kwargs):
+    backend = bi.LocalBatchBackend(model or StubModel(), str(tmp_path / "jobs"))
+    return bi.BacklogRun(str(tmp_path / "run"), backend, actions=actions, poll_seconds=0.01, **kwargs)
+
+
+def test_backlog_runs_through_guardrails_into_actions(tmp_path, capsys):
+    bodies = [_body(i) for i in range(6)] + [_body(6, attempts=5)]
+    actions = Recorder()
+
+    progress = _run(tmp_path, actions, chunk_size=3).run(bi.messages_from_bodies(bodies))
+
+    assert progress["records"] == progress["applied"] == 7
+    assert progress["chunks"] == {"applied": 3}
+    assert progress["decisions"] == {"REDRIVE": 6, "TICKET": 1, "invalid": 0}
+    # Too many redrive attempts: the guardrails block the redrive
+    assert ("TICKET", "c-6", False) in actions.calls
+    assert sorted(call[1] for call in actions.calls) == [f"c-{i}" for i in range(7)]
+    first = json.loads((tmp_path / "run" / "chunk-00000.jsonl").read_text().splitlines()[0])
+    assert first["recordId"] == "00000000000"
+    assert first["modelInput"]["messages"][0]["content"][0]["text"].startswith("Return ONLY JSON")
+
+
+def test_invalid_and_failed_records_become_tickets(tmp_path, capsys):
+    bodies = [_body(0), _body(1, error="garbled output"), _body(2, error="boom")]
+    actions = Recorder()
+
+    progress = _run(tmp_path, actions).run(bi.messages_from_bodies(bodies))
+
+    assert progress["decisions"] == {"REDRIVE": 1, "TICKET": 2, "invalid": 2}
+    assert [call[0] for call in actions.calls] == ["REDRIVE", "TICKET", "TICKET"]
+
+
+def test_packed_bodies_are_unpacked():
+    packed = json.dumps({"dlqEvents": [json.loads(_body(0)), json.loads(_body(1))]})
+
+    assert [m["correlationId"] for m in bi.messages_from_bodies([packed, _body(2)])] == ["c-0", "c-1", "c-2"]
+
+
+def test_large_bodies_are_decoded_in_full(tmp_path, capsys):
+    body = json.loads(_body(0))
+    body["document"] = "x" * 70000
+    messages = list(bi.messages_from_bodies([json.dumps(body)]))
+
+    assert messages[0]["raw"]["document"] == "x" * 70000
+    actions = Recorder()
+    progress = _run(tmp_path, actions).run(messages)
+    assert progress["applied"] == 1 and actions.calls[0][1] == "c-0"
+
+
+def test_apply_resumes_from_last_checkpoint(tmp_path, capsys):
+    bodies = [_body(i) for i in range(10)]
+    model = StubModel()
+    crashing = Recorder(fail_after=5)
+    with pytest.raises(RuntimeError):
+        _run(tmp_path, crashing, model=model, checkpoint_every=2).run(bi.messages_from_bodies(bodies))
+
+    resumed = Recorder()
+    run = _run(tmp_path, resumed, model=model, checkpoint_every=2)
+    # The failed action is not counted, so the resume starts with it
+    assert run.progress()["applied"] == 5
+    progress = run.run(bi.messages_from_bodies([]))
+
+    assert progress["applied"] == 10
+    assert [call[1] for call in resumed.calls] == [f"c-{i}" for i in range(5, 10)]
+    # Prompts were not rebuilt and no job was resubmitted
+    assert model.calls == 10
+
+
+def test_jobs_lost_with_the_process_are_resubmitted(tmp_path, capsys):
+    bodies = [_body(i) for i in range(4)]
+    first = _run(tmp_path, Recorder(), chunk_size=2)
+    first.prepare(bi.messages_from_bodies(bodies))
+    first.manifest["chunks"][0]["status"] = "submitted"
+    first.manifest["chunks"][0]["job_id"] = "local-gone"
+    first.save()
+
+    actions = Recorder()
+    run = _run(tmp_path, actions, chunk_size=2)
+    progress = run.run([])
+
+    assert progress["applied"] == 4 and len(actions.calls) == 4
+    # The resubmitted job has a new name
+    assert run.manifest["chunks"][0]["job_id"] == f"local-dlq-backlog-{run.manifest['run_id']}-00000-1"
+
+
+def test_report_compares_batch_with_realtime(tmp_path, capsys):
+    run = _run(tmp_path, Recorder())
+    run.run(bi.messages_from_bodies([_body(i) for i in range(4)]))
+
+    report = run.report(input_cost_per_1k=0.003, output_cost_per_1k=0.015, realtime_latency_ms=2000, realtime_concurrency=10)
+
+    assert report["input_tokens"] == 800 and report["output_tokens"] == 200
+    per_1k = report["per_1k_messages"]
+    # 200 in + 50 out tokens per message: $0.00135 on demand
+    assert per_1k["realtime"]["cost_usd"] == pytest.approx(1.35)
+    assert per_1k["batch"]["cost_usd"] == pytest.approx(0.675)
+    assert per_1k["realtime"]["seconds"] == 200.0
+
+
+def test_bedrock_backend_uploads_and_reads_job_output(tmp_path):
+    class FakeS3:
+        def __init__(self):
+            self.objects = {}
+
+        def upload_file(self, path, bucket, key):
+            self.objects[(bucket, key)] = Path(path).read_text()
+
+        def download_file(self, bucket, key, path):
+            Path(path).write_text(self.objects[(bucket, key)])
+
+    class FakeBedrock:
+        def __init__(self):
+            self.jobs = {}
+
+        def create_model_invocation_job(self, **kwargs):
+            arn = f"arn:aws:bedrock:us-east-1:1:model-invocation-job/job{len(self.jobs)}"
+            self.jobs[arn] = {**kwargs, "status": "Completed"}
+            return {"jobArn": arn}
+
+        def get_model_invocation_job(self, jobIdentifier):
+            return self.jobs[jobIdentifier]
+
+    s3, bedrock = FakeS3(), FakeBedrock()
+    backend = bi.BedrockBatchBackend("s3://bucket/dlq/", "arn:role", bedrock=bedrock, s3=s3)
+    source = tmp_path / "chunk-00000.jsonl"
+    source.write_text('{"recordId": "00000000000"}\n')
+
+    job = backend.submit(str(source), "model-x", "dlq-backlog-r1-00000")
+    s3.objects[("bucket", "dlq/output/job0/dlq-backlog-r1-00000.jsonl.out")] = '{"recordId": "00000000000"}\n'
+    backend.fetch(job, str(tmp_path / "out.jsonl"))
+
+    request = bedrock.jobs[job]
+    assert ("bucket", "dlq/input/dlq-backlog-r1-00000.jsonl") in s3.objects
+    assert request["inputDataConfig"]["s3InputDataConfig"]["s3Uri"] == "s3://bucket/dlq/input/dlq-backlog-r1-00000.jsonl"
+    assert request["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"] == "s3://bucket/dlq/output/"
+    assert backend.status(job) == "Completed"
+    assert (tmp_path / "out.jsonl").read_text() == '{"recordId": "00000000000"}\n'
@@ -20,7 +20,7 @@ class DummyBedrock:
         self.payload = payload
 
     def invoke_model(self, **_kwargs):
-        return {"Body": DummyBody(self.payload)}
+        return {"body": DummyBody(self.payload)}
 
 
 def test_bedrock_adapter_parses_valid_json(monkeypatch):
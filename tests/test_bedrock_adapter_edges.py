@@ -23,7 +23,7 @@ class DummyBedrock:
     def invoke_model(self, **_kwargs):
         if self.error:
             raise self.error
-        return {"Body": DummyBody(self.payload)}
+        return {"body": DummyBody(self.payload)}
 
 
 def test_bedrock_adapter_missing_required_fields(monkeypatch):
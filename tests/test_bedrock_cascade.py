@@ -0,0 +1,94 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+
+
+class DummyBody:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def read(self):
+        return json.dumps(self.payload).encode("utf-8")
+
+
+class TieredBedrock:
+    def __init__(self, outputs: dict):
+        self.outputs = outputs
+        self.calls = []
+
+    def invoke_model(self, modelId, **_kwargs):
+        self.calls.append(modelId)
+        text = self.outputs[modelId]
+        return {
+            "body": DummyBody(
+                {"content": [{"text": text}], "usage": {"input_tokens": 1000, "output_tokens": 100}}
+            )
+        }
+
+
+def _output(category: str, confidence: float) -> str:
+    return json.dumps(
+        {
+            "category": category,
+            "recommended_action": "REDRIVE",
+            "confidence": confidence,
+            "summary": "ok",
+            "reasoning": "ok",
+        }
+    )
+
+
+def _setup(monkeypatch, outputs, thresholds=None):
+    dummy = TieredBedrock(outputs)
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: dummy)
+    monkeypatch.setenv(
+        "MODEL_TIERS",
+        json.dumps(
+            [
+                {"model_id": "fast", "input_cost_per_1k": 0.001, "output_cost_per_1k": 0.005},
+                {"model_id": "large", "input_cost_per_1k": 0.003, "output_cost_per_1k": 0.015},
+            ]
+        ),
+    )
+    monkeypatch.setenv("CONFIDENCE_THRESHOLD", "0.8")
+    if thresholds:
+        monkeypatch.setenv("ESCALATION_THRESHOLDS", json.dumps(thresholds))
+    return dummy
+
+
+def test_cascade_accepts_confident_fast_tier(monkeypatch, capsys):
+    dummy = _setup(monkeypatch, {"fast": _output("SYSTEM_TRANSIENT", 0.9), "large": _output("X", 0.99)})
+    result = ba.handler({"message": {"id": "1"}}, None)
+
+    assert dummy.calls == ["fast"]
+    assert result["llm"]["category"] == "SYSTEM_TRANSIENT"
+    assert result["cascade"] == {"tier": 0, "model_id": "fast"}
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert any(m.get("CascadeEscalated") == 0 for m in metrics)
+    assert any(m.get("TierCost") == 0.0015 for m in metrics)
+
+
+def test_cascade_escalates_on_per_category_threshold(monkeypatch):
+    dummy = _setup(
+        monkeypatch,
+        {"fast": _output("SYSTEM_TRANSIENT", 0.9), "large": _output("SYSTEM_TRANSIENT", 0.97)},
+        thresholds={"SYSTEM_TRANSIENT": 0.95},
+    )
+    result = ba.handler({"message": {"id": "1"}}, None)
+
+    assert dummy.calls == ["fast", "large"]
+    assert result["llm"]["confidence"] == 0.97
+    assert result["cascade"]["tier"] == 1
+
+
+def test_cascade_escalates_invalid_output(monkeypatch):
+    dummy = _setup(monkeypatch, {"fast": "not json", "large": _output("SYSTEM_TRANSIENT", 0.5)})
+    result = ba.handler({"message": {"id": "1"}}, None)
+
+    # The last tier's answer stands even when it is below the threshold
+    assert dummy.calls == ["fast", "large"]
+    assert result["llm"]["confidence"] == 0.5
@@ -0,0 +1,81 @@
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import bedrock_standin as bs
+
+
+OUTPUT = {
+    "category": "SYSTEM_TRANSIENT",
+    "recommended_action": "REDRIVE",
+    "confidence": 0.93,
+    "summary": "ok",
+    "reasoning": "ok",
+}
+
+
+class DummyBody:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def read(self):
+        return json.dumps(self.payload).encode("utf-8")
+
+
+class DummyBedrock:
+    def invoke_model(self, **_kwargs):
+        return {"body": DummyBody({"content": [{"text": json.dumps(OUTPUT)}]})}
+
+
+def _record(monkeypatch, cassette, message):
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: DummyBedrock())
+    monkeypatch.setenv("BEDROCK_STANDIN_MODE", "record")
+    monkeypatch.setenv("BEDROCK_CASSETTE", str(cassette))
+    return ba.handler({"message": message}, None)
+
+
+def test_record_then_replay_without_network(monkeypatch, tmp_path):
+    cassette = tmp_path / "bedrock.jsonl"
+    message = {"correlationId": "c-1", "errorMessage": "Timeout"}
+    recorded = _record(monkeypatch, cassette, message)
+    assert recorded["llm"]["confidence"] == 0.93
+    assert len(cassette.read_text().splitlines()) == 1
+
+    def no_network(*_args, **_kwargs):
+        raise AssertionError("replay must not create a real client")
+
+    monkeypatch.setattr(ba.boto3, "client", no_network)
+    monkeypatch.setenv("BEDROCK_STANDIN_MODE", "replay")
+    monkeypatch.setenv("BEDROCK_STANDIN_LATENCY", "fixed:0")
+    replayed = ba.handler({"message": message}, None)
+    assert replayed["llm"] == recorded["llm"]
+
+
+def test_replay_injects_throttles_and_latency():
+    body = json.dumps({"messages": [{"role": "user", "content": [{"type": "text", "text": "p"}]}]})
+    entries = {
+        bs.fingerprint("m", body): [
+            {"response": {"content": [{"text": json.dumps(OUTPUT)}]}, "latency_ms": 250.0}
+        ]
+    }
+    slept = []
+    client = bs.ReplayClient(entries, throttle_rate=1.0, seed=1, sleep=slept.append)
+
+    with pytest.raises(bs.ClientError) as exc:
+        client.invoke_model(modelId="m", body=body)
+    assert exc.value.response["Error"]["Code"] == "ThrottlingException"
+    assert slept == [0.25]
+    assert client.stats["throttled"] == 1
+
+
+def test_replay_miss_without_default_raises():
+    client = bs.ReplayClient({}, latency=bs.LatencyModel("fixed:0"), sleep=lambda _s: None)
+    with pytest.raises(bs.ClientError) as exc:
+        client.invoke_model(modelId="m", body="{}")
+    assert exc.value.response["Error"]["Code"] == "ValidationException"
+    assert client.stats["misses"] == 1
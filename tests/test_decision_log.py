@@ -0,0 +1,121 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import decision_log as dl
+import ticket_handler as tk
+
+
+def _row(ts, category="SYSTEM_TRANSIENT", action="REDRIVE", source="svc-a", reasons=()):
+    return {
+        **dl.decision_row(
+            {"correlationId": f"c-{ts}", "failureCategory": "DOWNSTREAM_TIMEOUT", "source": source, "errorMessage": "Timeout"},
+            {"category": category, "recommended_action": action, "confidence": 0.9, "summary": "s"},
+            {"reasons": list(reasons)},
+            action,
+        ),
+        "ts": ts,
+    }
+
+
+def _log(tmp_path, rows, segment_rows=4):
+    writer = dl.DecisionLogWriter(str(tmp_path), segment_rows=segment_rows, flush_rows=3)
+    writer.extend(rows)
+    writer.close()
+    return dl.DecisionLog(str(tmp_path))
+
+
+def test_count_filters_across_segments(tmp_path):
+    log = _log(
+        tmp_path,
+        [
+            _row(100),
+            _row(110, source="svc-b"),
+            _row(120, category="DATA_QUALITY", action="TICKET"),
+            _row(130),
+            _row(140, action="TICKET", reasons=["stale_message"]),
+            _row(150, source="svc-b"),
+        ],
+    )
+    assert log.count() == 6
+    assert log.count(category="SYSTEM_TRANSIENT", action="REDRIVE") == 4
+    assert log.count(category="SYSTEM_TRANSIENT", action="REDRIVE", source="svc-b") == 2
+    assert log.count(start=110, end=140, action="REDRIVE") == 2
+    assert log.count(reason="stale_message") == 1
+    assert log.count(source=["svc-a", "svc-b"], category="MISSING") == 0
+
+
+def test_aggregations(tmp_path):
+    log = _log(
+        tmp_path,
+        [_row(0), _row(10, action="TICKET", reasons=["stale_message", "duplicate_message"]), _row(3700, action="TICKET")],
+    )
+    assert log.aggregate("action") == {"REDRIVE": 1, "TICKET": 2}
+    assert log.aggregate("reason", action="TICKET") == {"stale_message": 1, "duplicate_message": 1}
+    assert log.aggregate("time", bucket_seconds=3600) == {0: 2, 3600: 1}
+
+
+def test_unsorted_segment_time_filter_and_rows(tmp_path):
+    log = _log(tmp_path, [_row(50), _row(10), _row(30)], segment_rows=10)
+    assert log.count(start=20, end=60) == 2
+    rows = log.rows(start=20, end=40)
+    assert [r["correlation_id"] for r in rows] == ["c-30"]
+    assert rows[0]["confidence"] == 0.9 and rows[0]["reasons"] == []
+
+
+def test_ticket_handler_records_decision(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("DECISION_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(dl, "_WRITER", None)
+    tk.handler(
+        {
+            "message": {"correlationId": "c-1", "failureCategory": "DOWNSTREAM_TIMEOUT"},
+            "llm": {"category": "UNKNOWN", "recommended_action": "TICKET", "confidence": 0.0, "summary": "x"},
+            "guardrails": {"reasons": ["max_attempts_exceeded"]},
+        },
+        None,
+    )
+    capsys.readouterr()
+
+    dl.main([str(tmp_path), "--group-by", "reason"])
+    assert json.loads(capsys.readouterr().out) == {"max_attempts_exceeded": 1}
+
+
+def test_a_failing_log_write_does_not_fail_the_action(monkeypatch, capsys):
+    def broken(*_args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(dl, "record_decision", broken)
+    result = tk.handler({"message": {"correlationId": "c-1"}, "llm": {"recommended_action": "TICKET"}}, None)
+
+    assert result["status"] == "ticket_created"
+    assert '"action": "decision_log_error"' in capsys.readouterr().out
+
+
+def test_failed_flush_keeps_columns_in_line(tmp_path, monkeypatch):
+    writer = dl.DecisionLogWriter(str(tmp_path), flush_rows=1)
+    writer.append(_row(100))
+    write = writer._write
+
+    def failing_write(name, data):
+        if name == "strings.jsonl":
+            raise OSError("No space left on device")
+        write(name, data)
+
+    monkeypatch.setattr(writer, "_write", failing_write)
+    try:
+        writer.append(_row(110, source="svc-b"))
+    except OSError:
+        pass
+    else:
+        raise AssertionError("flush should fail")
+    # The next write retries the buffered row once, in line with the other columns
+    monkeypatch.setattr(writer, "_write", write)
+    writer.append(_row(120, action="TICKET"))
+
+    log = dl.DecisionLog(str(tmp_path))
+    assert log.count() == 3
+    assert [r["correlation_id"] for r in log.rows(source="svc-b")] == ["c-110"]
+    assert [r["correlation_id"] for r in log.rows(action="TICKET")] == ["c-120"]
+    assert (Path(writer.segment_dir) / "ts.q").stat().st_size == 3 * 8
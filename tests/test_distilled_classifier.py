@@ -0,0 +1,107 @@
+from pathlib import Path
+import json
+import random
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import decision_log
+import distilled_classifier as dc
+from test_bedrock_adapter import DummyBedrock
+
+TEMPLATES = [
+    ("DOWNSTREAM_TIMEOUT", "Timeout after {n} retries calling inventory-service", "SYSTEM_TRANSIENT", "REDRIVE"),
+    ("DOWNSTREAM_TIMEOUT", "Read timed out on payments gateway after {n}ms", "SYSTEM_TRANSIENT", "REDRIVE"),
+    ("VALIDATION_ERROR", "Schema mismatch: field amount expected number got string at row {n}", "DATA_ERROR", "TICKET"),
+    ("VALIDATION_ERROR", "Missing required field customerId in order {n}", "DATA_ERROR", "TICKET"),
+    ("AUTH_ERROR", "AccessDenied: role lacks kms:Decrypt for key {n}", "PERMISSION", "TICKET"),
+]
+RARE = ("UNKNOWN_ERROR", "Segmentation fault in native module {n}", "CRASH", "TICKET")
+
+
+def _corpus(count, seed=7, rare=0):
+    rng = random.Random(seed)
+    rows = [rng.choice(TEMPLATES) for _ in range(count)] + [RARE] * rare
+    return [(fc, text.format(n=rng.randint(1, 99999)), dc.label_for(cat, action)) for fc, text, cat, action in rows]
+
+
+def test_learns_repetitive_decisions_and_batches_agree():
+    model = dc.train(_corpus(400), calibration=_corpus(100, seed=8))
+    holdout = _corpus(200, seed=9)
+
+    report = dc.evaluate(model, holdout)
+    messages = [{"failureCategory": c, "errorMessage": e} for c, e, _ in holdout]
+
+    assert report["accuracy"] == 1.0
+    assert report["thresholds"]["0.9"]["coverage"] > 0.9
+    assert model.predict_batch(messages) == [model.predict(m) for m in messages]
+    assert model.predict(messages[0])[0] == holdout[0][2]
+
+
+def test_rare_labels_fold_into_other_which_never_answers():
+    model = dc.train(_corpus(300, rare=3), min_class_count=20)
+    label, _ = model.predict({"failureCategory": "UNKNOWN_ERROR", "errorMessage": "Segmentation fault in native module 7"})
+
+    assert dc.OTHER in model.labels
+    assert label == dc.OTHER
+
+
+def test_calibration_softens_overconfident_scores():
+    noisy = [(c, e, label if i % 5 else dc.label_for("SYSTEM_TRANSIENT", "REDRIVE")) for i, (c, e, label) in enumerate(_corpus(500))]
+    raw = dc.train(noisy[:400])
+    calibrated = dc.train(noisy[:400], calibration=noisy[400:])
+
+    assert calibrated.temperature > 1
+    assert dc.evaluate(calibrated, noisy[400:])["calibration_error"] < dc.evaluate(raw, noisy[400:])["calibration_error"]
+
+
+def test_artifact_round_trip(tmp_path):
+    model = dc.train(_corpus(400), summaries={dc.label_for("DATA_ERROR", "TICKET"): "Bad payload."})
+    path = tmp_path / "model.dlqc"
+
+    size = dc.save(model, str(path))
+    loaded = dc.load(str(path))
+    messages = [{"failureCategory": c, "errorMessage": e} for c, e, _ in _corpus(50, seed=3)]
+
+    assert size == path.stat().st_size < 20000
+    assert [label for label, _ in loaded.predict_batch(messages)] == [label for label, _ in model.predict_batch(messages)]
+    assert loaded.triage_output(dc.label_for("DATA_ERROR", "TICKET"), 0.97)["summary"] == "Bad payload."
+
+
+def test_train_cli_reads_decision_log(tmp_path, capsys):
+    writer = decision_log.DecisionLogWriter(str(tmp_path / "log"), flush_rows=100)
+    for i, (fc, error, label) in enumerate(_corpus(300)):
+        category, action = label.split("|")
+        llm = {"category": category, "recommended_action": action, "confidence": 0.9, "summary": f"{category} summary"}
+        writer.append(decision_log.decision_row({"correlationId": f"c-{i}", "failureCategory": fc, "errorMessage": error}, llm, None, action))
+    writer.append(decision_log.decision_row({"correlationId": "fb", "errorMessage": "x"}, ba._fallback_llm("bad"), None, "TICKET"))
+    writer.close()
+
+    dc.main(["train", str(tmp_path / "log"), "--out", str(tmp_path / "model.dlqc"), "--min-class-count", "5"])
+    report = json.loads(capsys.readouterr().out)
+
+    assert report["holdout"]["accuracy"] == 1.0
+    assert dc.OTHER not in report["labels"] and len(report["labels"]) == 3
+    assert report["latency"]["predict_us_p50"] > 0
+    assert dc.load(str(tmp_path / "model.dlqc")).summaries[dc.label_for("PERMISSION", "TICKET")] == "PERMISSION summary"
+
+
+def test_adapter_answers_locally_when_confident(tmp_path, monkeypatch, capsys):
+    dc.save(dc.train(_corpus(400), calibration=_corpus(100, seed=8)), str(tmp_path / "model.dlqc"))
+    monkeypatch.setenv("DISTILLED_MODEL_PATH", str(tmp_path / "model.dlqc"))
+    monkeypatch.setenv("DISTILLED_THRESHOLD", "0.9")
+    calls = []
+    bedrock_answer = {"content": [{"text": "not json"}]}
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: calls.append(1) or DummyBedrock(bedrock_answer))
+
+    local = ba.handler({"message": {"failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": "Timeout after 3 retries calling inventory-service"}}, None)
+    remote = ba.handler({"message": {"failureCategory": "NEW", "errorMessage": "Disk quota exceeded"}}, None)
+
+    assert local["llm"]["recommended_action"] == "REDRIVE" and local["llm"]["confidence"] >= 0.9
+    assert local["distilled"]["label"] == "SYSTEM_TRANSIENT|REDRIVE"
+    assert "distilled_classify" in [span["name"] for span in local["trace"]["spans"]]
+    assert "distilled" not in remote and remote["llm"]["category"] == "UNKNOWN"
+    assert len(calls) == 1
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [m["DistilledHit"] for m in metrics if "DistilledHit" in m] == [1, 0]
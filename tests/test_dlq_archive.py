@@ -0,0 +1,217 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import dlq_archive as da
+import error_analytics
+import triage_handler as th
+from test_triage_handler import DummySfn
+
+
+def _message(i, category="DOWNSTREAM_TIMEOUT", source="orders", hour=10, error="Timeout calling inventory"):
+    return {
+        "correlationId": f"c-{i}",
+        "failureCategory": category,
+        "errorMessage": f"{error} after {i % 5} retries",
+        "timestamp": f"2025-01-15T{hour:02d}:{i % 60:02d}:00Z",
+        "source": source,
+    }
+
+
+def _archive(tmp_path, messages, segment_rows=4):
+    writer = da.ArchiveWriter(str(tmp_path), segment_rows=segment_rows, flush_rows=3)
+    writer.extend(da.archive_row(m, json.dumps(m)) for m in messages)
+    writer.close()
+    return da.DlqArchive(str(tmp_path))
+
+
+def _fixture(tmp_path, segment_rows=4):
+    messages = [
+        _message(0),
+        _message(1, source="payments"),
+        _message(2, category="VALIDATION_ERROR", error="Schema mismatch"),
+        _message(3, hour=9),
+        _message(4, hour=11),
+        _message(5),
+        _message(6, hour=10, source="payments"),
+    ]
+    return messages, _archive(tmp_path, messages, segment_rows)
+
+
+def test_filters_on_sealed_and_open_segments(tmp_path):
+    messages, archive = _fixture(tmp_path)
+    window = {"start": "2025-01-15T10:00:00", "end": "2025-01-15T11:00:00"}
+
+    assert archive.count() == 7
+    assert archive.count(category="DOWNSTREAM_TIMEOUT", **window) == 4
+    assert archive.count(category="DOWNSTREAM_TIMEOUT", source="orders", **window) == 2
+    assert archive.count(category=["VALIDATION_ERROR", "MISSING"]) == 1
+    assert archive.count(correlation_id="c-6") == 1
+    assert archive.count(correlation_id=["c-1", "c-3", "missing"]) == 2
+    fingerprint = error_analytics.signature(messages[0])[0]
+    # Digits are normalized away, so every timeout shares one fingerprint
+    assert archive.count(fingerprint=fingerprint) == 6
+    assert archive.count(fingerprint=fingerprint, source="payments", **window) == 2
+    assert archive.count(fingerprint=error_analytics.signature(messages[2])[0]) == 1
+
+
+def test_query_returns_original_bodies(tmp_path):
+    messages, archive = _fixture(tmp_path)
+
+    [record] = archive.query(correlation_id="c-3")
+    assert json.loads(record["body"]) == messages[3]
+    assert record["category"] == "DOWNSTREAM_TIMEOUT"
+    assert record["fingerprint"] == error_analytics.signature(messages[3])[0]
+    assert len(list(archive.query(limit=2))) == 2
+
+
+def test_sealed_segments_have_secondary_indexes(tmp_path):
+    _fixture(tmp_path, segment_rows=4)
+    sealed = [p for p in tmp_path.iterdir() if json.loads((p / "meta.json").read_text())["sealed"]]
+
+    assert len(sealed) == 1
+    assert all((sealed[0] / f"{col}.sidx").exists() for col in da.INDEXED)
+    # The hour-9 message makes the sealed segment unsorted, so time uses the index
+    assert not json.loads((sealed[0] / "meta.json").read_text())["sorted"]
+
+
+def test_replay_streams_in_batches(tmp_path):
+    messages, archive = _fixture(tmp_path)
+    batches = []
+
+    stats = archive.replay(batches.append, batch_size=2, category="DOWNSTREAM_TIMEOUT")
+
+    assert stats["replayed"] == 6 and stats["batches"] == 3
+    assert [len(b) for b in batches] == [2, 2, 2]
+    assert {json.loads(body)["correlationId"] for batch in batches for body in batch} == {
+        m["correlationId"] for m in messages if m["failureCategory"] == "DOWNSTREAM_TIMEOUT"
+    }
+
+
+def test_sqs_sender_uses_send_message_batch(tmp_path):
+    messages, archive = _fixture(tmp_path)
+    calls = []
+
+    class Sqs:
+        def send_message_batch(self, QueueUrl, Entries):
+            calls.append((QueueUrl, Entries))
+            return {"Successful": Entries}
+
+    archive.replay(da.sqs_sender(Sqs(), "https://queue"), batch_size=100)
+
+    assert [len(entries) for _url, entries in calls] == [7]
+    assert calls[0][0] == "https://queue"
+
+
+def test_triage_handler_archives_started_events(monkeypatch, tmp_path):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("DLQ_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(da, "_WRITER", None)
+    packed = json.dumps({"dlqEvents": [_message(1), _message(2)]})
+
+    th.handler({"Records": [{"messageId": "m-1", "body": json.dumps(_message(0))}, {"messageId": "m-2", "body": packed}]}, None)
+
+    archive = da.DlqArchive(str(tmp_path))
+    assert archive.count() == 3
+    [record] = archive.query(correlation_id="c-2")
+    assert json.loads(record["body"]) == _message(2)
+
+
+def _metas(tmp_path):
+    return {p.name: json.loads((p / "meta.json").read_text()) for p in tmp_path.iterdir() if (p / "meta.json").exists()}
+
+
+def test_segments_seal_and_index_on_age(tmp_path):
+    now = [1000.0]
+    writer = da.ArchiveWriter(str(tmp_path), flush_rows=1 << 30, segment_seconds=60, clock=lambda: now[0])
+    writer.extend(da.archive_row(m, json.dumps(m)) for m in [_message(0), _message(1)])
+    writer.flush()
+    now[0] += 60
+    writer.append(da.archive_row(_message(2), json.dumps(_message(2))))
+    writer.flush()
+
+    [meta] = _metas(tmp_path).values()
+    assert meta["sealed"] and meta["rows"] == 3
+    assert da.DlqArchive(str(tmp_path)).count(correlation_id="c-1") == 1
+
+
+def test_compaction_merges_small_segments_into_indexed_ones(tmp_path):
+    messages = [_message(i, hour=10 + i % 3) for i in range(9)]
+    for part, chunk in enumerate((messages[:3], messages[3:5], messages[5:])):
+        writer = da.ArchiveWriter(str(tmp_path), flush_rows=1, segment_seconds=900, clock=lambda: 1000.0)
+        writer.extend(da.archive_row(m, json.dumps(m)) for m in chunk)
+        if part < 2:
+            writer.seal()
+    archive = da.DlqArchive(str(tmp_path))
+    # The last writer's segment is still open; too recent to take over
+    assert archive.compact(idle_seconds=3600, clock=lambda: 2000.0)["segments_merged"] == 2
+    assert archive.compact(idle_seconds=3600, clock=lambda: 1000.0 + 3600)["segments_merged"] == 2
+
+    metas = _metas(tmp_path)
+    assert len(metas) == 1 and all(meta["sealed"] for meta in metas.values())
+    assert sum(meta["rows"] for meta in metas.values()) == 9
+    # Sealed with secondary indexes, so lookups binary-search instead of scanning
+    assert all((tmp_path / name / f"{col}.sidx").exists() for name in metas for col in da.INDEXED)
+    assert archive.count(correlation_id=["c-4", "c-8"]) == 2
+    assert archive.count(fingerprint=error_analytics.signature(messages[0])[0]) == 9
+    [record] = archive.query(correlation_id="c-7")
+    assert json.loads(record["body"]) == messages[7]
+
+
+def test_interrupted_compaction_never_shows_rows_twice(tmp_path):
+    for chunk in ([_message(0), _message(1)], [_message(2)]):
+        writer = da.ArchiveWriter(str(tmp_path))
+        writer.extend(da.archive_row(m, json.dumps(m)) for m in chunk)
+        writer.seal()
+    sources = sorted(_metas(tmp_path))
+    archive = da.DlqArchive(str(tmp_path))
+
+    # Merged segment written but not sealed yet: the sources are still the live copy
+    merged = da.ArchiveWriter(str(tmp_path), segment_rows=10, flush_rows=1, writer_id="compact-x")
+    merged.replaces = sources
+    for segment in list(archive.segments()):
+        merged.extend(segment.rows_for_writer())
+        segment.close()
+    assert archive.count() == 3
+    # Sealed but the sources not removed yet: the merged segment is the live copy
+    merged.seal()
+    assert archive.count() == 3 and archive.count(correlation_id="c-2") == 1
+
+    assert archive.compact()["leftovers_removed"] == 2
+    assert archive.count() == 3
+
+
+def test_failed_flush_keeps_columns_in_line(tmp_path, monkeypatch):
+    writer = da.ArchiveWriter(str(tmp_path), flush_rows=1 << 30)
+    writer.extend(da.archive_row(m, json.dumps(m)) for m in [_message(0), _message(1)])
+    writer.flush()
+    writer.extend(da.archive_row(m, json.dumps(m)) for m in [_message(2), _message(3)])
+    write = writer._write
+
+    def failing_write(name, data, mode="ab"):
+        if name == "bodies.bin":
+            raise OSError("No space left on device")
+        write(name, data, mode)
+
+    monkeypatch.setattr(writer, "_write", failing_write)
+    try:
+        writer.flush()
+    except OSError:
+        pass
+    else:
+        raise AssertionError("flush should fail")
+    # Retried after the failure: the rows are written once, in line with the bodies
+    monkeypatch.setattr(writer, "_write", write)
+    writer.append(da.archive_row(_message(4), json.dumps(_message(4))))
+    writer.flush()
+
+    archive = da.DlqArchive(str(tmp_path))
+    assert archive.count() == 5
+    assert (tmp_path / next(iter(_metas(tmp_path))) / "ts.q").stat().st_size == 5 * 8
+    for i in range(5):
+        [record] = archive.query(correlation_id=f"c-{i}")
+        assert json.loads(record["body"]) == _message(i)
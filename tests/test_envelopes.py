@@ -0,0 +1,163 @@
+from pathlib import Path
+import base64
+import gzip
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import envelopes
+import producer_handler as ph
+import triage_handler as th
+
+EVENT = {
+    "correlationId": "c-1",
+    "failureCategory": "DOWNSTREAM_TIMEOUT",
+    "errorMessage": "Timeout",
+    "timestamp": "2025-01-15T10:36:00Z",
+}
+
+
+def test_plain_body_decodes_to_single_event():
+    assert envelopes.decode_body(json.dumps(EVENT)) == [EVENT]
+
+
+def test_sns_wrapping_eventbridge_is_unwrapped():
+    bridge = {"detail-type": "DlqEvent", "source": "orders", "time": "2025-01-16T00:00:00Z", "detail": {"correlationId": "c-2"}}
+    sns = {"Type": "Notification", "MessageId": "m", "Message": json.dumps(bridge)}
+
+    events = envelopes.decode_body(json.dumps(sns))
+
+    assert events == [{"correlationId": "c-2", "source": "orders", "time": "2025-01-16T00:00:00Z"}]
+
+
+def test_cloudevents_data_base64_gzip():
+    data = base64.b64encode(gzip.compress(json.dumps(EVENT).encode())).decode()
+    cloud = {"specversion": "1.0", "id": "e-1", "source": "billing", "type": "dlq", "data_base64": data}
+
+    events = envelopes.decode_body(json.dumps(cloud))
+
+    assert events[0]["correlationId"] == "c-1"
+    assert events[0]["source"] == "billing"
+
+
+def test_encode_decode_roundtrip_gzip_packed():
+    events = [{**EVENT, "correlationId": f"c-{i}"} for i in range(250)]
+
+    bodies = envelopes.encode_events(events, compression="gzip", max_events=100)
+
+    assert len(bodies) == 3
+    decoded = [e for body in bodies for e in envelopes.decode_body(body)]
+    assert decoded == events
+
+
+def test_encode_splits_to_respect_max_bytes():
+    events = [{**EVENT, "errorMessage": "x" * 500, "correlationId": str(i)} for i in range(20)]
+
+    bodies = envelopes.encode_events(events, max_bytes=2000)
+
+    assert all(len(b) <= 2000 for b in bodies)
+    assert [e["correlationId"] for b in bodies for e in envelopes.decode_body(b)] == [str(i) for i in range(20)]
+
+
+def test_zstd_roundtrip_when_available():
+    pytest.importorskip("zstandard")
+    bodies = envelopes.encode_events([EVENT, EVENT], compression="zstd")
+    assert envelopes.decode_body(bodies[0]) == [EVENT, EVENT]
+
+
+def test_garbage_body_raises_decode_error():
+    with pytest.raises(envelopes.DecodeError):
+        envelopes.decode_body("not json")
+
+
+def test_decompression_is_bounded():
+    bomb = gzip.compress(b"[" + b" " * (envelopes.MAX_DECOMPRESSED_BYTES + 1) + b"]")
+    assert len(bomb) < envelopes.MAX_BODY_BYTES
+    with pytest.raises(envelopes.DecodeError, match="expands beyond"):
+        envelopes.decode_body(base64.b64encode(bomb).decode())
+    with pytest.raises(envelopes.DecodeError):
+        envelopes.decode_body(base64.b64encode(gzip.compress(json.dumps(EVENT).encode())[:-6]).decode())
+    # Concatenated gzip members still decode, as with gzip.decompress
+    members = gzip.compress(b'[{"correlationId": "a"},') + gzip.compress(b'{"correlationId": "b"}]')
+    assert envelopes.decode_body(base64.b64encode(members).decode()) == [{"correlationId": "a"}, {"correlationId": "b"}]
+
+
+def test_zstd_corrupt_or_oversized_frames_raise_decode_error():
+    zstandard = pytest.importorskip("zstandard")
+    bomb = zstandard.ZstdCompressor().compress(b" " * (envelopes.MAX_DECOMPRESSED_BYTES + 1))
+    with pytest.raises(envelopes.DecodeError, match="expands beyond"):
+        envelopes.decode_body(base64.b64encode(bomb).decode())
+    frame = zstandard.ZstdCompressor().compress(json.dumps(EVENT).encode())
+    with pytest.raises(envelopes.DecodeError):
+        envelopes.decode_body(base64.b64encode(frame[:-3] + b"\xff\xff\xff").decode())
+
+
+class DummySfn:
+    def __init__(self):
+        self.calls = []
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.calls.append(json.loads(input))
+        return {"executionArn": "arn"}
+
+
+class DummySqs:
+    def __init__(self):
+        self.batches = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append(Entries)
+        return {"Successful": Entries}
+
+
+def test_producer_packs_and_triage_unpacks(monkeypatch):
+    sqs = DummySqs()
+    monkeypatch.setattr(ph.boto3, "client", lambda service: sqs)
+    monkeypatch.setenv("DLQ_QUEUE_URL", "https://example.com/queue")
+    monkeypatch.setenv("PRODUCER_ENCODING", "gzip")
+    monkeypatch.setenv("PRODUCER_PACK_SIZE", "5")
+    messages = [{**EVENT, "correlationId": f"c-{i}"} for i in range(12)]
+
+    result = ph.handler({"messages": messages}, None)
+
+    assert result["requests"] == 1
+    records = [{"messageId": e["Id"], "body": e["MessageBody"]} for e in sqs.batches[0]]
+    assert len(records) == 3
+
+    sfn = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: sfn)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn")
+    th.handler({"Records": records}, None)
+
+    assert sorted(c["message"]["correlationId"] for c in sfn.calls) == sorted(m["correlationId"] for m in messages)
+    assert len({c["trace"]["trace_id"] for c in sfn.calls}) == 12
+
+
+def test_send_batches_resends_failed_entries_and_raises_on_the_rest():
+    class FlakySqs:
+        def __init__(self):
+            self.sent = []
+            self.throttled = False
+
+        def send_message_batch(self, QueueUrl, Entries):
+            failed = []
+            for entry in Entries:
+                if entry["MessageBody"] == "too-big":
+                    failed.append({"Id": entry["Id"], "Code": "InvalidParameterValue", "SenderFault": True})
+                elif entry["MessageBody"] == "flaky" and not self.throttled:
+                    self.throttled = True
+                    failed.append({"Id": entry["Id"], "Code": "InternalError", "SenderFault": False})
+                else:
+                    self.sent.append(entry["MessageBody"])
+            return {"Successful": [], "Failed": failed}
+
+    sqs = FlakySqs()
+    assert envelopes.send_batches(sqs, "https://queue", ["a", "flaky", "b"], backoff_seconds=0) == 2
+    assert sorted(sqs.sent) == ["a", "b", "flaky"]
+
+    with pytest.raises(envelopes.SendError) as excinfo:
+        envelopes.send_batches(FlakySqs(), "https://queue", ["a", "too-big"], backoff_seconds=0)
+    assert excinfo.value.failed == [(1, "InvalidParameterValue")] and excinfo.value.requests == 1
@@ -0,0 +1,108 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import error_analytics as ea
+
+
+def _event(i, error):
+    return {"correlationId": f"c-{i}", "failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": error}
+
+
+def _stream(n):
+    # One storm signature, one steady one and a long tail of unique errors
+    for i in range(n):
+        if i % 2 == 0:
+            yield _event(i, f"Timeout calling inventory after {i % 5} retries")
+        elif i % 5 == 1:
+            yield _event(i, "Connection reset by peer")
+        else:
+            yield _event(i, f"unique failure mode {chr(97 + i % 26)}{chr(97 + i // 26 % 26)}{chr(97 + i // 676 % 26)}")
+
+
+def test_signature_ignores_numbers_and_ids():
+    a, _ = ea.signature(_event(1, "Timeout after 3 retries (req 0194e12c-13c4-7358-bf00-d40b0d69497b)"))
+    b, _ = ea.signature(_event(2, "Timeout after 5 retries (req 0194e12c-13c4-7358-bf00-aaaaaaaaaaaa)"))
+    assert a == b
+
+
+def test_count_min_never_underestimates():
+    sketch = ea.CountMinSketch(width=64, depth=4)
+    for i in range(1000):
+        sketch.add(f"k{i % 100}")
+    assert all(sketch.estimate(f"k{i}") >= 10 for i in range(100))
+
+
+def test_heavy_hitters_and_distinct_counts():
+    stats = ea.WindowStats(0, capacity=20)
+    for event in _stream(20000):
+        stats.observe(event)
+
+    snapshot = stats.snapshot(k=2)
+
+    assert snapshot["top"][0]["label"] == "DOWNSTREAM_TIMEOUT: timeout calling inventory after <n> retries"
+    assert snapshot["top"][0]["count"] >= 10000
+    assert snapshot["top"][1]["label"] == "DOWNSTREAM_TIMEOUT: connection reset by peer"
+    assert abs(snapshot["distinct_correlation_ids"] - 20000) / 20000 < 0.05
+    assert len(stats.sketch.table) == 2048 * 4
+    assert len(stats.heavy.candidates) <= 20
+
+
+def test_merged_snapshots_match_single_stream():
+    events = list(_stream(4000))
+    left, right, whole = ea.WindowStats(0), ea.WindowStats(0), ea.WindowStats(0)
+    for i, event in enumerate(events):
+        (left if i % 2 else right).observe(event)
+        whole.observe(event)
+
+    merged = ea.merge_snapshots([json.loads(json.dumps(left.snapshot())), right.snapshot()])
+    expected = whole.snapshot()
+
+    assert merged["events"] == 4000
+    assert merged["distinct_correlation_ids"] == expected["distinct_correlation_ids"]
+    assert merged["top"][:2] == expected["top"][:2]
+
+
+def test_window_rollover_emits_final_snapshot(capsys):
+    now = [0.0]
+    analytics = ea.ErrorAnalytics(window_seconds=60, emit_seconds=10, clock=lambda: now[0])
+    analytics.observe_batch([_event(1, "boom")])
+    assert analytics.maybe_emit()
+    now[0] = 5.0
+    assert not analytics.maybe_emit()
+    capsys.readouterr()
+
+    now[0] = 61.0
+    analytics.observe_batch([_event(2, "boom")])
+
+    logs = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    final = [entry for entry in logs if entry.get("message") == "Error signature snapshot"]
+    assert final and final[0]["final"] and final[0]["snapshot"]["events"] == 1
+    assert "sketches" in final[0]["snapshot"]
+    assert analytics.current.window_start == 60
+
+
+def test_metrics_are_deltas_without_signature_dimensions(capsys):
+    now = [0.0]
+    analytics = ea.ErrorAnalytics(window_seconds=60, emit_seconds=10, clock=lambda: now[0])
+    analytics.observe_batch(list(_stream(30)))
+    analytics.maybe_emit()
+    now[0] = 20.0
+    analytics.observe_batch([_event(1, "boom"), {"correlationId": "x", "errorMessage": "boom"}])
+    analytics.maybe_emit()
+    now[0] = 30.0
+    analytics.maybe_emit()
+
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [m["DlqEvents"] for m in metrics if "DlqEvents" in m] == [30, 2, 0]
+    assert [(m["category"], m["ErrorCategoryEvents"]) for m in metrics if "ErrorCategoryEvents" in m] == [
+        ("DOWNSTREAM_TIMEOUT", 30),
+        ("DOWNSTREAM_TIMEOUT", 1),
+        ("UNKNOWN", 1),
+    ]
+    dimensions = {d for m in metrics for group in m["_aws"]["CloudWatchMetrics"] for ds in group["Dimensions"] for d in ds}
+    assert dimensions == {"category"}
+    # Distinct counts are only emitted when the window closes
+    assert not [m for m in metrics if "DistinctCorrelationIds" in m]
@@ -0,0 +1,111 @@
+from pathlib import Path
+import json
+import os
+import sys
+import threading
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import guardrail_policy as gp
+
+
+def _policy(*rules):
+    return {"name": "t", "rules": list(rules)}
+
+
+ATTEMPTS = {"id": "max_attempts_exceeded", "check": "less_than", "field": "message.redriveAttempts", "value": 2}
+COMPLETED = {
+    "id": "already_completed",
+    "check": "not_equals",
+    "field": "message.stateAtFailure",
+    "value": "COMPLETED",
+    "outcome": "SUPPRESS",
+}
+TOKENS = {"id": "token_budget_exceeded", "check": "token_budget", "field": "message", "value": {"param": "budget", "default": 5}}
+
+
+def test_short_circuit_stops_at_first_failure():
+    evaluator = gp.PolicyEvaluator(_policy(ATTEMPTS, TOKENS))
+    verdict = evaluator.evaluate({"message": {"redriveAttempts": 3, "payload": "x" * 100}})
+
+    assert not verdict.allowed
+    assert verdict.reasons == ["max_attempts_exceeded"]
+    assert evaluator.stats()["token_budget_exceeded"]["evaluated"] == 0
+
+    full = evaluator.evaluate({"message": {"redriveAttempts": 3, "payload": "x" * 100}}, short_circuit=False)
+    assert full.reasons == ["max_attempts_exceeded", "token_budget_exceeded"]
+
+
+def test_root_evaluates_only_message_rules():
+    confidence = {"id": "low_confidence", "check": "at_least", "field": "llm.confidence", "value": 0.8}
+    evaluator = gp.PolicyEvaluator(_policy(confidence, ATTEMPTS))
+
+    assert evaluator.evaluate({"message": {"redriveAttempts": 0}}, root="message").allowed
+    assert evaluator.evaluate({"message": {"redriveAttempts": 3}}, root="message").reasons == ["max_attempts_exceeded"]
+    assert evaluator.stats()["low_confidence"]["evaluated"] == 0
+
+
+def test_params_override_defaults():
+    evaluator = gp.PolicyEvaluator(_policy(TOKENS))
+    assert not evaluator.evaluate({"message": {"payload": "x" * 100}}).allowed
+    assert evaluator.evaluate({"message": {"payload": "x" * 100}, "params": {"budget": 1000}}).allowed
+
+
+def test_reorders_by_selectivity_within_same_outcome_only():
+    never_fails = {"id": "never", "check": "less_than", "field": "message.redriveAttempts", "value": 100}
+    evaluator = gp.PolicyEvaluator(_policy(never_fails, ATTEMPTS, COMPLETED), reorder_every=8)
+    for _ in range(64):
+        evaluator.evaluate({"message": {"redriveAttempts": 5, "stateAtFailure": "COMPLETED"}})
+
+    # The always-failing attempts rule moves ahead; the SUPPRESS rule stays behind the TICKET run
+    assert evaluator.order() == ["max_attempts_exceeded", "never", "already_completed"]
+    verdict = evaluator.evaluate({"message": {"redriveAttempts": 5, "stateAtFailure": "COMPLETED"}})
+    assert verdict.outcome == "TICKET"
+
+
+def test_reorder_does_not_disturb_concurrent_evaluations():
+    evaluator = gp.PolicyEvaluator(_policy(ATTEMPTS, COMPLETED, TOKENS), reorder_every=1)
+    message = {"message": {"redriveAttempts": 5, "stateAtFailure": "COMPLETED", "payload": "x" * 100}}
+    results = []
+
+    def run():
+        for _ in range(2000):
+            results.append(tuple(evaluator.evaluate(message, short_circuit=False).reasons))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    # Switch threads as often as possible so evaluations overlap reorders
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    # Every evaluation saw every rule, whatever order it ran them in
+    assert {frozenset(reasons) for reasons in results} == {frozenset(r["id"] for r in (ATTEMPTS, COMPLETED, TOKENS))}
+    assert all(len(reasons) == 3 for reasons in results)
+
+
+def test_policy_store_hot_reloads_and_keeps_stats(tmp_path):
+    path = tmp_path / "policy.json"
+    path.write_text(json.dumps(_policy(ATTEMPTS)))
+    now = [0.0]
+    store = gp.PolicyStore(str(path), check_interval=10, clock=lambda: now[0])
+    store.get().evaluate({"message": {"redriveAttempts": 0}})
+
+    path.write_text(json.dumps(_policy(ATTEMPTS, COMPLETED)))
+    os.utime(path, ns=(1, 10**18))
+    assert len(store.get().rules) == 1  # not re-checked before the interval
+
+    now[0] = 11.0
+    reloaded = store.get()
+    assert [r.id for r in reloaded.rules] == ["max_attempts_exceeded", "already_completed"]
+    assert reloaded.stats()["max_attempts_exceeded"]["evaluated"] == 1
+
+    path.write_text("{not json")
+    os.utime(path, ns=(1, 2 * 10**18))
+    now[0] = 22.0
+    assert store.get() is reloaded
@@ -86,3 +86,20 @@ def test_guardrails_blocks_token_budget():
     result = gh.handler(event, None)
     assert result["guardrails"]["allow_redrive"] is False
     assert "token_budget_exceeded" in result["guardrails"]["reasons"]
+
+
+def test_guardrails_reports_every_reason_and_the_estimate(monkeypatch):
+    event = {
+        "message": {"timestamp": "2000-01-01T00:00:00Z", "redriveAttempts": 5, "stateAtFailure": "FAILED"},
+        "llm": {},
+        "max_age_days": 2,
+        "max_redrive_attempts": 2,
+    }
+    result = gh.handler(event, None)["guardrails"]
+    assert {"stale_message", "max_attempts_exceeded"} <= set(result["reasons"])
+    assert result["reasons_complete"] is True and result["token_estimate"] > 0
+
+    monkeypatch.setenv("GUARDRAILS_SHORT_CIRCUIT", "1")
+    result = gh.handler(event, None)["guardrails"]
+    assert len(result["reasons"]) == 1 and result["reasons_complete"] is False
+    assert result["token_estimate"] > 0
@@ -0,0 +1,165 @@
+from pathlib import Path
+import io
+import json
+import sys
+import threading
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import hedging
+import region_pool as rp
+
+GOOD_TEXT = json.dumps(
+    {
+        "category": "SYSTEM_TRANSIENT",
+        "recommended_action": "REDRIVE",
+        "confidence": 0.9,
+        "summary": "ok",
+        "reasoning": "ok",
+    }
+)
+
+
+class SlowClient:
+    def __init__(self, name, delay, text=GOOD_TEXT):
+        self.name = name
+        self.delay = delay
+        self.text = text
+        self.calls = 0
+
+    def invoke_model(self, **_kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"body": io.BytesIO(json.dumps({"content": [{"text": self.text}], "region": self.name}).encode())}
+
+
+def _hedger(**kwargs):
+    return hedging.Hedger(**{"initial_delay_ms": 20, "min_delay_ms": 1, "max_rate": 1.0, **kwargs})
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    release = threading.Event()
+
+    result, info = _hedger().run(lambda: release.wait(2) and "primary", lambda: "hedge")
+    release.set()
+
+    assert result == "hedge"
+    assert info["hedged"] and info["winner"] == "hedge"
+    assert info["latency_ms"] < 1000
+
+
+def test_fast_primary_is_not_hedged():
+    hedge_calls = []
+    hedger = _hedger()
+
+    result, info = hedger.run(lambda: "primary", lambda: hedge_calls.append(1))
+
+    assert result == "primary"
+    assert not info["hedged"] and hedge_calls == []
+    assert hedger.stats()["hedge_rate"] == 0.0
+
+
+def test_delay_tracks_recent_primary_latency():
+    hedger = _hedger(min_samples=5, percentile=0.5)
+    for _ in range(5):
+        hedger.run(lambda: time.sleep(0.01) or "ok", lambda: "hedge")
+    time.sleep(0.01)
+
+    assert 5 <= hedger.delay_ms() < 200
+
+
+def test_hedge_rate_is_capped():
+    hedger = _hedger(max_rate=0.25, initial_delay_ms=1)
+
+    infos = [hedger.run(lambda: time.sleep(0.02) or "primary", lambda: "hedge")[1] for _ in range(8)]
+
+    assert sum(info["hedged"] for info in infos) == 2
+    assert hedger.stats()["hedged"] == 2
+
+
+def test_invalid_primary_falls_through_to_hedge():
+    result, info = _hedger(initial_delay_ms=1).run(
+        lambda: time.sleep(0.02) or None, lambda: time.sleep(0.05) or "hedge", valid=lambda r: r is not None
+    )
+
+    assert result == "hedge" and info["winner"] == "hedge"
+
+
+def test_nothing_valid_returns_primary_outcome():
+    result, info = _hedger(initial_delay_ms=1).run(
+        lambda: time.sleep(0.02) or "bad-primary", lambda: "bad-hedge", valid=lambda _r: False
+    )
+
+    assert result == "bad-primary" and info["winner"] == "primary"
+
+
+def test_hedge_view_starts_at_second_region():
+    stubs = {"us-east-1": SlowClient("us-east-1", 0), "us-west-2": SlowClient("us-west-2", 0)}
+    pool = rp.RegionPool(list(stubs), lambda region: stubs[region])
+    assert pool.route()[0] == "us-east-1"
+
+    pool.hedge_view().invoke_model(modelId="m")
+
+    assert (stubs["us-east-1"].calls, stubs["us-west-2"].calls) == (0, 1)
+
+
+def test_adapter_hedges_slow_region(monkeypatch, capsys):
+    monkeypatch.setenv("BEDROCK_HEDGING", "1")
+    monkeypatch.setenv("BEDROCK_REGIONS", "us-east-1,us-west-2")
+    monkeypatch.setenv("HEDGE_INITIAL_DELAY_MS", "30")
+    monkeypatch.setenv("HEDGE_MAX_RATE", "1")
+    stubs = {"us-east-1": SlowClient("us-east-1", 0.5), "us-west-2": SlowClient("us-west-2", 0)}
+    monkeypatch.setattr(ba, "_real_client", lambda region=None: stubs[region])
+
+    started = time.perf_counter()
+    out = ba.handler({"message": {"correlationId": "c1", "errorMessage": "Timeout"}}, None)
+    elapsed = time.perf_counter() - started
+
+    assert out["llm"]["recommended_action"] == "REDRIVE"
+    assert elapsed < 0.4
+    assert [span["name"] for span in out["trace"]["spans"]].count("invoke_model") == 1
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert next(m for m in metrics if "BedrockHedged" in m)["BedrockHedged"] == 1
+    assert next(m for m in metrics if "BedrockHedgeWon" in m)["BedrockHedgeWon"] == 1
+
+
+def test_adapter_records_usage_of_both_hedged_calls(monkeypatch):
+    monkeypatch.setenv("BEDROCK_HEDGING", "1")
+    monkeypatch.setenv("HEDGE_INITIAL_DELAY_MS", "10")
+    monkeypatch.setenv("HEDGE_MAX_RATE", "1")
+    monkeypatch.setenv("MODEL_ID", "big")
+    monkeypatch.setenv("MODEL_INPUT_COST_PER_1K", "3")
+    monkeypatch.setenv("HEDGE_MODEL_ID", "small")
+    monkeypatch.setenv("HEDGE_INPUT_COST_PER_1K", "1")
+
+    class Client:
+        def invoke_model(self, modelId, **_kwargs):
+            time.sleep(0.1 if modelId == "big" else 0)
+            body = {"content": [{"text": GOOD_TEXT}], "usage": {"input_tokens": 1000, "output_tokens": 0}}
+            return {"body": io.BytesIO(json.dumps(body).encode())}
+
+    class Governor:
+        def __init__(self):
+            self.recorded = []
+            self.done = threading.Event()
+
+        def mode(self):
+            return "normal"
+
+        def record(self, model_id, message, usage, cost):
+            self.recorded.append((model_id, cost))
+            if len(self.recorded) == 2:
+                self.done.set()
+
+    governor = Governor()
+    monkeypatch.setattr(ba.spend_governor, "governor_from_env", lambda: governor)
+    monkeypatch.setattr(ba, "_bedrock_client", lambda: Client())
+
+    ba.handler({"message": {"correlationId": "c1", "errorMessage": "Timeout"}}, None)
+
+    # The hedge wins at once; the slow primary is recorded when it finishes
+    assert governor.recorded[0] == ("small", 1.0)
+    assert governor.done.wait(2)
+    assert governor.recorded[1] == ("big", 3.0)
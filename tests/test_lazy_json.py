@@ -0,0 +1,72 @@
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import lazy_json
+import triage_handler as th
+
+
+def _big_body(**head):
+    document = {"items": [{"sku": f"s-{i}", "note": 'say "hi"\n', "tags": [1, 2.5, None, True]} for i in range(2000)]}
+    return json.dumps({**head, "payload": document, "blob": "x" * 50000})
+
+
+def test_scan_extracts_only_requested_keys_and_handles_escapes():
+    text = ' { "skip": {"a": [1, {"b": "}"}]}, "corr\\u0065lationId": "c-1", "redriveAttempts": 2 } '
+
+    assert lazy_json.scan(text, ["correlationId", "redriveAttempts", "missing"]) == {
+        "correlationId": "c-1",
+        "redriveAttempts": 2,
+    }
+    assert lazy_json.scan('{"a": 1, "a": 2}', ["a"]) == {"a": 2}
+    assert lazy_json.scan("[1, 2]", ["a"]) is None
+    assert lazy_json.scan("{}", ["a"]) == {}
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"a": 1', '{"a" 1}', '{"a": [1, 2}', '{"a": 1} trailing', '{"a": {"b": tru}}', "{a: 1}"],
+)
+def test_scan_rejects_malformed_objects(text):
+    with pytest.raises(lazy_json.LazyDecodeError):
+        lazy_json.scan(text, ["a"])
+
+
+def test_dumps_splices_raw_text_verbatim():
+    raw = '{"b": 1,   "a": [1,2]}'
+    out = lazy_json.dumps({"message": {"id": "x", "raw": lazy_json.RawJson(raw)}, "note": "plain"})
+
+    assert raw in out
+    assert json.loads(out) == {"message": {"id": "x", "raw": {"b": 1, "a": [1, 2]}}, "note": "plain"}
+    with pytest.raises(TypeError):
+        lazy_json.dumps({"x": object()})
+
+
+def test_large_plain_body_is_decoded_lazily(monkeypatch):
+    monkeypatch.setattr(th, "LAZY_DECODE_MIN_BYTES", 1024)
+    body = _big_body(id="c-9", category="THROTTLED", error="slow", redriveAttempts=3, service="orders")
+
+    [event] = th._decode(body)
+    normalized = th._normalize(event)
+
+    assert isinstance(event, lazy_json.LazyEvent)
+    assert normalized["raw"].text is body
+    assert {k: v for k, v in normalized.items() if k != "raw"} == {
+        k: v for k, v in th._normalize(json.loads(body)).items() if k != "raw"
+    }
+    assert json.loads(lazy_json.dumps(normalized))["raw"] == json.loads(body)
+
+
+def test_large_envelopes_and_lists_fall_back_to_full_decoding(monkeypatch):
+    monkeypatch.setattr(th, "LAZY_DECODE_MIN_BYTES", 1024)
+    inner = _big_body(correlationId="c-1")
+    sns = json.dumps({"Type": "Notification", "Message": inner})
+    packed = json.dumps({"dlqEvents": [json.loads(inner), json.loads(inner)]})
+
+    assert th._decode(sns)[0]["correlationId"] == "c-1"
+    assert len(th._decode(packed)) == 2
+    assert all(isinstance(event, dict) for event in th._decode(packed))
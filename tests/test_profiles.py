@@ -0,0 +1,43 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from dlq_triage_infra import profiles
+
+
+def test_every_profile_resolves():
+    for name in profiles.PROFILES:
+        assert profiles.resolve(name)["name"] == name
+
+
+def test_profiles_keep_standard_workflows_for_name_dedupe():
+    # Triage relies on ExecutionAlreadyExists, which Express workflows never raise
+    assert {profile["workflow_type"] for profile in profiles.PROFILES.values()} == {"STANDARD"}
+    assert profiles.resolve("low-latency", {"workflow_type": "EXPRESS"})["workflow_type"] == "EXPRESS"
+
+
+def test_overrides_merge_into_nested_settings():
+    profile = profiles.resolve("low-latency", {"provisioned_concurrency": {"bedrock": 8}, "batch_size": 5})
+
+    assert profile["provisioned_concurrency"] == {"triage": 2, "bedrock": 8}
+    assert profile["batch_size"] == 5
+    assert profiles.memory_for(profile, "triage") == 1024
+    assert profiles.memory_for(profile, "ticket") == 512
+
+
+@pytest.mark.parametrize(
+    "name, overrides",
+    [
+        ("turbo", None),
+        ("default", {"batch_size": 20}),
+        ("default", {"workflow_type": "SYNC"}),
+        ("default", {"reserved_concurrency": {"notifier": 1}}),
+        ("cost", {"visibility_timeout_seconds": 30}),
+    ],
+)
+def test_invalid_profiles_are_rejected(name, overrides):
+    with pytest.raises(ValueError):
+        profiles.resolve(name, overrides)
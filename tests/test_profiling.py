@@ -0,0 +1,138 @@
+from pathlib import Path
+import json
+import pstats
+import sys
+import time
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import profiling
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    def _configure(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, str(value))
+        profiling.reset()
+
+    yield _configure
+    profiling.reset()
+
+
+def _records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if "Handler profile" in line]
+
+
+def _busy_work(ms):
+    deadline = time.perf_counter() + ms / 1000
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def test_disabled_by_default_and_passes_results_through(configure, capsys):
+    configure()
+
+    @profiling.profiled()
+    def handler(event, _context):
+        return {"echo": event}
+
+    assert handler({"a": 1}, None) == {"echo": {"a": 1}}
+    assert handler.__name__ == "handler"
+    assert _records(capsys) == []
+
+
+def test_cprofile_mode_logs_top_functions_and_writes_pstats(configure, capsys, tmp_path):
+    configure(PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=1, PROFILE_OUTPUT_DIR=tmp_path)
+
+    @profiling.profiled("busy")
+    def handler(event, _context):
+        return _busy_work(20)
+
+    handler({}, None)
+    [record] = _records(capsys)
+
+    assert record["handler"] == "busy"
+    assert any("_busy_work" in row["function"] for row in record["top"])
+    assert Path(record["file"]).suffix == ".pstats"
+    assert pstats.Stats(record["file"]).total_calls > 0
+
+
+def test_sample_mode_writes_collapsed_stacks(configure, capsys, tmp_path):
+    configure(PROFILE_MODE="sample", PROFILE_SAMPLE_RATE=1, PROFILE_SAMPLE_INTERVAL_MS=1, PROFILE_OUTPUT_DIR=tmp_path)
+
+    @profiling.profiled("busy")
+    def handler(event, _context):
+        return _busy_work(80)
+
+    handler({}, None)
+    [record] = _records(capsys)
+
+    assert record["samples"] > 0
+    assert "test_profiling:_busy_work" in record["stacks"][0]["stack"]
+    lines = Path(record["file"]).read_text().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("test_profiling:") and int(count) > 0
+
+
+def test_tracemalloc_reports_allocation_sites(configure, capsys):
+    configure(PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=1, PROFILE_TRACEMALLOC=1)
+
+    @profiling.profiled()
+    def handler(event, _context):
+        return [bytearray(1024) for _ in range(2000)]
+
+    handler({}, None)
+    [record] = _records(capsys)
+
+    assert record["peak_kib"] >= 2000
+    assert record["allocations"][0]["where"].startswith("test_profiling.py:")
+
+
+def test_sampling_rate_and_nested_calls(configure, capsys):
+    configure(PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=0)
+
+    @profiling.profiled("inner")
+    def inner():
+        return 1
+
+    @profiling.profiled("outer")
+    def outer():
+        return inner()
+
+    outer()
+    assert _records(capsys) == []
+
+    configure(PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=1)
+    outer()
+    assert [r["handler"] for r in _records(capsys)] == ["outer"]
+
+
+def test_unknown_mode_is_rejected(configure):
+    configure(PROFILE_MODE="perf")
+    with pytest.raises(ValueError):
+        profiling.load_config()
+
+
+def test_report_failures_keep_the_handlers_outcome(configure, capsys, tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    configure(PROFILE_MODE="cprofile", PROFILE_SAMPLE_RATE=1, PROFILE_TRACEMALLOC=1, PROFILE_OUTPUT_DIR=blocker)
+
+    @profiling.profiled()
+    def handler(event, _context):
+        if event.get("fail"):
+            raise KeyError("handler error")
+        return "ok"
+
+    assert handler({}, None) == "ok"
+    with pytest.raises(KeyError, match="handler error"):
+        handler({"fail": True}, None)
+
+    errors = [json.loads(line) for line in capsys.readouterr().out.splitlines() if "Handler profile failed" in line]
+    assert len(errors) == 2
+    assert not profiling.tracemalloc.is_tracing()
@@ -0,0 +1,73 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import prompt_compaction as pc
+
+
+def _message(error: str, **raw_extra):
+    raw = {
+        "correlationId": "c-1",
+        "failureCategory": "DOWNSTREAM_TIMEOUT",
+        "errorMessage": error,
+        "timestamp": "2025-01-15T10:36:00Z",
+        **raw_extra,
+    }
+    return {
+        "correlationId": "c-1",
+        "failureCategory": "DOWNSTREAM_TIMEOUT",
+        "errorMessage": error,
+        "timestamp": "2025-01-15T10:36:00Z",
+        "stateAtFailure": "FAILED",
+        "redriveAttempts": 0,
+        "source": "orders",
+        "raw": raw,
+    }
+
+
+def test_raw_duplicates_are_removed():
+    text, report = pc.compact(_message("Timeout after 3 retries"))
+
+    assert "raw" not in json.loads(text)
+    assert report["raw_fields_deduped"] == 4
+
+
+def test_raw_keeps_unique_fields_and_drops_low_signal_keys():
+    message = _message("Timeout", orderId="o-9", headers={"x": "y"}, awsRequestId="r-1")
+
+    text, report = pc.compact(message)
+
+    assert json.loads(text)["raw"] == {"orderId": "o-9"}
+    assert sorted(report["dropped_keys"]) == ["raw.awsRequestId", "raw.headers"]
+
+
+def test_repeated_frames_are_collapsed():
+    frames = "\n".join(f"    at com.acme.Node.visit(Node.java:{40 + i % 2})" for i in range(200))
+    error = "java.lang.StackOverflowError\n" + frames + "\n    at com.acme.Main.main(Main.java:5)"
+
+    text, report = pc.compact(_message(error))
+
+    compacted = json.loads(text)["errorMessage"]
+    assert "199 repeated frames omitted" in compacted
+    assert compacted.endswith("Main.java:5)")
+    assert report["collapsed_frames"] == 199
+
+
+def test_budget_keeps_error_head_and_tail():
+    error = "ValueError: bad payload\n" + "".join(f"line {i} {'x' * 40}\n" for i in range(2000)) + "Caused by: root cause"
+    rules = {**pc.DEFAULT_RULES, "max_tokens": 500}
+
+    text, report = pc.compact(_message(error), rules)
+
+    compacted = json.loads(text)["errorMessage"]
+    assert len(text) <= 2000
+    assert compacted.startswith("ValueError: bad payload")
+    assert compacted.endswith("Caused by: root cause")
+    assert report["compacted_tokens"] < report["original_tokens"]
+
+
+def test_collapse_frames_ignores_short_runs():
+    text = "a\nb\na\nb"
+    assert pc.collapse_frames(text) == (text, 0)
@@ -0,0 +1,243 @@
+from pathlib import Path
+import io
+import json
+import sys
+import types
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import quarantine as qm
+import quarantine_handler
+import triage_handler as th
+from dlq_triage_local.workflow import WorkflowEmulator, load_definition
+from test_triage_handler import DummySfn
+
+
+class Clock:
+    def __init__(self, now=1736942400.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CountingStore(qm.LocalQuarantineStore):
+    def __init__(self, clock):
+        super().__init__(clock)
+        self.reads = 0
+
+    def get_many(self, keys):
+        self.reads += 1
+        return super().get_many(keys)
+
+
+def _message(correlation_id, error="NullPointerException in mapper"):
+    return {"correlationId": correlation_id, "failureCategory": "UNHANDLED", "errorMessage": error, "raw": {"id": correlation_id}}
+
+
+def test_repeat_failures_quarantine_the_message_then_its_fingerprint():
+    clock = Clock()
+    store = CountingStore(clock)
+    quarantine = qm.Quarantine(store, max_failures=2, max_fingerprint_failures=3, cache_seconds=30, clock=clock)
+
+    assert quarantine.record_failure(_message("a"), "TimeoutError: slow") is None
+    assert quarantine.record_failure(_message("a"), "TimeoutError: slow") == "msg#a"
+    # Repeats of one message count once towards the fingerprint
+    assert quarantine.record_failure(_message("b"), "x") is None
+    assert quarantine.record_failure(_message("b"), "x") == "msg#b"
+    fingerprint = quarantine.record_failure(_message("c"), "x")
+
+    assert fingerprint.startswith("fp#")
+    assert quarantine.check([_message("a"), _message("d"), _message("e", "Other error")]) == ["msg#a", fingerprint, None]
+    assert store.items["msg#a"]["body"] == json.dumps({"id": "a"})
+    assert store.items["msg#a"]["last_error"] == "TimeoutError: slow"
+    # Cached: a second check within cache_seconds does not read the store
+    reads = store.reads
+    quarantine.check([_message("a"), _message("e", "Other error")])
+    assert store.reads == reads
+    # A fingerprint hold is short; a message quarantine outlives it
+    clock.now += qm.FINGERPRINT_TTL_SECONDS + 1
+    assert fingerprint not in store.get_many([fingerprint])
+    assert "msg#a" in store.get_many(["msg#a"])
+
+
+def test_counters_use_fixed_windows():
+    clock = Clock()
+    store = qm.LocalQuarantineStore(clock)
+    quarantine = qm.Quarantine(store, max_failures=3, max_fingerprint_failures=2, fingerprint_window_seconds=900, clock=clock)
+
+    quarantine.record_failure(_message("a"), "x")
+    first_expiry = store.items["msg#a"]["expires_at"]
+    clock.now += 86400
+    quarantine.record_failure(_message("a"), "x")
+    # Later failures do not push the message window out
+    assert store.items["msg#a"]["expires_at"] == first_expiry
+    clock.now = first_expiry + 1
+    assert quarantine.record_failure(_message("a"), "x") is None
+    assert store.items["msg#a"]["failures"] == 1
+
+    # Distinct messages in different windows never add up
+    clock.now = 900 * 10**6
+    assert quarantine.record_failure(_message("b"), "x") is None
+    clock.now += 900
+    assert quarantine.record_failure(_message("c"), "x") is None
+    assert quarantine.record_failure(_message("d"), "x").startswith("fp#")
+
+
+def test_empty_errors_have_no_fingerprint():
+    clock = Clock()
+    quarantine = qm.Quarantine(qm.LocalQuarantineStore(clock), max_failures=5, max_fingerprint_failures=1, clock=clock)
+
+    assert qm.fingerprint_key(_message("a", "")) is None
+    assert quarantine.record_failure(_message("a", ""), "States.TaskFailed: boom") is None
+    assert quarantine.check([_message("b", "")]) == [None]
+    assert not [key for key in quarantine.store.items if key.startswith("fp")]
+
+
+def test_infrastructure_errors_are_recognised():
+    assert qm.is_infrastructure_error("States.Timeout")
+    assert qm.is_infrastructure_error("Lambda.ServiceException")
+    assert qm.is_infrastructure_error("SNS.InternalErrorException")
+    assert qm.is_infrastructure_error("ClientError", '{"errorMessage": "An error occurred (ThrottlingException) when calling InvokeModel"}')
+    assert not qm.is_infrastructure_error("ValueError", "cannot parse payload")
+    assert not qm.is_infrastructure_error("States.Runtime", "JSONPath $.message.id could not be found")
+
+
+def test_release_returns_held_bodies_for_replay():
+    clock = Clock()
+    quarantine = qm.Quarantine(qm.LocalQuarantineStore(clock), max_failures=5, max_fingerprint_failures=1, clock=clock)
+    fingerprint = quarantine.record_failure(_message("a"), "x")
+    quarantine.hold(_message("b"), '{"id": "b"}', fingerprint)
+    quarantine.hold(_message("b"), '{"id": "b"}', fingerprint)
+
+    assert [item["pk"] for item in quarantine.quarantined()] == [fingerprint, "msg#b"]
+    assert quarantine.store.items["msg#b"]["skipped"] == 2
+    released = quarantine.release(fingerprint)
+
+    assert [item["pk"] for item in released] == [fingerprint, "msg#b"]
+    assert [item.get("body") for item in released] == [None, '{"id": "b"}']
+    assert quarantine.check([_message("b")]) == [None]
+
+
+def test_dynamo_store_encodes_updates_and_pages_reads():
+    class FakeDynamo:
+        def __init__(self):
+            self.updates = []
+
+        def update_item(self, **kwargs):
+            self.updates.append(kwargs)
+            return {"Attributes": {"pk": {"S": "msg#a"}, "failures": {"N": "3"}}}
+
+        def batch_get_item(self, RequestItems):
+            (request,) = RequestItems.values()
+            return {"Responses": {"q": [{"pk": {"S": "fp#1"}, "quarantined": {"N": "1"}, "reason": {"S": "r"}}]}}
+
+    client = FakeDynamo()
+    store = qm.DynamoQuarantineStore("q", client)
+
+    assert store.increment("msg#a", {"failures": 1}, {"last_error": "x"}) == {"pk": "msg#a", "failures": 3}
+    assert client.updates[0]["UpdateExpression"] == "ADD #c0 :c0 SET #a0 = :a0"
+    assert client.updates[0]["ExpressionAttributeValues"] == {":c0": {"N": "1"}, ":a0": {"S": "x"}}
+    assert store.get_many(["fp#1", "msg#a"]) == {"fp#1": {"pk": "fp#1", "quarantined": 1, "reason": "r"}}
+
+
+def test_dynamo_store_restarts_an_expired_window():
+    class Expired(Exception):
+        pass
+
+    class FakeDynamo:
+        exceptions = types.SimpleNamespace(ConditionalCheckFailedException=Expired)
+
+        def __init__(self):
+            self.updates = []
+
+        def update_item(self, **kwargs):
+            self.updates.append(kwargs)
+            if "ConditionExpression" in kwargs:
+                raise Expired()
+            return {"Attributes": {"pk": {"S": "fpw#1#2"}, "correlation_ids": {"SS": ["msg#a"]}}}
+
+    client = FakeDynamo()
+    item = qm.DynamoQuarantineStore("q", client).increment("fpw#1#2", {"correlation_ids": {"msg#a"}}, {}, expires_at=2700)
+
+    assert item == {"pk": "fpw#1#2", "correlation_ids": {"msg#a"}}
+    assert "#x = if_not_exists(#x, :x)" in client.updates[0]["UpdateExpression"]
+    # The restart overwrites the stale counters instead of adding to them
+    assert client.updates[1]["UpdateExpression"] == "SET #a0 = :a0, #a1 = :a1"
+    assert client.updates[1]["ExpressionAttributeValues"] == {":a0": {"SS": ["msg#a"]}, ":a1": {"N": "2700"}}
+
+
+def test_infrastructure_failures_are_not_counted(monkeypatch):
+    monkeypatch.setenv("QUARANTINE_STORE", "local")
+    monkeypatch.setenv("QUARANTINE_MAX_FAILURES", "1")
+    message = {"correlationId": "ok", "errorMessage": "boom"}
+
+    result = quarantine_handler.handler({"message": message, "error": {"Error": "States.Timeout", "Cause": ""}}, None)
+
+    assert result["quarantined"] is None and "msg#ok" not in qm._LOCAL_STORE.items
+    result = quarantine_handler.handler({"message": message, "error": {"Error": "ValueError", "Cause": "bad"}}, None)
+    assert result["quarantined"] == "msg#ok"
+
+
+def test_triage_holds_quarantined_messages_without_starting_executions(monkeypatch, capsys):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("QUARANTINE_STORE", "local")
+    monkeypatch.setenv("QUARANTINE_MAX_FAILURES", "1")
+    monkeypatch.setenv("QUARANTINE_EXECUTION_COST_USD", "0.02")
+    qm.quarantine_from_env().record_failure({"correlationId": "bad", "errorMessage": "boom"}, "ValueError: boom")
+    bodies = [json.dumps({"correlationId": "bad", "errorMessage": "boom"}), json.dumps({"correlationId": "ok", "errorMessage": "boom"})]
+
+    result = th.handler({"Records": [{"messageId": str(i), "body": body} for i, body in enumerate(bodies)]}, None)
+
+    assert result["batchItemFailures"] == []
+    assert [json.loads(call["input"])["message"]["correlationId"] for call in dummy.calls] == ["ok"]
+    held = qm._LOCAL_STORE.items["msg#bad"]
+    assert held["skipped"] == 1 and held["body"] == bodies[0]
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [m["QuarantineSkipped"] for m in metrics if "QuarantineSkipped" in m] == [1]
+    assert [m["QuarantineCostAvoided"] for m in metrics if "QuarantineCostAvoided" in m] == [0.02]
+    assert [m["stage"] for m in metrics if "BedrockCallsAvoided" in m] == ["quarantine"]
+
+
+def test_workflow_failures_are_counted_until_the_message_is_skipped(monkeypatch):
+    calls = []
+
+    def poison(event, _ctx):
+        calls.append(event["message"]["correlationId"])
+        raise ValueError("cannot parse payload")
+
+    emulator = WorkflowEmulator(load_definition(), functions={"bedrock_adapter.handler": poison})
+    monkeypatch.setattr(th.boto3, "client", lambda service: emulator)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("QUARANTINE_STORE", "local")
+    monkeypatch.setenv("QUARANTINE_MAX_FAILURES", "2")
+    monkeypatch.setenv("QUARANTINE_CACHE_SECONDS", "0")
+    body = json.dumps({"correlationId": "poison", "errorMessage": "bad"})
+
+    # Each failure comes back to the DLQ as a new SQS message
+    for i in range(4):
+        th.handler({"Records": [{"messageId": f"m-{i}", "body": body}]}, None)
+
+    executions = list(emulator.executions.values())
+    assert [e["status"] for e in executions] == ["FAILED", "FAILED"]
+    assert executions[0]["states"][-2:] == ["RecordFailure", "TriageFailed"]
+    # Each failed execution retried the adapter; the skipped deliveries called it zero times
+    assert len(calls) == 2 * 3
+    assert qm._LOCAL_STORE.items["msg#poison"]["skipped"] == 2
+
+
+def test_referenced_bodies_are_loaded_for_replay(monkeypatch):
+    class S3:
+        def get_object(self, Bucket, Key):
+            assert (Bucket, Key) == ("payloads", "payloads/abc.json")
+            return {"Body": io.BytesIO(b'{"id": "big"}')}
+
+    monkeypatch.setattr(qm.payload_refs, "_S3", S3())
+    quarantine = qm.Quarantine(qm.LocalQuarantineStore(Clock()), max_failures=1)
+    message = {**_message("big"), "raw": {"$ref": "s3://payloads/payloads/abc.json", "bytes": 13}}
+
+    assert quarantine.record_failure(message, "x") == "msg#big"
+    assert quarantine.store.items["msg#big"]["body"] == '{"id": "big"}'
@@ -0,0 +1,196 @@
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import sys
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import region_pool as rp
+
+GOOD = {
+    "content": [
+        {
+            "text": json.dumps(
+                {
+                    "category": "SYSTEM_TRANSIENT",
+                    "recommended_action": "REDRIVE",
+                    "confidence": 0.9,
+                    "summary": "ok",
+                    "reasoning": "ok",
+                }
+            )
+        }
+    ]
+}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubRegion:
+    def __init__(self, name, fail=None):
+        self.name = name
+        self.fail = fail
+        self.calls = 0
+
+    def invoke_model(self, **_kwargs):
+        self.calls += 1
+        if self.fail == "throttle":
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "InvokeModel")
+        if self.fail == "error":
+            raise ClientError({"Error": {"Code": "ServiceUnavailableException", "Message": "down"}}, "InvokeModel")
+        if self.fail == "invalid":
+            error = {"Error": {"Code": "ValidationException", "Message": "bad"}, "ResponseMetadata": {"HTTPStatusCode": 400}}
+            raise ClientError(error, "InvokeModel")
+        return {"region": self.name}
+
+
+def _pool(stubs, clock):
+    return rp.RegionPool(list(stubs), lambda region: stubs[region], clock=clock, base_cooldown=10.0)
+
+
+def _eject(pool, region, clock):
+    for _ in range(3):
+        pool.health[region].record(1.0, "error", clock())
+
+
+def test_fails_over_and_prefers_healthy_region():
+    clock = Clock()
+    stubs = {"us-east-1": StubRegion("us-east-1", fail="throttle"), "us-west-2": StubRegion("us-west-2")}
+    pool = _pool(stubs, clock)
+
+    results = [pool.invoke_model(modelId="m")["region"] for _ in range(5)]
+
+    assert results == ["us-west-2"] * 5
+    # Throttled once, then scored below the healthy region
+    assert stubs["us-east-1"].calls == 1
+    assert pool.route() == ["us-west-2", "us-east-1"]
+
+
+def test_region_ejected_after_consecutive_failures():
+    health = rp.RegionHealth(base_cooldown=10.0)
+
+    ejected = [health.record(1.0, "throttle", 0.0) for _ in range(3)]
+
+    assert ejected == [False, False, True]
+    assert health.state(5.0) == "ejected"
+    assert health.state(10.0) == "half_open"
+
+
+def test_recovery_probe_restores_region():
+    clock = Clock()
+    stubs = {"us-east-1": StubRegion("us-east-1"), "us-west-2": StubRegion("us-west-2")}
+    pool = _pool(stubs, clock)
+    _eject(pool, "us-east-1", clock)
+    assert pool.route() == ["us-west-2", "us-east-1"]
+
+    clock.now = 11.0
+    assert pool.route()[0] == "us-east-1"
+    assert pool.invoke_model(modelId="m")["region"] == "us-east-1"
+    assert pool.snapshot()["us-east-1"]["state"] == "healthy"
+
+
+def test_failed_probe_doubles_cooldown():
+    clock = Clock()
+    stubs = {"us-east-1": StubRegion("us-east-1", fail="error"), "us-west-2": StubRegion("us-west-2")}
+    pool = _pool(stubs, clock)
+    _eject(pool, "us-east-1", clock)
+
+    clock.now = 11.0
+    assert pool.invoke_model(modelId="m")["region"] == "us-west-2"
+
+    assert pool.health["us-east-1"].ejected_until == pytest.approx(31.0)
+
+
+def test_all_regions_failing_raises_last_error():
+    clock = Clock()
+    stubs = {"a": StubRegion("a", fail="error"), "b": StubRegion("b", fail="throttle")}
+    pool = _pool(stubs, clock)
+
+    with pytest.raises(ClientError):
+        pool.invoke_model(modelId="m")
+
+
+def test_caller_errors_are_raised_without_failover_or_penalty():
+    clock = Clock()
+    stubs = {"a": StubRegion("a", fail="invalid"), "b": StubRegion("b")}
+    pool = _pool(stubs, clock)
+
+    for _ in range(5):
+        with pytest.raises(ClientError):
+            pool.invoke_model(modelId="m")
+
+    assert stubs["a"].calls == 5 and stubs["b"].calls == 0
+    assert pool.snapshot()["a"]["state"] == "healthy" and not pool.health["a"].samples
+
+
+def test_clients_are_reused():
+    created = []
+    pool = rp.RegionPool(["a"], lambda region: created.append(region) or StubRegion(region))
+
+    pool.invoke_model(modelId="m")
+    pool.invoke_model(modelId="m")
+
+    assert created == ["a"]
+
+
+class _StubBedrock(BaseHTTPRequestHandler):
+    status = 200
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(GOOD if self.status == 200 else {"message": "throttled"}).encode()
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        if self.status != 200:
+            self.send_header("x-amzn-ErrorType", "ThrottlingException")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+def _serve(status):
+    handler = type("Handler", (_StubBedrock,), {"status": status})
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_adapter_routes_between_local_stub_endpoints(monkeypatch):
+    throttled, healthy = _serve(429), _serve(200)
+    try:
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+        monkeypatch.setenv("BEDROCK_REGIONS", "us-east-1,us-west-2")
+        monkeypatch.setenv(
+            "BEDROCK_ENDPOINTS",
+            json.dumps(
+                {
+                    "us-east-1": f"http://127.0.0.1:{throttled.server_port}",
+                    "us-west-2": f"http://127.0.0.1:{healthy.server_port}",
+                }
+            ),
+        )
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+
+        result = ba.handler({"message": {"id": "1"}}, None)
+
+        assert result["llm"]["recommended_action"] == "REDRIVE"
+        pool = rp._POOLS[("us-east-1", "us-west-2")]
+        assert pool.snapshot()["us-east-1"]["throttle_rate"] == 1.0
+    finally:
+        throttled.shutdown()
+        healthy.shutdown()
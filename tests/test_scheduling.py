@@ -0,0 +1,224 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import scheduling
+import triage_handler as th
+
+
+class DummySfn:
+    def __init__(self):
+        self.calls = []
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.calls.append(json.loads(input))
+        return {"executionArn": "arn:aws:states:sample"}
+
+
+CONFIG = {
+    "lanes": {"critical": 6, "standard": 3, "bulk": 1},
+    "rules": [
+        {"lane": "critical", "sources": ["payments"]},
+        {"lane": "bulk", "categories": ["validation_error"]},
+    ],
+    "default_lane": "standard",
+}
+
+
+def test_lane_for_matches_source_then_category():
+    config = {**scheduling.DEFAULT_CONFIG, **CONFIG}
+    assert scheduling.lane_for({"source": "payments", "failureCategory": "VALIDATION_ERROR"}, config) == "critical"
+    assert scheduling.lane_for({"source": "search", "failureCategory": "VALIDATION_ERROR"}, config) == "bulk"
+    assert scheduling.lane_for({"source": "search"}, config) == "standard"
+
+
+def test_rules_naming_unknown_lanes_use_the_default_lane(monkeypatch):
+    config = {**CONFIG, "rules": [{"lane": "urgent", "sources": ["payments"]}, *CONFIG["rules"]]}
+    assert scheduling.lane_for({"source": "payments"}, config) == "standard"
+
+    sfn = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: sfn)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("PRIORITY_LANES", json.dumps(config))
+    body = json.dumps({"correlationId": "p-1", "source": "payments", "errorMessage": "x"})
+
+    result = th.handler({"Records": [{"messageId": "m-1", "body": body}]}, None)
+
+    assert result["batchItemFailures"] == []
+    assert [call["message"]["correlationId"] for call in sfn.calls] == ["p-1"]
+
+
+def test_scheduler_shares_follow_weights_under_backlog():
+    scheduler = scheduling.WeightedFairScheduler(CONFIG["lanes"])
+    for lane in ("bulk", "standard", "critical"):
+        for i in range(100):
+            scheduler.push(lane, i)
+
+    served = [scheduler.pop()[0] for _ in range(100)]
+    assert served.count("critical") == 60
+    assert served.count("standard") == 30
+    assert served.count("bulk") == 10
+
+
+def test_idle_lanes_do_not_block_busy_ones():
+    scheduler = scheduling.WeightedFairScheduler(CONFIG["lanes"])
+    for i in range(5):
+        scheduler.push("bulk", i)
+    assert [scheduler.pop()[1] for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert scheduler.pop() is None
+
+
+def test_tenant_quota_resets_per_window():
+    now = [0.0]
+    quota = scheduling.TenantQuota(100, window_seconds=60, clock=lambda: now[0])
+    assert quota.try_consume("noisy", 80)
+    assert not quota.try_consume("noisy", 30)
+    assert quota.try_consume("quiet", 30)
+    now[0] = 61.0
+    assert quota.try_consume("noisy", 30)
+
+
+def test_triage_prioritises_lanes_and_defers_over_quota(monkeypatch):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("PRIORITY_LANES", json.dumps({**CONFIG, "tenant_token_quota": 40}))
+
+    def record(message_id, source):
+        body = json.dumps({"correlationId": message_id, "source": source, "errorMessage": "x" * 40})
+        return {"messageId": message_id, "body": body}
+
+    result = th.handler(
+        {"Records": [record("n-1", "noisy"), record("n-2", "noisy"), record("p-1", "payments")]},
+        None,
+    )
+
+    assert [call["message"]["correlationId"] for call in dummy.calls] == ["p-1", "n-1"]
+    assert result["batchItemFailures"] == [{"itemIdentifier": "n-2"}]
+
+
+def test_shared_quota_is_one_budget_across_containers():
+    now = [0.0]
+    store = scheduling.spend_governor.LocalCounterStore(clock=lambda: now[0])
+    containers = [scheduling.SharedTenantQuota(store, 100, window_seconds=60, clock=lambda: now[0]) for _ in range(3)]
+
+    assert [quota.try_consume("noisy", 40) for quota in containers] == [True, True, False]
+    assert containers[2].remaining("noisy") == 20
+    containers[0].refund("noisy", 40)
+    assert containers[2].try_consume("noisy", 60)
+    now[0] = 61.0
+    assert containers[1].try_consume("noisy", 100)
+
+
+def test_shared_dlq_events_are_forwarded_to_lane_queues(monkeypatch):
+    class Clients:
+        def __init__(self):
+            self.calls, self.sent = [], []
+
+        def start_execution(self, stateMachineArn, name, input):
+            self.calls.append(json.loads(input))
+            return {"executionArn": "arn:aws:states:sample"}
+
+        def send_message_batch(self, QueueUrl, Entries):
+            self.sent.extend((QueueUrl, entry) for entry in Entries)
+            return {"Successful": Entries}
+
+    clients = Clients()
+    lane_queues = {lane: f"https://sqs.local/000000000000/dlq-{lane}" for lane in CONFIG["lanes"]}
+    monkeypatch.setattr(th.boto3, "client", lambda service: clients)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("PRIORITY_LANES", json.dumps(CONFIG))
+    monkeypatch.setenv("LANE_QUEUES", json.dumps(lane_queues))
+    body = json.dumps({"correlationId": "p-1", "source": "payments", "errorMessage": "x"})
+
+    th.handler(
+        {"Records": [{"messageId": "m-1", "body": body, "eventSourceARN": "arn:aws:sqs:us-east-1:0:dlq",
+                      "attributes": {"SentTimestamp": "1000"}}]},
+        None,
+    )
+    assert clients.calls == []
+    ((url, entry),) = clients.sent
+    assert url == lane_queues["critical"] and entry["MessageBody"] == body
+    assert entry["MessageAttributes"]["DlqSentTimestamp"]["StringValue"] == "1000"
+
+    # The lane queue's consumer starts the execution; the trace still begins at the DLQ send
+    lane_record = {
+        "messageId": "m-2",
+        "body": body,
+        "eventSourceARN": "arn:aws:sqs:us-east-1:0:dlq-critical",
+        "attributes": {"SentTimestamp": "3000"},
+        "messageAttributes": {"DlqSentTimestamp": {"stringValue": "1000", "dataType": "Number"}},
+    }
+    th.handler({"Records": [lane_record]}, None)
+    (call,) = clients.calls
+    assert call["trace"]["start_ms"] == 1000
+    assert [span["name"] for span in call["trace"]["spans"]][:2] == ["sqs_wait", "lane_wait"]
+
+
+def test_lane_forwarding_errors_fail_only_that_lanes_items(monkeypatch):
+    class Clients:
+        def __init__(self):
+            self.sent = []
+
+        def send_message_batch(self, QueueUrl, Entries):
+            if QueueUrl.endswith("dlq-critical"):
+                raise RuntimeError("AWS.SimpleQueueService.NonExistentQueue")
+            self.sent.extend(Entries)
+            return {"Successful": Entries}
+
+    clients = Clients()
+    lane_queues = {lane: f"https://sqs.local/000000000000/dlq-{lane}" for lane in CONFIG["lanes"]}
+    monkeypatch.setattr(th.boto3, "client", lambda service: clients)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("PRIORITY_LANES", json.dumps(CONFIG))
+    monkeypatch.setenv("LANE_QUEUES", json.dumps(lane_queues))
+
+    def record(message_id, source):
+        body = json.dumps({"correlationId": message_id, "source": source, "errorMessage": "x"})
+        return {"messageId": message_id, "body": body, "eventSourceARN": "arn:aws:sqs:us-east-1:0:dlq"}
+
+    result = th.handler({"Records": [record("m-1", "payments"), record("m-2", "orders"), record("m-3", "payments")]}, None)
+
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m-1"}, {"itemIdentifier": "m-3"}]
+    assert [json.loads(entry["MessageBody"])["correlationId"] for entry in clients.sent] == ["m-2"]
+
+
+def test_packed_record_is_admitted_or_deferred_as_a_whole(monkeypatch):
+    class FlakySfn(DummySfn):
+        def __init__(self):
+            super().__init__()
+            self.names = set()
+
+        def start_execution(self, stateMachineArn, name, input):
+            if name in self.names:
+                error = RuntimeError("exists")
+                error.response = {"Error": {"Code": "ExecutionAlreadyExists"}}
+                raise error
+            if json.loads(input)["message"]["correlationId"] == "q-2" and not self.names & {"failed-once"}:
+                self.names.add("failed-once")
+                raise RuntimeError("throttled")
+            self.names.add(name)
+            return super().start_execution(stateMachineArn, name, input)
+
+    sfn = FlakySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: sfn)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    # Four events' worth of tokens
+    monkeypatch.setenv("PRIORITY_LANES", json.dumps({**CONFIG, "tenant_token_quota": 4 * 25}))
+    monkeypatch.setenv("QUOTA_STORE", "local")
+
+    def packed(message_id, ids, source):
+        events = [{"correlationId": i, "source": source, "errorMessage": "x" * 40} for i in ids]
+        return {"messageId": message_id, "body": json.dumps({"dlqEvents": events})}
+
+    # The second record does not fit after the first, so none of its events start
+    result = th.handler({"Records": [packed("r-1", ["q-1", "q-2"], "noisy"), packed("r-2", ["q-3", "q-4", "q-5"], "noisy")]}, None)
+    assert [call["message"]["correlationId"] for call in sfn.calls] == ["q-1"]
+    assert result["batchItemFailures"] == [{"itemIdentifier": "r-2"}, {"itemIdentifier": "r-1"}]
+
+    # The failed start gave its tokens back. Redelivery starts only that event; q-1 keeps its name
+    result = th.handler({"Records": [packed("r-1", ["q-1", "q-2"], "noisy")]}, None)
+    assert [call["message"]["correlationId"] for call in sfn.calls] == ["q-1", "q-2"]
+    assert result["batchItemFailures"] == []
@@ -0,0 +1,85 @@
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import dlq_triage_sample as sample
+import sharding
+from dlq_triage_local.sqs import InMemorySqs
+from test_worker import _stop, _wait_for
+
+KEYS = [f"{i:012x}" for i in range(20000)]
+
+
+def test_ring_is_balanced_and_stable():
+    ring = sharding.HashRing([f"w{i}" for i in range(8)])
+
+    assert all(0.09 < share < 0.16 for share in ring.load().values())
+    assert sum(ring.load().values()) == pytest.approx(1.0, abs=1e-3)
+    assert sharding.HashRing(reversed(ring.nodes)).node_for("abc") == ring.node_for("abc")
+    # Volatile numbers normalize away, so one error signature maps to one shard
+    first = {"failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": "Timeout after 3 retries (request 1234)"}
+    second = {"failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": "Timeout after 5 retries (request 98)"}
+    assert sharding.shard_key(first) == sharding.shard_key(second)
+    with pytest.raises(LookupError):
+        sharding.HashRing().node_for("abc")
+
+
+def test_adding_or_removing_a_worker_moves_only_its_share():
+    before = sharding.HashRing([f"w{i}" for i in range(8)])
+    grown = sharding.HashRing(before.nodes + ["w8"])
+    shrunk = sharding.HashRing(before.nodes)
+    shrunk.remove("w3")
+
+    # Keys move only to the new worker, or only off the removed one
+    assert 0.07 < sharding.moved_fraction(before, grown, KEYS) < 0.16
+    assert all(grown.node_for(k) == "w8" for k in KEYS if before.node_for(k) != grown.node_for(k))
+    assert all(before.node_for(k) == "w3" for k in KEYS if before.node_for(k) != shrunk.node_for(k))
+    assert sharding.moved_fraction(before, shrunk, KEYS) == pytest.approx(before.load()["w3"], abs=0.02)
+
+
+def test_router_worker_gives_each_shard_a_disjoint_set_of_signatures():
+    sqs = InMemorySqs()
+    source = sqs.create_queue(QueueName="dlq")["QueueUrl"]
+    queues = {name: sqs.create_queue(QueueName=f"dlq-{name}")["QueueUrl"] for name in ("a", "b", "c")}
+    for i in range(60):
+        body = {"correlationId": f"c-{i}", "failureCategory": "X", "errorMessage": f"error kind {'abcdefghij'[i % 10]} #{i}"}
+        sqs.send_message(QueueUrl=source, MessageBody=json.dumps(body))
+    router = sharding.ShardRouter(sqs, queues)
+    worker = sample.SqsWorker(sqs, source, process=router.process, wait_time_seconds=0.05, heartbeat_interval=0.05)
+    threads = worker.start()
+    assert _wait_for(lambda: worker.stats["deleted"] == 60)
+    _stop(worker, threads)
+
+    owners = {}
+    for name, url in queues.items():
+        messages = sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10, VisibilityTimeout=60).get("Messages", [])
+        while messages:
+            for message in messages:
+                owners.setdefault(sharding.shard_key(json.loads(message["Body"])), set()).add(name)
+            messages = sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10, VisibilityTimeout=60).get("Messages", [])
+    assert len(owners) == 10 and all(len(names) == 1 for names in owners.values())
+    assert sum(router.stats.values()) == 60
+
+
+def test_fifo_targets_use_the_shard_as_message_group():
+    class Recorder:
+        def __init__(self):
+            self.batches = []
+
+        def send_message_batch(self, QueueUrl, Entries):
+            self.batches.append((QueueUrl, Entries))
+            return {"Successful": [], "Failed": [{"Id": "0", "Code": "Throttled"}] if len(self.batches) > 1 else []}
+
+    sqs = Recorder()
+    router = sharding.ShardRouter(sqs, {"only": "https://sqs.local/000000000000/dlq.fifo"})
+    router.process({"correlationId": "c-1", "errorMessage": "Timeout"})
+
+    ((url, (entry,)),) = sqs.batches
+    assert entry["MessageGroupId"] == "only" and len(entry["MessageDeduplicationId"]) == 64
+    with pytest.raises(RuntimeError, match="Throttled"):
+        router.process({"correlationId": "c-2", "errorMessage": "Timeout"})
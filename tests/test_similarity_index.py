@@ -0,0 +1,80 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+from similarity_index import SimilarityIndex, shingles
+
+
+DECISION = {
+    "category": "SYSTEM_TRANSIENT",
+    "recommended_action": "REDRIVE",
+    "confidence": 0.9,
+    "summary": "ok",
+    "reasoning": "ok",
+}
+ERROR = (
+    "Timeout calling payments-api after 3 retries (request 7f3e2a1c-0b4d-4e55-9a1b-2c3d4e5f6a7b) "
+    "at PaymentClient.charge line 112 at OrderService.submit line 58"
+)
+VARIANT = (
+    "Timeout calling payments-api after 5 retries (request 0a1b2c3d-4e5f-4a6b-8c7d-9e0f1a2b3c4d) "
+    "at PaymentClient.charge line 118 at OrderService.submit line 61"
+)
+
+
+class DummyBody:
+    def read(self):
+        return json.dumps({"content": [{"text": json.dumps(DECISION)}]}).encode("utf-8")
+
+
+class CountingBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke_model(self, **_kwargs):
+        self.calls += 1
+        return {"body": DummyBody()}
+
+
+def test_shingles_ignore_volatile_tokens():
+    assert shingles(ERROR) == shingles(VARIANT)
+
+
+def test_query_matches_near_duplicates_only_within_group():
+    index = SimilarityIndex()
+    index.add("c-1", ERROR, DECISION, group="DOWNSTREAM_TIMEOUT")
+
+    hit = index.query(VARIANT.replace("OrderService", "CheckoutService"), 0.5, group="DOWNSTREAM_TIMEOUT")
+    assert hit is not None and hit[0] == "c-1" and 0.5 <= hit[1] < 1.0
+    assert index.query(VARIANT, 0.5, group="VALIDATION") is None
+    assert index.query("Schema validation failed for field amount", 0.5, group="DOWNSTREAM_TIMEOUT") is None
+    assert index.hit_rate == 1 / 3
+
+
+def test_index_is_bounded_and_evicts_oldest():
+    index = SimilarityIndex(max_entries=2)
+    for i, text in enumerate(["alpha beta gamma delta", "one two three four", "red green blue yellow"]):
+        index.add(f"c-{i}", text, DECISION)
+    assert len(index) == 2
+    assert index.stats["evictions"] == 1
+    assert index.query("alpha beta gamma delta", 0.9) is None
+
+
+def test_adapter_reuses_neighbor_decision(monkeypatch, capsys):
+    dummy = CountingBedrock()
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: dummy)
+    monkeypatch.setattr(ba, "_SIMILARITY_INDEX", None)
+    monkeypatch.setenv("SIMILARITY_THRESHOLD", "0.8")
+
+    first = ba.handler({"message": {"correlationId": "c-1", "errorMessage": ERROR}}, None)
+    second = ba.handler({"message": {"correlationId": "c-2", "errorMessage": VARIANT}}, None)
+
+    assert dummy.calls == 1
+    assert "reuse" not in first
+    assert second["reuse"] == {"correlationId": "c-1", "similarity": 1.0}
+    assert second["llm"]["recommended_action"] == "REDRIVE"
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [m["SimilarityHit"] for m in metrics if "SimilarityHit" in m] == [0, 1]
@@ -0,0 +1,158 @@
+from pathlib import Path
+import json
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import spend_governor as sg
+from test_bedrock_cascade import TieredBedrock, _output
+
+NOON = 1736942400.0  # 2025-01-15T12:00:00Z
+USAGE = {"input_tokens": 1000, "output_tokens": 100}
+
+
+class Clock:
+    def __init__(self, now=NOON):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _governor(budgets=None, clock=None, refresh_seconds=0.0):
+    clock = clock or Clock()
+    return sg.SpendGovernor(sg.LocalCounterStore(clock), budgets, refresh_seconds=refresh_seconds, clock=clock)
+
+
+def test_usage_is_aggregated_per_category_source_and_model():
+    governor = _governor()
+    governor.record("fast", {"failureCategory": "DOWNSTREAM_TIMEOUT", "source": "orders"}, USAGE, 0.0015)
+    governor.record("fast", {"failureCategory": "DOWNSTREAM_TIMEOUT", "source": "payments"}, USAGE, 0.0015)
+    governor.record("large", {"failureCategory": "VALIDATION_ERROR", "source": "orders"}, USAGE, 0.0045)
+
+    report = sg.usage_report(governor.store, "20250115")
+
+    assert report["total"] == {"calls": 3, "input_tokens": 3000, "output_tokens": 300, "cost_micro_usd": 7500}
+    assert report["category"]["DOWNSTREAM_TIMEOUT"]["calls"] == 2
+    assert report["source"]["orders"]["cost_micro_usd"] == 6000
+    assert report["model"]["large"]["input_tokens"] == 1000
+    assert governor.store.get_many([("h#2025011512", "total")])[0]["calls"] == 3
+
+
+def test_mode_follows_hourly_and_daily_budgets():
+    clock = Clock()
+    governor = _governor({"hourly_tokens": 2500, "daily_usd": 0.01}, clock)
+    message = {"failureCategory": "X"}
+
+    assert governor.mode() == "normal"
+    governor.record("m", message, USAGE, 0.001)
+    governor.record("m", message, USAGE, 0.001)
+    assert governor.mode() == "normal"
+    governor.record("m", message, USAGE, 0.001)
+    assert governor.utilization()["hourly_tokens"] == 1.32
+    assert governor.mode() == "exhausted"
+
+    # A new hour resets the hourly budget; the daily one keeps counting
+    for _ in range(7):
+        clock.now += 3600
+        assert governor.mode() == "normal"
+        governor.record("m", message, USAGE, 0.001)
+    governor.record("m", message, USAGE, 0.001)
+    assert governor.utilization() == {"hourly_tokens": 0.88, "daily_usd": 1.1}
+    assert governor.mode() == "degraded"
+
+
+def test_other_containers_spend_is_seen_after_refresh():
+    clock = Clock()
+    store = sg.LocalCounterStore(clock)
+    ours = sg.SpendGovernor(store, {"hourly_tokens": 1000}, refresh_seconds=5, clock=clock)
+    theirs = sg.SpendGovernor(store, {"hourly_tokens": 1000}, refresh_seconds=5, clock=clock)
+    assert ours.mode() == "normal"
+
+    theirs.record("m", {}, USAGE, 0.0)
+    assert theirs.mode() == "degraded"
+    assert ours.mode() == "normal"
+    clock.now += 5
+    assert ours.mode() == "degraded"
+
+
+def test_dynamo_store_batches_updates_and_decodes_counters():
+    class FakeDynamo:
+        def __init__(self):
+            self.transactions = []
+
+        def transact_write_items(self, TransactItems):
+            self.transactions.append(TransactItems)
+
+        def batch_get_item(self, RequestItems):
+            return {"Responses": {"spend": [{"pk": {"S": "d#20250115"}, "sk": {"S": "total"}, "calls": {"N": "4"}, "expires_at": {"N": "9"}}]}}
+
+    client = FakeDynamo()
+    store = sg.DynamoCounterStore("spend", client)
+    governor = sg.SpendGovernor(store, clock=Clock())
+    governor.record("m", {"failureCategory": "X", "source": "orders"}, USAGE, 0.002)
+
+    (items,) = client.transactions
+    assert [item["Update"]["Key"]["sk"]["S"] for item in items] == ["total", "total", "category#X", "source#orders", "model#m"]
+    assert items[0]["Update"]["UpdateExpression"].startswith("ADD #f0 :v0")
+    assert items[0]["Update"]["ExpressionAttributeValues"][":v3"] == {"N": "2000"}
+    assert store.get_many([("d#20250115", "total"), ("h#2025011512", "total")]) == [{"calls": 4}, {}]
+
+
+def _adapter(monkeypatch, tokens_budget):
+    dummy = TieredBedrock({"fast": _output("SYSTEM_TRANSIENT", 0.5), "large": _output("SYSTEM_TRANSIENT", 0.9)})
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: dummy)
+    monkeypatch.setenv("MODEL_TIERS", json.dumps([{"model_id": "fast"}, {"model_id": "large"}]))
+    monkeypatch.setenv("SPEND_STORE", "local")
+    monkeypatch.setenv("SPEND_HOURLY_TOKENS", str(tokens_budget))
+    monkeypatch.setenv("SPEND_REFRESH_SECONDS", "0")
+    return dummy
+
+
+def test_adapter_records_usage_and_degrades_to_cheapest_tier(monkeypatch, capsys):
+    dummy = _adapter(monkeypatch, tokens_budget=2200)
+    event = {"message": {"failureCategory": "DOWNSTREAM_TIMEOUT", "source": "orders", "errorMessage": "Timeout"}}
+
+    normal = ba.handler(event, None)
+    degraded = ba.handler(event, None)
+
+    # The cascade escalates in normal mode; once over budget only the cheap tier runs
+    assert dummy.calls == ["fast", "large", "fast"]
+    assert "governor" not in normal
+    assert degraded["governor"] == {"mode": "degraded", "model_id": "fast"}
+    report = sg.usage_report(sg._LOCAL_STORE, sg.day_key(__import__("time").time())[2:])
+    assert report["model"]["fast"]["calls"] == 2 and report["model"]["large"]["calls"] == 1
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [m["SpendMode"] for m in metrics if "SpendMode" in m] == [0, 1]
+    assert sum(m["BedrockInputTokens"] for m in metrics if "BedrockInputTokens" in m) == 3000
+
+
+def test_adapter_stops_calling_bedrock_when_exhausted(monkeypatch, capsys):
+    dummy = _adapter(monkeypatch, tokens_budget=1000)
+    event = {"message": {"failureCategory": "DOWNSTREAM_TIMEOUT", "errorMessage": "Timeout"}}
+
+    ba.handler(event, None)
+    exhausted = ba.handler(event, None)
+
+    assert dummy.calls == ["fast", "large"]
+    assert exhausted["governor"] == {"mode": "exhausted"}
+    assert exhausted["llm"]["recommended_action"] == "TICKET"
+    assert exhausted["llm"]["reasoning"] == "Bedrock spend budget exhausted"
+
+
+def test_unreachable_store_does_not_block_triage(monkeypatch, capsys):
+    dummy = _adapter(monkeypatch, tokens_budget=1000)
+
+    class Broken(sg.LocalCounterStore):
+        def get_many(self, keys):
+            raise ConnectionError("down")
+
+        def add(self, updates):
+            raise ConnectionError("down")
+
+    sg._LOCAL_STORE = Broken()
+    result = ba.handler({"message": {"errorMessage": "Timeout"}}, None)
+
+    assert result["llm"]["confidence"] == 0.9 and dummy.calls == ["fast", "large"]
+    assert "Spend governor unavailable" in capsys.readouterr().out
@@ -1,4 +1,5 @@
 from pathlib import Path
+import json
 import os
 import sys
 import shutil
@@ -35,3 +36,96 @@ def test_state_machine_contains_guardrails_and_bedrock():
     assert "CallBedrock" in definition
     assert "GuardrailsLambda" in definition
     assert "Decision" in definition
+
+
+def _template(profile=None, overrides=None):
+    context = {}
+    if profile:
+        context["performance_profile"] = profile
+    if overrides:
+        context["performance_overrides"] = overrides
+    app = aws_cdk.App(context=context)
+    return assertions.Template.from_stack(DlqTriageStack(app, "TestStack"))
+
+
+def test_default_profile_keeps_original_settings():
+    template = _template()
+
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping", {"BatchSize": 1, "ScalingConfig": assertions.Match.absent()}
+    )
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {"StateMachineType": "STANDARD"})
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "triage_handler.handler", "MemorySize": 128, "Architectures": ["x86_64"]}
+    )
+    template.resource_count_is("AWS::Lambda::Alias", 0)
+
+
+def test_low_latency_profile_uses_provisioned_aliases_and_standard_workflow():
+    template = _template("low-latency")
+
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {"Handler": "bedrock_adapter.handler", "MemorySize": 1024, "Architectures": ["arm64"]},
+    )
+    template.resource_count_is("AWS::Lambda::Alias", 2)
+    template.has_resource_properties(
+        "AWS::Lambda::Alias",
+        {"Name": "live", "ProvisionedConcurrencyConfig": {"ProvisionedConcurrentExecutions": 4}},
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping", {"BatchSize": 1, "ScalingConfig": {"MaximumConcurrency": 50}}
+    )
+    mapping = next(iter(template.find_resources("AWS::Lambda::EventSourceMapping").values()))
+    assert "DlqTriageLambdaAliaslive" in json.dumps(mapping["Properties"]["FunctionName"])
+    # Express would not reject duplicate execution names on redelivery
+    template.has_resource_properties("AWS::StepFunctions::StateMachine", {"StateMachineType": "STANDARD"})
+
+
+def test_high_throughput_profile_batches_and_reserves_concurrency():
+    template = _template("high-throughput")
+
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {"BatchSize": 50, "MaximumBatchingWindowInSeconds": 2, "ScalingConfig": {"MaximumConcurrency": 200}},
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function", {"Handler": "bedrock_adapter.handler", "ReservedConcurrentExecutions": 100}
+    )
+    template.has_resource_properties("AWS::SQS::Queue", {"VisibilityTimeout": 370})
+
+
+def test_cost_profile_with_overrides():
+    template = _template("cost", {"batch_size": 5, "memory_overrides": {"triage": 512}})
+
+    template.has_resource_properties(
+        "AWS::Lambda::EventSourceMapping",
+        {"BatchSize": 5, "MaximumBatchingWindowInSeconds": 30, "ScalingConfig": {"MaximumConcurrency": 2}},
+    )
+    template.has_resource_properties("AWS::Lambda::Function", {"Handler": "triage_handler.handler", "MemorySize": 512})
+    template.has_resource_properties("AWS::Lambda::Function", {"Handler": "ticket_handler.handler", "MemorySize": 256})
+
+
+def test_priority_lanes_get_their_own_queues_and_concurrency():
+    lanes = {"lanes": {"critical": 3, "bulk": 1}, "tenant_token_quota": 1000}
+    app = aws_cdk.App(context={"priority_lanes": json.dumps(lanes), "performance_profile": "low-latency"})
+    template = assertions.Template.from_stack(DlqTriageStack(app, "TestStack"))
+
+    template.resource_count_is("AWS::SQS::Queue", 3)
+    template.resource_count_is("AWS::Lambda::EventSourceMapping", 3)
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {"ScalingConfig": {"MaximumConcurrency": 38}})
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {"ScalingConfig": {"MaximumConcurrency": 12}})
+    template.resource_count_is("AWS::DynamoDB::Table", 2)
+
+
+def test_decision_log_and_archive_mount_shared_efs():
+    app = aws_cdk.App(context={"decision_log_dir": "/mnt/efs/decisions", "archive_dir": "/mnt/efs/archive"})
+    template = assertions.Template.from_stack(DlqTriageStack(app, "TestStack"))
+
+    template.resource_count_is("AWS::EFS::FileSystem", 1)
+    mounted = template.find_resources(
+        "AWS::Lambda::Function", {"Properties": {"FileSystemConfigs": [{"LocalMountPath": "/mnt/efs"}]}}
+    )
+    assert len(mounted) == 3
+    with pytest.raises(ValueError):
+        DlqTriageStack(aws_cdk.App(context={"decision_log_dir": "/tmp/decisions"}), "Local")
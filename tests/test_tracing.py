@@ -0,0 +1,79 @@
+from pathlib import Path
+import json
+import sys
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+import guardrails_handler as gh
+import ticket_handler as tk
+import tracing
+import triage_handler as th
+
+
+class DummyBody:
+    def read(self):
+        return json.dumps({"content": [{"text": "not json"}]}).encode("utf-8")
+
+
+class DummyBedrock:
+    def invoke_model(self, **_kwargs):
+        return {"body": DummyBody()}
+
+
+class DummySfn:
+    def __init__(self):
+        self.calls = []
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.calls.append(json.loads(input))
+        return {"executionArn": "arn:aws:states:sample"}
+
+
+def test_triage_records_sqs_wait_and_passes_trace(monkeypatch):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    sent_ms = int(time.time() * 1000) - 1500
+
+    th.handler(
+        {"Records": [{"body": json.dumps({"correlationId": "c-1"}), "attributes": {"SentTimestamp": str(sent_ms)}}]},
+        None,
+    )
+
+    trace = dummy.calls[0]["trace"]
+    assert trace["start_ms"] == sent_ms
+    names = [s["name"] for s in trace["spans"]]
+    assert names == ["sqs_wait", "normalize"]
+    assert trace["spans"][0]["duration_ms"] >= 1500
+
+
+def test_trace_flows_through_workflow_handlers(monkeypatch, capsys):
+    monkeypatch.setattr(ba.boto3, "client", lambda _svc: DummyBedrock())
+    trace = tracing.new_trace()
+
+    adapter = ba.handler({"message": {"correlationId": "c-1"}, "trace": trace}, None)
+    guarded = gh.handler({"message": adapter["message"], "llm": adapter["llm"], "trace": adapter["trace"]}, None)
+    capsys.readouterr()
+    ticket = tk.handler({"message": guarded["message"], "llm": guarded["llm"], "trace": guarded["trace"]}, None)
+
+    names = [s["name"] for s in ticket["trace"]["spans"]]
+    assert names == ["prompt_build", "invoke_model", "parse", "guardrails", "action"]
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    stages = {m["stage"] for m in metrics if "StageLatency" in m}
+    assert stages == set(names)
+    assert any("EndToEndLatency" in m for m in metrics)
+
+
+def test_otlp_export_shape():
+    trace = tracing.new_trace(start_ms=1000.0)
+    tracing.add_span(trace, "invoke_model", "bedrock_adapter", 1010.0, 250.0)
+
+    otlp = tracing.to_otlp(trace)
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = spans
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert child["parentSpanId"] == root["spanId"]
+    assert child["startTimeUnixNano"] == "1010000000"
+    assert child["endTimeUnixNano"] == root["endTimeUnixNano"] == "1260000000"
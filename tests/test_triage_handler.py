@@ -1,4 +1,5 @@
 from pathlib import Path
+import io
 import json
 import sys
 import time
@@ -49,4 +50,79 @@ def test_triage_starts_execution(monkeypatch):
     payload = json.loads(call["input"])
     assert payload["message"]["correlationId"] == "c-1"
     assert payload["message"]["redriveAttempts"] == 1
-    assert int(call["name"].split("-")[-1]) >= before
+    # Without an SQS message id the name falls back to the second, plus the event index
+    assert int(call["name"].split("-")[-2]) >= before and call["name"].endswith("-0")
+
+
+def test_large_body_reaches_step_functions_unchanged(monkeypatch):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setattr(th, "LAZY_DECODE_MIN_BYTES", 1024)
+    body = json.dumps({"correlationId": "c-big", "errorMessage": "Timeout", "document": {"lines": ["x" * 100] * 50}})
+
+    th.handler({"Records": [{"messageId": "m-1", "body": body}]}, None)
+
+    payload = json.loads(dummy.calls[0]["input"])
+    assert payload["message"]["correlationId"] == "c-big"
+    assert payload["message"]["raw"] == json.loads(body)
+    assert body in dummy.calls[0]["input"]
+
+
+def test_body_over_the_input_limit_travels_by_reference(monkeypatch):
+    class Clients(DummySfn):
+        def __init__(self):
+            super().__init__()
+            self.objects = {}
+
+        def put_object(self, Bucket, Key, Body, **_kwargs):
+            self.objects[(Bucket, Key)] = Body
+
+        def get_object(self, Bucket, Key):
+            return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    clients = Clients()
+    monkeypatch.setattr(th.boto3, "client", lambda service: clients)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("PAYLOAD_BUCKET", "payloads")
+    monkeypatch.setattr(th.payload_refs, "OFFLOAD_BYTES", 4096)
+    small = json.dumps({"correlationId": "c-small", "errorMessage": "Timeout"})
+    big = json.dumps({"correlationId": "c-big", "errorMessage": "Timeout", "document": {"lines": ["x" * 100] * 50}})
+
+    th.handler({"Records": [{"messageId": "m-1", "body": small}, {"messageId": "m-2", "body": big}]}, None)
+
+    inputs = {json.loads(c["input"])["message"]["correlationId"]: c["input"] for c in clients.calls}
+    assert json.loads(inputs["c-small"])["message"]["raw"] == json.loads(small)
+    message = json.loads(inputs["c-big"])["message"]
+    assert len(inputs["c-big"]) < 4096 and message["raw"]["$ref"].startswith("s3://payloads/payloads/")
+    assert th.payload_refs.resolve(message, clients)["raw"] == json.loads(big)
+    # The guardrail budget still sees the full body
+    assert th.guardrails_handler.guardrail_policy.token_estimate(message) > len(big) // 4
+
+
+def test_guardrails_precheck_skips_bedrock_for_hopeless_messages(monkeypatch, capsys):
+    dummy = DummySfn()
+    monkeypatch.setattr(th.boto3, "client", lambda service: dummy)
+    monkeypatch.setenv("STATE_MACHINE_ARN", "arn:aws:states:sample")
+    monkeypatch.setenv("GUARDRAILS_PRECHECK", "1")
+    fresh = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    bodies = [
+        {"correlationId": "ok", "timestamp": fresh, "redriveAttempts": 0},
+        {"correlationId": "tried", "timestamp": fresh, "redriveAttempts": 5},
+        {"correlationId": "done", "timestamp": fresh, "stateAtFailure": "COMPLETED"},
+        {"correlationId": "old", "failureCategory": "DOWNSTREAM_TIMEOUT", "timestamp": "2000-01-01T00:00:00Z"},
+    ]
+
+    th.handler({"Records": [{"body": json.dumps(body)} for body in bodies]}, None)
+
+    inputs = {json.loads(c["input"])["message"]["correlationId"]: json.loads(c["input"]) for c in dummy.calls}
+    assert "precheck" not in inputs["ok"]
+    assert inputs["tried"]["precheck"]["guardrails"]["reasons"] == ["max_attempts_exceeded"]
+    assert inputs["done"]["precheck"]["guardrails"]["reasons"] == ["already_completed"]
+    old = inputs["old"]["precheck"]
+    assert old["llm"]["recommended_action"] == "TICKET" and old["llm"]["category"] == "DOWNSTREAM_TIMEOUT"
+    assert old["llm"]["summary"] == "Message is older than the redrive window."
+    assert set(old) == {"llm", "guardrails"}
+    assert "guardrails_precheck" in [span["name"] for span in inputs["old"]["trace"]["spans"]]
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [m["BedrockCallsAvoided"] for m in metrics if "BedrockCallsAvoided" in m] == [3]
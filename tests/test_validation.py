@@ -0,0 +1,53 @@
+from pathlib import Path
+import json
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "lambda"))
+
+import bedrock_adapter as ba
+from validation import CompiledModel
+
+
+VALID = {
+    "category": "SYSTEM_TRANSIENT",
+    "recommended_action": "REDRIVE",
+    "confidence": 0.9,
+    "summary": "ok",
+    "reasoning": "ok",
+}
+
+
+def test_validate_json_from_bytes_returns_model():
+    triage = ba.TRIAGE_OUTPUT.validate_json(json.dumps(VALID).encode("utf-8"))
+    assert isinstance(triage, ba.TriageOutput)
+    assert triage.confidence == 0.9
+
+
+def test_validate_json_dict_matches_model_dump():
+    raw = json.dumps({**VALID, "extra": "ignored"})
+    assert ba.TRIAGE_OUTPUT.validate_json_dict(raw) == ba.TRIAGE_OUTPUT.dump(ba.TRIAGE_OUTPUT.validate_json(raw))
+
+
+def test_validate_json_dict_rejects_invalid_json_and_bounds():
+    with pytest.raises(ValidationError):
+        ba.TRIAGE_OUTPUT.validate_json_dict("not json")
+    with pytest.raises(ValidationError):
+        ba.TRIAGE_OUTPUT.validate_json_dict(json.dumps({**VALID, "confidence": 1.5}))
+
+
+def test_batch_validation_of_outputs():
+    data = json.dumps([VALID, {**VALID, "recommended_action": "TICKET"}])
+    models = ba.TRIAGE_OUTPUT.validate_json_many(data)
+    dicts = ba.TRIAGE_OUTPUT.validate_json_many_dict(data)
+    assert [m.recommended_action for m in models] == ["REDRIVE", "TICKET"]
+    assert [d["recommended_action"] for d in dicts] == ["REDRIVE", "TICKET"]
+
+
+def test_model_without_dict_type_falls_back_to_dump():
+    compiled = CompiledModel(ba.TriageOutput)
+    assert compiled.validate_python_dict(VALID) == VALID
+    with pytest.raises(ValidationError):
+        compiled.validate_many([VALID, {"category": "X"}])
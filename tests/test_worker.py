@@ -0,0 +1,139 @@
+from pathlib import Path
+import json
+import sys
+import threading
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import dlq_triage_sample as sample
+from dlq_triage_local.sqs import InMemorySqs
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _fill(sqs, url, count):
+    for i in range(count):
+        sqs.send_message(QueueUrl=url, MessageBody=json.dumps({"correlationId": f"c-{i}"}))
+
+
+def _stop(worker, threads):
+    worker.stop()
+    for thread in threads:
+        thread.join(timeout=5)
+
+
+def test_worker_processes_backlog_with_batch_deletes():
+    sqs = InMemorySqs()
+    url = sqs.create_queue(QueueName="dlq")["QueueUrl"]
+    _fill(sqs, url, 45)
+    seen = []
+    worker = sample.SqsWorker(
+        sqs, url, process=lambda m: seen.append(m["correlationId"]), wait_time_seconds=0.05, heartbeat_interval=0.05
+    )
+    threads = worker.start()
+
+    assert _wait_for(lambda: worker.stats["deleted"] == 45)
+    _stop(worker, threads)
+
+    assert sorted(seen) == sorted(f"c-{i}" for i in range(45))
+    assert sqs.calls["DeleteMessageBatch"] <= 10
+    assert "DeleteMessage" not in sqs.calls
+    assert sqs.get_queue_attributes(QueueUrl=url)["Attributes"]["ApproximateNumberOfMessages"] == "0"
+
+
+def test_heartbeat_extends_visibility_for_slow_messages():
+    sqs = InMemorySqs()
+    url = sqs.create_queue(QueueName="dlq")["QueueUrl"]
+    _fill(sqs, url, 1)
+    calls = []
+
+    def slow(message):
+        calls.append(message)
+        time.sleep(0.5)
+
+    controller = sample.AdaptiveController(visibility_timeout=0.3, max_pollers=2)
+    controller.pollers = 2
+    worker = sample.SqsWorker(
+        sqs, url, process=slow, visibility_timeout=0.3, wait_time_seconds=0.05, heartbeat_interval=0.05, controller=controller
+    )
+    threads = worker.start()
+
+    assert _wait_for(lambda: worker.stats["deleted"] == 1)
+    _stop(worker, threads)
+
+    # Without the heartbeat the second poller would have received it again
+    assert len(calls) == 1
+    assert worker.stats["heartbeats"] > 0
+
+
+def test_stop_drains_in_flight_messages():
+    sqs = InMemorySqs()
+    url = sqs.create_queue(QueueName="dlq")["QueueUrl"]
+    _fill(sqs, url, 3)
+    release = threading.Event()
+    worker = sample.SqsWorker(
+        sqs, url, process=lambda _m: release.wait(), wait_time_seconds=0.05, heartbeat_interval=0.05
+    )
+    threads = worker.start()
+    assert _wait_for(lambda: worker.stats["received"] == 3)
+
+    worker.stop()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert worker.stats["deleted"] == 3
+
+
+def test_controller_adapts_batch_and_pollers():
+    controller = sample.AdaptiveController(visibility_timeout=10, max_pollers=4)
+    controller.observe_batch(10, 20.0)  # 2 s per message -> 2 fit in half the timeout
+    assert controller.batch_size == 2
+    controller.observe_depth(1000)
+    controller.observe_depth(1000)
+    assert controller.pollers == 3
+    controller.observe_batch(0, 0.0)
+    assert controller.pollers == 2
+
+
+def test_transient_sqs_errors_do_not_kill_the_worker_threads():
+    class FlakySqs(InMemorySqs):
+        def __init__(self):
+            super().__init__()
+            self.failures = {"receive_message": 3, "get_queue_attributes": 2}
+
+        def _maybe_fail(self, name):
+            if self.failures.get(name):
+                self.failures[name] -= 1
+                raise ConnectionError(f"{name} unavailable")
+
+        def receive_message(self, **kwargs):
+            self._maybe_fail("receive_message")
+            return super().receive_message(**kwargs)
+
+        def get_queue_attributes(self, **kwargs):
+            self._maybe_fail("get_queue_attributes")
+            return super().get_queue_attributes(**kwargs)
+
+    sqs = FlakySqs()
+    url = sqs.create_queue(QueueName="dlq")["QueueUrl"]
+    _fill(sqs, url, 5)
+    controller = sample.AdaptiveController(60, min_pollers=1, max_pollers=1)
+    worker = sample.SqsWorker(
+        sqs, url, process=lambda m: None, wait_time_seconds=0.05, heartbeat_interval=0.05, controller=controller
+    )
+    threads = worker.start()
+
+    assert _wait_for(lambda: worker.stats["deleted"] == 5)
+    assert _wait_for(lambda: sqs.failures["get_queue_attributes"] == 0)
+    assert all(thread.is_alive() for thread in threads)
+    _stop(worker, threads)
+    assert worker.stats["errors"] == 5
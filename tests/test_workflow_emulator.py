@@ -0,0 +1,153 @@
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from dlq_triage_local import emulate
+from dlq_triage_local.sns import InMemorySns
+from dlq_triage_local.workflow import LAMBDA_INVOKE, StatesError, WorkflowEmulator, load_definition
+
+
+def _task(function, **extra):
+    return {
+        "Type": "Task",
+        "Resource": LAMBDA_INVOKE,
+        "Parameters": {"FunctionName": f"lambda:{function}", "Payload.$": "$"},
+        **extra,
+    }
+
+
+def test_choice_routes_on_lambda_payload():
+    definition = {
+        "StartAt": "Score",
+        "States": {
+            "Score": _task("score", ResultPath="$.scored", Next="Decide"),
+            "Decide": {
+                "Type": "Choice",
+                "Choices": [{"Variable": "$.scored.Payload.score", "NumericGreaterThan": 5, "Next": "High"}],
+                "Default": "Low",
+            },
+            "High": {"Type": "Pass", "Result": "high", "ResultPath": "$.band", "End": True},
+            "Low": {"Type": "Pass", "Result": "low", "ResultPath": "$.band", "End": True},
+        },
+    }
+    emulator = WorkflowEmulator(definition, functions={"score": lambda event, _ctx: {"score": event["value"] * 2}})
+
+    high = emulator.run({"value": 4})
+    low = emulator.run({"value": 1})
+
+    assert high["status"] == "SUCCEEDED"
+    assert high["output"]["band"] == "high"
+    assert high["output"]["scored"]["StatusCode"] == 200
+    assert high["states"] == ["Score", "Decide", "High"]
+    assert low["output"]["band"] == "low"
+
+
+def test_retry_then_succeed_and_catch_on_exhaustion():
+    calls = []
+
+    def flaky(event, _ctx):
+        calls.append(event)
+        if len(calls) < event["fail_times"] + 1:
+            raise TimeoutError("slow downstream")
+        return {"ok": True}
+
+    definition = {
+        "StartAt": "Call",
+        "States": {
+            "Call": _task(
+                "flaky",
+                Retry=[{"ErrorEquals": ["TimeoutError"], "MaxAttempts": 2, "IntervalSeconds": 1}],
+                Catch=[{"ErrorEquals": ["States.ALL"], "ResultPath": "$.error", "Next": "Recover"}],
+                ResultPath="$.result",
+                End=True,
+            ),
+            "Recover": {"Type": "Pass", "End": True},
+        },
+    }
+    sleeps = []
+    emulator = WorkflowEmulator(definition, functions={"flaky": flaky}, time_scale=1.0, sleep=sleeps.append)
+
+    recovered = emulator.run({"fail_times": 2})
+    assert recovered["output"]["result"]["Payload"] == {"ok": True}
+    assert sleeps == [1.0, 2.0]
+
+    calls.clear()
+    caught = emulator.run({"fail_times": 5})
+    assert caught["status"] == "SUCCEEDED"
+    assert caught["states"] == ["Call", "Recover"]
+    assert caught["output"]["error"]["Error"] == "TimeoutError"
+    assert len(calls) == 3
+
+
+def test_fail_state_and_uncaught_errors_fail_the_execution():
+    definition = {
+        "StartAt": "Call",
+        "States": {
+            "Call": _task("boom", Next="Done"),
+            "Done": {"Type": "Fail", "Error": "Unreachable", "Cause": "should not get here"},
+        },
+    }
+
+    def boom(_event, _ctx):
+        raise ValueError("bad input")
+
+    result = WorkflowEmulator(definition, functions={"boom": boom}).run({})
+
+    assert result["status"] == "FAILED"
+    assert result["error"] == "ValueError"
+    assert "bad input" in result["cause"]
+
+
+def test_sns_publish_and_duplicate_execution_names():
+    sns = InMemorySns()
+    topic = sns.create_topic(Name="outcomes")["TopicArn"]
+    definition = {
+        "StartAt": "Notify",
+        "States": {
+            "Notify": {
+                "Type": "Task",
+                "Resource": "arn:aws:states:::sns:publish",
+                "Parameters": {"TopicArn": topic, "Message": {"id.$": "$.id"}},
+                "End": True,
+            }
+        },
+    }
+    emulator = WorkflowEmulator(definition, sns=sns)
+
+    arn = emulator.start_execution(stateMachineArn="arn:sm", name="one", input=json.dumps({"id": "c-1"}))["executionArn"]
+
+    assert emulator.describe_execution(arn)["status"] == "SUCCEEDED"
+    assert json.loads(sns.published[topic][0]["Message"]) == {"id": "c-1"}
+    with pytest.raises(StatesError):
+        emulator.start_execution(stateMachineArn="arn:sm", name="one", input="{}")
+
+
+def test_checked_in_definition_matches_stack_shape():
+    definition = load_definition()
+
+    assert definition["StartAt"] == "GuardrailsPrecheck"
+    assert {"SkipBedrock", "BedrockAdapter", "GuardrailsLambda", "Decision", "RedriveLambda", "TicketLambda", "Notify"} <= set(definition["States"])
+
+
+def test_end_to_end_run_through_real_handlers():
+    summary = emulate.run(60, workers=4, batch_size=10)
+
+    assert summary["executions"] == 60
+    assert sum(summary["outcomes"].values()) == 60
+    assert set(summary["outcomes"]) <= {"redrive", "ticket"}
+    assert summary["sns_published"] == 60
+    assert summary["sqs_calls"]["DeleteMessageBatch"] == 6
+    assert summary["end_to_end_ms"]["p99"] >= summary["end_to_end_ms"]["p50"] > 0
+
+
+def test_precheck_routes_exhausted_messages_around_bedrock(monkeypatch):
+    monkeypatch.setenv("GUARDRAILS_PRECHECK", "1")
+    summary = emulate.run(60, workers=4, batch_size=10)
+
+    # sample_messages gives a fifth of the messages 3 redrive attempts
+    assert summary["executions"] == summary["sns_published"] == 60
+    assert summary["outcomes"]["ticket"] >= summary["skipped_bedrock"] > 0